@@ -5,10 +5,13 @@ Hip-Hop Noir Detective - 자연어 질문 → Cypher 쿼리 → 답변 챗봇
 import streamlit as st
 import os
 from dotenv import load_dotenv
-from langchain_community.graphs import Neo4jGraph
-from langchain_community.chains.graph_qa.cypher import GraphCypherQAChain
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
+from query_governor import GovernedNeo4jGraph, default_governor
+from prompts import persona_template
+from model_router import TieredCypherQAChain, get_model_tiers
+from planner import QuestionPlanner
+from cypher_examples import ExampleStore
+from schema_selector import SchemaSelector
 
 # 1. 환경 변수 로드 (.env 파일에서 접속 정보 가져옴)
 load_dotenv()
@@ -27,60 +30,38 @@ if not os.getenv("OPENAI_API_KEY") or not os.getenv("NEO4J_URI"):
 # 4. 체인 생성 (리소스 캐싱)
 @st.cache_resource
 def get_chain():
-    # LLM 설정 (똑똑한 GPT-4o 권장)
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
+    # LLM 설정 (모델 티어링)
+    # - fast_llm: Cypher 생성 (CYPHER_MODEL_FAST, 기본 gpt-4o-mini) - 검증 실패 시에만 큰 모델로 재생성
+    # - llm: 느와르 답변 (LLM_MODEL, 기본 똑똑한 GPT-4o 권장)
+    fast_llm, llm = get_model_tiers()
     
     # Neo4j 연결
-    graph = Neo4jGraph(
+    # - 거버너: 타임아웃/행 수 상한/읽기 전용/취소 (GOVERNOR_* 환경 변수)
+    # - CYPHER_PROFILE_MODE=profile|explain 이면 슬로우 쿼리 로그 기록
+    graph = GovernedNeo4jGraph(
         url=os.getenv("NEO4J_URI"),
         username=os.getenv("NEO4J_USERNAME"),
         password=os.getenv("NEO4J_PASSWORD")
     )
     
-    # ★ 탐정 페르소나 프롬프트 (여기가 핵심!)
-    # LLM에게 "넌 단순한 검색기가 아니라 탐정이야"라고 최면을 겁니다.
-    template = """
-    당신은 1990년대 힙합 범죄 전문 프로파일러입니다.
-    Neo4j 데이터베이스를 조회하여 답변하세요.
-
-    [중요한 수사 규칙]
-    1. 사용자가 "누가 죽였어?"라고 물어도, 반드시 **직접 살인(KILLED, SHOT_AT)**뿐만 아니라 
-       **청부(HIRED_HITMAN, OFFERED_BOUNTY)**나 **배후 조종(ALLEGEDLY_ORCHESTRATED_MURDER_OF, ORDERED_HIT)** 관계까지 찾아야 합니다.
-    2. Cypher 쿼리를 짤 때, 직접 관계가 안 나오면 **2단계, 3단계 관계(Multi-hop)**를 의심하세요.
-       예: (A)-[:HIRED_HITMAN]->(B)-[:SHOT_AT]->(C) 라면, A가 배후입니다.
-    3. 답변은 느와르 영화의 독백처럼 서술하고, 찾은 단서(증거)를 구체적으로 언급하세요.
-    4. "관련 기록 없음"이라고 답하기 전에, 다른 관계 타입으로 다시 검색해보세요.
-    
-    [데이터 스키마 정보]
-    Nodes: Rapper, Producer, Person, Gang, Location, Event, Label, Vehicle, Weapon
-    
-    Relationships (직접): 
-    - KILLED, SHOT_AT, ATTACKED, BEEF_WITH, SUSPECTED_KILLER_OF
-    
-    Relationships (간접/배후):
-    - HIRED_HITMAN, OFFERED_BOUNTY, ORDERED_HIT, ALLEGEDLY_ORCHESTRATED_MURDER_OF
-    - GAVE_WEAPON, RODE_IN, USED_IN
-    
-    Relationships (소속/관계):
-    - MEMBER_OF, SIGNED_TO, FOUNDED, AFFILIATED_WITH, UNCLE_OF
-    - VICTIM_OF, DIED_FROM, SURVIVED, INJURED_IN
-    
-    질문: {question}
-    
-    Cypher 쿼리 생성 결과와 DB 검색 결과를 종합하여, 직접적인 실행범과 배후를 모두 밝혀내세요.
-    """
-    
-    PROMPT = PromptTemplate(input_variables=["question"], template=template)
+    # ★ 탐정 페르소나 프롬프트 (prompts.py의 persona_template)
+    PROMPT = PromptTemplate(input_variables=["schema", "context", "question"], template=persona_template)
     
     # 체인 생성 (Natural Language -> Cypher -> Result -> Answer)
-    chain = GraphCypherQAChain.from_llm(
-        llm, 
-        graph=graph, 
-        verbose=True, # 터미널에 에이전트의 생각(쿼리)을 보여줍니다
+    # 작은 목록/개수/단일 사실 결과는 템플릿으로 바로 답하고, 추론형 질문만 느와르 답변 LLM을 부릅니다.
+    # (쓰기/폭주 쿼리는 GovernedNeo4jGraph가 차단)
+    chain = TieredCypherQAChain(
+        graph=graph,
+        cypher_llm=fast_llm,
+        escalation_llm=llm,
+        qa_llm=llm,
         qa_prompt=PROMPT,
-        allow_dangerous_requests=True # Cypher 실행 허용
+        verbose=True, # 터미널에 에이전트의 생각(쿼리)을 보여줍니다
+        examples=ExampleStore(),  # 비슷한 검증 예시를 Cypher 생성 프롬프트에 넣고, 성공한 쿼리로 학습
+        schema_selector=SchemaSelector(graph),  # 질문에 관련된 스키마 조각만 Cypher/답변 프롬프트에 넣음
     )
-    return chain
+    # 복합 질문("~와 ~의 연관성은?")은 하위 질문으로 나눠 동시에 조회하고 느와르 답변 한 번으로 종합
+    return QuestionPlanner(chain, planner_llm=fast_llm)
 
 chain = get_chain()
 
@@ -105,7 +86,13 @@ if prompt := st.chat_input("수사관님, 질문을 입력하세요..."):
         with st.spinner("사건 기록 뒤지는 중... 🔍"):
             try:
                 # 여기서 LLM이 그래프를 탐색합니다
-                response = chain.invoke(prompt)
+                # (기다리는 동안 경과 시간을 갱신하며, 사용자가 요청을 버리면 쿼리도 취소됩니다)
+                elapsed = st.empty()
+                response = default_governor.run_cancellable(
+                    chain.invoke, prompt,
+                    heartbeat=lambda s: elapsed.caption(f"⏱️ {s:.0f}초 경과")
+                )
+                elapsed.empty()
                 msg = response['result']
                 
                 st.write(msg)
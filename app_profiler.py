@@ -6,8 +6,12 @@ AI 범죄 프로파일러 - 확률 기반 추론 엔진
 import streamlit as st
 import os
 from dotenv import load_dotenv
-from langchain_community.graphs import Neo4jGraph
 from langchain_openai import ChatOpenAI
+from query_profiler import collect_profiles, expensive_operators
+from query_governor import GovernedNeo4jGraph
+from graph_analytics import ConflictGraphAnalytics
+from evidence import pack_evidence, relation_weight
+from provenance import ProvenanceIndex
 
 # 1. 설정 및 연결
 load_dotenv()
@@ -22,6 +26,10 @@ st.markdown("""
 with st.sidebar:
     st.header("🔍 수사 설정")
     sensitivity = st.slider("수사 강도 (Inference Level)", 0.0, 1.0, 0.0, help="높을수록 창의적인 추론을 합니다.")
+    evidence_budget = st.slider(
+        "증거 토큰 예산", 200, 3000, int(os.getenv("EVIDENCE_MAX_TOKENS", 600)), step=100,
+        help="강한 증거(가중치 × 홉 감쇠)부터 이 예산까지만 프롬프트에 넣습니다.",
+    )
     
     st.divider()
     st.markdown("### 📊 관계 가중치")
@@ -29,8 +37,8 @@ with st.sidebar:
     | 관계 | 점수 |
     |------|------|
     | `SHOT_AT`, `KILLED` | 99% |
-    | `HIRED_HITMAN`, `ORDERED_HIT` | 95% |
-    | `GAVE_WEAPON`, `RODE_IN` | 70% |
+    | `HIRED_HITMAN`, `ORDERED_HIT`, `MASTERMIND_OF` | 95% |
+    | `GAVE_WEAPON`, `RODE_IN`, `ACCOMPLICE_OF` | 70% |
     | `BEEF_WITH`, `RIVAL_OF` | 30% |
     """)
     
@@ -42,7 +50,8 @@ with st.sidebar:
 # 2. Neo4j & LLM 연결
 @st.cache_resource
 def get_graph():
-    return Neo4jGraph(
+    # 템플릿 쿼리도 거버너/재작성기(라벨 추론, 파라미터화)를 거칩니다.
+    return GovernedNeo4jGraph(
         url=os.getenv("NEO4J_URI"),
         username=os.getenv("NEO4J_USERNAME"),
         password=os.getenv("NEO4J_PASSWORD")
@@ -52,8 +61,16 @@ def get_graph():
 def get_llm(_sensitivity):
     return ChatOpenAI(model="gpt-4o", temperature=_sensitivity)
 
+@st.cache_resource
+def get_analytics():
+    # 중심성 결과는 그래프 버전(관계 타입별 개수)이 바뀔 때까지 캐시됩니다.
+    return ConflictGraphAnalytics(get_graph())
+
 graph = get_graph()
 llm = get_llm(sensitivity)
+analytics = get_analytics()
+# 사실의 evidence 참조 → Document 노드 (근거 문장 인용)
+provenance = ProvenanceIndex(graph)
 
 def get_evidence_from_db():
     """데이터베이스에서 투팍 관련 모든 증거를 가져옵니다."""
@@ -62,64 +79,62 @@ def get_evidence_from_db():
     query1 = """
     MATCH (a)-[r]->(t)
     WHERE t.id CONTAINS 'Tupac' OR t.id CONTAINS 'tupac'
-    RETURN a.id as suspect, type(r) as relation, t.id as victim
+    RETURN a.id as suspect, type(r) as relation, t.id as victim, r.evidence as evidence
     """
     
     # Multi-hop 관계 (A -> B -> Tupac)
+    # 순위는 증거 패커가 매기므로 넉넉히 가져옵니다. (행 수 상한은 거버너가 지킴)
     query2 = """
     MATCH path = (a)-[r1]->(b)-[r2]->(t)
     WHERE (t.id CONTAINS 'Tupac' OR t.id CONTAINS 'tupac')
     AND a.id <> b.id
     RETURN a.id as mastermind, type(r1) as relation1, b.id as middleman, type(r2) as relation2, t.id as victim
-    LIMIT 20
+    LIMIT 200
     """
     
     # Puff Daddy의 모든 관계
     query3 = """
     MATCH (p)-[r]->(t)
     WHERE p.id CONTAINS 'Puff' OR p.id CONTAINS 'Diddy'
-    RETURN p.id as suspect, type(r) as relation, t.id as target
-    """
-    
-    # 모든 용의자들
-    query4 = """
-    MATCH (a)-[r]->(t)
-    WHERE (t.id CONTAINS 'Tupac' OR t.id CONTAINS 'tupac')
-    AND type(r) IN ['SHOT_AT', 'KILLED', 'HIRED_HITMAN', 'ORDERED_HIT', 'OFFERED_BOUNTY', 
-                    'ALLEGEDLY_ORCHESTRATED_MURDER_OF', 'GAVE_WEAPON', 'SUSPECTED_KILLER_OF']
-    RETURN DISTINCT a.id as suspect, collect(DISTINCT type(r)) as relations
+    RETURN p.id as suspect, type(r) as relation, t.id as target, r.evidence as evidence
     """
     
     results = {
         "direct_relations": graph.query(query1),
         "multi_hop": graph.query(query2),
         "puff_daddy": graph.query(query3),
-        "suspects": graph.query(query4)
+        # 갈등 서브그래프 중심성 기반 상위 용의자 (피해자 기준 개인화 PageRank + PageRank + 매개 중심성)
+        "centrality": analytics.top_suspects("Tupac", k=5)
     }
     
     return results
 
-def format_evidence(evidence):
-    """증거를 문자열로 포맷팅"""
-    formatted = "=== 데이터베이스 증거 ===\n\n"
-    
-    formatted += "1. 투팍을 향한 직접 관계:\n"
-    for r in evidence["direct_relations"][:15]:
-        formatted += f"   - {r['suspect']} -[:{r['relation']}]-> {r['victim']}\n"
-    
-    formatted += "\n2. Multi-hop 관계 (배후 -> 중간자 -> 피해자):\n"
-    for r in evidence["multi_hop"][:10]:
-        formatted += f"   - {r['mastermind']} -[:{r['relation1']}]-> {r['middleman']} -[:{r['relation2']}]-> {r['victim']}\n"
-    
-    formatted += "\n3. Puff Daddy의 관계:\n"
-    for r in evidence["puff_daddy"][:10]:
-        formatted += f"   - {r['suspect']} -[:{r['relation']}]-> {r['target']}\n"
-    
-    formatted += "\n4. 주요 용의자 목록:\n"
-    for r in evidence["suspects"]:
-        formatted += f"   - {r['suspect']}: {r['relations']}\n"
-    
-    return formatted
+def format_evidence(evidence, max_tokens=None):
+    """
+    증거를 프롬프트용 문자열로 묶습니다. (evidence.pack_evidence)
+    경로를 중복 제거하고 관계 가중치·홉 수로 순위를 매겨, 토큰 예산 안에서 강한 증거부터 담습니다.
+    주요 용의자 목록은 담긴 경로에서 만듭니다.
+
+    Returns:
+        tuple: (증거 문자열, {'paths', 'kept', 'tokens'})
+    """
+    return pack_evidence(evidence, max_tokens=max_tokens)
+
+def cite_evidence(evidence, limit=5):
+    """
+    가중치가 높은 직접 관계부터 근거 문장을 찾습니다. (evidence 참조 → Document.id 인덱스 한 번)
+
+    Returns:
+        list: [{'row': 관계 행, 'citations': [{'quote', 'source', 'section', ...}]}, ...]
+    """
+    rows, seen = [], set()
+    for row in evidence["direct_relations"] + evidence["puff_daddy"]:
+        key = (row["suspect"], row["relation"], row.get("victim") or row.get("target"))
+        if row.get("evidence") and key not in seen:
+            seen.add(key)
+            rows.append(row)
+    rows.sort(key=lambda row: -relation_weight(row["relation"]))
+    return provenance.cite(rows[:limit])
 
 def analyze_with_llm(question, evidence_str):
     """LLM으로 증거를 분석하여 프로파일링"""
@@ -130,8 +145,8 @@ def analyze_with_llm(question, evidence_str):
 
     [⚠️ 추론 규칙 (Scoring Logic)]
     1. **실행범 (The Executor):** `SHOT_AT`, `KILLED`, `SUSPECTED_KILLER_OF` → **확률 99%**
-    2. **설계자 (The Mastermind):** `HIRED_HITMAN`, `ORDERED_HIT`, `OFFERED_BOUNTY`, `ALLEGEDLY_ORCHESTRATED_MURDER_OF` → **확률 95%**
-    3. **공범 (Accomplice):** `GAVE_WEAPON`, `RODE_IN`, `ORCHESTRATED_MURDER_OF` → **확률 70%**
+    2. **설계자 (The Mastermind):** `HIRED_HITMAN`, `ORDERED_HIT`, `OFFERED_BOUNTY`, `ALLEGEDLY_ORCHESTRATED_MURDER_OF`, `MASTERMIND_OF` → **확률 95%**
+    3. **공범 (Accomplice):** `GAVE_WEAPON`, `RODE_IN`, `ORCHESTRATED_MURDER_OF`, `ACCOMPLICE_OF` → **확률 70%**
     4. **동기 보유 (Suspect):** `BEEF_WITH`, `RIVAL_OF`, `ATTACKED` → **확률 30%**
 
     [데이터베이스 증거]
@@ -177,13 +192,36 @@ if prompt := st.chat_input("예: 투팍 사건의 범인과 배후를 확률 높
         with st.spinner("🕵️‍♂️ 데이터베이스 조회 중..."):
             try:
                 # 1. DB에서 증거 수집
-                evidence = get_evidence_from_db()
-                evidence_str = format_evidence(evidence)
+                with collect_profiles() as profiles:
+                    evidence = get_evidence_from_db()
+                evidence_str, packed = format_evidence(evidence, max_tokens=evidence_budget)
                 
                 # 디버그: 증거 표시
                 with st.expander("🔍 수집된 증거 보기"):
+                    st.caption(f"경로 {packed['kept']}/{packed['paths']}개, 약 {packed['tokens']} 토큰")
                     st.code(evidence_str)
                 
+                # 근거 문장 (수집 때 기록된 출처가 있는 관계만)
+                citations = cite_evidence(evidence)
+                if citations:
+                    with st.expander(f"📎 근거 문장 ({len(citations)})"):
+                        for cited in citations:
+                            row = cited["row"]
+                            st.markdown(f"**{row['suspect']} -[{row['relation']}]-> {row.get('victim') or row.get('target')}**")
+                            for citation in cited["citations"]:
+                                where = " · ".join(str(v) for v in (citation.get("source"), citation.get("section")) if v)
+                                st.markdown(f"> {citation['quote'].strip()}")
+                                if where:
+                                    st.caption(where)
+                
+                # 디버그: 템플릿 쿼리 비용 (CYPHER_PROFILE_MODE=profile|explain 일 때)
+                if profiles:
+                    with st.expander("🐢 쿼리 비용 (PROFILE)"):
+                        for profile in profiles:
+                            st.markdown(f"**{profile['elapsed_ms']}ms / db hits {profile['db_hits']:,}**")
+                            st.code(profile['query'], language='cypher')
+                            st.table(expensive_operators(profile))
+                
             except Exception as e:
                 st.error(f"DB 조회 실패: {e}")
                 st.stop()
@@ -2,7 +2,8 @@
 Hip-Hop Noir 수사 본부 - Streamlit 웹 인터페이스
 """
 import streamlit as st
-from detective import ask_detective
+from detective import ask_detective, get_citations
+from query_profiler import expensive_operators
 
 # 페이지 설정
 st.set_page_config(
@@ -72,14 +73,21 @@ if submit_button or (question and question not in [h['question'] for h in st.ses
             st.warning("이미 수사한 질문입니다. 아래 기록을 확인하세요.")
         else:
             with st.spinner("⏳ 데이터베이스 조회 및 추론 중... (잠시만 기다려주세요)"):
-                result = ask_detective(question)
+                # 경과 시간 표시는 사용자가 다른 버튼을 눌러 요청을 버렸을 때 쿼리를 취소하는 지점이기도 합니다.
+                elapsed = st.empty()
+                result = ask_detective(question, heartbeat=lambda s: elapsed.caption(f"⏱️ {s:.0f}초 경과"))
+                elapsed.empty()
                 answer = result.get('result', '답변을 생성할 수 없습니다.')
                 
                 # 히스토리에 추가
                 st.session_state['history'].append({
                     'question': question,
                     'answer': answer,
-                    'intermediate_steps': result.get('intermediate_steps', [])
+                    'intermediate_steps': result.get('intermediate_steps', []),
+                    'profiles': result.get('profiles', []),
+                    'governor': result.get('governor', {}),
+                    'route': result.get('route', {}),
+                    'citations': get_citations(result)
                 })
                 
                 st.session_state['question'] = ''  # 입력창 초기화
@@ -96,12 +104,58 @@ if st.session_state['history']:
             st.markdown("**📋 프로파일러 보고서:**")
             st.markdown(record['answer'])
             
+            # 근거 문장 (수집 때 기록된 출처)
+            if record.get('citations'):
+                st.markdown("**📎 근거 문장:**")
+                for cited in record['citations']:
+                    row = cited['row']
+                    for citation in cited['citations']:
+                        where = " · ".join(str(v) for v in (citation.get('source'), citation.get('section')) if v)
+                        st.markdown(f"- `{row['source']} -[{row['relation']}]-> {row['target']}` — “{citation['quote'].strip()}”"
+                                    + (f" ({where})" if where else ""))
+            
+            # GraphRAG로 찾은 경우 (RETRIEVAL_MODE)
+            retrieval = record.get('route', {}).get('retrieval')
+            if retrieval == 'fallback':
+                st.caption("🧭 Cypher 조회 결과가 없어 수집된 원문과 주변 관계(GraphRAG)로 답했습니다.")
+            elif retrieval in ('graphrag', 'hybrid'):
+                st.caption(f"🧭 검색 방식: {retrieval}")
+            
+            if record.get('governor', {}).get('truncated'):
+                st.caption("⚠️ 결과가 너무 커서 일부만 사용했습니다. (GOVERNOR_MAX_ROWS / GOVERNOR_MAX_BYTES)")
+            
             # Cypher 쿼리 표시 (접을 수 있음)
             if record.get('intermediate_steps'):
                 with st.expander("🔧 실행된 Cypher 쿼리 (디버그)"):
                     for step in record['intermediate_steps']:
                         if 'query' in step:
                             st.code(step['query'], language='cypher')
+                        if 'retrieval' in step:
+                            st.markdown("**🧭 GraphRAG 검색:** 시드 엔티티 " + ", ".join(step['retrieval']['seeds'][:10])
+                                        + f" · 관계 {step['retrieval']['facts']}개")
+                            st.table(step['retrieval']['passages'])
+                    
+                    # 실행 전 스키마 교정 (RIVAL_OF → RIVALRY_WITH, 뒤집힌 방향 등)
+                    if record.get('route', {}).get('fixes'):
+                        st.markdown("**🩹 스키마 교정:** " + " / ".join(record['route']['fixes']))
+                    
+                    # 실행 전 재작성 내역 (라벨 추론, 가변 길이 상한, 파라미터화)
+                    for rewrite in record.get('governor', {}).get('rewrites', []):
+                        st.markdown("**✏️ 재작성된 쿼리:** " + " / ".join(rewrite['changes']))
+                        st.code(rewrite['rewritten'], language='cypher')
+                    
+                    # 쿼리 비용 (CYPHER_PROFILE_MODE=profile|explain 일 때만 수집됨)
+                    for profile in record.get('profiles', []):
+                        badge = "🐢 SLOW" if profile.get('slow') else "✅"
+                        st.markdown(
+                            f"**{badge} {profile['mode'].upper()}** — "
+                            f"{profile['elapsed_ms']}ms, db hits: {profile['db_hits']:,}, rows: {profile['rows']:,}"
+                        )
+                        st.table([
+                            {"연산자": op['operator'], "db hits": op['db_hits'], "rows": op['rows'], "상세": op['details']}
+                            for op in expensive_operators(profile)
+                        ])
+                        st.code(profile['tree'], language='text')
 
 # 히스토리 초기화 버튼
 if st.session_state['history']:
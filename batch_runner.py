@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 배치 질문 실행기
+JSONL 파일의 질문들을 ask_detective()로 동시에(작업자 풀) 돌리고, 결과를 JSONL로 씁니다.
+
+입력: 한 줄에 JSON 하나. 질문은 question > query > body > title 순으로 찾고,
+      id는 id > request_id > 줄 번호 순으로 정합니다. (repo의 requests.jsonl도 그대로 읽힙니다)
+출력: 한 줄에 결과 하나 (완료 순서)
+    {"id", "question", "answer", "cypher", "rows", "context_rows", "truncated", "answer_route",
+     "llm_calls", "tokens", "latency_ms": {"planner", "cypher_generation", "escalation", "qa", "db", "total"}, "error"}
+
+사용법:
+    python batch_runner.py questions.jsonl -o results.jsonl --workers 8 --rate 4
+    python batch_runner.py questions.jsonl -o results.jsonl --resume    # 이미 끝난 id는 건너뜀
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from model_router import STAGE_TAG, STAGES
+
+QUESTION_KEYS = ("question", "query", "body", "title")
+ID_KEYS = ("id", "request_id")
+
+
+# ==========================================
+# 1. 단계별 지연 측정 (LLM 콜백)
+# ==========================================
+class StageTimer(BaseCallbackHandler):
+    """
+    체인 안의 LLM 호출 시간을 단계별로 기록합니다.
+    단계는 호출 순서가 아니라 각 호출 지점이 config에 붙인 태그(model_router.stage_config)로 정합니다.
+        planner → cypher_generation → escalation(재생성) → qa
+    태그가 없는 호출은 "other"로 모읍니다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: Dict[Any, Tuple[float, str]] = {}
+        self.calls: List[Dict[str, Any]] = []
+
+    def _start(self, run_id, tags) -> None:
+        stage = next((tag[len(STAGE_TAG):] for tag in tags or () if str(tag).startswith(STAGE_TAG)), "other")
+        with self._lock:
+            self._started[run_id] = (time.perf_counter(), stage)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs) -> None:
+        self._start(run_id, tags)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs) -> None:
+        self._start(run_id, tags)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        with self._lock:
+            started, stage = self._started.pop(run_id, (None, "other"))
+            self.calls.append({
+                "stage": stage,
+                "ms": round((time.perf_counter() - started) * 1000, 1) if started else 0.0,
+                "prompt_tokens": int(usage.get("prompt_tokens", 0) or 0),
+                "completion_tokens": int(usage.get("completion_tokens", 0) or 0),
+            })
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        with self._lock:
+            self._started.pop(run_id, None)
+
+    @property
+    def tokens(self) -> Dict[str, int]:
+        prompt = sum(c["prompt_tokens"] for c in self.calls)
+        completion = sum(c["completion_tokens"] for c in self.calls)
+        return {"prompt": prompt, "completion": completion, "total": prompt + completion}
+
+    def stages(self) -> Dict[str, float]:
+        """단계별 LLM 시간 합계 (ms). 같은 단계의 호출(하위 질문, 후보 쿼리)은 더합니다."""
+        totals = {stage: 0.0 for stage in STAGES}
+        for call in self.calls:
+            totals[call["stage"]] = round(totals.get(call["stage"], 0.0) + call["ms"], 1)
+        return totals
+
+
+# ==========================================
+# 2. 속도 제한 (토큰 버킷)
+# ==========================================
+class RateLimiter:
+    """초당 rate개의 질문만 시작하도록 막습니다. rate <= 0이면 제한 없음."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(self.rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# ==========================================
+# 3. 입출력
+# ==========================================
+def read_questions(path: str) -> Iterator[Tuple[str, str]]:
+    """JSONL에서 (id, 질문)을 읽습니다. 질문이 없는 줄은 건너뜁니다."""
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"  [SKIP] {lineno}번째 줄: JSON 형식 오류")
+                continue
+            if isinstance(record, str):
+                record = {"question": record}
+            question = next((record[k] for k in QUESTION_KEYS if isinstance(record.get(k), str) and record[k].strip()), None)
+            if not question:
+                print(f"  [SKIP] {lineno}번째 줄: 질문 필드 없음")
+                continue
+            qid = next((str(record[k]) for k in ID_KEYS if record.get(k) is not None), str(lineno))
+            yield qid, question.strip()
+
+
+def finished_ids(path: str) -> Set[str]:
+    """이미 결과가 기록된 id (오류 없이 끝난 것만)."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not record.get("error"):
+                done.add(str(record.get("id")))
+    return done
+
+
+# ==========================================
+# 4. 실행
+# ==========================================
+def run_one(qid: str, question: str, ask, keep_context: bool = False) -> Dict[str, Any]:
+    """질문 하나를 실행하고 결과 레코드를 만듭니다. keep_context=True면 DB 결과 행도 담습니다."""
+    timer = StageTimer()
+    started = time.perf_counter()
+    result = ask(question, callbacks=[timer])
+    total_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    steps = result.get("intermediate_steps") or []
+    cypher = next((s.get("query") for s in steps if isinstance(s, dict) and s.get("query")), None)
+    context = next((s.get("context") for s in steps if isinstance(s, dict) and "context" in s), None)
+    governor = result.get("governor") or {}
+
+    record = {
+        "id": qid,
+        "question": question,
+        "answer": result.get("result"),
+        "cypher": cypher,
+        "rows": governor.get("rows"),
+        "context_rows": len(context) if isinstance(context, list) else None,
+        "truncated": governor.get("truncated", False),
+        "answer_route": (result.get("route") or {}).get("answer"),
+        "llm_calls": len(timer.calls),
+        "tokens": timer.tokens,
+        "latency_ms": {**timer.stages(), "db": governor.get("db_ms", 0.0), "total": total_ms},
+        "error": result.get("error"),
+    }
+    if keep_context:
+        record["context"] = context if isinstance(context, list) else []
+    return record
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run_batch(
+    questions: List[Tuple[str, str]],
+    output: str,
+    workers: int = 4,
+    rate: float = 0,
+    ask=None,
+    append: bool = False,
+    module=None,
+) -> Dict[str, Any]:
+    """
+    질문 목록을 작업자 풀로 실행하고, 끝나는 대로 output에 한 줄씩 씁니다.
+
+    Args:
+        questions: [(id, 질문), ...]
+        output: 결과 JSONL 경로
+        workers: 동시에 실행할 질문 수
+        rate: 초당 시작할 질문 수 (0이면 제한 없음, OpenAI 요금제 한도에 맞춰 설정)
+        ask: 질문 함수 (기본 detective.ask_detective, 질문별 출력 없이)
+        append: 기존 결과 파일 뒤에 이어 쓰기
+        module: 이미 불러온 detective 모듈 (python detective.py ...로 실행해 __main__으로 떠 있을 때).
+                없으면 import 합니다.
+
+    Returns:
+        dict: {'total', 'errors', 'elapsed_s', 'qps', 'p50_ms', 'p95_ms'}
+    """
+    if ask is None:
+        if module is None:
+            import detective as module
+        module.chain.verbose = False  # 수천 건을 돌릴 때 체인 로그가 병목이 되지 않도록
+        ask = functools.partial(module.ask_detective, verbose=False)
+
+    limiter = RateLimiter(rate)
+    write_lock = threading.Lock()
+    latencies: List[float] = []
+    errors = 0
+
+    def task(qid: str, question: str) -> Dict[str, Any]:
+        limiter.acquire()
+        try:
+            return run_one(qid, question, ask)
+        except Exception as e:  # ask가 예외를 던져도 배치는 계속 진행합니다.
+            return {"id": qid, "question": question, "answer": None, "error": str(e)}
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    started = time.perf_counter()
+    with open(output, "a" if append else "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(task, qid, q) for qid, q in questions]
+        for i, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                out.flush()
+            if record.get("error"):
+                errors += 1
+            else:
+                latencies.append(record["latency_ms"]["total"])
+            if i % 50 == 0 or i == len(futures):
+                print(f"  [BATCH] {i}/{len(futures)} 완료 (오류 {errors})")
+
+    elapsed = time.perf_counter() - started
+    return {
+        "total": len(questions),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 1),
+        "qps": round(len(questions) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+    }
+
+
+def main(argv: Optional[List[str]] = None, module=None) -> int:
+    """명령행 진입점. module은 run_batch()에 그대로 넘깁니다 (detective.py의 배치 모드)."""
+    parser = argparse.ArgumentParser(description="Hip-Hop Noir batch question runner")
+    parser.add_argument("input", help="질문 JSONL 파일")
+    parser.add_argument("-o", "--output", default=os.path.join("logs", "batch_results.jsonl"), help="결과 JSONL 파일")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BATCH_WORKERS", 4)), help="동시 실행 수")
+    parser.add_argument("--rate", type=float, default=float(os.getenv("BATCH_RATE", 0)), help="초당 시작할 질문 수 (0=무제한)")
+    parser.add_argument("--limit", type=int, default=0, help="앞에서부터 N개만 실행")
+    parser.add_argument("--resume", action="store_true", help="결과 파일에 이미 성공한 id는 건너뜀")
+    args = parser.parse_args(argv)
+
+    questions = list(read_questions(args.input))
+    if args.resume:
+        done = finished_ids(args.output)
+        questions = [(qid, q) for qid, q in questions if qid not in done]
+    if args.limit:
+        questions = questions[:args.limit]
+
+    print("=" * 60)
+    print(f"Batch Runner - {len(questions)} questions, workers={args.workers}, rate={args.rate or '∞'}/s")
+    print("=" * 60)
+    summary = run_batch(questions, args.output, workers=args.workers, rate=args.rate, append=args.resume,
+                        module=module)
+    print(f"\n[DONE] {summary['total']}건, 오류 {summary['errors']}건, {summary['elapsed_s']}초 "
+          f"({summary['qps']} q/s, p50 {summary['p50_ms']}ms, p95 {summary['p95_ms']}ms)")
+    print(f"  -> {args.output}")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    load_dotenv()
+    sys.exit(main())
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 정확도/지연 회귀 벤치마크
+골든 질문(benchmarks/golden_questions.jsonl)을 seed_corrected.py 그래프에 돌려
+답변 정확도, Cypher 유효성, LLM 호출/토큰 수, 전체 지연을 측정하고
+임계값(benchmarks/thresholds.json)이나 기준선(benchmarks/baseline.json)보다 나빠지면 실패합니다.
+
+모드:
+    offline (기본) : 스크립트로 정해진 결정적 LLM 대역(ScriptedChatModel)을 씁니다.
+                     API 키 없이 프롬프트/거버너/재작성기/DB 변경의 회귀를 잡습니다.
+                     토큰은 프롬프트 길이로 근사하므로, 프롬프트가 커지면 토큰 회귀로 드러납니다.
+    live           : 실제 detective 체인(GPT-4o)을 씁니다.
+
+사용법:
+    python seed_corrected.py                          # 골든 그래프 준비
+    python benchmark.py                               # detective_template, 오프라인
+    python benchmark.py --prompt persona              # app.py 페르소나 프롬프트
+    python benchmark.py --template-answers            # 운영 경로 그대로 (단순 결과는 템플릿 답변)
+    python benchmark.py --live --save-baseline        # 실제 모델로 기준선 갱신
+
+기본으로는 템플릿 답변(TEMPLATE_ANSWERS)을 끄고 모든 질문을 QA 프롬프트로 답하게 합니다.
+골든 질문의 결과는 대부분 작고 단순해서, 켜 두면 --prompt를 바꿔도 같은 템플릿 문장만 비교하게 됩니다.
+요약의 template_rate는 템플릿으로 답한 질문 비율입니다.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from batch_runner import _percentile, run_one
+from text_utils import approx_tokens
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+GOLDEN_PATH = os.path.join(BENCH_DIR, "golden_questions.jsonl")
+THRESHOLDS_PATH = os.path.join(BENCH_DIR, "thresholds.json")
+
+# GraphCypherQAChain의 Cypher 생성 프롬프트 첫 문장
+_CYPHER_STAGE_MARKER = "Generate Cypher statement"
+# 컨텍스트(list[dict]의 repr)에서 문자열 값을 뽑습니다.
+_CONTEXT_VALUE = re.compile(r"""'[^'\n]+':\s*(?:'((?:[^'\\\n]|\\.)*)'|"((?:[^"\\\n]|\\.)*)"|(-?\d+(?:\.\d+)?))""")
+
+
+# ==========================================
+# 1. 결정적 LLM 대역
+# ==========================================
+class ScriptedChatModel(BaseChatModel):
+    """
+    골든 질문마다 정해진 Cypher를 돌려주고, 답변 단계에서는 프롬프트 속 DB 결과를
+    그대로 나열하는 결정적 챗 모델. 같은 입력이면 항상 같은 출력을 냅니다.
+    """
+
+    script: Dict[str, str] = {}
+    latency_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _match_question(self, text: str) -> Optional[str]:
+        hits = [q for q in self.script if q in text]
+        return max(hits, key=len) if hits else None
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        if _CYPHER_STAGE_MARKER in prompt:
+            question = self._match_question(prompt)
+            # 스크립트에 없는 질문은 빈 결과를 내는 유효한 쿼리로 답합니다.
+            text = self.script[question] if question else "MATCH (n:__Unscripted__) RETURN n LIMIT 0"
+        else:
+            values = []
+            for groups in _CONTEXT_VALUE.findall(prompt):
+                value = next((g for g in groups if g), None)
+                if value and value not in values:
+                    values.append(value)
+            text = "수사 기록: " + ", ".join(values) if values else "관련 기록 없음"
+
+        usage = {"prompt_tokens": approx_tokens(prompt), "completion_tokens": approx_tokens(text)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))],
+            llm_output={"token_usage": usage, "model_name": "scripted"},
+        )
+
+
+# ==========================================
+# 2. 채점
+# ==========================================
+def load_golden(path: str = GOLDEN_PATH) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _flatten(rows: List[Any]) -> List[str]:
+    values: List[str] = []
+
+    def walk(value: Any) -> None:
+        if isinstance(value, dict):
+            for v in value.values():
+                walk(v)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                walk(v)
+        elif value is not None:
+            values.append(str(value))
+
+    walk(rows)
+    return values
+
+
+def grade(item: Dict[str, Any], record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    골든 항목 하나를 채점합니다.
+
+    Returns:
+        dict: {'cypher_valid', 'result_recall', 'result_ok', 'answer_ok', 'correct'}
+    """
+    expected = item.get("expected") or {}
+    want = set(expected.get("values") or [])
+    got = set(_flatten(record.get("context") or []))
+
+    recall = len(want & got) / len(want) if want else 1.0
+    if expected.get("mode") == "exact":
+        result_ok = want == got
+    else:
+        result_ok = recall == 1.0
+
+    answer = (record.get("answer") or "").lower()
+    answer_ok = all(term.lower() in answer for term in item.get("answer_contains") or [])
+    cypher_valid = not record.get("error") and bool(record.get("cypher"))
+
+    return {
+        "cypher_valid": cypher_valid,
+        "result_recall": round(recall, 3),
+        "result_ok": result_ok,
+        "answer_ok": answer_ok,
+        "correct": cypher_valid and result_ok and answer_ok,
+    }
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    n = len(records) or 1
+    latencies = [r["latency_ms"]["total"] for r in records if r.get("latency_ms")]
+    return {
+        "questions": len(records),
+        "accuracy": round(sum(r["grade"]["correct"] for r in records) / n, 3),
+        "cypher_validity": round(sum(r["grade"]["cypher_valid"] for r in records) / n, 3),
+        "result_recall": round(sum(r["grade"]["result_recall"] for r in records) / n, 3),
+        "template_rate": round(sum(r.get("answer_route") == "template" for r in records) / n, 3),
+        "llm_calls": sum(r.get("llm_calls", 0) for r in records),
+        "tokens": sum((r.get("tokens") or {}).get("total", 0) for r in records),
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+    }
+
+
+def check_regressions(summary: Dict[str, Any], thresholds: Dict[str, Any],
+                      baseline: Optional[Dict[str, Any]] = None) -> List[str]:
+    """임계값/기준선을 어긴 항목을 사람이 읽을 수 있는 문장 목록으로 반환합니다."""
+    failures = []
+    if summary["accuracy"] < thresholds.get("min_accuracy", 0):
+        failures.append(f"정확도 {summary['accuracy']:.1%} < 최소 {thresholds['min_accuracy']:.1%}")
+    if summary["cypher_validity"] < thresholds.get("min_cypher_validity", 0):
+        failures.append(f"Cypher 유효율 {summary['cypher_validity']:.1%} < 최소 {thresholds['min_cypher_validity']:.1%}")
+    if "max_p95_ms" in thresholds and summary["p95_ms"] > thresholds["max_p95_ms"]:
+        failures.append(f"p95 지연 {summary['p95_ms']}ms > 최대 {thresholds['max_p95_ms']}ms")
+
+    if baseline:
+        allowed = thresholds.get("max_regression", {})
+        if summary["accuracy"] < baseline["accuracy"] - allowed.get("accuracy", 0):
+            failures.append(f"정확도 회귀: {baseline['accuracy']:.1%} → {summary['accuracy']:.1%}")
+        if baseline.get("p95_ms") and summary["p95_ms"] > baseline["p95_ms"] * (1 + allowed.get("p95_ms", 0)):
+            failures.append(f"지연 회귀: p95 {baseline['p95_ms']}ms → {summary['p95_ms']}ms")
+        if baseline.get("tokens") and summary["tokens"] > baseline["tokens"] * (1 + allowed.get("tokens", 0)):
+            failures.append(f"토큰 회귀: {baseline['tokens']} → {summary['tokens']}")
+    return failures
+
+
+# ==========================================
+# 3. 실행
+# ==========================================
+def run_benchmark(golden: List[Dict[str, Any]], live: bool = False, prompt: str = "detective",
+                  template_answers: bool = False) -> List[Dict[str, Any]]:
+    """
+    골든 질문을 순서대로(지연 측정을 위해 직렬로) 실행하고 채점된 레코드를 반환합니다.
+    template_answers=False(기본)면 모든 답변이 QA 프롬프트를 거치므로 --prompt 비교가 의미를 가집니다.
+    """
+    if not live:
+        # 오프라인 모드에서는 실제 API를 부르지 않지만 ChatOpenAI 생성에는 키가 필요합니다.
+        os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+    import detective
+    from langchain_core.prompts import PromptTemplate
+    from cypher_examples import ExampleStore
+    from prompts import persona_template
+
+    qa_prompt = None
+    if prompt == "persona":
+        qa_prompt = PromptTemplate(input_variables=["schema", "context", "question"], template=persona_template)
+
+    # 골든 질문이 학습 예시로 새어 들어가 다음 실행의 점수를 부풀리지 않도록 기본 예시만 씁니다.
+    seed_examples = ExampleStore(learned_path=os.devnull, learn=False)
+    if live:
+        qa_chain = detective.build_chain(detective.llm, qa_prompt=qa_prompt, verbose=False,
+                                         cypher_llm=detective.fast_llm, examples_store=seed_examples,
+                                         template_answers=template_answers)
+    else:
+        llm = ScriptedChatModel(script={g["question"]: g["cypher"] for g in golden})
+        qa_chain = detective.build_chain(llm, qa_prompt=qa_prompt, verbose=False, examples_store=seed_examples,
+                                         template_answers=template_answers)
+
+    def ask(question, callbacks=None):
+        return detective.ask_detective(question, callbacks=callbacks, qa_chain=qa_chain, verbose=False)
+
+    records = []
+    for item in golden:
+        record = run_one(item["id"], item["question"], ask, keep_context=True)
+        record["grade"] = grade(item, record)
+        mark = "✅" if record["grade"]["correct"] else "❌"
+        route = "T" if record.get("answer_route") == "template" else "L"
+        print(f"  {mark} {item['id']} {record['latency_ms']['total']:>8}ms  "
+              f"LLM {record['llm_calls']}회  {record['tokens']['total']} tok  [{route}] {item['question']}")
+        if record.get("error"):
+            print(f"      오류: {record['error']}")
+        records.append(record)
+    return records
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Hip-Hop Noir accuracy/latency regression benchmark")
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="골든 질문 JSONL")
+    parser.add_argument("--live", action="store_true", help="실제 LLM 사용 (기본: 스크립트 대역)")
+    parser.add_argument("--prompt", choices=("detective", "persona"), default="detective", help="측정할 QA 프롬프트")
+    parser.add_argument("--template-answers", action="store_true",
+                        help="단순한 결과는 템플릿으로 답함 (운영 경로, 기본: 모든 답변을 QA 프롬프트로)")
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH)
+    parser.add_argument("--baseline", default=None,
+                        help="기준선 JSON (기본 benchmarks/baseline_<mode>_<prompt>[_template].json)")
+    parser.add_argument("--save-baseline", action="store_true", help="이번 결과를 기준선으로 저장")
+    parser.add_argument("-o", "--output", default=os.path.join("logs", "benchmark_results.jsonl"))
+    args = parser.parse_args(argv)
+
+    mode = "live" if args.live else "offline"
+    suffix = "_template" if args.template_answers else ""
+    baseline_path = args.baseline or os.path.join(BENCH_DIR, f"baseline_{mode}_{args.prompt}{suffix}.json")
+
+    print("=" * 60)
+    print(f"Benchmark - mode={mode}, prompt={args.prompt}, template_answers={args.template_answers}")
+    print("=" * 60)
+    golden = load_golden(args.golden)
+    records = run_benchmark(golden, live=args.live, prompt=args.prompt, template_answers=args.template_answers)
+    summary = summarize(records)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    print(f"\n[SUMMARY] 정확도 {summary['accuracy']:.1%}, Cypher 유효 {summary['cypher_validity']:.1%}, "
+          f"템플릿 답변 {summary['template_rate']:.1%}, "
+          f"LLM {summary['llm_calls']}회, 토큰 {summary['tokens']}, p50 {summary['p50_ms']}ms, p95 {summary['p95_ms']}ms")
+
+    with open(args.thresholds, encoding="utf-8") as f:
+        thresholds = json.load(f)[mode]
+    baseline = None
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    failures = check_regressions(summary, thresholds, baseline)
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"  -> 기준선 저장: {baseline_path}")
+
+    if failures:
+        print("\n[FAIL] 회귀 감지:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\n[PASS] 임계값/기준선 통과")
+    return 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    load_dotenv()
+    sys.exit(main())
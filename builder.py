@@ -3,14 +3,21 @@
 Hip-Hop Noir - 투팍 사건 그래프 구축 스크립트
 """
 import os
-import re
 import sys
 from dotenv import load_dotenv
 from langchain_community.graphs import Neo4jGraph
 from langchain_openai import ChatOpenAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_core.documents import Document
+from chunker import TokenChunker
+from loaders import load_documents, load_text
+from entity_prefilter import EntityPrefilter
+from packed_extraction import PackedGraphExtractor
+from pattern_extractor import PatternExtractor
+from provenance import ProvenanceIndex
+from graph_rag import GraphRAGRetriever
+from rule_engine import RuleEngine
+from triple_dedup import merge_graph_documents
+from temporal import TemporalNormalizer
+from spatial import GeoEnricher
 
 # Windows 콘솔 UTF-8 설정
 if sys.platform == 'win32':
@@ -54,8 +61,12 @@ MGM 호텔 로비에서 트레이 디와 같이 동행하고 있던 투팍은 
 비기는 1997년 3월 9일 로스앤젤레스에서 총격을 받고 사망했다. 이 사건도 미해결 상태다.
 """
 
-# 4. 전처리 (위키 주석 [1], [편집] 같은 노이즈 제거)
-cleaned_text = re.sub(r"\[\d+\]|\[편집\]", "", raw_text)
+# 4. 전처리 (위키 주석 [1], [편집], (중략) 같은 노이즈 제거, 절 단위로 나눔)
+#    python builder.py notes.md wiki_dump.wiki ... 처럼 파일을 주면 내장 텍스트 대신 그 파일들을 읽습니다.
+def load_sources(paths=None):
+    if paths:
+        return list(load_documents(paths))
+    return load_text(raw_text, source="builder.raw_text")
 
 def process_graph():
     print("=" * 60)
@@ -67,29 +78,42 @@ def process_graph():
     # graph.query("MATCH (n) DETACH DELETE n")
 
     print("\n[CHUNK] Text chunking...")
-    # 텍스트가 기니까 1000자 단위로 자르고, 문맥 유지를 위해 200자씩 겹치게 함
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    docs = [Document(page_content=cleaned_text)]
+    # 모델 토큰 기준으로 문장/절 경계에서 자르고, 지시어로 시작하는 청크에만 앞 문장을 붙임 (CHUNK_MAX_TOKENS)
+    text_splitter = TokenChunker()
+    docs = load_sources(sys.argv[1:])
     chunks = text_splitter.split_documents(docs)
-    print(f"  -> {len(chunks)} chunks created.")
+    print(f"  -> {len(docs)} sections, {len(chunks)} chunks created.")
 
     print("\n[EXTRACT] LLM extracting entities and relationships... (GPT-4o)")
     print("  This may take 30-60 seconds...")
     
     llm = ChatOpenAI(model="gpt-4o", temperature=0)
     
-    llm_transformer = LLMGraphTransformer(
+    # 작은 청크 여러 개를 한 요청에 묶어 고정 프롬프트 비용을 나눕니다. (EXTRACT_PACK_TOKENS)
+    allowed_nodes = ["Rapper", "Producer", "Gang", "Person", "Event", "Location", "Label"]
+    allowed_rels = [
+        "BEEF_WITH", "ATTACKED", "KILLED", "HIRED", "UNCLE_OF", 
+        "MEMBER_OF", "SIGNED_TO", "LOCATED_IN", "ORDERED_HIT",
+        "FRIEND_WITH", "CEO_OF", "SHOT", "SUSPECTED"
+    ]
+    llm_transformer = PackedGraphExtractor(
         llm=llm,
-        allowed_nodes=["Rapper", "Producer", "Gang", "Person", "Event", "Location", "Label"],
-        allowed_relationships=[
-            "BEEF_WITH", "ATTACKED", "KILLED", "HIRED", "UNCLE_OF", 
-            "MEMBER_OF", "SIGNED_TO", "LOCATED_IN", "ORDERED_HIT",
-            "FRIEND_WITH", "CEO_OF", "SHOT", "SUSPECTED"
-        ]
+        allowed_nodes=allowed_nodes,
+        allowed_relationships=allowed_rels,
+        # 엔티티 후보가 없는 청크(목차, 각주 등)는 LLM에 보내지 않음 (ENTITY_PREFILTER)
+        prefilter=EntityPrefilter(graph),
+        # "X는 Y의 멤버였다" 같은 정형 문장은 규칙으로 먼저 추출 (PATTERN_EXTRACTION)
+        patterns=PatternExtractor(allowed_nodes, allowed_rels)
     )
 
     # 변환 실행
     graph_documents = llm_transformer.convert_to_graph_documents(chunks)
+    print(f"  -> {len(chunks)} chunks extracted in {llm_transformer.calls} LLM calls.")
+    if llm_transformer.patterns.rule_facts:
+        patterns = llm_transformer.patterns
+        print(f"  -> [PATTERN] {patterns.rule_facts} facts from {patterns.covered_sentences}/{patterns.total_sentences} templated sentences ({llm_transformer.rule_only} chunks without LLM)")
+    if llm_transformer.skipped:
+        print(f"  -> [PREFILTER] {llm_transformer.skipped} chunks without entity candidates skipped ({llm_transformer.saved_calls} LLM calls saved)")
     
     total_nodes = sum(len(d.nodes) for d in graph_documents)
     total_rels = sum(len(d.relationships) for d in graph_documents)
@@ -106,9 +130,29 @@ def process_graph():
         for rel in graph_documents[0].relationships[:5]:
             print(f"  - ({rel.source.id}) -[:{rel.type}]-> ({rel.target.id})")
 
+    # 청크 간 중복 사실을 메모리에서 합쳐 DB에는 한 번씩만 씁니다.
+    graph_documents, dedup = merge_graph_documents(graph_documents)
+    print(f"\n[DEDUP] nodes {dedup['nodes_in']} -> {dedup['nodes_out']}, relationships {dedup['rels_in']} -> {dedup['rels_out']}")
+
     # DB 저장
     print("\n[SAVE] Saving to Neo4j...")
     graph.add_graph_documents(graph_documents)
+
+    # 청크를 Document 노드로 한 번 저장하고, 노드/관계마다 근거 문장 참조(evidence)를 남김 (PROVENANCE)
+    provenance = ProvenanceIndex(graph).record(chunks, graph_documents)
+    print(f"  -> [PROVENANCE] {provenance['documents']} chunks stored, evidence on {provenance['nodes']} nodes / {provenance['relationships']} relationships")
+    # 청크/엔티티 임베딩 (탐정의 GraphRAG 검색용 벡터 인덱스, GRAPHRAG)
+    indexed = GraphRAGRetriever(graph).index()
+    print(f"  -> [GRAPHRAG] embedded {indexed['documents']} chunks / {indexed['entities']} entities")
+    
+    # 새 사실로 파생 관계(MASTERMIND_OF, ACCOMPLICE_OF) 증분 갱신
+    print("\n[RULES] Updating derived relationships...")
+    RuleEngine(graph).on_graph_documents(graph_documents)
+    
+    # 시간/장소 속성 정규화 (새로 들어온 항목만 point가 붙습니다)
+    print("\n[ENRICH] Normalizing time and place properties...")
+    TemporalNormalizer(graph).normalize()
+    GeoEnricher(graph).geocode()
     
     # 저장 후 통계
     print("\n[STATS] Database statistics:")
@@ -2,13 +2,14 @@
 import os
 import sys
 from dotenv import load_dotenv
-from langchain_community.graphs import Neo4jGraph
+from query_governor import GovernedNeo4jGraph
 
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
 
 load_dotenv()
-graph = Neo4jGraph(
+# 라벨 없는 점검 쿼리는 재작성기가 라벨을 추론해 인덱스를 타도록 바꿉니다. ([REWRITE] 로그 참고)
+graph = GovernedNeo4jGraph(
     url=os.getenv('NEO4J_URI'),
     username=os.getenv('NEO4J_USERNAME'),
     password=os.getenv('NEO4J_PASSWORD')
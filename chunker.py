@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 한국어 수사 기록 청커 (Token-aware Sentence Chunker)
+RecursiveCharacterTextSplitter는 청크를 글자 수로 잽니다. 한국어는 글자당 토큰 수가 영어와 크게 달라
+같은 1000자라도 컨텍스트 창을 남기거나 넘치고, 고정 중복(100~200자)은 본문의 10~20%를 GPT-4o에 다시 보냅니다.
+
+TokenChunker는 한 번의 선형 스캔으로
+    1. 텍스트를 절 제목("2.3.2. 퍼프 대디의 암살 의뢰", "[사건 개요 ...]")과 문장("...했다.", "...였다.")으로 나누고
+    2. 모델 토큰(tiktoken, 없으면 UTF-8 바이트/4 근사) 기준으로 예산이 찰 때까지 문장을 담으며
+    3. 새 절이 시작되면 (청크가 충분히 찼을 때) 거기서 끊습니다.
+
+중복은 고정 길이 대신 필요할 때만 붙입니다.
+    - 청크가 절 중간에서 시작하면 그 절 제목을 앞에 붙이고
+    - 첫 문장이 "그는", "이 사건", "당시" 같은 지시어로 시작하면 바로 앞 문장을 붙입니다. (상호참조 문맥)
+
+각 청크의 metadata에는 원문 위치(start, end), 토큰 수, 절 제목이 담깁니다.
+
+환경 변수:
+    CHUNK_MAX_TOKENS     : 청크 토큰 예산 (기본 600)
+    CHUNK_OVERLAP_TOKENS : 앞 문맥으로 붙일 수 있는 최대 토큰 (기본 80, 0이면 중복 없음)
+    CHUNK_TOKEN_MODEL    : 토큰 수를 셀 모델 (기본 gpt-4o)
+"""
+import bisect
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# 절 제목: "2.3.2. 퍼프 대디의 암살 의뢰", "1. 배후와 청부 (The Mastermind)", "[사건 개요: ...]"
+_HEADER = re.compile(r"^[ \t]*(?:\d+(?:\.\d+)*\.[ \t]+\S.{0,80}|\[[^\]\n]{1,80}\])[ \t]*$", re.MULTILINE)
+# 문장 끝: 마침표/물음표/느낌표(+닫는 따옴표·괄호) 뒤 공백, 말줄임표, 또는 줄바꿈
+_SENTENCE_END = re.compile(r"(?:[.!?…]+[\"'”’)\]]*)(?=\s|$)|\n")
+# 문장 끝 뒤 이 글자 수 안에서 괄호가 닫힐 때만 괄호 안 마침표로 봅니다. ("(P. Diddy)", "(Notorious B.I.G., 비기)")
+_PAREN_WINDOW = 40
+# 앞 문장을 가리키는 말로 시작하는 문장 (앞 문장이 없으면 주어를 알 수 없음)
+_REFERRING = re.compile(
+    r"^(?:그(?:는|가|의|를|에게|와|도|들|녀|곳|때|후|러나|리고|래서|날)|이(?:로써|후|에|는|가|를|들|\s)|"
+    r"당시|같은 날|해당|또한|한편|결국|반면)"
+)
+
+_encoders: Dict[str, Any] = {}
+
+
+def _encoder(model: Optional[str] = None):
+    """모델의 tiktoken 인코더 (tiktoken이 없으면 None)."""
+    model = model or os.getenv("CHUNK_TOKEN_MODEL", "gpt-4o")
+    if model not in _encoders:
+        try:
+            import tiktoken
+            try:
+                _encoders[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encoders[model] = tiktoken.get_encoding("o200k_base")
+        except ImportError:
+            _encoders[model] = None
+    return _encoders[model]
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """모델 토큰 수. tiktoken이 없으면 UTF-8 바이트/4로 근사합니다."""
+    encoder = _encoder(model)
+    if encoder is None:
+        return max(1, len(text.encode("utf-8")) // 4)
+    return len(encoder.encode(text))
+
+
+def _token_byte_ends(text: str, model: Optional[str] = None) -> Optional[List[int]]:
+    """토큰마다 끝나는 UTF-8 바이트 위치 (한 번만 인코딩). tiktoken이 없으면 None."""
+    encoder = _encoder(model)
+    if encoder is None:
+        return None
+    ends: List[int] = []
+    total = 0
+    for token in encoder.encode(text):
+        total += len(encoder.decode_single_token_bytes(token))
+        ends.append(total)
+    return ends
+
+
+# ==========================================
+# 1. 문장/절 분할 (선형 스캔)
+# ==========================================
+def split_units(text: str) -> List[Tuple[int, int, bool]]:
+    """
+    텍스트를 (start, end, 절 제목 여부) 단위로 나눕니다. 공백만 있는 구간은 버립니다.
+    """
+    headers = {m.start(): m.end() for m in _HEADER.finditer(text)}
+    units: List[Tuple[int, int, bool]] = []
+    pos = 0
+    length = len(text)
+    while pos < length:
+        # 앞 공백 건너뛰기
+        while pos < length and text[pos].isspace():
+            pos += 1
+        if pos >= length:
+            break
+        line_start = text.rfind("\n", 0, pos) + 1
+        if line_start in headers and text[line_start:pos].strip() == "":
+            end = headers[line_start]
+            units.append((pos, end, True))
+            pos = end
+            continue
+        match = _SENTENCE_END.search(text, pos)
+        # 괄호 안 약어("퍼프 대디(P. Diddy)는")의 마침표에서는 끊지 않습니다.
+        # 괄호 깊이는 앞으로 읽은 구간만 더해 가며 세고, 짝인 ")"가 가까이(같은 줄, _PAREN_WINDOW 글자 안) 있을 때만
+        # 건너뜁니다. 닫히지 않은 "("가 그 줄의 나머지 문장 경계를 모두 지우지 않도록 합니다.
+        depth = 0
+        scanned = pos
+        while match and match.group(0) != "\n":
+            depth = max(0, depth + text.count("(", scanned, match.end()) - text.count(")", scanned, match.end()))
+            scanned = match.end()
+            if depth == 0:
+                break
+            window = text[scanned:scanned + _PAREN_WINDOW].split("\n", 1)[0]
+            if ")" not in window:
+                break
+            match = _SENTENCE_END.search(text, scanned)
+        end = match.end() if match else length
+        if text[pos:end].strip():
+            units.append((pos, end, False))
+        pos = max(end, pos + 1)
+    return units
+
+
+def _hard_split(text: str, start: int, end: int, max_tokens: int, model: Optional[str]) -> List[Tuple[int, int]]:
+    """
+    예산보다 긴 문장 하나를 공백 경계에서 나눕니다.
+    문장을 한 번만 인코딩해 토큰 끝 바이트 위치(tiktoken이 없으면 바이트/4 근사)에서 자를 곳을 찾고
+    글자 위치로 되돌리므로, 문장 길이에 선형입니다.
+    """
+    sentence = text[start:end]
+    char_bytes: List[int] = []  # 글자마다 시작 바이트 위치
+    last_space: List[int] = []  # 글자 위치까지의 마지막 공백 (없으면 -1)
+    size = 0
+    space = -1
+    for i, ch in enumerate(sentence):
+        char_bytes.append(size)
+        size += len(ch.encode("utf-8"))
+        if ch.isspace():
+            space = i
+        last_space.append(space)
+    token_ends = _token_byte_ends(sentence, model)
+
+    pieces: List[Tuple[int, int]] = []
+    piece_start = 0
+    while piece_start < len(sentence):
+        begin = char_bytes[piece_start]
+        if token_ends is None:
+            limit = begin + max_tokens * 4
+        else:
+            first = bisect.bisect_right(token_ends, begin)  # piece_start 뒤에서 끝나는 첫 토큰
+            last = first + max_tokens - 1
+            limit = token_ends[last] if last < len(token_ends) else size
+        if limit >= size:
+            pieces.append((piece_start, len(sentence)))
+            break
+        # limit 바이트 안에 온전히 들어가는 글자까지, 그 안에 공백이 있으면 공백에서 자릅니다.
+        cut = max(piece_start + 1, bisect.bisect_right(char_bytes, limit) - 1)
+        if cut >= len(sentence):
+            pieces.append((piece_start, len(sentence)))
+            break
+        if last_space[cut] > piece_start:
+            cut = last_space[cut]
+        pieces.append((piece_start, cut))
+        piece_start = cut
+    return [(start + s, start + e) for s, e in pieces if sentence[s:e].strip()]
+
+
+# ==========================================
+# 2. 청커
+# ==========================================
+class TokenChunker:
+    """
+    RecursiveCharacterTextSplitter 대신 쓰는 토큰 기준, 문장/절 경계 청커.
+
+    사용 예:
+        chunker = TokenChunker(max_tokens=600)
+        chunks = chunker.split_documents([Document(page_content=text)])
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None,
+                 model: Optional[str] = None, min_fill: float = 0.5):
+        self.max_tokens = max_tokens or int(os.getenv("CHUNK_MAX_TOKENS", 600))
+        self.overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", 80)) if overlap_tokens is None else overlap_tokens
+        self.model = model
+        # 새 절에서 끊으려면 청크가 예산의 이만큼은 차 있어야 함 (작은 절은 합쳐서 LLM 호출 수를 줄임)
+        self.min_fill = min_fill
+
+    def _spans(self, text: str) -> List[Dict[str, Any]]:
+        """청크 목록 [{'start', 'end', 'prefix', 'section', 'tokens'}, ...]"""
+        units: List[Tuple[int, int, bool, int]] = []
+        for start, end, is_header in split_units(text):
+            tokens = count_tokens(text[start:end], self.model)
+            if tokens > self.max_tokens and not is_header:
+                for s, e in _hard_split(text, start, end, self.max_tokens, self.model):
+                    units.append((s, e, False, count_tokens(text[s:e], self.model)))
+            else:
+                units.append((start, end, is_header, tokens))
+
+        chunks: List[Dict[str, Any]] = []
+        section: Optional[Tuple[int, int, int]] = None  # 현재 절 제목 (start, end, tokens)
+        current: Optional[Dict[str, Any]] = None
+        prev_sentence: Optional[Tuple[int, int, int]] = None
+
+        def flush():
+            if current and current["end"] > current["start"]:
+                chunks.append(current)
+
+        for start, end, is_header, tokens in units:
+            if is_header:
+                if current and current["tokens"] >= self.max_tokens * self.min_fill:
+                    flush()
+                    current = None
+                section = (start, end, tokens)
+                prev_sentence = None
+            if current is not None and current["tokens"] + tokens + 1 > self.max_tokens:
+                flush()
+                current = None
+            if current is None:
+                current = {"start": start, "end": end, "prefix": [], "section": None, "tokens": 0}
+                if section and not is_header:
+                    current["section"] = text[section[0]:section[1]].strip()
+                # 절 중간에서 시작하면 절 제목을, 지시어로 시작하면 앞 문장을 앞 문맥으로 붙입니다.
+                budget = self.overlap_tokens
+                if not is_header and section and section[0] < start and section[2] <= budget:
+                    current["prefix"].append((section[0], section[1]))
+                    current["tokens"] += section[2] + 1
+                    budget -= section[2]
+                if (not is_header and prev_sentence and _REFERRING.match(text[start:end])
+                        and prev_sentence[2] <= budget):
+                    current["prefix"].append((prev_sentence[0], prev_sentence[1]))
+                    current["tokens"] += prev_sentence[2] + 1
+            current["end"] = end
+            current["tokens"] += tokens + 1
+            if not is_header:
+                prev_sentence = (start, end, tokens)
+        flush()
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        return [self._render(text, span) for span in self._spans(text)]
+
+    @staticmethod
+    def _render(text: str, span: Dict[str, Any]) -> str:
+        prefix = "\n".join(text[s:e].strip() for s, e in span["prefix"])
+        body = text[span["start"]:span["end"]].strip()
+        return f"{prefix}\n{body}" if prefix else body
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """
+        문서를 청크 Document로 나눕니다. metadata에 원문 위치와 토큰 수, 절 제목을 더합니다.
+        (start/end는 앞 문맥을 뺀 본문의 원문 내 글자 위치, chunk는 여러 문서에 걸쳐 이어지는 번호)
+        """
+        chunks: List[Document] = []
+        for doc in documents:
+            text = doc.page_content
+            for span in self._spans(text):
+                content = self._render(text, span)
+                metadata = dict(doc.metadata or {})
+                metadata.update({
+                    "chunk": len(chunks),
+                    "start": span["start"],
+                    "end": span["end"],
+                    "tokens": count_tokens(content, self.model),
+                    "context_prefix": bool(span["prefix"]),
+                    # page_content 안에서 본문이 시작하는 위치 (앞 문맥 길이)
+                    "body_offset": len(content) - len(text[span["start"]:span["end"]].strip()),
+                })
+                if span["section"]:
+                    metadata["section"] = span["section"]
+                chunks.append(Document(page_content=content, metadata=metadata))
+        return chunks
+
+
+if __name__ == "__main__":
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "data.txt"
+    max_tokens = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    for chunk in TokenChunker(max_tokens=max_tokens).split_documents([Document(page_content=source)]):
+        meta = chunk.metadata
+        print(f"[CHUNK {meta['chunk']}] {meta['tokens']} tokens, chars {meta['start']}-{meta['end']}"
+              + (f", section={meta['section']}" if meta.get("section") else ""))
+        print(chunk.page_content)
+        print("-" * 60)
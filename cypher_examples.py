@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 검증된 질문 → Cypher 예시 저장소 (Few-shot)
+스키마만 보고 Cypher를 만들면 이 그래프의 낯선 관계 타입(SUSPECTED_SHOOTER, ORDERED_HIT_ON,
+OFFERED_BOUNTY, MASTERMIND_OF ...)에서 첫 시도가 자주 빗나갑니다.
+ExampleStore는 검증된 (질문, Cypher) 쌍을 모아 두고, 질문마다 비슷한 예시 top-k를 골라
+Cypher 생성 프롬프트에 넣습니다.
+
+    - 유사도: 글자 2~3-gram TF-IDF 코사인 (한국어 조사/띄어쓰기에 강하고 외부 모델이 필요 없음)
+    - 예산: top-k + 최소 유사도 + 토큰 상한 (기본 3개, 300 토큰 안쪽)
+    - 검증: 현재 스키마에 없는 라벨/관계를 쓰는 예시는 고르지 않음
+    - 성장: 첫 생성 쿼리가 고치지 않고 검증(EXPLAIN, 스키마)을 통과해 결과가 있었으면 학습 파일에 자동으로 추가
+            (재생성/큰 모델 승격/자동 교정을 거친 쿼리는 배우지 않음)
+    - 상한: 학습 예시가 CYPHER_EXAMPLES_MAX를 넘으면 가장 오래 안 쓰인(LRU) 학습 예시를 버림 (기본 예시는 유지)
+
+저장소 파일 (JSONL, 한 줄에 {"question", "cypher"}):
+    CYPHER_EXAMPLES_PATH    : 기본 예시 (기본 examples/cypher_examples.jsonl, 저장소에 포함)
+    CYPHER_EXAMPLES_LEARNED : 실행 중 학습한 예시 (기본 logs/cypher_examples_learned.jsonl)
+
+환경 변수:
+    CYPHER_EXAMPLES_K          : 프롬프트에 넣을 예시 수 (기본 3, 0이면 끔)
+    CYPHER_EXAMPLES_MIN_SCORE  : 최소 유사도 (기본 0.2)
+    CYPHER_EXAMPLES_MAX_TOKENS : 예시 블록 토큰 상한 (기본 300)
+    CYPHER_EXAMPLES_LEARN      : 성공한 쿼리 자동 학습 (기본 true)
+    CYPHER_EXAMPLES_MAX        : 학습 예시 최대 개수 (기본 500, 넘으면 LRU로 교체)
+"""
+import json
+import math
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from cypher_validator import unknown_identifiers
+from text_utils import approx_tokens, char_ngrams, normalize_question
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples", "cypher_examples.jsonl")
+LEARNED_PATH = os.path.join("logs", "cypher_examples_learned.jsonl")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# ==========================================
+# 1. 예시 저장소 + 유사도 인덱스
+# ==========================================
+class ExampleStore:
+    """
+    검증된 질문 → Cypher 예시 저장소.
+
+    사용 예:
+        store = ExampleStore()
+        store.prompt_block("올랜도는 어느 갱단이야?", structured_schema=graph.structured_schema)
+        store.add("올랜도는 어느 갱단이야?", "MATCH (p:Person {id: 'Orlando Anderson'})-[:MEMBER_OF]->(g) RETURN g.id")
+    """
+
+    def __init__(self, path: Optional[str] = None, learned_path: Optional[str] = None, learn: Optional[bool] = None):
+        self.path = path or os.getenv("CYPHER_EXAMPLES_PATH", DEFAULT_PATH)
+        self.learned_path = learned_path or os.getenv("CYPHER_EXAMPLES_LEARNED", LEARNED_PATH)
+        self.learn = _env_bool("CYPHER_EXAMPLES_LEARN", True) if learn is None else learn
+        self.max_learned = int(os.getenv("CYPHER_EXAMPLES_MAX", 500))
+
+        self._lock = threading.Lock()
+        self.examples: List[Dict[str, Any]] = []
+        self._keys: set = set()
+        self._idf: Optional[Dict[str, float]] = None
+        self.learned = 0
+        self._clock = 0
+        # 학습 파일은 오래 안 쓰인 순서로 다시 쓰므로, 상한을 넘으면 뒤쪽(최근)만 읽습니다.
+        for example in self._read(self.path):
+            self._append(example["question"], example["cypher"], "seed")
+        learned = self._read(self.learned_path)
+        for example in learned[max(0, len(learned) - self.max_learned):]:
+            self._append(example["question"], example["cypher"], "learned")
+
+    @staticmethod
+    def _read(path: str) -> List[Dict[str, str]]:
+        if not path or not os.path.exists(path):
+            return []
+        examples = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict) and record.get("question") and record.get("cypher"):
+                    examples.append(record)
+        return examples
+
+    def _append(self, question: str, cypher: str, source: str) -> bool:
+        key = normalize_question(question)
+        if not key or key in self._keys:
+            return False
+        self._keys.add(key)
+        self._clock += 1
+        self.examples.append({"question": question, "cypher": cypher.strip(), "source": source,
+                              "grams": char_ngrams(question), "used": self._clock})
+        if source == "learned":
+            self.learned += 1
+        self._idf = None
+        return True
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    # ---------- 학습 ----------
+    def add(self, question: str, cypher: str) -> bool:
+        """
+        검증된 예시를 추가하고 학습 파일에 기록합니다. 이미 있는 질문이거나 학습이 꺼져 있으면 False.
+        학습 예시가 상한이면 가장 오래 안 쓰인 학습 예시를 버리고 학습 파일을 다시 씁니다.
+        """
+        if not self.learn or self.max_learned <= 0 or not question or not cypher:
+            return False
+        with self._lock:
+            if not self._append(question, cypher, "learned"):
+                return False
+            try:
+                if self.learned > self.max_learned:
+                    self._evict()
+                    self._rewrite()
+                else:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.learned_path)), exist_ok=True)
+                    with open(self.learned_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps({"question": question, "cypher": cypher.strip()}, ensure_ascii=False) + "\n")
+            except OSError as e:  # 기록 실패는 답변에 영향을 주지 않습니다.
+                print(f"  [WARN] 예시 저장 실패: {e}")
+        return True
+
+    def _evict(self) -> None:
+        """가장 오래 안 쓰인 학습 예시 하나를 버립니다. (기본 예시는 버리지 않음)"""
+        oldest = min((e for e in self.examples if e["source"] == "learned"), key=lambda e: e["used"])
+        self.examples.remove(oldest)
+        self._keys.discard(normalize_question(oldest["question"]))
+        self.learned -= 1
+        self._idf = None
+
+    def _rewrite(self) -> None:
+        """학습 파일을 오래 안 쓰인 순서로 다시 씁니다. (다시 읽을 때 최근 예시가 남도록)"""
+        learned = sorted((e for e in self.examples if e["source"] == "learned"), key=lambda e: e["used"])
+        os.makedirs(os.path.dirname(os.path.abspath(self.learned_path)), exist_ok=True)
+        tmp_path = self.learned_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for example in learned:
+                f.write(json.dumps({"question": example["question"], "cypher": example["cypher"]},
+                                   ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.learned_path)
+
+    # ---------- 검색 ----------
+    def _weights(self) -> Dict[str, float]:
+        if self._idf is None:
+            df: Counter = Counter()
+            for example in self.examples:
+                df.update(example["grams"].keys())
+            total = len(self.examples)
+            self._idf = {gram: math.log((1 + total) / (1 + count)) + 1 for gram, count in df.items()}
+        return self._idf
+
+    def _cosine(self, a: Counter, b: Counter, idf: Dict[str, float]) -> float:
+        dot = sum(count * b[gram] * idf.get(gram, 1.0) ** 2 for gram, count in a.items() if gram in b)
+        if not dot:
+            return 0.0
+        norm_a = math.sqrt(sum((count * idf.get(gram, 1.0)) ** 2 for gram, count in a.items()))
+        norm_b = math.sqrt(sum((count * idf.get(gram, 1.0)) ** 2 for gram, count in b.items()))
+        return dot / (norm_a * norm_b)
+
+    def search(
+        self,
+        question: str,
+        k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        structured_schema: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        질문과 비슷한 예시를 유사도 순으로 반환합니다.
+
+        Args:
+            question: 사용자 질문
+            k: 최대 개수 (기본 CYPHER_EXAMPLES_K)
+            min_score: 최소 유사도 (기본 CYPHER_EXAMPLES_MIN_SCORE)
+            structured_schema: 주면 현재 스키마에 없는 라벨/관계를 쓰는 예시는 제외
+
+        Returns:
+            list: [{'question', 'cypher', 'source', 'score'}, ...]
+        """
+        k = k if k is not None else int(os.getenv("CYPHER_EXAMPLES_K", 3))
+        min_score = min_score if min_score is not None else float(os.getenv("CYPHER_EXAMPLES_MIN_SCORE", 0.2))
+        if k <= 0 or not self.examples:
+            return []
+        with self._lock:
+            idf = self._weights()
+            grams = char_ngrams(question)
+            scored = [
+                (self._cosine(grams, example["grams"], idf), example)
+                for example in self.examples
+            ]
+        hits, used = [], []
+        for score, example in sorted(scored, key=lambda pair: -pair[0]):
+            if score < min_score or len(hits) >= k:
+                break
+            if structured_schema and unknown_identifiers(example["cypher"], structured_schema):
+                continue
+            used.append(example)
+            hits.append({"question": example["question"], "cypher": example["cypher"],
+                         "source": example["source"], "score": round(score, 3)})
+        with self._lock:  # 고른 예시는 최근에 쓰인 것으로 표시 (LRU 교체 기준)
+            for example in used:
+                self._clock += 1
+                example["used"] = self._clock
+        return hits
+
+    def prompt_block(
+        self,
+        question: str,
+        structured_schema: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        Cypher 생성 프롬프트에 넣을 예시 블록. 고를 예시가 없으면 빈 문자열.
+        토큰 상한(CYPHER_EXAMPLES_MAX_TOKENS)을 넘는 예시는 뒤에서부터 뺍니다.
+        """
+        max_tokens = max_tokens if max_tokens is not None else int(os.getenv("CYPHER_EXAMPLES_MAX_TOKENS", 300))
+        header = "Examples (validated question -> Cypher pairs for this graph):\n"
+        lines: List[str] = []
+        used = approx_tokens(header)
+        for hit in self.search(question, structured_schema=structured_schema):
+            entry = f"# {hit['question']}\n{hit['cypher']}\n"
+            cost = approx_tokens(entry)
+            if used + cost > max_tokens:
+                break
+            lines.append(entry)
+            used += cost
+        return header + "\n".join(lines) + "\n" if lines else ""
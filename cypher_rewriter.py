@@ -0,0 +1,705 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - Cypher 재작성기 (라벨 없는/상한 없는 패턴 → 인덱스를 탈 수 있는 형태)
+실행 직전에 쿼리를 토큰 단위로 분석해 다음을 적용하고, 무엇을 바꿨는지 보고합니다.
+    1. 라벨 추론: 고정된 id(앵커)에 맞는 노드를 DB에서 찾아 그 라벨로 노드 라벨을 채움
+       예) MATCH (a)-[r]->(t) WHERE t.id CONTAINS 'Tupac'  →  (t:Rapper)
+       캐시된 스키마(APOC 표본)의 관계 시작/끝 라벨로는 붙이지 않습니다. 표본에 빠진 라벨을 붙이면
+       라벨 없는 패턴이 찾았을 행이 조용히 빠지기 때문입니다.
+    2. 가변 길이 상한: [*], [*2..] 처럼 끝이 열린 패턴에 최대 홉 수를 붙임
+    3. 리터럴 파라미터화: 문자열/비교용 숫자 리터럴을 $파라미터로 바꿔 실행 계획 재사용
+
+환경 변수:
+    CYPHER_REWRITE        : "true"(기본) 이면 거버너 그래프에서 자동 적용
+    CYPHER_MAX_HOPS       : 열린 가변 길이 패턴의 상한 (기본 4)
+    CYPHER_MAX_LABELS     : 라벨 합집합(:A|B)으로 붙일 최대 라벨 수 (기본 3)
+"""
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# ==========================================
+# 1. 토크나이저
+# ==========================================
+_TOKEN = re.compile(
+    r"""
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<number>\d+\.\d+|\d+)
+  | (?P<param>\$\w+)
+  | (?P<ident>`[^`]*`|[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><>|<=|>=|=~|->|<-|\.\.|[-=<>(){}\[\]:,.|*+/%^;!])
+  | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_WRITE_KEYWORDS = {"CREATE", "MERGE", "SET", "DELETE", "DETACH", "REMOVE", "DROP", "FOREACH"}
+_PATTERN_CLAUSES = {"MATCH"}
+_COMPARISON_OPS = {"=", "<>", "<", ">", "<=", ">="}
+
+
+class Token:
+    __slots__ = ("kind", "text")
+
+    def __init__(self, kind: str, text: str):
+        self.kind = kind
+        self.text = text
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper()
+
+    def __repr__(self) -> str:
+        return f"Token({self.kind}, {self.text!r})"
+
+
+def tokenize(query: str) -> List[Token]:
+    return [Token(m.lastgroup, m.group()) for m in _TOKEN.finditer(query)]
+
+
+def _unquote(literal: str) -> str:
+    body = literal[1:-1]
+    return re.sub(r"\\(.)", r"\1", body)
+
+
+def _next_code(tokens: List[Token], i: int, step: int = 1) -> int:
+    """공백/주석을 건너뛴 다음(또는 이전) 토큰 위치. 없으면 -1."""
+    i += step
+    while 0 <= i < len(tokens):
+        if tokens[i].kind not in ("ws", "comment"):
+            return i
+        i += step
+    return -1
+
+
+# ==========================================
+# 2. 패턴 구조 추출
+# ==========================================
+class NodePattern:
+    """(var:Label {id: "..."}) 형태의 노드 패턴 위치 정보"""
+
+    def __init__(self, open_idx: int, close_idx: int, var: Optional[str], labels: List[str],
+                 var_idx: int, props: Dict[str, str]):
+        self.open_idx = open_idx
+        self.close_idx = close_idx
+        self.var = var
+        self.labels = labels
+        self.var_idx = var_idx  # 라벨을 삽입할 위치(변수 토큰, 없으면 여는 괄호)
+        self.props = props      # 인라인 맵의 리터럴 값 {key: 문자열 값}
+
+
+class RelPattern:
+    """-[r:TYPE*1..3]-> 형태의 관계 패턴"""
+
+    def __init__(self, left: NodePattern, right: NodePattern, types: List[str], direction: str):
+        self.left = left
+        self.right = right
+        self.types = types
+        self.direction = direction  # "out"(->), "in"(<-), "both"
+
+
+def _parse_node(tokens: List[Token], open_idx: int) -> Optional[NodePattern]:
+    """open_idx의 '('부터 노드 패턴 문법에 맞으면 NodePattern을 반환합니다."""
+    i = _next_code(tokens, open_idx)
+    var, var_idx, labels, props = None, open_idx, [], {}
+    if i >= 0 and tokens[i].kind == "ident":
+        var, var_idx = tokens[i].text, i
+        i = _next_code(tokens, i)
+    while i >= 0 and tokens[i].text in (":", "|", "&"):
+        j = _next_code(tokens, i)
+        if j < 0 or tokens[j].kind != "ident":
+            return None
+        labels.append(tokens[j].text.strip("`"))
+        var_idx = j
+        i = _next_code(tokens, j)
+    if i >= 0 and tokens[i].text == "{":
+        depth = 0
+        key = None
+        while i >= 0:
+            t = tokens[i]
+            if t.text == "{":
+                depth += 1
+            elif t.text == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+            elif depth == 1 and t.kind == "ident":
+                nxt = _next_code(tokens, i)
+                if nxt >= 0 and tokens[nxt].text == ":":
+                    key = t.text.strip("`")
+            elif depth == 1 and t.kind == "string" and key:
+                props[key] = _unquote(t.text)
+                key = None
+            i = _next_code(tokens, i)
+        if i < 0:
+            return None
+        i = _next_code(tokens, i)
+    if i >= 0 and tokens[i].text == ")":
+        return NodePattern(open_idx, i, var, labels, var_idx, props)
+    return None
+
+
+def _is_pattern_context(tokens: List[Token], open_idx: int, close_idx: int) -> bool:
+    """함수 호출/괄호식과 노드 패턴을 구분합니다."""
+    prev = _next_code(tokens, open_idx, -1)
+    nxt = _next_code(tokens, close_idx)
+    if nxt >= 0 and tokens[nxt].text in ("-", "<-", "<"):
+        return True
+    if prev >= 0 and tokens[prev].text in ("-", "->", ">"):
+        return True
+    if prev >= 0 and tokens[prev].upper in ("MATCH", ",", "="):
+        # "= (" 는 path = (a)... 인 경우만, "," 는 MATCH 절 안의 두 번째 패턴인 경우
+        return tokens[prev].upper == "MATCH" or _clause_of(tokens, open_idx) in _PATTERN_CLAUSES
+    return False
+
+
+def _clause_of(tokens: List[Token], idx: int) -> str:
+    """idx가 속한 절의 키워드 (MATCH/WHERE/RETURN/...)"""
+    depth = 0
+    i = idx - 1
+    while i >= 0:
+        t = tokens[i]
+        if t.text in (")", "]", "}"):
+            depth += 1
+        elif t.text in ("(", "[", "{"):
+            depth = max(depth - 1, 0)
+        elif depth == 0 and t.kind == "ident" and t.upper in (
+            "MATCH", "WHERE", "RETURN", "WITH", "UNWIND", "ORDER", "CALL", "CREATE", "MERGE", "SET",
+        ):
+            return t.upper
+        i -= 1
+    return ""
+
+
+def _parse_rel(tokens: List[Token], start: int) -> Optional[Tuple[int, List[str], str, Optional[Tuple[int, int]]]]:
+    """
+    노드 패턴의 ')' 다음 위치부터 관계 패턴을 읽습니다.
+
+    Returns:
+        (다음 노드의 '(' 위치, 관계 타입들, 방향, 가변 길이 '*' 구간 (시작, 끝) 또는 None)
+    """
+    i = _next_code(tokens, start)
+    if i < 0:
+        return None
+    left_arrow = False
+    if tokens[i].text == "<-":
+        left_arrow = True
+        i = _next_code(tokens, i)
+    elif tokens[i].text == "<":
+        left_arrow = True
+        i = _next_code(tokens, i)
+        if i < 0 or tokens[i].text != "-":
+            return None
+        i = _next_code(tokens, i)
+    elif tokens[i].text == "-":
+        i = _next_code(tokens, i)
+    elif tokens[i].text == "->":
+        # "-->" 는 "-", "->" 로 토큰화되므로 여기서 오지 않지만 방어적으로 처리
+        return None
+    else:
+        return None
+
+    types: List[str] = []
+    star: Optional[Tuple[int, int]] = None
+    if i >= 0 and tokens[i].text == "[":
+        j = _next_code(tokens, i)
+        while j >= 0 and tokens[j].text != "]":
+            t = tokens[j]
+            if t.text in (":", "|"):
+                k = _next_code(tokens, j)
+                if k >= 0 and tokens[k].kind == "ident":
+                    types.append(tokens[k].text.strip("`"))
+            elif t.text == "*":
+                k = j
+                end = j
+                n = _next_code(tokens, k)
+                while n >= 0 and (tokens[n].kind == "number" or tokens[n].text == ".."):
+                    end = n
+                    n = _next_code(tokens, n)
+                star = (j, end)
+            elif t.text == "{":
+                break
+            j = _next_code(tokens, j)
+        while j >= 0 and tokens[j].text != "]":
+            j = _next_code(tokens, j)
+        if j < 0:
+            return None
+        i = _next_code(tokens, j)
+
+    right_arrow = False
+    if i >= 0 and tokens[i].text == "->":
+        right_arrow = True
+    elif i >= 0 and tokens[i].text == "-":
+        k = _next_code(tokens, i)
+        if k >= 0 and tokens[k].text == ">":
+            right_arrow = True
+            i = k
+    else:
+        return None
+    nxt = _next_code(tokens, i)
+    if nxt < 0 or tokens[nxt].text != "(":
+        return None
+
+    if right_arrow and not left_arrow:
+        direction = "out"
+    elif left_arrow and not right_arrow:
+        direction = "in"
+    else:
+        direction = "both"
+    return nxt, types, direction, star
+
+
+def extract_patterns(tokens: List[Token]) -> Tuple[List[NodePattern], List[RelPattern], List[Tuple[int, int]]]:
+    """토큰 목록에서 노드 패턴, 관계 패턴, 가변 길이 구간을 모읍니다."""
+    nodes: Dict[int, NodePattern] = {}
+    rels: List[RelPattern] = []
+    stars: List[Tuple[int, int]] = []
+
+    for idx, tok in enumerate(tokens):
+        if tok.text != "(" or idx in nodes:
+            continue
+        node = _parse_node(tokens, idx)
+        if node is None or not _is_pattern_context(tokens, idx, node.close_idx):
+            continue
+        nodes[idx] = node
+        # 이 노드에서 시작하는 체인을 따라갑니다.
+        current = node
+        while True:
+            rel = _parse_rel(tokens, current.close_idx)
+            if rel is None:
+                break
+            next_open, types, direction, star = rel
+            right = nodes.get(next_open) or _parse_node(tokens, next_open)
+            if right is None:
+                break
+            nodes[next_open] = right
+            rels.append(RelPattern(current, right, types, direction))
+            if star:
+                stars.append(star)
+            current = right
+
+    return [nodes[k] for k in sorted(nodes)], rels, stars
+
+
+# ==========================================
+# 3. WHERE 절의 id 앵커
+# ==========================================
+_ANCHOR_OPS = ("=", "CONTAINS", "STARTS WITH", "ENDS WITH")
+
+
+def _where_ranges(tokens: List[Token]) -> List[Tuple[int, int]]:
+    """각 WHERE 절의 (시작, 끝) 토큰 구간"""
+    ranges = []
+    for i, t in enumerate(tokens):
+        if t.kind == "ident" and t.upper == "WHERE":
+            depth = 0
+            j = i + 1
+            while j < len(tokens):
+                tj = tokens[j]
+                if tj.text in ("(", "[", "{"):
+                    depth += 1
+                elif tj.text in (")", "]", "}"):
+                    if depth == 0:
+                        break
+                    depth -= 1
+                elif depth == 0 and tj.kind == "ident" and tj.upper in (
+                    "RETURN", "WITH", "MATCH", "OPTIONAL", "UNWIND", "ORDER", "CALL", "UNION",
+                ):
+                    break
+                j += 1
+            ranges.append((i + 1, j))
+    return ranges
+
+
+def _split_top_level(tokens: List[Token], start: int, end: int, keyword: str) -> List[Tuple[int, int]]:
+    parts, depth, s = [], 0, start
+    for i in range(start, end):
+        t = tokens[i]
+        if t.text in ("(", "[", "{"):
+            depth += 1
+        elif t.text in (")", "]", "}"):
+            depth -= 1
+        elif depth == 0 and t.kind == "ident" and t.upper == keyword:
+            parts.append((s, i))
+            s = i + 1
+    parts.append((s, end))
+    return parts
+
+
+def _strip_parens(tokens: List[Token], start: int, end: int) -> Tuple[int, int]:
+    while True:
+        a = start if tokens[start].kind not in ("ws", "comment") else _next_code(tokens, start)
+        b = end - 1
+        while b > a and tokens[b].kind in ("ws", "comment"):
+            b -= 1
+        if a < 0 or a >= end or tokens[a].text != "(" or tokens[b].text != ")":
+            return start, end
+        # 바깥 괄호가 서로 짝인지 확인
+        depth = 0
+        for i in range(a, b + 1):
+            if tokens[i].text == "(":
+                depth += 1
+            elif tokens[i].text == ")":
+                depth -= 1
+                if depth == 0 and i != b:
+                    return start, end
+        start, end = a + 1, b
+
+
+def _parse_anchor_atom(tokens: List[Token], start: int, end: int) -> Optional[Tuple[str, str, str]]:
+    """'var.id OP literal' 한 개를 (var, op, value)로 읽습니다. 다른 형태면 None."""
+    code = [t for t in tokens[start:end] if t.kind not in ("ws", "comment")]
+    if len(code) < 5 or code[0].kind != "ident" or code[1].text != "." or code[2].text != "id":
+        return None
+    rest = code[3:]
+    op = " ".join(t.upper for t in rest[:-1])
+    if op not in _ANCHOR_OPS or rest[-1].kind != "string":
+        return None
+    return code[0].text, op, _unquote(rest[-1].text)
+
+
+def find_id_anchors(tokens: List[Token]) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    WHERE 절에서 변수별 id 앵커를 찾습니다.
+    AND로 묶인 조건 중 한 변수의 'var.id OP 리터럴'만 OR로 나열된 조건만 인정합니다.
+    (그래야 이 조건을 만족하는 모든 노드가 찾은 라벨 중 하나를 갖는다고 보장할 수 있습니다.)
+
+    Returns:
+        {var: [(op, value), ...]}
+    """
+    anchors: Dict[str, List[Tuple[str, str]]] = {}
+    for w_start, w_end in _where_ranges(tokens):
+        for c_start, c_end in _split_top_level(tokens, w_start, w_end, "AND"):
+            c_start, c_end = _strip_parens(tokens, c_start, c_end)
+            atoms = []
+            for a_start, a_end in _split_top_level(tokens, c_start, c_end, "OR"):
+                a_start, a_end = _strip_parens(tokens, a_start, a_end)
+                atom = _parse_anchor_atom(tokens, a_start, a_end)
+                if atom is None:
+                    atoms = []
+                    break
+                atoms.append(atom)
+            variables = {a[0] for a in atoms}
+            if atoms and len(variables) == 1:
+                var = variables.pop()
+                # 같은 변수에 여러 AND 조건이 있으면 첫 조건만으로도 충분히 안전합니다.
+                anchors.setdefault(var, [(op, value) for _, op, value in atoms])
+    return anchors
+
+
+# ==========================================
+# 4. 스키마 캐시
+# ==========================================
+# 수집/검색이 만드는 내부 라벨 (provenance.DOCUMENT_LABEL, graph_rag.ENTITY_LABEL).
+# 엔티티 스키마가 아니므로 프롬프트 스키마, 스키마 선택기, 검증기, 라벨 추론에서 모두 뺍니다.
+INTERNAL_LABELS = frozenset({"Document", "EntityVector"})
+
+
+def public_schema(structured_schema: Dict[str, Any], exclude: Iterable[str] = INTERNAL_LABELS) -> Dict[str, Any]:
+    """structured_schema에서 exclude 라벨과, 그 라벨에만 닿는 관계 타입을 뺀 사본."""
+    exclude = set(exclude)
+    relationships = [
+        rel for rel in structured_schema.get("relationships") or []
+        if rel["start"] not in exclude and rel["end"] not in exclude
+    ]
+    dropped = {rel["type"] for rel in structured_schema.get("relationships") or []} - {rel["type"] for rel in relationships}
+    schema = dict(structured_schema)
+    schema["node_props"] = {k: v for k, v in (structured_schema.get("node_props") or {}).items() if k not in exclude}
+    schema["rel_props"] = {k: v for k, v in (structured_schema.get("rel_props") or {}).items() if k not in dropped}
+    schema["relationships"] = relationships
+    return schema
+
+
+class SchemaCache:
+    """
+    관계 타입별 시작/끝 라벨과 id → 라벨 색인을 보관합니다.
+    Neo4jGraph.structured_schema로 채우고, 노드 id의 라벨은 쿼리에 나온 앵커 값만 DB에서 찾습니다.
+
+    - lookup(op, value, labels)  : 앵커 조건에 맞는 노드의 {id: 라벨} (라벨별 id 인덱스 조회)
+    - loader()                   : 전체 id → 라벨 색인 (lookup이 없을 때만 쓰는 전체 스캔, 작은 그래프/테스트용)
+    - version()                  : 그래프 버전 (노드/관계 개수). 바뀔 때만 캐시를 비우고 색인을 다시 읽음
+    - names()                    : DB의 (라벨, 관계 타입) 이름 (db.labels/db.relationshipTypes 토큰 조회)
+    version이 없으면 ttl_s마다 다시 읽습니다.
+    """
+
+    def __init__(self, structured_schema: Optional[Dict[str, Any]] = None,
+                 id_labels: Optional[Dict[str, Iterable[str]]] = None,
+                 loader: Optional[Callable[[], Dict[str, Iterable[str]]]] = None,
+                 lookup: Optional[Callable[[str, str, Set[str]], Dict[str, Iterable[str]]]] = None,
+                 version: Optional[Callable[[], Any]] = None,
+                 names: Optional[Callable[[], Tuple[Iterable[str], Iterable[str]]]] = None,
+                 ttl_s: float = 300.0):
+        self.rel_endpoints: Dict[str, Tuple[Set[str], Set[str]]] = {}
+        self.labels: Set[str] = set()
+        self.set_schema(structured_schema or {})
+        self._id_labels: Dict[str, Set[str]] = {k: set(v) for k, v in (id_labels or {}).items()}
+        self._loader = loader
+        self._lookup = lookup
+        self._version_fn = version
+        self._ttl_s = ttl_s
+        self._loaded_at = time.time() if id_labels is not None else 0.0
+        self._loaded_version: Any = None
+        self._version: Any = None
+        self._version_checked_at = 0.0
+        self._anchors: Dict[Tuple[str, str], Set[str]] = {}
+        self._names_fn = names
+        self._names: Optional[Tuple[Set[str], Set[str]]] = None
+        self._names_version: Any = None
+
+    def set_schema(self, structured_schema: Dict[str, Any]) -> None:
+        self.rel_endpoints = {}
+        self.labels = set(structured_schema.get("node_props") or {})
+        for rel in structured_schema.get("relationships", []):
+            starts, ends = self.rel_endpoints.setdefault(rel["type"], (set(), set()))
+            starts.add(rel["start"])
+            ends.add(rel["end"])
+            self.labels.update((rel["start"], rel["end"]))
+
+    def graph_version(self) -> Any:
+        """그래프 버전 (ttl_s 안에서는 마지막 값). 바뀌면 앵커 캐시를 비웁니다."""
+        if self._version_fn is None:
+            return None
+        now = time.time()
+        if self._version is None or now - self._version_checked_at > self._ttl_s:
+            version = self._version_fn()
+            if version != self._version:
+                self._version = version
+                self._anchors.clear()
+            self._version_checked_at = now
+        return self._version
+
+    def db_names(self, fresh: bool = False) -> Tuple[Set[str], Set[str]]:
+        """
+        DB에 있는 (라벨, 관계 타입) 이름. 그래프 버전이 바뀔 때만 다시 읽고, fresh면 바로 다시 읽습니다.
+        names가 없으면 캐시된 스키마의 이름입니다. (APOC 스키마는 표본 조회라 빠진 이름이 있을 수 있음)
+        """
+        if self._names_fn is None:
+            return set(self.labels), set(self.rel_endpoints)
+        version = self.graph_version()
+        if fresh or self._names is None or self._names_version != version:
+            labels, types = self._names_fn()
+            self._names = (set(labels), set(types))
+            self._names_version = version
+        return self._names
+
+    @property
+    def id_labels(self) -> Dict[str, Set[str]]:
+        if self._loader:
+            if self._version_fn is not None:
+                stale = self._loaded_at == 0.0 or self.graph_version() != self._loaded_version
+            else:
+                stale = time.time() - self._loaded_at > self._ttl_s
+            if stale:
+                self._id_labels = {k: set(v) for k, v in self._loader().items()}
+                self._loaded_at = time.time()
+                self._loaded_version = self._version
+        return self._id_labels
+
+    def labels_for_anchor(self, op: str, value: str) -> Set[str]:
+        if self._lookup is not None:
+            self.graph_version()
+            key = (op, value)
+            if key not in self._anchors:
+                found = self._lookup(op, value, self.db_names()[0])
+                self._anchors[key] = {label for labels in found.values() for label in labels}
+            return set(self._anchors[key])
+
+        index = self.id_labels
+        if op == "=":
+            return set(index.get(value, ()))
+        if op == "CONTAINS":
+            match = lambda k: value in k
+        elif op == "STARTS WITH":
+            match = lambda k: k.startswith(value)
+        else:
+            match = lambda k: k.endswith(value)
+        labels: Set[str] = set()
+        for node_id, node_labels in index.items():
+            if match(node_id):
+                labels |= node_labels
+        return labels
+
+
+# ==========================================
+# 5. 재작성기
+# ==========================================
+class CypherRewriter:
+    """
+    쿼리를 인덱스 친화적으로 재작성합니다.
+
+    사용 예:
+        rewriter = CypherRewriter(SchemaCache(graph.structured_schema, lookup=..., version=...))
+        query, params, changes = rewriter.rewrite("MATCH (a)-[r]->(t) WHERE t.id CONTAINS 'Tupac' RETURN a")
+    """
+
+    def __init__(self, schema: SchemaCache, max_hops: Optional[int] = None, max_labels: Optional[int] = None,
+                 infer_labels: bool = True, bound_var_length: bool = True, parameterize: bool = True):
+        self.schema = schema
+        self.max_hops = int(max_hops if max_hops is not None else os.getenv("CYPHER_MAX_HOPS", 4))
+        self.max_labels = int(max_labels if max_labels is not None else os.getenv("CYPHER_MAX_LABELS", 3))
+        self.infer_labels = infer_labels
+        self.bound_var_length = bound_var_length
+        self.parameterize = parameterize
+
+    def rewrite(self, query: str, params: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any], List[str]]:
+        """
+        Returns:
+            (재작성된 쿼리, 파라미터, 변경 내역 목록)
+        """
+        params = dict(params or {})
+        tokens = tokenize(query)
+        if any(t.kind == "ident" and t.upper in _WRITE_KEYWORDS for t in tokens):
+            return query, params, []  # 쓰기 쿼리는 건드리지 않습니다.
+
+        changes: List[str] = []
+        nodes, _, stars = extract_patterns(tokens)
+        # 토큰 뒤에 붙일 텍스트 {토큰 위치: 추가 문자열}
+        inserts: Dict[int, str] = {}
+
+        if self.infer_labels:
+            self._infer_labels(tokens, nodes, inserts, changes)
+        if self.bound_var_length:
+            self._bound_stars(tokens, stars, inserts, changes)
+        if self.parameterize:
+            self._parameterize(tokens, params, changes)
+
+        rewritten = "".join(t.text + inserts.get(i, "") for i, t in enumerate(tokens))
+        return rewritten, params, changes
+
+    # ---------- 라벨 추론 ----------
+    def _infer_labels(self, tokens, nodes, inserts, changes) -> None:
+        anchors = find_id_anchors(tokens)
+        seen_vars: Set[str] = set()
+        labeled_vars = {n.var for n in nodes if n.var and n.labels}
+
+        for node in nodes:
+            if node.labels or (node.var and (node.var in seen_vars or node.var in labeled_vars)):
+                continue
+            if node.var:
+                seen_vars.add(node.var)
+
+            # 인라인 id 또는 WHERE 앵커에 맞는 노드들의 라벨 (합집합이라 찾을 노드가 빠지지 않음)
+            if "id" in node.props:
+                candidates, reason = self.schema.labels_for_anchor("=", node.props["id"]), "id 앵커"
+            elif node.var in anchors:
+                candidates, reason = set(), "WHERE id 앵커"
+                for op, value in anchors[node.var]:
+                    candidates |= self.schema.labels_for_anchor(op, value)
+            else:
+                continue
+
+            if not candidates or len(candidates) > self.max_labels:
+                continue
+            label_expr = ":" + "|".join(sorted(f"`{l}`" if not l.isidentifier() else l for l in candidates))
+            inserts[node.var_idx] = inserts.get(node.var_idx, "") + label_expr
+            changes.append(f"라벨 추론 ({reason}): ({node.var or ''}) → ({node.var or ''}{label_expr})")
+
+    # ---------- 가변 길이 상한 ----------
+    def _bound_stars(self, tokens, stars, inserts, changes) -> None:
+        for star_idx, end_idx in stars:
+            parts = [tokens[i].text for i in range(star_idx + 1, end_idx + 1) if tokens[i].kind not in ("ws", "comment")]
+            if not parts:
+                # [*] → [*1..N]
+                inserts[star_idx] = inserts.get(star_idx, "") + f"1..{self.max_hops}"
+                changes.append(f"가변 길이 상한: * → *1..{self.max_hops}")
+            elif parts[-1] == "..":
+                # [*2..] → [*2..N],  [*..] 은 드물지만 같은 방식
+                lower = parts[0] if parts[0] != ".." else "1"
+                upper = max(self.max_hops, int(lower))
+                inserts[end_idx] = inserts.get(end_idx, "") + str(upper)
+                changes.append(f"가변 길이 상한: *{''.join(parts)} → *{''.join(parts)}{upper}")
+
+    # ---------- 리터럴 파라미터화 ----------
+    def _parameterize(self, tokens, params, changes) -> None:
+        count = 0
+        for i, t in enumerate(tokens):
+            if t.kind == "string":
+                value: Any = _unquote(t.text)
+            elif t.kind == "number":
+                prev = _next_code(tokens, i, -1)
+                prev_tok = tokens[prev] if prev >= 0 else None
+                # 비교 연산자 뒤 또는 맵의 "key: 123" 값만 (가변 길이 *1..3, LIMIT 등은 제외)
+                if prev_tok is None or prev_tok.text not in _COMPARISON_OPS | {":"}:
+                    continue
+                if prev_tok.text == ":" and not _inside(tokens, i, "{"):
+                    continue
+                value = float(t.text) if "." in t.text else int(t.text)
+            else:
+                continue
+            name = f"lit_{count}"
+            while name in params:
+                count += 1
+                name = f"lit_{count}"
+            params[name] = value
+            t.text = f"${name}"
+            t.kind = "param"
+            count += 1
+        if count:
+            changes.append(f"리터럴 파라미터화: {count}개")
+
+
+def _inside(tokens: List[Token], idx: int, bracket: str) -> bool:
+    """idx가 가장 가까운 여는 괄호 bracket 안에 있는지 확인합니다."""
+    closing = {"(": ")", "[": "]", "{": "}"}
+    depth = {k: 0 for k in closing}
+    for i in range(idx - 1, -1, -1):
+        t = tokens[i].text
+        for open_b, close_b in closing.items():
+            if t == close_b:
+                depth[open_b] += 1
+            elif t == open_b:
+                if depth[open_b] == 0:
+                    return open_b == bracket
+                depth[open_b] -= 1
+    return False
+
+
+def load_id_labels(run_query: Callable[[str], List[Dict[str, Any]]]) -> Dict[str, List[str]]:
+    """id → 라벨 색인을 DB에서 읽습니다. run_query는 cypher 문자열을 받아 행 목록을 반환해야 합니다."""
+    rows = run_query("MATCH (n) WHERE n.id IS NOT NULL RETURN n.id AS id, labels(n) AS labels")
+    index: Dict[str, List[str]] = {}
+    for row in rows:
+        index.setdefault(str(row["id"]), []).extend(row["labels"])
+    return index
+
+
+def lookup_anchor_labels(run_query: Callable[[str, Dict[str, Any]], List[Dict[str, Any]]],
+                         op: str, value: str, labels: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    id 앵커(n.id = / CONTAINS / STARTS WITH / ENDS WITH 값)에 맞는 노드의 id → 라벨을 DB에서 찾습니다.
+    라벨별 MATCH를 UNION으로 묶어 각 라벨의 id 인덱스(rule_engine.ensure_indexes)를 타게 합니다.
+    run_query는 (cypher, params)를 받아 행 목록을 반환해야 합니다.
+    """
+    if op not in ("=", "CONTAINS", "STARTS WITH", "ENDS WITH"):
+        return {}
+    branches = [
+        f"MATCH (n:`{label}`) WHERE n.id {op} $value RETURN n.id AS id, labels(n) AS labels"
+        for label in sorted(labels)
+    ] or [f"MATCH (n) WHERE n.id {op} $value RETURN n.id AS id, labels(n) AS labels"]
+    index: Dict[str, List[str]] = {}
+    for row in run_query(" UNION ".join(branches), {"value": value}):
+        node_labels = index.setdefault(str(row["id"]), [])
+        node_labels.extend(label for label in row["labels"] if label not in node_labels)
+    return index
+
+
+def load_graph_version(run_query: Callable[[str], List[Dict[str, Any]]]) -> Tuple[int, int]:
+    """노드/관계 개수 (카운트 스토어 조회라 그래프 크기와 무관하게 빠름)."""
+    nodes = run_query("MATCH (n) RETURN count(n) AS c")
+    rels = run_query("MATCH ()-[r]->() RETURN count(r) AS c")
+    return (nodes[0]["c"] if nodes else 0, rels[0]["c"] if rels else 0)
+
+
+def load_db_names(run_query: Callable[[str], List[Dict[str, Any]]]) -> Tuple[Set[str], Set[str]]:
+    """DB의 라벨/관계 타입 이름 (토큰 조회라 그래프 크기와 무관하게 빠름). 내부 라벨(INTERNAL_LABELS)은 뺍니다."""
+    labels = run_query("CALL db.labels() YIELD label RETURN collect(label) AS names")
+    types = run_query("CALL db.relationshipTypes() YIELD relationshipType RETURN collect(relationshipType) AS names")
+    return (set(labels[0]["names"]) - INTERNAL_LABELS if labels else set(),
+            set(types[0]["names"]) if types else set())
+
+
+def rewrite_enabled() -> bool:
+    return os.getenv("CYPHER_REWRITE", "true").strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - Cypher 정적 검증기 (Schema Lint)
+프롬프트와 예시는 그래프에 없을 수도 있는 관계 타입을 알려주고(RIVAL_OF ↔ RIVALRY_WITH,
+ORDERED_HIT ↔ ORDERED_HIT_ON, KILLED), 생성된 쿼리는 없는 라벨/속성을 자주 씁니다.
+이런 쿼리는 오류 없이 빈 결과만 돌려주므로 DB 왕복 한 번을 그냥 버리게 됩니다.
+
+CypherValidator는 실행 전에 쿼리를 토큰 단위로 읽어(cypher_rewriter의 패턴 파서) 캐시된 스키마
+(Neo4jGraph.structured_schema)와 맞춰 봅니다.
+    1. 라벨 / 관계 타입   : 스키마에 없으면 비슷한 이름을 찾음 (RIVAL_OF → RIVALRY_WITH)
+    2. 방향 / 연결         : (:Rapper)-[:MEMBER_OF]->(:Gang) 처럼 스키마에 있는 시작/끝 라벨인지,
+                             반대 방향만 있으면 화살표를 뒤집음
+    3. 속성               : 변수의 라벨(관계 타입)에 없는 속성 (n.nme → n.name)
+
+비슷한 이름이 하나로 확실하면(CYPHER_AUTOFIX_MIN_SCORE 이상) 쿼리를 바로 고치고, 남은 문제는
+"후보" 목록과 함께 재생성 피드백으로 돌려줍니다. (model_router.TieredCypherQAChain이 사용)
+RETURN/ORDER BY에만 쓰인 없는 속성은 null 열이 될 뿐이라 고칠 수 있으면 고치고 실행은 막지 않습니다.
+
+캐시된 스키마는 앱 시작 때(그리고 그래프 버전이 바뀔 때) 읽은 APOC 표본이라, 그 뒤에 수집된 이름이 빠져 있을 수 있습니다.
+known(DB의 실제 라벨/관계 타입 이름)을 넘기면 스키마에 없는 이름이 DB에는 있는지 먼저 보고,
+있으면 고치거나 막지 않고 후보만 알려줍니다. (새로 생긴 [:ORDERED_HIT]을 [:ORDERED_HIT_ON]으로 바꾸지 않도록)
+
+환경 변수:
+    CYPHER_AUTOFIX            : 확실한 교정을 쿼리에 바로 적용 (기본 true)
+    CYPHER_AUTOFIX_MIN_SCORE  : 자동 교정에 필요한 이름 유사도 (기본 0.8, 0~1)
+"""
+import difflib
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from cypher_rewriter import Token, _clause_of, _inside, _next_code, extract_patterns, tokenize
+
+# 이름 비교에서 빼는 연결어 (RIVAL_OF ↔ RIVALRY_WITH)
+_STOPWORDS = {"of", "with", "on", "in", "to", "by", "at", "for", "from", "the", "a", "an", "has", "is"}
+_WORD = re.compile(r"[a-z0-9]+")
+# 이보다 덜 비슷한 이름은 후보로도 내지 않습니다.
+SUGGEST_MIN_SCORE = 0.5
+# 자동 교정 시 1등과 2등의 최소 차이 (애매하면 LLM에 맡김)
+AUTOFIX_MARGIN = 0.1
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _words(identifier: str) -> List[str]:
+    spaced = re.sub(r"([a-z])([A-Z])", r"\1 \2", identifier).replace("_", " ").lower()
+    return [w for w in _WORD.findall(spaced) if w not in _STOPWORDS]
+
+
+def name_similarity(a: str, b: str) -> float:
+    """
+    식별자 유사도 (0~1): 글자 정렬 비율과 단어 겹침(접두어 허용, 연결어 제외) 중 큰 값.
+        RIVAL_OF ~ RIVALRY_WITH = 1.0, ORDERED_HIT ~ ORDERED_HIT_ON = 1.0, KILLED ~ SUSPECTED_KILLER_OF = 0.4
+    """
+    ratio = difflib.SequenceMatcher(None, a.lower(), b.lower()).ratio()
+    wa, wb = _words(a), _words(b)
+    if not wa or not wb:
+        return ratio
+    shared = sum(1 for x in wa if any(
+        x == y or (min(len(x), len(y)) >= 4 and (x.startswith(y) or y.startswith(x))) for y in wb
+    ))
+    return max(ratio, shared / max(len(wa), len(wb)))
+
+
+def _quote(name: str) -> str:
+    return name if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name) else f"`{name}`"
+
+
+# ==========================================
+# 1. 스키마 어휘
+# ==========================================
+def schema_vocabulary(structured_schema: Dict[str, Any]) -> Tuple[set, set]:
+    """구조화된 스키마에서 (라벨 집합, 관계 타입 집합)을 뽑습니다."""
+    labels = set((structured_schema.get("node_props") or {}).keys())
+    types = set((structured_schema.get("rel_props") or {}).keys())
+    for rel in structured_schema.get("relationships") or []:
+        labels.update((rel.get("start"), rel.get("end")))
+        types.add(rel.get("type"))
+    labels.discard(None)
+    types.discard(None)
+    return labels, types
+
+
+def unknown_identifiers(cypher: str, structured_schema: Dict[str, Any]) -> List[str]:
+    """쿼리 패턴에 쓰였지만 스키마에 없는 라벨/관계 타입 목록 (스키마가 비어 있으면 검사하지 않음)."""
+    labels, types = schema_vocabulary(structured_schema or {})
+    if not labels and not types:
+        return []
+    nodes, rels, _ = extract_patterns(tokenize(cypher))
+    unknown = []
+    for node in nodes:
+        unknown.extend(f":{label}" for label in node.labels if labels and label not in labels)
+    for rel in rels:
+        unknown.extend(f"[:{t}]" for t in rel.types if types and t not in types)
+    return sorted(set(unknown))
+
+
+class CypherValidator:
+    """
+    캐시된 스키마로 생성 Cypher를 실행 전에 검사/교정합니다.
+
+    사용 예:
+        validator = CypherValidator(graph.structured_schema)
+        fixed, fixes, issues = validator.repair("MATCH (a:Rapper)-[:RIVAL_OF]->(b) RETURN b.id")
+        # fixes  → ['[:RIVAL_OF] → [:RIVALRY_WITH]'], issues → 고치지 못한 문제 (없으면 실행)
+        describe(issues)                        # → 재생성 피드백 문자열
+    """
+
+    def __init__(self, structured_schema: Dict[str, Any], autofix: Optional[bool] = None,
+                 min_score: Optional[float] = None):
+        self.autofix = _env_bool("CYPHER_AUTOFIX", True) if autofix is None else autofix
+        self.min_score = min_score if min_score is not None else float(os.getenv("CYPHER_AUTOFIX_MIN_SCORE", 0.8))
+        self.node_props: Dict[str, Set[str]] = {
+            label: {p.get("property") for p in props or [] if p.get("property")}
+            for label, props in (structured_schema.get("node_props") or {}).items()
+        }
+        self.rel_props: Dict[str, Set[str]] = {
+            rel_type: {p.get("property") for p in props or [] if p.get("property")}
+            for rel_type, props in (structured_schema.get("rel_props") or {}).items()
+        }
+        self.patterns: Set[Tuple[str, str, str]] = set()
+        for rel in structured_schema.get("relationships") or []:
+            if rel.get("start") and rel.get("type") and rel.get("end"):
+                self.patterns.add((rel["start"], rel["type"], rel["end"]))
+        self.labels = set(self.node_props) | {s for s, _, _ in self.patterns} | {e for _, _, e in self.patterns}
+        self.types = set(self.rel_props) | {t for _, t, _ in self.patterns}
+
+    def __bool__(self) -> bool:
+        return bool(self.labels or self.types)
+
+    def suggest(self, name: str, vocabulary: Iterable[str], limit: int = 3,
+                prefer: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """비슷한 이름 후보 [(이름, 점수)]. prefer에 든 이름(패턴에 맞는 관계 타입 등)은 같은 점수에서 앞섭니다."""
+        prefer = prefer or set()
+        scored = [(candidate, round(name_similarity(name, candidate), 3)) for candidate in vocabulary]
+        scored = [item for item in scored if item[1] >= SUGGEST_MIN_SCORE]
+        scored.sort(key=lambda item: (-item[1], item[0] not in prefer, item[0]))
+        return scored[:limit]
+
+    def _pick(self, suggestions: List[Tuple[str, float]]) -> Optional[str]:
+        """자동 교정할 이름: 점수가 충분하고 2등과 확실히 차이 날 때만."""
+        if not self.autofix or not suggestions or suggestions[0][1] < self.min_score:
+            return None
+        if len(suggestions) > 1 and suggestions[0][1] - suggestions[1][1] < AUTOFIX_MARGIN:
+            return None
+        return suggestions[0][0]
+
+    # ==========================================
+    # 2. 검사
+    # ==========================================
+    def analyze(self, cypher: str, known: Optional[Callable[[], Set[str]]] = None
+                ) -> Tuple[List[Token], List[Dict[str, Any]]]:
+        """
+        쿼리를 검사합니다.
+
+        Args:
+            cypher: 생성된 쿼리
+            known: DB에 실제로 있는 라벨/관계 타입 이름을 돌려주는 함수 (스키마에 없는 이름이 나올 때만 한 번 호출)
+
+        Returns:
+            tuple: (토큰, 문제 목록 [{'kind', 'found', 'fix', 'suggestions', 'blocking', 'message', 'edits'}])
+                   edits는 fix를 적용할 (토큰 위치, 새 텍스트) 목록입니다.
+                   DB에는 있는 이름은 'stale': True인 막지 않는 문제입니다. (스키마를 다시 읽어야 함)
+        """
+        tokens = tokenize(cypher)
+        issues: List[Dict[str, Any]] = []
+        if not self:
+            return tokens, issues
+        nodes, rels, _ = extract_patterns(tokens)
+        renamed: Dict[Tuple[str, str], str] = {}
+        stale: Set[str] = set()
+        live: List[Set[str]] = []
+
+        def in_db(name: str) -> bool:
+            if known is None:
+                return False
+            if not live:
+                live.append(set(known()))
+            return name in live[0]
+
+        # ---------- 라벨 ----------
+        for name in dict.fromkeys(label for node in nodes for label in node.labels):
+            if name in self.labels:
+                continue
+            suggestions = self.suggest(name, self.labels)
+            if in_db(name):
+                stale.add(name)
+                issues.append(self._stale_issue("label", name, suggestions, f":{name}"))
+                continue
+            fix = self._pick(suggestions)
+            if fix:
+                renamed[("label", name)] = fix
+            issues.append(self._issue("label", name, fix, suggestions, f":{name}", f":{fix}" if fix else None,
+                                      self._rename_edits(tokens, name, fix, in_brackets=False)))
+
+        def labels_of(node) -> Set[str]:
+            return {renamed.get(("label", label), label) for label in node.labels} & self.labels
+
+        # ---------- 관계 타입 (끝 라벨이 맞는 타입을 우선) ----------
+        checked: Set[str] = set()
+        for rel in rels:
+            for name in rel.types:
+                if name in self.types or name in checked:
+                    continue
+                checked.add(name)
+                if in_db(name):
+                    stale.add(name)
+                    issues.append(self._stale_issue("type", name, self.suggest(name, self.types), f"[:{name}]"))
+                    continue
+                left, right = labels_of(rel.left), labels_of(rel.right)
+                ends = [(left, right), (right, left)] if rel.direction == "both" else \
+                    [(left, right) if rel.direction == "out" else (right, left)]
+                prefer = {t for s, t, e in self.patterns
+                          if any((not a or s in a) and (not b or e in b) for a, b in ends)}
+                suggestions = self.suggest(name, self.types, prefer=prefer)
+                fix = self._pick(suggestions)
+                if fix:
+                    renamed[("type", name)] = fix
+                issue = self._issue("type", name, fix, suggestions, f"[:{name}]", f"[:{fix}]" if fix else None,
+                                    self._rename_edits(tokens, name, fix, in_brackets=True))
+                if not suggestions and prefer and len(prefer) < len(self.types):
+                    # 비슷한 이름이 없으면 양끝 라벨을 잇는 관계 타입을 알려줍니다. (KILLED → SHOT_AT, ...)
+                    issue["suggestions"] = sorted(prefer)[:5]
+                    issue["message"] += f" (이 라벨 사이의 관계: {', '.join(issue['suggestions'])})"
+                issues.append(issue)
+
+        # ---------- 방향 / 연결 ----------
+        for rel in rels:
+            types = {renamed.get(("type", t), t) for t in rel.types} & self.types
+            left, right = labels_of(rel.left), labels_of(rel.right)
+            if len(rel.types) != 1 or not types or not (left or right) or rel.direction == "both":
+                continue
+            rel_type = types.pop()
+            start, end = (left, right) if rel.direction == "out" else (right, left)
+            if self._connects(start, rel_type, end):
+                continue
+            shown = f"({self._show(start)})-[:{rel_type}]->({self._show(end)})"
+            if self._connects(end, rel_type, start):
+                edits = self._flip_edits(tokens, rel.left.close_idx, rel.right.open_idx)
+                fix = f"({self._show(end)})-[:{rel_type}]->({self._show(start)})" if edits and self.autofix else None
+                issues.append({"kind": "direction", "found": shown, "fix": fix, "suggestions": [],
+                               "blocking": True, "edits": edits if fix else [],
+                               "message": f"{shown} → {fix}" if fix else f"{shown} 방향이 반대입니다"})
+            else:
+                valid = sorted(f"(:{s})-[:{t}]->(:{e})" for s, t, e in self.patterns if t == rel_type)[:4]
+                issues.append({"kind": "pattern", "found": shown, "fix": None, "suggestions": valid,
+                               "blocking": True, "edits": [],
+                               "message": f"{shown} 연결은 스키마에 없습니다 (가능: {', '.join(valid) or '-'})"})
+
+        # ---------- 속성 ----------
+        node_vars: Dict[str, Set[str]] = {}
+        # 스키마에 아직 없는 라벨/타입의 변수는 속성을 알 수 없으므로 검사하지 않습니다.
+        unchecked: Set[str] = set()
+        for node in nodes:
+            if node.var:
+                node_vars.setdefault(node.var, set()).update(labels_of(node))
+                if stale & set(node.labels):
+                    unchecked.add(node.var)
+        rel_vars = self._rel_vars(tokens, renamed, stale, unchecked)
+        all_node_props = set().union(*self.node_props.values()) if self.node_props else set()
+        all_rel_props = set().union(*self.rel_props.values()) if self.rel_props else set()
+        seen_props: Set[Tuple[str, str]] = set()
+        for i, token in enumerate(tokens):
+            if token.kind != "ident" or token.text not in node_vars and token.text not in rel_vars \
+                    or token.text in unchecked:
+                continue
+            dot = _next_code(tokens, i)
+            prop_idx = _next_code(tokens, dot) if dot >= 0 and tokens[dot].text == "." else -1
+            prev = _next_code(tokens, i, -1)
+            if prop_idx < 0 or tokens[prop_idx].kind != "ident" or (prev >= 0 and tokens[prev].text == "."):
+                continue
+            var, prop = token.text, tokens[prop_idx].text.strip("`")
+            if var in node_vars:
+                owners = node_vars[var]
+                allowed = set().union(*(self.node_props.get(l, set()) for l in owners)) if owners else all_node_props
+            else:
+                owners = rel_vars[var]
+                allowed = set().union(*(self.rel_props.get(t, set()) for t in owners)) if owners else all_rel_props
+            if not allowed or prop in allowed:
+                continue
+            blocking = _clause_of(tokens, i) not in ("RETURN", "ORDER")
+            if (var, prop) in seen_props:
+                issue = next(x for x in issues if x["kind"] == "property" and x["found"] == f"{var}.{prop}")
+                if issue["fix"]:
+                    issue["edits"].append((prop_idx, _quote(issue["fix"].split(".", 1)[1])))
+                issue["blocking"] = issue["blocking"] or blocking
+                continue
+            seen_props.add((var, prop))
+            suggestions = self.suggest(prop, allowed)
+            fix = self._pick(suggestions)
+            where = self._show(owners) if owners else ("노드" if var in node_vars else "관계")
+            candidates = [s for s, _ in suggestions] or sorted(allowed)[:6]
+            issues.append({
+                "kind": "property", "found": f"{var}.{prop}", "fix": f"{var}.{fix}" if fix else None,
+                "suggestions": candidates, "blocking": blocking,
+                "edits": [(prop_idx, _quote(fix))] if fix else [],
+                "message": f"{var}.{prop} → {var}.{fix}" if fix
+                           else f"{var}.{prop} 속성은 {where}에 없습니다 (있는 속성: {', '.join(candidates)})",
+            })
+        return tokens, issues
+
+    def repair(self, cypher: str, known: Optional[Callable[[], Set[str]]] = None
+               ) -> Tuple[str, List[str], List[Dict[str, Any]]]:
+        """
+        확실한 교정을 적용합니다. (known은 analyze와 같음)
+
+        Returns:
+            tuple: (교정된 쿼리, 적용한 교정 설명, 남은 실행 차단 문제)
+        """
+        tokens, issues = self.analyze(cypher, known)
+        fixes, remaining = [], []
+        for issue in issues:
+            if issue["fix"] and issue["edits"]:
+                for idx, text in issue["edits"]:
+                    tokens[idx].text = text
+                fixes.append(issue["message"])
+            elif issue["blocking"]:
+                remaining.append(issue)
+        fixed = "".join(t.text for t in tokens) if fixes else cypher
+        return fixed, fixes, remaining
+
+    # ---------- 도우미 ----------
+    @staticmethod
+    def _issue(kind: str, name: str, fix: Optional[str], suggestions: List[Tuple[str, float]],
+               shown: str, shown_fix: Optional[str], edits: List[Tuple[int, str]]) -> Dict[str, Any]:
+        what = "라벨" if kind == "label" else "관계 타입"
+        if shown_fix:
+            message = f"{shown} → {shown_fix}"
+        elif suggestions:
+            message = f"{shown} {what}은 스키마에 없습니다 (후보: {', '.join(s for s, _ in suggestions)})"
+        else:
+            message = f"{shown} {what}은 스키마에 없습니다"
+        return {"kind": kind, "found": name, "fix": fix, "suggestions": [s for s, _ in suggestions],
+                "blocking": True, "edits": edits if fix else [], "message": message}
+
+    @staticmethod
+    def _stale_issue(kind: str, name: str, suggestions: List[Tuple[str, float]], shown: str) -> Dict[str, Any]:
+        what = "라벨" if kind == "label" else "관계 타입"
+        message = f"{shown} {what}은 캐시된 스키마에 없지만 DB에는 있습니다"
+        if suggestions:
+            message += f" (비슷한 이름: {', '.join(s for s, _ in suggestions)})"
+        return {"kind": kind, "found": name, "fix": None, "suggestions": [s for s, _ in suggestions],
+                "blocking": False, "stale": True, "edits": [], "message": message}
+
+    @staticmethod
+    def _rename_edits(tokens: List[Token], name: str, fix: Optional[str], in_brackets: bool) -> List[Tuple[int, str]]:
+        """:name 위치들 (관계 타입은 [] 안, 라벨은 [] 밖. 맵 리터럴 {k: v}의 값은 제외)"""
+        if not fix:
+            return []
+        edits = []
+        for i, token in enumerate(tokens):
+            if token.kind != "ident" or token.text.strip("`") != name:
+                continue
+            prev = _next_code(tokens, i, -1)
+            if prev < 0 or tokens[prev].text not in (":", "|", "&") or _inside(tokens, i, "{"):
+                continue
+            if _inside(tokens, i, "[") == in_brackets:
+                edits.append((i, _quote(fix)))
+        return edits
+
+    @staticmethod
+    def _flip_edits(tokens: List[Token], left_close: int, right_open: int) -> List[Tuple[int, str]]:
+        """(a)-[...]->(b) ↔ (a)<-[...]-(b): 관계 양끝 화살표 토큰만 바꿉니다."""
+        first = _next_code(tokens, left_close)
+        last = _next_code(tokens, right_open, -1)
+        if first < 0 or last < 0 or first == last:
+            return []
+        if tokens[first].text == "-" and tokens[last].text == "->":
+            return [(first, "<-"), (last, "-")]
+        if tokens[first].text == "<-" and tokens[last].text == "-":
+            return [(first, "-"), (last, "->")]
+        return []
+
+    def _connects(self, starts: Set[str], rel_type: str, ends: Set[str]) -> bool:
+        return any(t == rel_type and (not starts or s in starts) and (not ends or e in ends)
+                   for s, t, e in self.patterns)
+
+    @staticmethod
+    def _show(labels: Set[str]) -> str:
+        return ":" + "|".join(sorted(labels)) if labels else ""
+
+    def _rel_vars(self, tokens: List[Token], renamed: Dict[Tuple[str, str], str],
+                  stale: Set[str], unchecked: Set[str]) -> Dict[str, Set[str]]:
+        """-[r:TYPE]- 의 관계 변수 → 타입 (stale 타입의 변수는 unchecked에 더함)"""
+        found: Dict[str, Set[str]] = {}
+        for i, token in enumerate(tokens):
+            if token.text != "[":
+                continue
+            prev = _next_code(tokens, i, -1)
+            var_idx = _next_code(tokens, i)
+            if prev < 0 or tokens[prev].text not in ("-", "<-") or var_idx < 0 or tokens[var_idx].kind != "ident":
+                continue
+            types: Set[str] = set()
+            j = _next_code(tokens, var_idx)
+            while j >= 0 and tokens[j].text in (":", "|"):
+                k = _next_code(tokens, j)
+                if k < 0 or tokens[k].kind != "ident":
+                    break
+                name = tokens[k].text.strip("`")
+                types.add(renamed.get(("type", name), name))
+                if name in stale:
+                    unchecked.add(tokens[var_idx].text)
+                j = _next_code(tokens, k)
+            found.setdefault(tokens[var_idx].text, set()).update(types & self.types)
+        return found
+
+
+def describe(issues: List[Dict[str, Any]]) -> str:
+    """재생성 피드백: 문제마다 한 줄 설명을 '; '로 잇습니다."""
+    return "; ".join(issue["message"] for issue in issues)
+
+
+# 스키마가 바뀔 때만 다시 만드는 검증기 (refresh_schema()는 새 dict를 만듭니다)
+_cached: Tuple[Optional[Dict[str, Any]], Optional[CypherValidator]] = (None, None)
+
+
+def get_validator(structured_schema: Optional[Dict[str, Any]]) -> Optional[CypherValidator]:
+    """캐시된 스키마의 검증기. 스키마가 비어 있으면 None (검사하지 않음)."""
+    global _cached
+    if not structured_schema:
+        return None
+    schema, validator = _cached
+    if schema is not structured_schema:
+        validator = CypherValidator(structured_schema)
+        _cached = (structured_schema, validator)
+    return validator if validator else None
@@ -5,114 +5,207 @@ LangChain을 사용하여 자연어 질문을 Cypher 쿼리로 변환하고,
 """
 import os
 from dotenv import load_dotenv
-from langchain_community.graphs import Neo4jGraph
-from langchain_openai import ChatOpenAI
-from langchain.chains import GraphCypherQAChain
 from langchain.prompts import PromptTemplate
+from query_profiler import collect_profiles
+from query_governor import GovernedNeo4jGraph, default_governor
+from graph_analytics import ConflictGraphAnalytics
+from temporal import Timeline
+from spatial import Proximity
+from prompts import detective_template
+from model_router import TieredCypherQAChain, get_model_tiers
+from planner import QuestionPlanner
+from cypher_examples import ExampleStore
+from schema_selector import SchemaSelector
+from provenance import ProvenanceIndex
+from graph_rag import GraphRAGRetriever, HybridQAChain, context_ids
 
 load_dotenv()
 
-# LLM 설정
-llm = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0,
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+# LLM 설정 (모델 티어링)
+# - fast_llm: Cypher 생성 (CYPHER_MODEL_FAST, 기본 gpt-4o-mini)
+# - llm: 검증 실패 시 재생성 + 추론형 답변 (LLM_MODEL, 기본 gpt-4o)
+fast_llm, llm = get_model_tiers()
 
 # Neo4j 그래프 연결
-graph = Neo4jGraph(
+# - 거버너: 타임아웃/행 수 상한/읽기 전용/취소 (GOVERNOR_* 환경 변수)
+# - CYPHER_PROFILE_MODE=profile|explain 이면 쿼리 비용을 수집
+graph = GovernedNeo4jGraph(
     url=os.getenv("NEO4J_URI"),
     username=os.getenv("NEO4J_USERNAME"),
     password=os.getenv("NEO4J_PASSWORD")
 )
 
+# 🔥 탐정 프롬프트 (prompts.py의 detective_template)
+PROMPT = PromptTemplate(
+    input_variables=["schema", "context", "question"],
+    template=detective_template
+)
 
-# 🔥 핵심: 탐정 프롬프트 (Detective Prompt)
-# LLM에게 단순 검색이 아니라 '추론'을 하도록 강제합니다.
-detective_template = """당신은 90년대 힙합 범죄 전문 프로파일러입니다.
-Neo4j 그래프 데이터베이스의 정보를 바탕으로 질문에 답하세요.
 
-**중요한 규칙:**
-1. 데이터베이스에 정답이 명시적으로 없으면, '관계(Relationships)'를 통해 추론하세요.
-2. '살해 동기(Motive)', '갱단 연결(Gang Affiliation)', '과거의 충돌(Past Conflicts)'을 연결하여 유력한 용의자를 지목하세요.
-3. 답변은 수사 보고서 형식으로 작성하세요:
-   - 증거 1, 증거 2, 증거 3...
-   - 관계 분석
-   - 동기 분석
-   - 결론 및 유력한 용의자
+# 검증된 질문 → Cypher 예시 (비슷한 예시를 Cypher 생성 프롬프트에 넣고, 성공한 쿼리로 계속 늘어남)
+examples = ExampleStore()
 
-**스키마 정보:**
-{schema}
+# 질문에 관련된 라벨/관계 타입과 1-hop 이웃만 프롬프트에 넣음 (스키마가 커져도 프롬프트 크기 일정)
+schema_selector = SchemaSelector(graph)
 
-**데이터베이스 쿼리 결과:**
-{context}
 
-**질문:** {question}
+def build_chain(llm, qa_prompt=None, verbose: bool = True, cypher_llm=None, examples_store=None,
+                template_answers=None) -> TieredCypherQAChain:
+    """
+    질문 → Cypher → 결과 → 답변 체인을 만듭니다. (benchmark.py가 스크립트 LLM으로 같은 체인을 만들 때도 사용)
+    
+    Args:
+        llm: 큰 모델 (Cypher 재생성, 추론형 답변)
+        qa_prompt: 답변 프롬프트 (기본 PROMPT)
+        verbose: 체인의 생각 과정 출력 여부
+        cypher_llm: Cypher 생성용 빠른 모델 (없으면 llm)
+        examples_store: few-shot 예시 저장소 (기본 examples)
+        template_answers: 단순한 결과를 템플릿으로 답할지 (기본 TEMPLATE_ANSWERS, 벤치마크는 QA 프롬프트를 재려고 끔)
+    """
+    # 답변 프롬프트의 {schema}도 체인이 질문에 관련된 스키마 조각으로 채웁니다.
+    return TieredCypherQAChain(
+        graph=graph,
+        cypher_llm=cypher_llm or llm,
+        escalation_llm=llm,
+        qa_llm=llm,
+        qa_prompt=qa_prompt or PROMPT,
+        verbose=verbose,  # 생각하는 과정 출력
+        examples=examples_store or examples,
+        schema_selector=schema_selector,
+        template_answers=template_answers,
+    )
 
-**답변 (한국어로 작성):**"""
 
-PROMPT = PromptTemplate(
-    input_variables=["schema", "context", "question"],
-    template=detective_template
-)
+# 체인 생성 (빠른 모델로 Cypher 생성, 단순한 결과는 템플릿 답변)
+chain = build_chain(llm, cypher_llm=fast_llm)
 
+# 복합 질문은 하위 질문으로 나눠 병렬 조회한 뒤 한 번에 종합 (단순 질문은 chain 그대로)
+planner = QuestionPlanner(chain, planner_llm=fast_llm)
 
-# GraphCypherQAChain 생성
-# 최신 버전에서는 allow_dangerous_requests 파라미터 확인 필요
-try:
-    # LangChain 최신 버전
-    chain = GraphCypherQAChain.from_llm(
-        llm=llm,
-        graph=graph,
-        verbose=True,  # 생각하는 과정 출력
-        qa_prompt=PROMPT,
-        return_intermediate_steps=True,  # 중간 단계 반환
-    )
-except TypeError:
-    # 일부 버전에서는 allow_dangerous_requests 필요
-    try:
-        chain = GraphCypherQAChain.from_llm(
-            llm=llm,
-            graph=graph,
-            verbose=True,
-            qa_prompt=PROMPT,
-            return_intermediate_steps=True,
-            allow_dangerous_requests=True,
-        )
-    except TypeError:
-        # 최신 버전에서는 allow_dangerous_requests 제거됨
-        chain = GraphCypherQAChain.from_llm(
-            llm=llm,
-            graph=graph,
-            verbose=True,
-            qa_prompt=PROMPT,
-            return_intermediate_steps=True,
-        )
-
-
-def ask_detective(question: str) -> dict:
+# Cypher가 비면 청크/엔티티 벡터 검색 + 1~2홉 이웃으로 다시 찾음 (RETRIEVAL_MODE, 기본 fallback)
+graph_rag = GraphRAGRetriever(graph)
+detective_chain = HybridQAChain(planner, graph_rag)
+
+
+def _invoke_chain(question: str, callbacks=None, qa_chain=None) -> dict:
+    """체인을 실행하고 프로파일/거버너 통계를 결과에 붙입니다. (거버너 요청 범위 안에서 호출)"""
+    config = {"callbacks": callbacks} if callbacks else None
+    with collect_profiles() as profiles:
+        result = (qa_chain or detective_chain).invoke({"query": question}, config=config)
+    result["profiles"] = profiles
+    result["governor"] = dict(default_governor.current()[2] or {})
+    return result
+
+
+def ask_detective(question: str, heartbeat=None, callbacks=None, qa_chain=None, verbose: bool = True) -> dict:
     """
     탐정에게 질문하고 추론 결과를 받습니다.
     
     Args:
         question: 사용자의 질문 (자연어)
+        heartbeat: 기다리는 동안 경과 시간(초)과 함께 호출되는 콜백 (선택적).
+                   호출 쪽에서 예외로 중단되면(Ctrl+C, Streamlit 재실행) 실행 중인 쿼리도 취소됩니다.
+        callbacks: LangChain 콜백 핸들러 목록 (선택적, 예: batch_runner.StageTimer)
+        qa_chain: 기본 chain 대신 쓸 체인 (선택적, 예: benchmark.py의 스크립트 LLM 체인)
+        verbose: 질문/오류를 콘솔에 출력 (배치 모드는 False)
         
     Returns:
-        dict: {'result': 답변, 'intermediate_steps': 중간 단계 (선택적)}
+        dict: {'result': 답변, 'intermediate_steps': 중간 단계 (선택적),
+               'profiles': 실행된 쿼리의 PROFILE/EXPLAIN 요약 (프로파일 모드일 때),
+               'governor': 요청 통계 {'queries', 'rows', 'truncated', 'db_ms'},
+               'error': 오류 메시지 (실패했을 때만)}
     """
     try:
-        print(f"\n🔍 질문 분석 중: {question}\n")
-        result = chain.invoke({"query": question})
-        return result
+        if verbose:
+            print(f"\n🔍 질문 분석 중: {question}\n")
+        return default_governor.run_cancellable(_invoke_chain, question, callbacks, qa_chain, heartbeat=heartbeat)
     except Exception as e:
         error_msg = f"수사 도중 오류 발생: {str(e)}"
-        print(f"❌ {error_msg}")
+        if verbose:
+            print(f"❌ {error_msg}")
         return {
             "result": error_msg,
-            "intermediate_steps": []
+            "intermediate_steps": [],
+            "profiles": [],
+            "governor": {},
+            "error": str(e)
         }
 
 
+# 갈등 서브그래프 중심성 (그래프 버전별 캐시)
+analytics = ConflictGraphAnalytics(graph)
+timeline = Timeline(graph)
+proximity = Proximity(graph)
+# 사실의 evidence 참조 → 수집 때 저장한 Document 노드 (근거 문장)
+provenance = ProvenanceIndex(graph)
+
+
+def get_citations(result: dict, limit: int = 5) -> list:
+    """
+    답변에 쓰인 결과 행(context)에 나온 엔티티들 사이 관계의 근거 문장을 반환합니다.
+    (관계의 evidence → Document.id 인덱스 한 번. 출처가 기록되지 않은 그래프면 빈 목록)
+    
+    Args:
+        result: ask_detective() 결과
+        limit: 최대 관계 수
+        
+    Returns:
+        list: [{'row': {'source', 'relation', 'target', 'evidence'}, 'citations': [{'quote', 'source', 'section', ...}]}, ...]
+    """
+    ids = context_ids(result)  # 플래너 결과는 하위 질문 행을 펼쳐서 봅니다.
+    try:
+        return provenance.cite(provenance.facts_between(ids, limit=limit))
+    except Exception as e:  # 인용은 부가 정보라 실패해도 답변은 그대로 보여줍니다.
+        print(f"⚠️ 근거 문장 조회 실패: {e}")
+        return []
+
+
+def get_top_suspects(victim: str, k: int = 10) -> list:
+    """
+    갈등/폭력 관계망에서 피해자 기준 상위 k명의 용의자를 반환합니다.
+    
+    Args:
+        victim: 피해자 id 또는 부분 문자열 (예: "Tupac")
+        k: 반환할 인원 수
+        
+    Returns:
+        list: [{'id', 'label', 'score', 'ppr', 'pagerank', 'betweenness'}, ...]
+    """
+    return analytics.top_suspects(victim, k=k)
+
+
+def get_timeline(start, end=None, limit: int = 50, offset: int = 0) -> dict:
+    """
+    시간 창 안의 사건/관계/생애 날짜를 시간순으로 반환합니다. (범위 인덱스 스캔)
+    
+    Args:
+        start: 창 시작 (예: "1996-09-07", "1996-09", "1996"). end가 없으면 그 날/달/해 전체
+        end: 창 끝 (선택)
+        limit: 페이지 크기
+        offset: 건너뛸 항목 수
+        
+    Returns:
+        dict: {'start', 'end', 'items': [...], 'next_offset'}
+    """
+    return timeline.window(start, end, limit=limit, offset=offset)
+
+
+def get_nearby(place, km: float = 5.0, around=None, hours: float = 0, limit: int = 50, offset: int = 0) -> dict:
+    """
+    기준 장소 반경 km 안의 사건/관계를 가까운 순으로 반환합니다. (포인트 + 범위 인덱스)
+    
+    Args:
+        place: 기준 장소 (예: "MGM Grand Hotel", (36.10, -115.17))
+        km: 반경 (km)
+        around: 기준 시점 (예: "1996-09-07"). 없으면 시간 조건 없음
+        hours: around 기준 ±시간 (예: 48)
+        
+    Returns:
+        dict: {'center', 'km', 'start', 'end', 'items': [...], 'next_offset'}
+    """
+    return proximity.near(place, km=km, around=around, hours=hours, limit=limit, offset=offset)
+
+
 def get_graph_schema() -> str:
     """그래프 데이터베이스의 스키마 정보를 반환합니다."""
     try:
@@ -136,6 +229,15 @@ def get_graph_schema() -> str:
 
 
 if __name__ == "__main__":
+    import sys
+    
+    # 배치 모드: python detective.py questions.jsonl -o results.jsonl --workers 8
+    # (이 스크립트는 __main__으로 떠 있으므로, batch_runner가 detective를 다시 import해
+    #  그래프 연결/체인/예시 저장소를 한 번 더 만들지 않도록 이미 만든 모듈을 넘깁니다.)
+    if len(sys.argv) > 1:
+        from batch_runner import main
+        sys.exit(main(sys.argv[1:], module=sys.modules[__name__]))
+    
     # 테스트
     test_questions = [
         "투팍과 사이가 안 좋았던 사람은 누구야?",
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 엔티티 사전 필터 (Gazetteer Prefilter)
+실제 수사 기록/위키 문서는 data.txt와 달리 목차, 메뉴, 각주, 출처 목록처럼 추출할 것이 없는 문단이 많습니다.
+이런 청크도 LLMGraphTransformer에 보내면 빈 결과를 받으려고 호출 비용을 냅니다.
+
+EntityPrefilter는 추출 전에 청크마다 "엔티티 후보가 있는가"만 싸게 판단합니다.
+    1. 알려진 이름: 그래프의 모든 노드 id/name/aliases + 한국어 별칭(schema_selector.ENTITY_ALIASES)
+       + 지명 사전(spatial.GAZETTEER)을 Aho–Corasick 오토마톤 하나로 만들어 한 번의 스캔으로 찾고
+    2. 새 이름: 대문자로 시작하는 영문 이름 연쇄("Orlando Anderson", "MGM"), 한국어 고유명사 단서
+       (음역 + 괄호 원어 "투팍(Tupac Shakur)", 따옴표 이름 '키피 D', 인물/사건 어휘 "갱단", "총격", "체포" ...)
+후보가 하나도 없는 청크는 LLM에 보내지 않습니다.
+
+그래프가 커지면 오토마톤은 새 이름만 트라이에 넣고 실패 링크만 다시 계산합니다.
+    - sync(): 노드 수가 바뀌었을 때만 id를 다시 읽어 처음 보는 이름을 추가
+    - observe(graph_documents): 방금 추출한 노드 이름을 바로 추가
+
+환경 변수:
+    ENTITY_PREFILTER : 사전 필터 사용 (기본 true)
+"""
+import os
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 이름의 일부로 따로 등록할 최소 길이 ("Tupac Shakur" → "tupac", "shakur")
+MIN_PART_LEN = 4
+
+# 대문자 연쇄지만 엔티티가 아닌 상투 문구 (메뉴, 각주, 출처)
+BOILERPLATE = {
+    "main page", "privacy policy", "terms of use", "cookie policy", "all rights reserved", "retrieved",
+    "see also", "external links", "references", "edit", "isbn", "doi", "archived", "original",
+    "wikipedia", "namu wiki", "creative commons",
+}
+
+_CAPITALIZED = re.compile(r"\b[A-Z][A-Za-z.]*(?:[ \-][A-Z][A-Za-z.]*)*")
+_KOREAN_CUES = re.compile(
+    r"[가-힣]{2,}\s*\([A-Za-z][^)]{1,40}\)"                  # 음역 + 원어: 투팍(Tupac Shakur)
+    r"|['‘\"“][가-힣A-Za-z][^'’\"”\n]{0,20}['’\"”]"          # 따옴표 이름: '키피 D'
+    r"|래퍼|갱단|갱스터|레이블|레코즈|프로듀서|멤버|조직원|용의자|범인|경찰|형사|검찰"
+    r"|총격|살해|살인|암살|폭행|체포|사망|청부|현상금|배후|의뢰"
+)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# ==========================================
+# 1. Aho–Corasick 오토마톤 (증분 추가)
+# ==========================================
+class AhoCorasick:
+    """
+    여러 이름을 한 번의 선형 스캔으로 찾는 오토마톤. 대소문자를 무시합니다.
+    add()는 트라이에 바로 넣고, 실패 링크는 다음 검색 전에 한 번만 다시 계산합니다.
+    """
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.word: List[Optional[str]] = [None]  # 이 상태에서 끝나는 이름
+        self.link: List[int] = [0]               # 실패 링크를 따라 처음 만나는 "이름이 끝나는 상태"
+        self.words = set()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def add(self, name: str) -> bool:
+        word = " ".join(str(name).split()).casefold()
+        if len(word) < 2 or word in self.words:
+            return False
+        state = 0
+        for ch in word:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.word.append(None)
+                self.link.append(0)
+                self.goto[state][ch] = nxt
+            state = nxt
+        self.word[state] = word
+        self.words.add(word)
+        self._dirty = True
+        return True
+
+    def _build(self) -> None:
+        queue = deque()
+        for state in self.goto[0].values():
+            self.fail[state] = 0
+            self.link[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                fail = self.fail[nxt]
+                self.link[nxt] = fail if self.word[fail] else self.link[fail]
+                queue.append(nxt)
+        self._dirty = False
+
+    def iter(self, text: str) -> Iterator[Tuple[int, str]]:
+        """(끝 위치, 이름) 목록. text는 casefold된 문자열이어야 합니다."""
+        if self._dirty:
+            self._build()
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            hit = state if self.word[state] else self.link[state]
+            while hit:
+                yield i + 1, self.word[hit]
+                hit = self.link[hit]
+
+
+def _is_ascii_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+# ==========================================
+# 2. 사전 필터
+# ==========================================
+class EntityPrefilter:
+    """
+    청크에 엔티티 후보가 있는지 판단해 LLM 추출 대상만 남깁니다.
+
+    사용 예:
+        prefilter = EntityPrefilter(graph)
+        keep, skipped = prefilter.split(chunks)
+    """
+
+    def __init__(self, graph=None, names: Optional[Iterable[str]] = None, enabled: Optional[bool] = None):
+        self.graph = graph
+        self.enabled = _env_bool("ENTITY_PREFILTER", True) if enabled is None else enabled
+        self.automaton = AhoCorasick()
+        self._node_count: Optional[int] = None
+        self.add_names(self._static_names())
+        self.add_names(names or [])
+        self.sync()
+
+    @staticmethod
+    def _static_names() -> List[str]:
+        from schema_selector import ENTITY_ALIASES
+        from spatial import GAZETTEER
+
+        names = list(ENTITY_ALIASES) + list(ENTITY_ALIASES.values())
+        for place, (_, _, _, aliases) in GAZETTEER.items():
+            names.append(place)
+            names.extend(aliases)
+        return names
+
+    def add_names(self, names: Iterable[Any]) -> int:
+        """이름과 그 일부(MIN_PART_LEN 이상 단어)를 오토마톤에 넣습니다. 새로 들어간 개수를 반환."""
+        added = 0
+        for name in names:
+            if not name:
+                continue
+            values = name if isinstance(name, (list, tuple)) else [name]
+            for value in values:
+                value = str(value)
+                added += self.automaton.add(value)
+                for part in re.split(r"[\s\-]+", value):
+                    if len(part) >= MIN_PART_LEN:
+                        added += self.automaton.add(part)
+        return added
+
+    def sync(self) -> int:
+        """그래프 노드 수가 바뀌었으면 처음 보는 이름만 추가합니다."""
+        if self.graph is None:
+            return 0
+        try:
+            count = self.graph.query("MATCH (n) RETURN count(n) AS count")[0]["count"]
+            if count == self._node_count:
+                return 0
+            rows = self.graph.query(
+                "MATCH (n) WHERE n.id IS NOT NULL OR n.name IS NOT NULL "
+                "RETURN n.id AS id, n.name AS name, n.aliases AS aliases"
+            )
+        except Exception as e:  # 필터는 비용 절감용이라 실패해도 수집은 계속합니다.
+            print(f"  [WARN] 엔티티 사전 동기화 실패: {e}")
+            return 0
+        self._node_count = count
+        return self.add_names(value for row in rows for value in (row.get("id"), row.get("name"), row.get("aliases")))
+
+    def observe(self, graph_documents) -> int:
+        """방금 추출한 노드 이름을 추가합니다."""
+        return self.add_names(node.id for doc in graph_documents for node in doc.nodes)
+
+    # ---------- 판단 ----------
+    def known_mentions(self, text: str) -> List[str]:
+        """알려진 이름 (영문 이름은 단어 경계에서만)"""
+        lowered = text.casefold()
+        found = []
+        for end, word in self.automaton.iter(lowered):
+            start = end - len(word)
+            if _is_ascii_word_char(word[0]) and start > 0 and _is_ascii_word_char(lowered[start - 1]):
+                continue
+            if _is_ascii_word_char(word[-1]) and end < len(lowered) and _is_ascii_word_char(lowered[end]):
+                continue
+            if word not in found:
+                found.append(word)
+        return found
+
+    @staticmethod
+    def candidate_mentions(text: str) -> List[str]:
+        """처음 보는 이름 후보 (대문자 연쇄, 한국어 고유명사 단서)"""
+        found = []
+        for match in _CAPITALIZED.finditer(text):
+            value = match.group(0).strip(" -")
+            if value.casefold() in BOILERPLATE:
+                continue
+            # 한 단어짜리 첫 글자 대문자 단어는 문장 첫머리일 수 있으니 두 단어 이상이나 약어만 인정
+            if " " in value or (value.replace(".", "").isupper() and len(value.replace(".", "")) >= 2):
+                found.append(value)
+        found.extend(match.group(0) for match in _KOREAN_CUES.finditer(text))
+        return found
+
+    def has_candidates(self, text: str) -> bool:
+        return bool(self.known_mentions(text) or self.candidate_mentions(text))
+
+    def split(self, chunks: List[Any]) -> Tuple[List[int], List[int]]:
+        """
+        청크 번호를 (추출할 것, 건너뛸 것)으로 나눕니다. 꺼져 있으면 모두 추출합니다.
+        """
+        if not self.enabled:
+            return list(range(len(chunks))), []
+        self.sync()
+        keep, skipped = [], []
+        for i, chunk in enumerate(chunks):
+            (keep if self.has_candidates(chunk.page_content) else skipped).append(i)
+        return keep, skipped
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 증거 패커 (Evidence Packer)
+app_profiler.py는 증거 섹션마다 앞에서 15개/10개씩 잘라 한 문자열로 만들었습니다.
+그러면 중복 경로와 허브 노드 잡음(SIGNED_TO, ATTENDED ...)이 SHOT_AT, HIRED_HITMAN 같은 결정적 증거를
+밀어내고, 프롬프트는 그래프와 함께 그 임의의 상한까지 커집니다.
+
+pack_evidence()는
+    1. 모든 섹션의 행을 경로(노드, 관계, 노드, ...)로 바꿔 중복을 지우고
+    2. 관계 가중치(추론 규칙의 범행 확률)와 홉 수로 순위를 매긴 뒤
+    3. 토큰 예산(EVIDENCE_MAX_TOKENS)이 찰 때까지 강한 증거부터 짧은 표기로 담습니다.
+
+    표기: "0.95 Puff Daddy -OFFERED_BOUNTY-> Keffe D -RODE_IN-> White Cadillac"
+          (앞의 숫자는 증거 강도 = 경로에서 가장 강한 관계 가중치 × 홉 감쇠)
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from text_utils import approx_tokens
+
+# 추론 규칙(app_profiler.analyze_with_llm)의 범행 확률과 같은 값
+RELATION_WEIGHTS: Dict[str, float] = {
+    # 실행범
+    "SHOT_AT": 0.99, "KILLED": 0.99, "SUSPECTED_KILLER_OF": 0.99, "SUSPECTED_SHOOTER": 0.99,
+    # 설계자
+    "HIRED_HITMAN": 0.95, "ORDERED_HIT": 0.95, "ORDERED_HIT_ON": 0.95, "OFFERED_BOUNTY": 0.95,
+    "ALLEGEDLY_ORCHESTRATED_MURDER_OF": 0.95, "MASTERMIND_OF": 0.95,
+    # 공범
+    "GAVE_WEAPON": 0.7, "RODE_IN": 0.7, "ORCHESTRATED_MURDER_OF": 0.7, "ACCOMPLICE_OF": 0.7, "USED_IN": 0.6,
+    # 동기
+    "BEEF_WITH": 0.3, "RIVAL_OF": 0.3, "RIVALRY_WITH": 0.3, "ATTACKED": 0.3, "FOUGHT_WITH": 0.3, "SUSPECTED": 0.3,
+}
+# 목록에 없는 관계 (소속, 참석 등 허브 잡음)
+DEFAULT_WEIGHT = 0.1
+# 홉이 하나 늘 때마다 곱하는 감쇠
+HOP_DECAY = 0.85
+
+# 섹션별 경로 컬럼 순서 (노드, 관계, 노드, ...)
+PATH_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "direct_relations": ("suspect", "relation", "victim"),
+    "multi_hop": ("mastermind", "relation1", "middleman", "relation2", "victim"),
+    "puff_daddy": ("suspect", "relation", "target"),
+}
+
+Path = Tuple[str, ...]
+
+
+def relation_weight(rel_type: str) -> float:
+    return RELATION_WEIGHTS.get(rel_type, DEFAULT_WEIGHT)
+
+
+def score_path(path: Path) -> float:
+    """경로의 증거 강도: 가장 강한 관계 가중치 × 감쇠^(홉-1)"""
+    weights = [relation_weight(rel) for rel in path[1::2]]
+    if not weights:
+        return 0.0
+    return round(max(weights) * HOP_DECAY ** (len(weights) - 1), 3)
+
+
+def encode_path(path: Path) -> str:
+    """A -REL-> B -REL-> C"""
+    parts = [str(path[0])]
+    for i in range(1, len(path), 2):
+        parts.append(f"-{path[i]}-> {path[i + 1]}")
+    return " ".join(parts)
+
+
+def collect_paths(evidence: Dict[str, List[Dict[str, Any]]]) -> List[Path]:
+    """섹션별 행을 경로로 바꾸고 중복(같은 노드·관계 순서)을 지웁니다. 빈 값이 있는 행은 버립니다."""
+    seen = set()
+    paths: List[Path] = []
+    for section, columns in PATH_COLUMNS.items():
+        for row in evidence.get(section) or []:
+            path = tuple(row.get(col) for col in columns)
+            if any(value is None for value in path) or path in seen:
+                continue
+            seen.add(path)
+            paths.append(tuple(str(value) for value in path))
+    return paths
+
+
+def rank_paths(paths: List[Path]) -> List[Tuple[float, Path]]:
+    """강도 높은 순, 같으면 짧은 경로와 평균 가중치 높은 순."""
+    def key(path: Path):
+        weights = [relation_weight(rel) for rel in path[1::2]]
+        return (-score_path(path), len(weights), -sum(weights) / len(weights))
+
+    return [(score_path(path), path) for path in sorted(paths, key=key)]
+
+
+def _centrality_lines(rows: List[Dict[str, Any]]) -> List[str]:
+    return [
+        f"   - {r['id']} ({r['label']}): score={r['score']}, ppr={r['ppr']}, pr={r['pagerank']}, btw={r['betweenness']}"
+        for r in rows
+    ]
+
+
+def pack_evidence(
+    evidence: Dict[str, Any],
+    max_tokens: Optional[int] = None,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    증거를 순위·중복 제거·토큰 예산에 맞춰 한 문자열로 묶습니다.
+
+    Args:
+        evidence: get_evidence_from_db() 결과 (섹션 이름 → 행 목록, 'centrality' → 상위 용의자)
+        max_tokens: 토큰 예산 (기본 EVIDENCE_MAX_TOKENS, 600)
+
+    Returns:
+        tuple: (증거 문자열, {'paths': 중복 제거 후 경로 수, 'kept': 담은 경로 수, 'tokens': 근사 토큰 수})
+    """
+    max_tokens = max_tokens or int(os.getenv("EVIDENCE_MAX_TOKENS", 600))
+    ranked = rank_paths(collect_paths(evidence))
+
+    header = "=== 데이터베이스 증거 (강도순, 중복 제거) ===\n표기: 강도 A -관계-> B (강도 = 가장 강한 관계 가중치 × 홉 감쇠)\n"
+    centrality = _centrality_lines(evidence.get("centrality") or [])
+    tail = "\n3. 갈등 네트워크 중심성 순위 (피해자 기준):\n" + "\n".join(centrality) + "\n" if centrality else ""
+
+    # 경로를 강한 것부터 담고, 용의자 요약은 담긴 경로로 만듭니다.
+    lines: List[str] = []
+    used = approx_tokens(header + tail)
+    for score, path in ranked:
+        line = f"   {score:.2f} {encode_path(path)}"
+        cost = approx_tokens(line + "\n")
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+
+    # 섹션 제목과 요약 줄까지 넣고 예산을 넘으면 가장 약한 경로부터 뺍니다.
+    text = _render(header, tail, ranked, lines)
+    while lines and approx_tokens(text) > max_tokens:
+        lines.pop()
+        text = _render(header, tail, ranked, lines)
+    return text, {"paths": len(ranked), "kept": len(lines), "tokens": approx_tokens(text)}
+
+
+def _render(header: str, tail: str, ranked: List[Tuple[float, Path]], lines: List[str]) -> str:
+    kept = [path for _, path in ranked[:len(lines)]]
+    suspects: Dict[str, List[str]] = {}
+    for path in kept:
+        rel = path[1]
+        if relation_weight(rel) >= 0.7 and rel not in suspects.setdefault(path[0], []):
+            suspects[path[0]].append(rel)
+    summary = ", ".join(f"{name}({'/'.join(rels)})" for name, rels in suspects.items() if rels) or "-"
+
+    omitted = len(ranked) - len(lines)
+    text = header
+    text += f"\n1. 경로 증거 ({len(lines)}/{len(ranked)}" + (f", 약한 증거 {omitted}개 생략" if omitted else "") + "):\n"
+    text += "\n".join(lines) + "\n"
+    text += f"\n2. 주요 용의자 (가중치 0.7 이상 관계의 출발점): {summary}\n"
+    return text + tail
@@ -7,6 +7,7 @@ import os
 import sys
 from dotenv import load_dotenv
 from langchain_community.graphs import Neo4jGraph
+from rule_engine import RuleEngine
 
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -56,22 +57,24 @@ MERGE (orlando)-[:SUSPECTED_KILLER_OF]->(tupac)
 """)
 print("  -> Orlando -[:SHOT_AT]-> Tupac")
 
-# 3단계: 직접적인 배후 관계 (Puff Daddy -> Tupac)
-print("\n[STEP 3] Creating direct mastermind links...")
+# 3단계: 동기 관계 (Puff Daddy -> Tupac)
+print("\n[STEP 3] Creating motive link...")
 graph.query("""
 MATCH (puffy:Producer {id: "Puff Daddy"}), (tupac:Rapper {id: "Tupac Shakur"})
 MERGE (puffy)-[:BEEF_WITH {reason: "East vs West Coast War"}]->(tupac)
-MERGE (puffy)-[:ALLEGEDLY_ORCHESTRATED_MURDER_OF]->(tupac)
 """)
-print("  -> Puff Daddy -[:ALLEGEDLY_ORCHESTRATED_MURDER_OF]-> Tupac")
+print("  -> Puff Daddy -[:BEEF_WITH]-> Tupac")
 
-# 4단계: 키피 D -> 투팍 연결 (Multi-hop 완성)
-print("\n[STEP 4] Completing multi-hop chain...")
-graph.query("""
-MATCH (keffe:Person {id: "Keffe D"}), (tupac:Rapper {id: "Tupac Shakur"})
-MERGE (keffe)-[:ORCHESTRATED_MURDER_OF {role: "Middleman"}]->(tupac)
-""")
-print("  -> Keffe D -[:ORCHESTRATED_MURDER_OF]-> Tupac")
+# 4단계: 배후/공범 지름길은 손으로 넣지 않고 룰 엔진이 청부 체인에서 도출합니다.
+#        (MASTERMIND_OF, ACCOMPLICE_OF + 근거 경로 provenance)
+print("\n[STEP 4] Deriving mastermind/accomplice links from the hit chain...")
+RuleEngine(graph).on_new_facts([
+    ("Producer", "Puff Daddy", "HIRED_HITMAN", "Person", "Keffe D"),
+    ("Person", "Keffe D", "ORDERED_HIT", "Person", "Orlando Anderson"),
+    ("Person", "Keffe D", "GAVE_WEAPON", "Person", "Orlando Anderson"),
+    ("Person", "Orlando Anderson", "SHOT_AT", "Rapper", "Tupac Shakur"),
+    ("Person", "Orlando Anderson", "SUSPECTED_KILLER_OF", "Rapper", "Tupac Shakur"),
+])
 
 # 검증
 print("\n" + "=" * 60)
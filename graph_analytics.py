@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 갈등/폭력 서브그래프 중심성 분석 (NumPy/SciPy 벡터화)
+BEEF_WITH, ATTACKED, SHOT_AT, ORDERED_HIT 같은 갈등 관계만 희소 행렬로 적재하고
+다음 지표를 계산해 그래프 버전별로 캐시합니다.
+    - 가중 PageRank (공격 방향을 거꾸로 따라가 "가해 영향력"을 측정)
+    - 근사 매개 중심성 (무작위 피벗 k개로 Brandes 알고리즘을 샘플링)
+    - 피해자에서 출발하는 개인화 PageRank (피해자 → 가해자 → 청부인 순으로 점수가 흐름)
+
+사용 예:
+    analytics = ConflictGraphAnalytics(graph)
+    analytics.top_suspects("Tupac", k=5)   # 한 번의 호출로 사건의 상위 용의자
+"""
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+# 갈등/폭력 관계 가중치 (app_profiler의 확률 규칙과 같은 척도)
+CONFLICT_WEIGHTS: Dict[str, float] = {
+    "SHOT_AT": 0.99,
+    "KILLED": 0.99,
+    "SUSPECTED_KILLER_OF": 0.99,
+    "SUSPECTED_SHOOTER": 0.99,
+    "HIRED_HITMAN": 0.95,
+    "ORDERED_HIT": 0.95,
+    "ORDERED_HIT_ON": 0.95,
+    "OFFERED_BOUNTY": 0.95,
+    "ALLEGEDLY_ORCHESTRATED_MURDER_OF": 0.95,
+    "MASTERMIND_OF": 0.95,
+    "GAVE_WEAPON": 0.7,
+    "ACCOMPLICE_OF": 0.7,
+    "ORCHESTRATED_MURDER_OF": 0.7,
+    "ATTACKED": 0.5,
+    "FOUGHT_WITH": 0.4,
+    "AT_WAR_WITH": 0.4,
+    "BEEF_WITH": 0.3,
+    "RIVAL_OF": 0.3,
+    "RIVALRY_WITH": 0.3,
+}
+
+# (피해자)-[:VICTIM_OF]->(사건) 관계는 "사건이 피해자를 해쳤다"는 방향으로 뒤집어 적재합니다.
+# 그래야 피해자에서 출발한 개인화 PageRank가 사건을 거쳐 저격범(SUSPECTED_SHOOTER)에 닿습니다.
+EVENT_LINKS: Dict[str, float] = {
+    "VICTIM_OF": 0.8,
+}
+
+
+class ConflictGraph:
+    """갈등 서브그래프의 희소 인접 행렬과 노드 색인"""
+
+    def __init__(self, ids: List[str], labels: List[str], src: np.ndarray, dst: np.ndarray, weight: np.ndarray):
+        self.ids = ids
+        self.labels = labels
+        self.index = {node_id: i for i, node_id in enumerate(ids)}
+        n = len(ids)
+        # 평행 간선은 가중치를 합칩니다.
+        self.adj = sparse.csr_matrix((weight, (src, dst)), shape=(n, n), dtype=np.float64)
+        self.adj.sum_duplicates()
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def resolve(self, name: str) -> List[int]:
+        """정확히 일치하는 id가 있으면 그것만, 없으면 부분 일치하는 노드들의 색인"""
+        if name in self.index:
+            return [self.index[name]]
+        lowered = name.lower()
+        return [i for i, node_id in enumerate(self.ids) if lowered in node_id.lower()]
+
+
+# ==========================================
+# 1. 벡터화 알고리즘
+# ==========================================
+def _row_normalize(adj: sparse.csr_matrix) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    out_weight = np.asarray(adj.sum(axis=1)).ravel()
+    inv = np.divide(1.0, out_weight, out=np.zeros_like(out_weight), where=out_weight > 0)
+    return sparse.diags(inv) @ adj, out_weight == 0
+
+
+def pagerank(adj: sparse.csr_matrix, damping: float = 0.85, personalization: Optional[np.ndarray] = None,
+             tol: float = 1e-10, max_iter: int = 200) -> np.ndarray:
+    """
+    가중 (개인화) PageRank. 행 정규화한 전이 행렬로 거듭제곱 반복을 수행합니다.
+
+    Args:
+        adj: i -> j 가중 인접 행렬 (CSR)
+        personalization: 재시작 분포 (None이면 균등)
+    """
+    n = adj.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    transition, dangling = _row_normalize(adj)
+    transition_t = transition.T.tocsr()
+    v = np.full(n, 1.0 / n) if personalization is None else personalization / personalization.sum()
+    rank = v.copy()
+    for _ in range(max_iter):
+        dangling_mass = rank[dangling].sum()
+        new_rank = damping * (transition_t @ rank + dangling_mass * v) + (1 - damping) * v
+        if np.abs(new_rank - rank).sum() < tol:
+            return new_rank
+        rank = new_rank
+    return rank
+
+
+def approximate_betweenness(adj: sparse.csr_matrix, samples: int = 64, seed: int = 42) -> np.ndarray:
+    """
+    무작위 피벗으로 샘플링한 Brandes 매개 중심성 (가중치 무시, 방향 유지).
+    BFS 레벨마다 희소 행렬-벡터 곱으로 최단 경로 수와 의존도를 한꺼번에 계산합니다.
+    """
+    n = adj.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    a = (adj > 0).astype(np.float64).tocsr()
+    a_t = a.T.tocsr()
+    rng = np.random.default_rng(seed)
+    pivots = rng.choice(n, size=min(samples, n), replace=False)
+    centrality = np.zeros(n)
+
+    for s in pivots:
+        dist = np.full(n, -1, dtype=np.int64)
+        sigma = np.zeros(n)
+        dist[s], sigma[s] = 0, 1.0
+        levels = [np.array([s])]
+        while True:
+            frontier = levels[-1]
+            frontier_sigma = np.zeros(n)
+            frontier_sigma[frontier] = sigma[frontier]
+            reach = a_t @ frontier_sigma           # 다음 노드별 최단 경로 수 합
+            new = np.flatnonzero((reach > 0) & (dist < 0))
+            if new.size == 0:
+                break
+            dist[new] = len(levels)
+            sigma[new] = reach[new]
+            levels.append(new)
+
+        delta = np.zeros(n)
+        for depth in range(len(levels) - 1, 0, -1):
+            children = levels[depth]
+            coef = np.zeros(n)
+            coef[children] = (1.0 + delta[children]) / sigma[children]
+            parents = levels[depth - 1]
+            delta[parents] += sigma[parents] * (a[parents] @ coef)
+        delta[s] = 0.0
+        centrality += delta
+
+    return centrality * (n / len(pivots))
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    top = values.max() if values.size else 0.0
+    return values / top if top > 0 else values
+
+
+# ==========================================
+# 2. 그래프 적재 + 버전별 캐시
+# ==========================================
+class ConflictGraphAnalytics:
+    """
+    Neo4j에서 갈등 서브그래프를 읽어 중심성 지표를 계산하고, 그래프 버전이 바뀔 때까지 캐시합니다.
+    그래프 버전은 관계 타입별 개수(카운트 스토어 조회라 빠름)로 판단합니다.
+    """
+
+    def __init__(self, graph, weights: Optional[Dict[str, float]] = None, version_ttl_s: float = 30.0):
+        self.graph = graph
+        self.weights = dict(weights or {**CONFLICT_WEIGHTS, **EVENT_LINKS})
+        self.version_ttl_s = version_ttl_s
+        self._version: Optional[Tuple] = None
+        self._version_checked_at = 0.0
+        self._conflict_graph: Optional[ConflictGraph] = None
+        self._cache: Dict[Tuple, np.ndarray] = {}
+
+    # ---------- DB 접근 ----------
+    def _stream(self, query: str, params: Optional[Dict[str, Any]] = None):
+        """
+        결과를 한 행씩 읽습니다. 수백만 간선도 dict 목록을 만들지 않도록 드라이버 세션을 직접 씁니다.
+        (분석용 고정 쿼리이므로 거버너의 행 수 상한을 거치지 않습니다)
+        """
+        from neo4j import READ_ACCESS
+
+        with self.graph._driver.session(database=self.graph._database, default_access_mode=READ_ACCESS) as session:
+            for record in session.run(query, params or {}):
+                yield record
+
+    def graph_version(self) -> Tuple:
+        now = time.time()
+        if self._version is not None and now - self._version_checked_at < self.version_ttl_s:
+            return self._version
+        counts = []
+        for rel_type in sorted(self.weights):
+            rows = list(self._stream(f"MATCH ()-[r:`{rel_type}`]->() RETURN count(r) AS c"))
+            counts.append(rows[0]["c"] if rows else 0)
+        version = tuple(counts)
+        if version != self._version:
+            self._version = version
+            self._conflict_graph = None
+            self._cache.clear()
+        self._version_checked_at = now
+        return version
+
+    def invalidate(self) -> None:
+        self._version = None
+        self._conflict_graph = None
+        self._cache.clear()
+
+    def conflict_graph(self) -> ConflictGraph:
+        self.graph_version()
+        if self._conflict_graph is not None:
+            return self._conflict_graph
+
+        ids: List[str] = []
+        labels: List[str] = []
+        index: Dict[str, int] = {}
+        src: List[int] = []
+        dst: List[int] = []
+        weight: List[float] = []
+
+        def node_index(element_id: str, node_id: Any, label: Optional[str]) -> int:
+            i = index.get(element_id)
+            if i is None:
+                i = index[element_id] = len(ids)
+                ids.append(str(node_id if node_id is not None else element_id))
+                labels.append(label or "")
+            return i
+
+        query = """
+        MATCH (a)-[r]->(b)
+        WHERE type(r) IN $types
+        RETURN elementId(a) AS a_key, a.id AS a_id, labels(a)[0] AS a_label,
+               elementId(b) AS b_key, b.id AS b_id, labels(b)[0] AS b_label, type(r) AS rel
+        """
+        for rec in self._stream(query, {"types": list(self.weights)}):
+            a = node_index(rec["a_key"], rec["a_id"], rec["a_label"])
+            b = node_index(rec["b_key"], rec["b_id"], rec["b_label"])
+            if rec["rel"] in EVENT_LINKS:
+                a, b = b, a
+            src.append(a)
+            dst.append(b)
+            weight.append(self.weights[rec["rel"]])
+
+        self._conflict_graph = ConflictGraph(
+            ids, labels, np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64),
+            np.asarray(weight, dtype=np.float64),
+        )
+        return self._conflict_graph
+
+    def _cached(self, key: Tuple, compute) -> np.ndarray:
+        key = (self.graph_version(),) + key
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    # ---------- 지표 ----------
+    def pagerank(self, damping: float = 0.85) -> np.ndarray:
+        """가해 영향력: 공격 간선을 거꾸로 따라가는 가중 PageRank"""
+        cg = self.conflict_graph()
+        return self._cached(("pagerank", damping), lambda: pagerank(cg.adj.T.tocsr(), damping))
+
+    def betweenness(self, samples: int = 64) -> np.ndarray:
+        cg = self.conflict_graph()
+        return self._cached(("betweenness", samples), lambda: approximate_betweenness(cg.adj, samples))
+
+    def personalized_pagerank(self, seeds: Sequence[int], damping: float = 0.85) -> np.ndarray:
+        """피해자(seeds)에서 출발해 공격 간선을 거꾸로 걷는 개인화 PageRank"""
+        cg = self.conflict_graph()
+
+        def compute():
+            v = np.zeros(cg.size)
+            v[list(seeds)] = 1.0
+            return pagerank(cg.adj.T.tocsr(), damping, personalization=v)
+
+        return self._cached(("ppr", tuple(sorted(seeds)), damping), compute)
+
+    def top_influencers(self, k: int = 10) -> List[Dict[str, Any]]:
+        """사건과 무관하게 갈등 그래프 전체에서 영향력이 큰 인물"""
+        cg = self.conflict_graph()
+        pr = self.pagerank()
+        order = np.argsort(-pr)[:k]
+        return [{"id": cg.ids[i], "label": cg.labels[i], "pagerank": float(pr[i])} for i in order]
+
+    def top_suspects(self, victim: str, k: int = 10, exclude_events: bool = True) -> List[Dict[str, Any]]:
+        """
+        피해자 기준 상위 k명의 용의자/배후를 한 번에 반환합니다.
+
+        Args:
+            victim: 피해자 id 또는 부분 문자열 (예: "Tupac")
+            k: 반환할 인원 수
+            exclude_events: Event/Location 등 사람이 아닌 노드 제외
+
+        Returns:
+            list: [{'id', 'label', 'score', 'ppr', 'pagerank', 'betweenness'}, ...] (score 내림차순)
+        """
+        cg = self.conflict_graph()
+        seeds = cg.resolve(victim)
+        if not seeds:
+            return []
+
+        ppr = _normalize(self.personalized_pagerank(seeds))
+        pr = _normalize(self.pagerank())
+        bc = _normalize(self.betweenness())
+        # 사건 관련도(ppr)를 중심으로, 전체 영향력과 중개 역할을 보정합니다.
+        score = 0.6 * ppr + 0.25 * pr + 0.15 * bc
+        score[seeds] = -np.inf
+        if exclude_events:
+            non_person = np.array([label in ("Event", "Location", "Vehicle", "Weapon", "Label") for label in cg.labels])
+            if non_person.size:
+                score[non_person] = -np.inf
+        # 피해자와 연결되지 않은 노드(ppr=0)는 제외
+        score[ppr <= 0] = -np.inf
+
+        k = min(k, cg.size)
+        candidates = np.argpartition(-score, k - 1)[:k] if k > 0 else np.array([], dtype=np.int64)
+        order = candidates[np.argsort(-score[candidates])]
+        return [
+            {
+                "id": cg.ids[i],
+                "label": cg.labels[i],
+                "score": round(float(score[i]), 4),
+                "ppr": round(float(ppr[i]), 4),
+                "pagerank": round(float(pr[i]), 4),
+                "betweenness": round(float(bc[i]), 4),
+            }
+            for i in order
+            if np.isfinite(score[i])
+        ]
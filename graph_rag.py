@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 그래프 RAG 검색 (Hybrid Vector + Graph Retrieval)
+Cypher 체인은 생성한 쿼리가 비거나 틀리면 "기록 없음"으로 끝납니다. 근거가 되는 원문은
+수집할 때 (:Document) 노드(provenance.py)로 저장돼 있는데도, 큰 모델로 재생성하고 후보를 더 만들어도
+결국 같은 스키마 추측에 기대므로 어려운 질문일수록 실패한 시도만 늘어납니다.
+
+GraphRAGRetriever는 Cypher를 만들지 않고 한 번에 찾습니다.
+    1. 질문을 로컬 임베딩 모델로 벡터화해 청크(Document)와 엔티티의 벡터 인덱스에서 top-k를 찾고
+    2. 찾은 엔티티 + 찾은 청크에 언급된 엔티티(근거 참조 evidence)에서 1~2홉 이웃 관계를 펼친 뒤
+    3. 청크 본문과 관계(증거 강도 = 관계 가중치 × 홉 감쇠 순)를 토큰 예산 안에서 한 컨텍스트로 묶어
+       답변 LLM에 넘깁니다.
+
+임베딩은 수집 스크립트가 출처 기록 뒤에 index()로 새 노드에만 붙입니다. 청크 벡터는 Document 노드에,
+엔티티 벡터는 (:EntityVector {entity, label}) 노드에 둡니다. 엔티티 노드에 라벨을 더하면
+labels(n)[0]으로 라벨을 읽는 곳(rule_engine.py 등)이 흔들리므로 벡터 인덱스용 라벨을 따로 씁니다.
+sentence-transformers가 없으면 글자 n-gram 해싱 벡터로 근사합니다.
+
+HybridQAChain은 체인(플래너)과 같은 invoke 형태로 검색 방식을 고릅니다.
+    cypher   : 기존 Cypher 체인만
+    graphrag : 벡터 + 그래프 검색만 (Cypher 생성 없음)
+    hybrid   : Cypher 조회와 GraphRAG 검색을 동시에 하고 한 번에 답변
+    fallback : Cypher 체인 결과가 비었을 때만 GraphRAG (기본)
+
+환경 변수:
+    RETRIEVAL_MODE      : cypher | graphrag | hybrid | fallback (기본 fallback)
+    GRAPHRAG            : 수집 시 임베딩 색인 (기본 true)
+    EMBEDDING_MODEL     : sentence-transformers 모델 (기본 paraphrase-multilingual-MiniLM-L12-v2, "hashing"이면 n-gram 해싱)
+    GRAPHRAG_TOP_K      : 청크/엔티티 벡터 검색 개수 (기본 5)
+    GRAPHRAG_HOPS       : 이웃 확장 홉 수 (기본 2)
+    GRAPHRAG_MAX_TOKENS : 컨텍스트 토큰 상한 (기본 1500)
+"""
+import math
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from text_utils import approx_tokens, char_ngrams
+from evidence import HOP_DECAY, relation_weight
+from provenance import DOCUMENT_LABEL, EVIDENCE_PROPERTY, entity_aliases
+from triple_dedup import normalize_id
+
+ENTITY_LABEL = "EntityVector"
+EMBEDDING_PROPERTY = "embedding"
+DOCUMENT_INDEX = "document_embedding"
+ENTITY_INDEX = "entity_embedding"
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+MODES = ("cypher", "graphrag", "hybrid", "fallback")
+# 이웃 확장에서 읽을 최대 경로 수 (허브 노드에서 2홉이 폭발하지 않도록)
+MAX_EXPANSION_PATHS = 2000
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# ==========================================
+# 1. 로컬 임베딩
+# ==========================================
+class HashingEmbedder:
+    """글자 n-gram을 고정 차원으로 해싱한 벡터. 모델 없이 동작하는 근사 임베딩입니다."""
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+        self.model_name = f"hashing-{dimensions}"
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for gram, count in char_ngrams(text).items():
+            vector[zlib.crc32(gram.encode("utf-8")) % self.dimensions] += count
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def get_embedder(model: Optional[str] = None):
+    """
+    로컬 임베딩 모델을 만듭니다. sentence-transformers가 없으면 HashingEmbedder로 근사합니다.
+    """
+    name = (model or os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)).strip()
+    if name and name != "hashing":
+        try:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            return HuggingFaceEmbeddings(model_name=name, encode_kwargs={"normalize_embeddings": True})
+        except ImportError:
+            print("[GRAPHRAG] sentence-transformers not installed, using char n-gram hashing embeddings")
+    return HashingEmbedder()
+
+
+def embedder_name(embedder: Any) -> str:
+    return str(getattr(embedder, "model_name", None) or type(embedder).__name__)
+
+
+def _quote(name: str) -> str:
+    return "`" + str(name).replace("`", "") + "`"
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+# ==========================================
+# 2. 검색기
+# ==========================================
+class GraphRAGRetriever:
+    """
+    청크/엔티티 벡터 검색 + 그래프 이웃 확장.
+
+    사용 예:
+        rag = GraphRAGRetriever(graph)
+        rag.index()                                  # 수집 스크립트: ProvenanceIndex.record() 뒤에
+        rag.retrieve("투팍을 쏜 사람의 삼촌은 누가 고용했어?")  # → {'passages', 'facts', 'seeds', 'context'}
+    """
+
+    def __init__(self, graph, embedder=None, top_k: Optional[int] = None, hops: Optional[int] = None,
+                 max_tokens: Optional[int] = None, enabled: Optional[bool] = None):
+        self.graph = graph
+        self._embedder = embedder
+        self.top_k = top_k or int(os.getenv("GRAPHRAG_TOP_K", 5))
+        self.hops = max(1, min(2, hops or int(os.getenv("GRAPHRAG_HOPS", 2))))
+        self.max_tokens = max_tokens or int(os.getenv("GRAPHRAG_MAX_TOKENS", 1500))
+        self.enabled = _env_bool("GRAPHRAG", True) if enabled is None else enabled
+        self._native: Optional[bool] = None  # db.index.vector.queryNodes 사용 가능 여부 (Neo4j 5.11+)
+
+    @property
+    def embedder(self):
+        # 모델 로딩은 처음 쓸 때 (Cypher 모드만 쓰면 로드하지 않음)
+        if self._embedder is None:
+            self._embedder = get_embedder()
+        return self._embedder
+
+    # ---------- 색인 (수집 시) ----------
+    def ensure_index(self, dimensions: int) -> None:
+        """벡터 인덱스 두 개와 EntityVector.entity 인덱스를 만듭니다. 차원이 바뀐 인덱스(모델 변경)는 다시 만듭니다."""
+        try:
+            existing = {row["name"]: row["options"] for row in self.graph.query(
+                "SHOW INDEXES YIELD name, options WHERE name IN $names RETURN name, options",
+                {"names": [DOCUMENT_INDEX, ENTITY_INDEX]},
+            )}
+        except Exception:
+            existing = {}
+        for name, label in ((DOCUMENT_INDEX, DOCUMENT_LABEL), (ENTITY_INDEX, ENTITY_LABEL)):
+            config = ((existing.get(name) or {}).get("indexConfig") or {})
+            if name in existing and config.get("vector.dimensions") not in (None, dimensions):
+                self.graph.query(f"DROP INDEX {name} IF EXISTS")
+            try:
+                self.graph.query(
+                    f"CREATE VECTOR INDEX {name} IF NOT EXISTS FOR (n:{label}) ON (n.{EMBEDDING_PROPERTY}) "
+                    "OPTIONS {indexConfig: {`vector.dimensions`: $dimensions, `vector.similarity_function`: 'cosine'}}",
+                    {"dimensions": dimensions},
+                )
+            except Exception as e:  # 벡터 인덱스가 없는 Neo4j: 검색은 전수 비교로
+                print(f"[GRAPHRAG] vector index unavailable ({e}); falling back to brute-force search")
+                self._native = False
+        self.graph.query(f"CREATE INDEX entity_vector_entity IF NOT EXISTS FOR (v:{ENTITY_LABEL}) ON (v.entity)")
+
+    def index(self, batch_size: int = 64) -> Dict[str, int]:
+        """
+        임베딩이 없거나 다른 모델로 만든 Document 노드와 엔티티(EntityVector)에 임베딩을 붙이고,
+        청크마다 언급된 엔티티 id(d.entities)를 근거 참조에서 다시 모읍니다.
+
+        Returns:
+            dict: {'documents', 'entities'} 새로 임베딩한 개수
+        """
+        stats = {"documents": 0, "entities": 0}
+        if not self.enabled:
+            return stats
+        model = embedder_name(self.embedder)
+        self.ensure_index(len(self.embedder.embed_query("투팍")))
+
+        documents = self.graph.query(
+            f"MATCH (d:{DOCUMENT_LABEL}) WHERE d.{EMBEDDING_PROPERTY} IS NULL OR d.embedding_model <> $model "
+            "RETURN d.id AS id, coalesce(d.section, '') + '\\n' + d.text AS text",
+            {"model": model},
+        )
+        # 엔티티: Document를 뺀 id 있는 노드 (라벨은 labels(n)[0])
+        entities = self.graph.query(
+            f"MATCH (n) WHERE n.id IS NOT NULL AND NOT n:{DOCUMENT_LABEL} "
+            f"OPTIONAL MATCH (v:{ENTITY_LABEL} {{entity: n.id, label: labels(n)[0]}}) "
+            "WITH n, v WHERE v IS NULL OR v.embedding_model <> $model "
+            "RETURN n.id AS id, labels(n)[0] AS label, n.name AS name",
+            {"model": model},
+        )
+        aliases = entity_aliases()
+        for row in entities:
+            names = [str(row["id"])] + ([str(row["name"])] if row.get("name") else [])
+            names += aliases.get(normalize_id(row["id"]), [])
+            row["text"] = f"{' / '.join(dict.fromkeys(names))} ({row['label']})"
+
+        writes = (
+            (documents, "documents", f"MATCH (n:{DOCUMENT_LABEL} {{id: row.id}})"),
+            (entities, "entities", f"MERGE (n:{ENTITY_LABEL} {{entity: row.id, label: row.label}})"),
+        )
+        for rows, key, target in writes:
+            for i in range(0, len(rows), batch_size):
+                batch = rows[i:i + batch_size]
+                vectors = self.embedder.embed_documents([row["text"] for row in batch])
+                self.graph.query(
+                    f"UNWIND $rows AS row {target} "
+                    f"SET n.{EMBEDDING_PROPERTY} = row.vector, n.embedding_model = $model",
+                    {"rows": [{"id": row["id"], "label": row.get("label"), "vector": v} for row, v in zip(batch, vectors)],
+                     "model": model},
+                )
+            stats[key] = len(rows)
+
+        # 청크 → 언급된 엔티티 (노드의 evidence 참조 "청크 해시:구간"에서)
+        self.graph.query(
+            f"MATCH (n) WHERE n.{EVIDENCE_PROPERTY} IS NOT NULL "
+            f"UNWIND n.{EVIDENCE_PROPERTY} AS ref "
+            "WITH split(ref, ':')[0] AS doc, collect(DISTINCT n.id) AS ids "
+            f"MATCH (d:{DOCUMENT_LABEL} {{id: doc}}) SET d.entities = ids"
+        )
+        return stats
+
+    # ---------- 검색 ----------
+    def _search(self, index: str, label: str, vector: List[float], k: int, returns: str) -> List[Dict[str, Any]]:
+        """벡터 인덱스 top-k. 프로시저가 없으면 같은 모델로 만든 임베딩을 전수 비교합니다."""
+        model = embedder_name(self.embedder)
+        if self._native is not False:
+            try:
+                rows = self.graph.query(
+                    "CALL db.index.vector.queryNodes($index, $fetch, $vector) YIELD node AS n, score "
+                    f"WHERE n.embedding_model = $model RETURN {returns}, score LIMIT $k",
+                    {"index": index, "fetch": k * 2, "vector": vector, "model": model, "k": k},
+                )
+                self._native = True
+                return rows
+            except Exception as e:
+                if self._native:
+                    raise
+                print(f"[GRAPHRAG] vector search unavailable ({e}); using brute-force search")
+                self._native = False
+        rows = self.graph.query(
+            f"MATCH (n:{label}) WHERE n.embedding_model = $model RETURN {returns}, n.{EMBEDDING_PROPERTY} AS vector",
+            {"model": model},
+        )
+        for row in rows:
+            row["score"] = _cosine(vector, row.pop("vector") or [])
+        return sorted(rows, key=lambda row: -row["score"])[:k]
+
+    def _expand(self, seeds: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        시드 (id, 라벨)에서 1~hops홉 안의 관계. 관계마다 시드에서 가장 가까운 홉 수를 붙입니다.
+        시작 노드는 라벨별로 찾아 rule_engine.py가 만든 (라벨, id) 인덱스를 씁니다.
+        """
+        by_label: Dict[str, List[str]] = {}
+        for entity_id, label in seeds:
+            by_label.setdefault(label, []).append(entity_id)
+        facts: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for label, ids in by_label.items():
+            rows = self.graph.query(
+                f"MATCH (s:{_quote(label)}) WHERE s.id IN $ids "
+                f"MATCH path = (s)-[*1..{self.hops}]-() "
+                "WITH path LIMIT $paths "
+                "UNWIND range(0, length(path) - 1) AS i "
+                "WITH relationships(path)[i] AS r, i + 1 AS hop "
+                "WITH r, min(hop) AS hop "
+                "RETURN startNode(r).id AS source, type(r) AS relation, endNode(r).id AS target, hop",
+                {"ids": ids, "paths": MAX_EXPANSION_PATHS},
+            )
+            for row in rows:
+                key = (row["source"], row["relation"], row["target"])
+                if key not in facts or row["hop"] < facts[key]["hop"]:
+                    facts[key] = row
+        return list(facts.values())
+
+    def retrieve(self, question: str) -> Dict[str, Any]:
+        """
+        질문 → 청크/엔티티 top-k → 이웃 관계 → 토큰 예산 안의 컨텍스트.
+
+        Returns:
+            dict: {'passages': [{'id', 'section', 'source', 'text', 'score'}],
+                   'facts': [{'source', 'relation', 'target', 'hop', 'strength'}],
+                   'seeds': 확장을 시작한 엔티티 (id, 라벨),
+                   'context': 답변 프롬프트에 넣을 행 (passage 행 + 관계 행)}
+        """
+        vector = self.embedder.embed_query(question)
+        passages = self._search(
+            DOCUMENT_INDEX, DOCUMENT_LABEL, vector, self.top_k,
+            "n.id AS id, n.section AS section, n.source AS source, n.text AS text, n.entities AS entities",
+        )
+        entities = self._search(ENTITY_INDEX, ENTITY_LABEL, vector, self.top_k, "n.entity AS id, n.label AS label")
+        seeds = [(row["id"], row["label"]) for row in entities]
+        # 찾은 청크에 언급된 엔티티의 라벨은 EntityVector에서 읽습니다.
+        mentioned = [e for row in passages for e in (row.pop("entities", None) or [])]
+        if mentioned:
+            seeds += [(row["id"], row["label"]) for row in self.graph.query(
+                f"MATCH (v:{ENTITY_LABEL}) WHERE v.entity IN $ids RETURN v.entity AS id, v.label AS label",
+                {"ids": list(dict.fromkeys(mentioned))},
+            )]
+        seeds = list(dict.fromkeys(seed for seed in seeds if seed[0] is not None and seed[1]))
+
+        facts = []
+        for row in self._expand(seeds):
+            row["strength"] = round(relation_weight(row["relation"]) * HOP_DECAY ** (row["hop"] - 1), 3)
+            facts.append(row)
+        facts.sort(key=lambda row: (-row["strength"], row["hop"]))
+
+        # 토큰 예산: 청크 본문 먼저 (최대 2/3), 남은 예산에 강한 관계부터
+        context: List[Dict[str, Any]] = []
+        budget = self.max_tokens
+        for row in passages:
+            text = (row.get("text") or "").strip()
+            cost = approx_tokens(text)
+            if cost > budget - self.max_tokens // 3 and context:
+                break
+            context.append({"passage": text, "section": row.get("section"), "source": row.get("source")})
+            budget -= cost
+        for row in facts:
+            cost = approx_tokens(f"{row['source']} -{row['relation']}-> {row['target']}")
+            if cost > budget:
+                break
+            context.append({"source": row["source"], "relation": row["relation"], "target": row["target"],
+                            "strength": row["strength"]})
+            budget -= cost
+        return {"passages": passages, "facts": facts, "seeds": seeds, "context": context}
+
+
+# ==========================================
+# 3. 검색 방식 선택 체인
+# ==========================================
+def context_rows(result: Dict[str, Any]) -> List[Any]:
+    """체인 결과의 DB 결과 행. 플래너 결과는 하위 질문 행을 펼칩니다."""
+    context = next((s["context"] for s in reversed(result.get("intermediate_steps") or [])
+                    if isinstance(s, dict) and "context" in s), None) or []
+    rows: List[Any] = []
+    for row in context:
+        if isinstance(row, dict) and "sub_question" in row:
+            rows.extend(row.get("rows") or [])
+        else:
+            rows.append(row)
+    return rows
+
+
+def context_ids(result: Dict[str, Any]) -> List[str]:
+    """결과 행에 나온 엔티티 id (노드 값은 id 속성, 문자열 값은 그대로). 근거 문장 조회용."""
+    ids: List[str] = []
+    for row in context_rows(result):
+        if not isinstance(row, dict):
+            continue
+        for value in row.values():
+            if isinstance(value, dict):
+                value = value.get("id")
+            if isinstance(value, str):
+                ids.append(value)
+    return ids
+
+
+class HybridQAChain:
+    """
+    QuestionPlanner/TieredCypherQAChain 앞에 두는 체인. invoke({"query": 질문}) → 체인과 같은 형태의 dict
+    GraphRAG로 답했을 때 intermediate_steps는 [{'retrieval': {'seeds', 'passages', 'facts'}}, {'context': 행}]이고
+    route['retrieval']에 검색 방식이 담깁니다.
+    """
+
+    def __init__(self, qa_chain, retriever: GraphRAGRetriever, mode: Optional[str] = None):
+        self.qa_chain = qa_chain
+        # 답변 생성과 Cypher 조회는 플래너 안의 티어링 체인에 맡깁니다.
+        self.chain = getattr(qa_chain, "chain", qa_chain)
+        self.retriever = retriever
+        self.mode = (mode or os.getenv("RETRIEVAL_MODE", "fallback")).strip().lower()
+        if self.mode not in MODES:
+            print(f"[GRAPHRAG] unknown RETRIEVAL_MODE={self.mode!r}, using fallback")
+            self.mode = "fallback"
+
+    @staticmethod
+    def _summary(found: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "seeds": [entity_id for entity_id, _ in found["seeds"]],
+            "passages": [{"id": p["id"], "section": p.get("section"), "score": round(p["score"], 3)}
+                         for p in found["passages"]],
+            "facts": len(found["facts"]),
+        }
+
+    def _log(self, found: Dict[str, Any]) -> None:
+        if getattr(self.chain, "verbose", False):
+            print(f"\n[GRAPHRAG] {len(found['passages'])} passages, {len(found['seeds'])} seed entities, "
+                  f"{len(found['facts'])} facts\n{found['context']}")
+
+    def graph_rag(self, question: str, config=None) -> Dict[str, Any]:
+        """벡터 + 그래프 검색 한 번으로 답합니다."""
+        found = self.retriever.retrieve(question)
+        self._log(found)
+        answer = self.chain.answer(question, found["context"], config)
+        return {
+            "query": question,
+            "result": answer,
+            "intermediate_steps": [{"retrieval": self._summary(found)}, {"context": found["context"]}],
+            "route": {"answer": "llm", "retrieval": "graphrag"},
+        }
+
+    def hybrid(self, question: str, config=None) -> Dict[str, Any]:
+        """Cypher 조회와 GraphRAG 검색을 동시에 하고 두 결과를 합쳐 한 번에 답합니다."""
+        governor = getattr(self.chain.graph, "governor", None)
+        bind = (lambda fn: fn) if governor is None else governor.bind
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            cypher_future = pool.submit(bind(self.chain.retrieve), question, config)
+            rag_future = pool.submit(bind(self.retriever.retrieve), question)
+            cypher, rows, route = cypher_future.result()
+            found = rag_future.result()
+        self._log(found)
+        context = list(rows) + found["context"]
+        answer = self.chain.answer(question, context, config)
+        route.update({"answer": "llm", "retrieval": "hybrid"})
+        return {
+            "query": question,
+            "result": answer,
+            "intermediate_steps": [{"query": cypher}, {"retrieval": self._summary(found)}, {"context": context}],
+            "route": route,
+        }
+
+    def invoke(self, inputs: Any, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        question = inputs["query"] if isinstance(inputs, dict) else str(inputs)
+        if self.mode == "graphrag":
+            return self.graph_rag(question, config)
+        if self.mode == "hybrid":
+            return self.hybrid(question, config)
+
+        result = self.qa_chain.invoke({"query": question}, config=config)
+        if self.mode == "cypher" or context_rows(result):
+            return result
+        # Cypher 체인이 아무것도 찾지 못함 → 수집한 원문과 이웃 관계로 다시 찾기
+        rag = self.graph_rag(question, config)
+        if not rag["intermediate_steps"][-1]["context"]:
+            return result
+        queries = [s for s in result.get("intermediate_steps") or [] if isinstance(s, dict) and "query" in s]
+        rag["intermediate_steps"] = queries + rag["intermediate_steps"]
+        rag["route"] = {**(result.get("route") or {}), "answer": "llm", "retrieval": "fallback"}
+        return rag
@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 문서 로더 & 노이즈 제거 전처리기 (Document Loaders)
+지금까지의 전처리는 builder.py의 re.sub(r"\[\d+\]|\[편집\]", "", raw_text) 한 줄이었습니다.
+실제로 수집하는 위키 덤프, HTML 페이지, Markdown 수사 메모에는 템플릿, 표, 태그, 메뉴 문구가 섞여 있고,
+data.txt 같은 발췌본에는 "(중략)", "..." 같은 흔적이 남아 있습니다.
+
+이 모듈은
+    1. 파일 형식(text / markdown / html / wiki)을 확장자로 정하고
+    2. 파일을 빈 줄 단위 블록으로 흘려 읽으며 (템플릿/표/스크립트처럼 여러 줄에 걸친 구조는 닫힐 때까지 모음)
+    3. 블록마다 미리 컴파일한 정규화 단계(Step)를 차례로 적용하고 (주석, 편집 표시, 표, 링크 문법, 상투 문구 ...)
+    4. 절 제목("[생애]", "2.3. 진작에 밝혀졌던 진실")에서 끊어 절 단위 Document를 내보냅니다.
+
+각 단계는 지운/바꾼 위치를 기록하므로 정리된 본문의 어느 글자든 원본 파일의 글자 위치로 되돌릴 수 있습니다.
+Document.metadata에는 source, format, section, source_start/source_end(원본 글자 위치)와
+offset_map([정리본 위치, 원본 위치, 정확 여부] 목록)이 담기며, source_span()으로 청크 구간을 원본 구간으로 바꿉니다.
+
+여러 파일은 프로세스 풀(LOADER_WORKERS)에서 파일 단위로 나눠 처리합니다.
+
+사용법:
+    python loaders.py data.txt notes.md wiki_dump.wiki      # 절 목록과 원본 위치 출력
+
+환경 변수:
+    LOADER_WORKERS           : 파일 처리 프로세스 수 (기본 CPU 수, 1이면 현재 프로세스에서 처리)
+    LOADER_SECTION_MAX_CHARS : 절 하나의 최대 글자 수, 넘으면 블록 경계에서 나눔 (기본 20000)
+    LOADER_MAX_BLOCK_CHARS   : 여러 줄 구조가 닫히지 않아도 블록을 끊는 글자 수 (기본 200000)
+"""
+import html
+import os
+import re
+import sys
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.documents import Document
+
+from entity_prefilter import BOILERPLATE
+
+FORMATS = {
+    ".txt": "text", ".text": "text",
+    ".md": "markdown", ".markdown": "markdown",
+    ".html": "html", ".htm": "html",
+    ".wiki": "wiki", ".mediawiki": "wiki", ".namu": "wiki",
+}
+
+# (정리본 시작 위치, 원본 시작 위치, 정확 여부)
+# 정확한 구간은 글자 단위로 원본과 1:1, 아니면(치환 문자열) 구간 전체가 원본의 한 점을 가리킵니다.
+Run = Tuple[int, int, bool]
+
+# 절 제목 (chunker.py와 같은 모양: "2.3.2. 퍼프 대디의 암살 의뢰", "[사건 개요]")
+_SECTION = re.compile(r"(?:\d+(?:\.\d+)*\.[ \t]+\S.{0,80}|\[[^\]\n]{1,80}\])")
+
+
+# ==========================================
+# 1. 위치를 기억하는 텍스트
+# ==========================================
+class Mapped:
+    """정리 중인 텍스트와 원본 위치 대응표"""
+
+    __slots__ = ("text", "runs", "_starts")
+
+    def __init__(self, text: str, runs: List[Run]):
+        self.text = text
+        self.runs = runs or [(0, 0, False)]
+        self._starts = [run[0] for run in self.runs]
+
+    def source(self, pos: int) -> int:
+        """정리본 위치 → 원본 위치"""
+        clean_start, src_start, exact = self.runs[max(0, bisect_right(self._starts, pos) - 1)]
+        return src_start + (pos - clean_start) if exact else src_start
+
+    def slice_runs(self, start: int, end: int, offset: int) -> List[Run]:
+        """[start, end) 구간의 대응표 (정리본 위치를 offset부터 다시 매김)"""
+        out: List[Run] = []
+        i = max(0, bisect_right(self._starts, start) - 1)
+        while i < len(self.runs) and self.runs[i][0] < end:
+            clean_start, src_start, exact = self.runs[i]
+            seg = max(clean_start, start)
+            out.append((offset + seg - start, src_start + (seg - clean_start) if exact else src_start, exact))
+            i += 1
+        return out
+
+
+class _Builder:
+    """조각을 이어 붙이며 대응표를 만듭니다. (이어지는 정확 구간은 하나로 합침)"""
+
+    def __init__(self):
+        self.pieces: List[str] = []
+        self.runs: List[Run] = []
+        self.length = 0
+
+    def _add_run(self, run: Run) -> None:
+        if self.runs and self.runs[-1][0] == run[0]:
+            self.runs.pop()  # 길이 0이 된 앞 구간
+        if self.runs:
+            clean_start, src_start, exact = self.runs[-1]
+            if exact and run[2] and run[1] - src_start == run[0] - clean_start:
+                return
+            if not exact and not run[2] and run[1] == src_start:
+                return
+        self.runs.append(run)
+
+    def span(self, mapped: Mapped, start: int, end: int) -> None:
+        if end <= start:
+            return
+        for run in mapped.slice_runs(start, end, self.length):
+            self._add_run(run)
+        self.pieces.append(mapped.text[start:end])
+        self.length += end - start
+
+    def literal(self, value: str, source: int) -> None:
+        if not value:
+            return
+        self._add_run((self.length, source, False))
+        self.pieces.append(value)
+        self.length += len(value)
+
+    def build(self) -> Mapped:
+        return Mapped("".join(self.pieces), self.runs)
+
+
+# ==========================================
+# 2. 정규화 단계
+# ==========================================
+Replacement = Union[str, int, Callable[[re.Match], str]]
+
+
+class Step:
+    """
+    미리 컴파일한 정규식 하나와 치환 규칙.
+    repl은 조각 목록입니다: 문자열(그대로 넣음), 정수(그 그룹을 원본 위치 그대로 남김), 함수(match → 문자열).
+    빈 목록이면 일치 부분을 지웁니다.
+    """
+
+    def __init__(self, name: str, pattern: str, repl: Sequence[Replacement] = (), flags: int = 0, repeat: int = 1):
+        self.name = name
+        self.pattern = re.compile(pattern, flags)
+        self.repl = tuple(repl)
+        self.repeat = repeat  # 중첩 구조({{ {{ }} }})는 안쪽부터 여러 번
+
+    def apply(self, mapped: Mapped) -> Mapped:
+        for _ in range(self.repeat):
+            if not self.pattern.search(mapped.text):
+                break
+            mapped = self._apply_once(mapped)
+        return mapped
+
+    def _apply_once(self, mapped: Mapped) -> Mapped:
+        out = _Builder()
+        pos = 0
+        for match in self.pattern.finditer(mapped.text):
+            out.span(mapped, pos, match.start())
+            for item in self.repl:
+                if isinstance(item, int):
+                    start, end = match.span(item)
+                    if start >= 0:
+                        out.span(mapped, start, end)
+                else:
+                    value = item(match) if callable(item) else item
+                    out.literal(value, mapped.source(match.start()))
+            pos = match.end()
+        out.span(mapped, pos, len(mapped.text))
+        return out.build()
+
+
+class Normalizer:
+    """Step 목록을 차례로 적용합니다. 파이프라인끼리 +로 이을 수 있습니다."""
+
+    def __init__(self, steps: Iterable[Step]):
+        self.steps = list(steps)
+
+    def __add__(self, other: "Normalizer") -> "Normalizer":
+        return Normalizer(self.steps + other.steps)
+
+    def apply(self, mapped: Mapped) -> Mapped:
+        for step in self.steps:
+            mapped = step.apply(mapped)
+        return mapped
+
+    def clean(self, text: str) -> str:
+        return self.apply(Mapped(text, [(0, 0, True)])).text
+
+
+_BOILERPLATE_LINE = "|".join(re.escape(term) for term in sorted(BOILERPLATE, key=len, reverse=True))
+
+COMMON = Normalizer([
+    Step("footnotes", r"\[\d+\]|\[(?:편집|edit|출처 필요|citation needed)\]", flags=re.I),
+    Step("omissions", r"[ \t]*\((?:중략|후략|전략|하략)\)[ \t]*", (" ",)),
+    Step("ellipses", r"[ \t]*(?:\.{3,}|…+)[ \t]*", (" ",)),
+    Step("boilerplate", rf"^[ \t]*(?:(?:{_BOILERPLATE_LINE})[ \t]*[|·•/]?[ \t]*)+$", flags=re.I | re.M),
+    Step("wiki_footer", r"^[ \t]*(?:최근 수정 시각|분류|이 문서는)\b.*$|^[ \t]*목차[ \t]*$", flags=re.M),
+    Step("spaces", r"([ \t])[ \t]+", (1,)),
+    Step("line_edges", r"^[ \t]+|[ \t]+$", flags=re.M),
+    Step("blank_lines", r"(\n\n)\n+", (1,)),
+])
+
+WIKI = Normalizer([
+    Step("comments", r"<!--.*?-->", flags=re.S),
+    Step("refs", r"<ref[^>]*/>|<ref[^>]*>.*?</ref\s*>", flags=re.S | re.I),
+    Step("templates", r"\{\{[^{}]*\}\}", repeat=5),
+    Step("edit_marks", r"[ \t]*\[(?:편집|edit)\]", flags=re.I),
+    Step("tables", r"^\{\|.*?^\|\}[ \t]*$", flags=re.S | re.M),
+    Step("namu_macros", r"\[(?:목차|각주|tableofcontents|include\([^)]*\)|youtube\([^)]*\))\]", flags=re.I),
+    Step("files", r"\[\[(?:File|Image|Category|파일|분류):[^\]]*\]\]", flags=re.I),
+    Step("links", r"\[\[(?:[^|\]]*\|)?([^\]]*)\]\]", (1,)),
+    Step("external_links", r"\[https?://[^\s\]]+(?:[ \t]+([^\]]*))?\]", (1,)),
+    Step("headings", r"^(={1,6})[ \t]*(.+?)[ \t]*\1[ \t]*$", ("[", 2, "]"), flags=re.M),
+    Step("emphasis", r"'{2,5}"),
+    Step("inline_tags", r"</?(?:small|span|sup|sub|br|div|center|big|u|s)\b[^>]*>", flags=re.I),
+    Step("lists", r"^[*#:;]+[ \t]*", flags=re.M),
+])
+
+MARKDOWN = Normalizer([
+    Step("code", r"^```.*?^```[ \t]*$", flags=re.S | re.M),
+    Step("comments", r"<!--.*?-->", flags=re.S),
+    Step("tables", r"^[ \t]*\|.*\|[ \t]*\n?", flags=re.M),
+    Step("images", r"!\[[^\]]*\]\([^)]*\)"),
+    Step("links", r"\[([^\]]+)\]\([^)]*\)", (1,)),
+    Step("headings", r"^#{1,6}[ \t]+(.+?)[ \t]*#*[ \t]*$", ("[", 1, "]"), flags=re.M),
+    Step("emphasis", r"(\*{1,3}|_{2,3})(?=\S)(.+?)(?<=\S)\1", (2,)),
+    Step("quotes", r"^[ \t]*>[ \t]?", flags=re.M),
+    Step("rules", r"^[ \t]*(?:-{3,}|\*{3,}|_{3,})[ \t]*$", flags=re.M),
+    Step("bullets", r"^[ \t]*(?:[-*+]|\d+\))[ \t]+", flags=re.M),
+])
+
+HTML = Normalizer([
+    Step("comments", r"<!--.*?-->", flags=re.S),
+    Step("scripts", r"<(script|style|noscript|nav|footer|aside)\b.*?</\1\s*>", flags=re.S | re.I),
+    Step("tables", r"<table\b.*?</table\s*>", flags=re.S | re.I),
+    Step("footnotes", r"<sup\b[^>]*>.*?</sup\s*>", flags=re.S | re.I),
+    Step("headings", r"<h([1-6])\b[^>]*>(.*?)</h\1\s*>", ("\n[", 2, "]\n"), flags=re.S | re.I),
+    Step("blocks", r"<br\s*/?>|</(?:p|div|li|tr|section|article|blockquote)\s*>", ("\n",), flags=re.I),
+    Step("tags", r"<[^>]+>"),
+    Step("entities", r"&(?:#\d+|#x[0-9a-fA-F]+|[A-Za-z]+);", (lambda m: html.unescape(m.group(0)),)),
+])
+
+PIPELINES: Dict[str, Normalizer] = {
+    "text": COMMON,
+    "markdown": MARKDOWN + COMMON,
+    "html": HTML + COMMON,
+    "wiki": WIKI + COMMON,
+}
+
+# 여러 줄에 걸쳐 열려 있으면 블록을 끊지 않는 구조 (열기, 닫기)
+_OPEN_CLOSE = {
+    "wiki": [("{{", "}}"), ("{|", "|}"), ("<!--", "-->")],
+    "html": [("<script", "</script"), ("<style", "</style"), ("<table", "</table"), ("<!--", "-->")],
+    "markdown": [("<!--", "-->")],
+    "text": [],
+}
+
+
+def detect_format(path: str) -> str:
+    return FORMATS.get(os.path.splitext(str(path))[1].lower(), "text")
+
+
+def clean_text(text: str, fmt: str = "text") -> str:
+    """메모리 안의 문자열을 정리합니다. (위치 정보가 필요 없을 때)"""
+    return PIPELINES[fmt].clean(text)
+
+
+# ==========================================
+# 3. 스트리밍 블록 → 절
+# ==========================================
+def _is_open(fmt: str, text: str) -> bool:
+    if fmt == "markdown" and text.count("```") % 2:
+        return True
+    lowered = text.lower()
+    return any(lowered.count(opening) > lowered.count(closing) for opening, closing in _OPEN_CLOSE.get(fmt, []))
+
+
+def iter_blocks(lines: Iterable[str], fmt: str = "text", max_chars: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    줄을 흘려 읽으며 빈 줄에서 끊은 (원본 시작 위치, 블록) 목록. 여러 줄 구조가 열려 있으면 닫힐 때까지 모읍니다.
+    """
+    max_chars = max_chars or int(os.getenv("LOADER_MAX_BLOCK_CHARS", 200000))
+    start = pos = 0
+    lines_buf: List[str] = []
+    size = 0
+    for line in lines:
+        lines_buf.append(line)
+        pos += len(line)
+        size += len(line)
+        if (line.strip() == "" and not _is_open(fmt, "".join(lines_buf))) or size >= max_chars:
+            yield start, "".join(lines_buf)
+            start, lines_buf, size = pos, [], 0
+    if lines_buf:
+        yield start, "".join(lines_buf)
+
+
+class _Section:
+    def __init__(self, title: Optional[str] = None):
+        self.title = title
+        self.builder = _Builder()
+
+    def has_body(self) -> bool:
+        text = "".join(self.builder.pieces)
+        if self.title:
+            text = text.replace(self.title, "", 1)
+        return bool(text.strip())
+
+
+def _emit(section: _Section, source: str, fmt: str) -> Optional[Document]:
+    mapped = section.builder.build()
+    text = mapped.text
+    lead = len(text) - len(text.lstrip())
+    body = text.strip()
+    if not body or not section.has_body():
+        return None
+    end = lead + len(body)
+    runs = mapped.slice_runs(lead, end, 0)
+    trimmed = Mapped(body, runs)
+    metadata: Dict[str, Any] = {
+        "source": source,
+        "format": fmt,
+        "source_start": trimmed.source(0),
+        "source_end": trimmed.source(len(body) - 1) + 1,
+        "offset_map": [[clean, src, int(exact)] for clean, src, exact in runs],
+    }
+    if section.title:
+        metadata["section"] = section.title
+    return Document(page_content=body, metadata=metadata)
+
+
+def iter_sections(lines: Iterable[str], source: str = "inline", fmt: str = "text") -> Iterator[Document]:
+    """
+    줄 스트림을 정리해 절 단위 Document를 내보냅니다. (한 번에 블록 하나와 절 하나만 메모리에 둠)
+    """
+    normalizer = PIPELINES[fmt]
+    section_max = int(os.getenv("LOADER_SECTION_MAX_CHARS", 20000))
+    section = _Section()
+    for block_start, block in iter_blocks(lines, fmt):
+        mapped = normalizer.apply(Mapped(block, [(0, block_start, True)]))
+        pos = 0
+        for line in mapped.text.splitlines(keepends=True):
+            stripped = line.strip()
+            if stripped and _SECTION.fullmatch(stripped):
+                document = _emit(section, source, fmt)
+                if document is not None:
+                    yield document
+                section = _Section(stripped)
+            section.builder.span(mapped, pos, pos + len(line))
+            pos += len(line)
+        if not mapped.text.endswith("\n"):
+            section.builder.literal("\n", mapped.source(len(mapped.text)))
+        # 절이 너무 길면 블록(문단) 경계에서 나눕니다. 이어지는 조각도 같은 절 제목을 가집니다.
+        if section.builder.length >= section_max:
+            document = _emit(section, source, fmt)
+            if document is not None:
+                yield document
+            section = _Section(section.title)
+    document = _emit(section, source, fmt)
+    if document is not None:
+        yield document
+
+
+def load_text(text: str, source: str = "inline", fmt: str = "text") -> List[Document]:
+    """메모리 안의 문자열을 절 단위 Document로 (builder.py/text.py의 내장 텍스트, 대시보드 입력)"""
+    return list(iter_sections(text.splitlines(keepends=True), source, fmt))
+
+
+def load_file(path: str, fmt: Optional[str] = None) -> List[Document]:
+    """파일 하나를 절 단위 Document로. 프로세스 풀 작업 단위입니다."""
+    fmt = fmt or detect_format(path)
+    # newline=""로 읽어야 원본 글자 위치가 파일과 맞습니다.
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        return list(iter_sections(f, str(path), fmt))
+
+
+def _expand(paths: Iterable[str]) -> List[str]:
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if os.path.splitext(name)[1].lower() in FORMATS)
+        else:
+            files.append(path)
+    return files
+
+
+def load_documents(paths: Iterable[str], workers: Optional[int] = None) -> Iterator[Document]:
+    """
+    여러 파일(디렉터리는 지원 확장자만)을 프로세스 풀에서 정리합니다. 결과는 입력 파일 순서대로 나옵니다.
+
+    Args:
+        paths: 파일/디렉터리 경로 목록
+        workers: 프로세스 수 (None이면 LOADER_WORKERS, 1이면 현재 프로세스에서 처리)
+    """
+    files = _expand(paths)
+    workers = workers or int(os.getenv("LOADER_WORKERS", os.cpu_count() or 1))
+    if workers <= 1 or len(files) <= 1:
+        for path in files:
+            yield from load_file(path)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        for documents in pool.map(load_file, files):
+            yield from documents
+
+
+def source_span(metadata: Dict[str, Any], start: int, end: int) -> Tuple[int, int]:
+    """
+    로더가 만든 Document 안의 [start, end) 구간 → 원본 파일의 글자 구간.
+    offset_map이 없으면(로더를 거치지 않은 Document) 그대로 돌려줍니다.
+    """
+    offset_map = metadata.get("offset_map")
+    if not offset_map:
+        return start, end
+    mapped = Mapped("", [(clean, src, bool(exact)) for clean, src, exact in offset_map])
+    if end <= start:
+        return mapped.source(start), mapped.source(start)
+    return mapped.source(start), mapped.source(end - 1) + 1
+
+
+if __name__ == "__main__":
+    if sys.platform == "win32":
+        sys.stdout.reconfigure(encoding="utf-8")
+    targets = sys.argv[1:] or ["data.txt"]
+    for doc in load_documents(targets):
+        meta = doc.metadata
+        print(f"[SECTION] {meta['source']} ({meta['format']}) chars {meta['source_start']}-{meta['source_end']}"
+              + (f", section={meta['section']}" if meta.get("section") else ""))
+        print(doc.page_content)
+        print("-" * 60)
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 모델 티어링 & LLM 없는 답변 합성
+GraphCypherQAChain은 질문마다 GPT-4o를 두 번(Cypher 생성, 답변 생성) 부릅니다.
+이 모듈의 TieredCypherQAChain은 같은 입출력 형태를 유지하면서
+
+    1. Cypher 생성은 빠르고 싼 모델(CYPHER_MODEL_FAST)로 하고,
+       검증(EXPLAIN, 스키마에 없는 라벨/관계 타입, 빈 결과)에 실패할 때만 큰 모델로 다시 생성합니다.
+       스키마와 어긋난 이름/방향은 DB에 보내기 전에 고치고(RIVAL_OF → RIVALRY_WITH, cypher_validator.py),
+       고치지 못하면 후보 이름을 알려주며 다시 생성합니다.
+    2. DB 결과가 작고 구조가 단순하면(목록, 개수, 단일 사실) 한국어 템플릿으로 바로 답하고
+       답변 LLM 호출을 건너뜁니다. 추론이 필요한 질문은 기존처럼 느와르 프롬프트로 답합니다.
+
+환경 변수:
+    LLM_MODEL                 : 큰 모델 (기본 gpt-4o)
+    CYPHER_MODEL_FAST         : Cypher 생성용 빠른 모델 (기본 gpt-4o-mini, 비우면 티어링 끔)
+    CYPHER_ESCALATE_ON_EMPTY  : 결과가 비면 큰 모델로 재생성 (기본 true)
+    TEMPLATE_ANSWERS          : 템플릿 답변 사용 (기본 true)
+    TEMPLATE_MAX_ROWS         : 템플릿으로 답할 최대 행 수 (기본 8)
+    CYPHER_SPECULATIVE        : 후보 쿼리 여러 개를 한 번에 만들어 동시 실행 (기본 true, speculative.py)
+    CYPHER_AUTOFIX*           : 스키마 정적 검증의 자동 교정 (cypher_validator.py)
+    CYPHER_EXAMPLES_*         : 비슷한 검증 예시를 Cypher 생성 프롬프트에 넣음 (cypher_examples.py)
+    SCHEMA_*                  : 질문에 관련된 스키마 조각만 프롬프트에 넣음 (schema_selector.py)
+"""
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_community.chains.graph_qa.cypher import extract_cypher
+from langchain_core.prompts import PromptTemplate
+
+from cypher_validator import describe, get_validator
+from prompts import cypher_generation_template
+
+CYPHER_GENERATION_PROMPT = PromptTemplate(
+    input_variables=["schema", "examples", "question"], template=cypher_generation_template
+)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# 이런 질문은 결과가 작아도 서술형 추론이 필요하므로 LLM으로 답합니다.
+REASONING_HINTS = (
+    "추론", "왜", "이유", "분석", "동기", "유력", "근거", "설명", "어떻게", "연관성", "배후",
+    "가능성", "why", "how", "explain", "reason",
+)
+# 개수 질문을 알아보는 컬럼 이름
+_COUNT_COLUMN = re.compile(r"(count|cnt|total|num|number|개수|수)$", re.IGNORECASE)
+
+
+# ==========================================
+# 1. 모델 티어
+# ==========================================
+# LLM 호출 단계는 config의 태그("stage:cypher_generation" 등)와 run_name으로 남깁니다.
+# (batch_runner.StageTimer가 호출 순서 대신 이 태그로 단계별 지연을 나눕니다)
+STAGE_TAG = "stage:"
+STAGES = ("planner", "cypher_generation", "escalation", "qa")
+
+
+def stage_config(config: Optional[Dict[str, Any]], stage: str) -> Dict[str, Any]:
+    """config 사본에 단계 태그와 run_name을 붙입니다. (바깥 단계의 태그는 지움)"""
+    config = dict(config or {})
+    tags = [tag for tag in config.get("tags") or [] if not str(tag).startswith(STAGE_TAG)]
+    config["tags"] = tags + [STAGE_TAG + stage]
+    config["run_name"] = stage
+    return config
+
+
+def model_name(llm: Any) -> str:
+    return str(getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__)
+
+
+def get_model_tiers(temperature: float = 0) -> Tuple[Any, Any]:
+    """
+    (빠른 Cypher 모델, 큰 모델)을 만듭니다. CYPHER_MODEL_FAST가 비어 있으면 둘 다 큰 모델입니다.
+    """
+    from langchain_openai import ChatOpenAI
+
+    large = ChatOpenAI(model=os.getenv("LLM_MODEL", "gpt-4o"), temperature=temperature,
+                       api_key=os.getenv("OPENAI_API_KEY"))
+    fast_name = os.getenv("CYPHER_MODEL_FAST", "gpt-4o-mini").strip()
+    if not fast_name or fast_name == model_name(large):
+        return large, large
+    fast = ChatOpenAI(model=fast_name, temperature=0, api_key=os.getenv("OPENAI_API_KEY"))
+    return fast, large
+
+
+# ==========================================
+# 2. Cypher 검증
+# ==========================================
+# 정적 검증 실패 사유의 머리말 (DB에 보내지 않고 다시 생성할 쿼리)
+SCHEMA_MISMATCH = "스키마 불일치"
+
+
+def _known_names(graph):
+    """DB의 실제 라벨/관계 타입 이름을 한 번만 읽는 함수 (그래프가 지원하지 않으면 None)."""
+    db_names = getattr(graph, "db_names", None)
+    if db_names is None:
+        return None
+    names: List[set] = []
+
+    def known() -> set:
+        if not names:
+            names.append(db_names())
+        return names[0]
+
+    return known
+
+
+def schema_validator(graph, cypher: str, known=None):
+    """
+    현재 스키마의 검증기. 그래프 버전이 바뀌었으면 스키마를 먼저 다시 읽습니다. (GovernedNeo4jGraph.sync_schema)
+    쿼리에 캐시된 스키마에는 없지만 DB에는 있는 이름이 있으면 스키마를 한 번 더 읽고 새 검증기를 돌려줍니다.
+    """
+    sync = getattr(graph, "sync_schema", None)
+    if sync is not None:
+        sync()
+    validator = get_validator(getattr(graph, "structured_schema", None))
+    if validator is None or known is None or sync is None:
+        return validator
+    _, issues = validator.analyze(cypher, known)
+    if any(issue.get("stale") for issue in issues) and sync(force=True):
+        validator = get_validator(getattr(graph, "structured_schema", None))
+    return validator
+
+
+def repair_cypher(graph, cypher: str) -> Tuple[str, List[str]]:
+    """
+    캐시된 스키마로 확실한 교정(비슷한 라벨/관계 타입/속성 이름, 뒤집힌 방향)을 적용합니다.
+    스키마에는 없지만 DB에는 있는 이름(스키마를 읽은 뒤 수집된 관계 등)은 고치지 않습니다.
+
+    Returns:
+        tuple: (교정된 쿼리, 적용한 교정 설명 목록)
+    """
+    if not cypher:
+        return cypher, []
+    known = _known_names(graph)
+    validator = schema_validator(graph, cypher, known)
+    if validator is None:
+        return cypher, []
+    fixed, fixes, _ = validator.repair(cypher, known)
+    return fixed, fixes
+
+
+def is_schema_mismatch(reason: Optional[str]) -> bool:
+    return bool(reason) and reason.startswith(SCHEMA_MISMATCH)
+
+
+def validate_cypher(graph, cypher: str) -> Optional[str]:
+    """
+    생성된 Cypher를 실행 전에 검증합니다.
+    스키마 정적 검사(라벨, 관계 타입, 방향, 속성)를 먼저 하고, 통과한 쿼리만 EXPLAIN으로 DB에 보냅니다.
+    스키마에는 없지만 DB에는 있는 이름은 막지 않습니다.
+
+    Returns:
+        str | None: 실패 사유 (통과하면 None). 정적 검사 실패는 "스키마 불일치: ..." (후보 이름 포함)
+    """
+    if not cypher or not cypher.strip():
+        return "빈 쿼리"
+    known = _known_names(graph)
+    validator = schema_validator(graph, cypher, known)
+    if validator is not None:
+        _, issues = validator.analyze(cypher, known)
+        blocking = [issue for issue in issues if issue["blocking"]]
+        if blocking:
+            return f"{SCHEMA_MISMATCH}: {describe(blocking)}"
+    try:
+        graph.query(f"EXPLAIN {cypher}")
+    except Exception as e:  # 문법 오류, 거버너 거부(쓰기 절) 등
+        return f"EXPLAIN 실패: {e}"
+    return None
+
+
+# ==========================================
+# 3. 템플릿 답변
+# ==========================================
+def _scalar(value: Any) -> Optional[str]:
+    """행의 값을 한 줄 문자열로 바꿉니다. 노드 dict는 id/name으로 줄이고, 복잡하면 None."""
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return "예" if value else "아니오"
+    if isinstance(value, (int, float, str)):
+        return str(value)
+    if isinstance(value, dict):
+        for key in ("id", "name"):
+            if isinstance(value.get(key), str):
+                return value[key]
+        return None
+    if isinstance(value, (list, tuple)) and len(value) <= 5 and all(isinstance(v, (str, int, float)) for v in value):
+        return ", ".join(str(v) for v in value)
+    return None
+
+
+def needs_reasoning(question: str) -> bool:
+    lowered = question.lower()
+    return any(hint in lowered for hint in REASONING_HINTS)
+
+
+def template_answer(question: str, rows: List[Dict[str, Any]], max_rows: Optional[int] = None) -> Optional[str]:
+    """
+    작고 단순한 결과를 한국어 문장으로 바로 씁니다. 템플릿으로 답할 수 없으면 None.
+
+    Args:
+        question: 사용자 질문
+        rows: DB 결과 행
+        max_rows: 템플릿으로 답할 최대 행 수 (기본 TEMPLATE_MAX_ROWS)
+    """
+    max_rows = max_rows if max_rows is not None else int(os.getenv("TEMPLATE_MAX_ROWS", 8))
+    if needs_reasoning(question) or len(rows) > max_rows:
+        return None
+    if not rows:
+        return "🔍 그래프에서 이 질문에 해당하는 기록을 찾지 못했습니다."
+
+    columns = list(rows[0].keys())
+    table: List[List[str]] = []
+    for row in rows:
+        cells = [_scalar(row.get(col)) for col in columns]
+        if any(cell is None for cell in cells):
+            return None
+        table.append(cells)
+
+    # 개수: 한 행, 한 컬럼, 정수
+    if len(rows) == 1 and len(columns) == 1:
+        value = rows[0][columns[0]]
+        if isinstance(value, int) and not isinstance(value, bool) and _COUNT_COLUMN.search(columns[0]):
+            return f"📊 기록상 총 {value}건입니다."
+        return f"🔎 기록에 따르면: {table[0][0]}"
+
+    # 단일 사실: 한 행, 여러 컬럼
+    if len(rows) == 1:
+        lines = [f"- {col}: {cell}" for col, cell in zip(columns, table[0])]
+        return "🔎 기록에 따르면:\n" + "\n".join(lines)
+
+    # 목록: 여러 행, 한 컬럼
+    if len(columns) == 1:
+        items = list(dict.fromkeys(cells[0] for cells in table))
+        return f"🗂️ 총 {len(items)}건: " + ", ".join(items)
+
+    # 작은 표: 여러 행, 여러 컬럼
+    header = " · ".join(columns)
+    lines = [f"- {' · '.join(cells)}" for cells in table]
+    return f"🗂️ 총 {len(rows)}건 ({header}):\n" + "\n".join(lines)
+
+
+# ==========================================
+# 4. 티어링 체인
+# ==========================================
+class TieredCypherQAChain:
+    """
+    GraphCypherQAChain 대신 쓰는 체인. invoke({"query": 질문}) → {'query', 'result', 'intermediate_steps', 'route'}
+    intermediate_steps는 기존과 같은 [{'query': cypher}, {'context': rows}] 형태입니다.
+    """
+
+    def __init__(
+        self,
+        graph,
+        cypher_llm,
+        escalation_llm,
+        qa_llm,
+        qa_prompt,
+        cypher_prompt=None,
+        top_k: int = 10,
+        verbose: bool = True,
+        template_answers: Optional[bool] = None,
+        escalate_on_empty: Optional[bool] = None,
+        speculative: Optional[bool] = None,
+        examples=None,
+        schema_selector=None,
+    ):
+        self.graph = graph
+        self.cypher_llm = cypher_llm
+        self.escalation_llm = escalation_llm
+        self.qa_llm = qa_llm
+        self.qa_prompt = qa_prompt
+        self.cypher_prompt = cypher_prompt or CYPHER_GENERATION_PROMPT
+        self.top_k = top_k
+        self.verbose = verbose
+        self.template_answers = _env_bool("TEMPLATE_ANSWERS", True) if template_answers is None else template_answers
+        self.escalate_on_empty = (
+            _env_bool("CYPHER_ESCALATE_ON_EMPTY", True) if escalate_on_empty is None else escalate_on_empty
+        )
+        self.speculative = _env_bool("CYPHER_SPECULATIVE", True) if speculative is None else speculative
+        self.examples = examples  # cypher_examples.ExampleStore (없으면 예시 없이 생성)
+        self.schema_selector = schema_selector  # schema_selector.SchemaSelector (없으면 전체 스키마)
+
+    def _log(self, title: str, body: Any) -> None:
+        if self.verbose:
+            print(f"\n{title}\n{body}")
+
+    @staticmethod
+    def _with_feedback(question: str, feedback: Optional[str]) -> str:
+        if not feedback:
+            return question
+        return f"{question}\n(이전 쿼리는 다음 이유로 실패했습니다. 스키마에 있는 라벨/관계만 쓰세요: {feedback})"
+
+    def schema_for(self, question: str) -> str:
+        """질문에 관련된 스키마 조각 (선택기가 없으면 전체 스키마)."""
+        if self.schema_selector is None:
+            return self.graph.schema
+        return self.schema_selector.select(question)
+
+    def cypher_inputs(self, question: str, feedback: Optional[str] = None) -> Dict[str, Any]:
+        """Cypher 생성 프롬프트 입력 {'schema', 'examples', 'question'}. 스키마와 예시는 원래 질문으로 고릅니다."""
+        examples = ""
+        if self.examples is not None:
+            examples = self.examples.prompt_block(question, getattr(self.graph, "structured_schema", None))
+        return {"schema": self.schema_for(question), "examples": examples,
+                "question": self._with_feedback(question, feedback)}
+
+    def generate_cypher(self, llm, question: str, config=None, feedback: Optional[str] = None) -> str:
+        """
+        Cypher 생성 프롬프트로 쿼리를 만듭니다. feedback이 있으면 이전 실패 사유를 알려줍니다.
+        (feedback이 있는 재생성은 "escalation" 단계로 태그)
+        """
+        inputs = self.cypher_inputs(question, feedback)
+        if "examples" not in self.cypher_prompt.input_variables:
+            inputs.pop("examples")
+        config = stage_config(config, "escalation" if feedback else "cypher_generation")
+        text = (self.cypher_prompt | llm | StrOutputParser()).invoke(inputs, config=config)
+        return extract_cypher(text)
+
+    def _repair(self, cypher: str, route: Dict[str, Any]) -> str:
+        """스키마와 어긋난 이름/방향을 실행 전에 고치고 route['fixes']에 남깁니다."""
+        fixed, fixes = repair_cypher(self.graph, cypher)
+        if fixes:
+            self._log("Schema Fixes:", "\n".join(fixes))
+            route.setdefault("fixes", []).extend(fixes)
+        return fixed
+
+    def _single(self, question: str, route: Dict[str, Any], config=None) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        쿼리 하나를 만들어 실행하고, 실패하면 큰 모델로 한 번 더 만듭니다.
+        스키마 불일치는 티어링이 꺼져 있어도 후보 이름을 알려주며 한 번 다시 만듭니다.
+        """
+        cypher = self._repair(self.generate_cypher(self.cypher_llm, question, config), route)
+        reason = validate_cypher(self.graph, cypher)
+        context: List[Dict[str, Any]] = []
+        if reason is None:
+            context = self.graph.query(cypher)[: self.top_k]
+            if not context and self.escalate_on_empty:
+                reason = "결과 없음"
+
+        # 검증 실패(또는 빈 결과) → 큰 모델로 한 번 더
+        if reason is not None and (self.escalation_llm is not self.cypher_llm or is_schema_mismatch(reason)):
+            self._log("Escalating:", reason)
+            route.update({"escalated": self.escalation_llm is not self.cypher_llm, "reason": reason,
+                          "cypher_model": model_name(self.escalation_llm)})
+            retry = self._repair(self.generate_cypher(self.escalation_llm, question, config, feedback=reason), route)
+            if validate_cypher(self.graph, retry) is None:
+                cypher, reason = retry, None
+                context = self.graph.query(cypher)[: self.top_k]
+        if reason is not None and reason != "결과 없음" and not is_schema_mismatch(reason):
+            # 고치지 못한 쿼리는 기존 체인처럼 그대로 실행해 오류(또는 빈 결과)를 드러냅니다.
+            context = self.graph.query(cypher)[: self.top_k]
+        route["validated"] = reason is None
+        return cypher, context
+
+    def _speculate(self, question: str, route: Dict[str, Any], config=None) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        후보 쿼리(direct/chain/event)를 한 번에 만들어 동시에 실행하고 신뢰도 정책으로 합칩니다.
+        모든 후보가 실패하거나 비면 큰 모델로 한 번만 다시 만듭니다.
+        """
+        from speculative import generate_variants, merge_results, run_variants
+
+        def attempt(llm, feedback: Optional[str] = None) -> Dict[str, Any]:
+            stage = "escalation" if feedback else "cypher_generation"
+            variants = generate_variants(llm, self.cypher_inputs(question, feedback), stage_config(config, stage))
+            self._log("Cypher Variants:", "\n".join(f"[{name}] {cypher}" for name, cypher in variants))
+            return merge_results(question, run_variants(self.graph, variants, self.top_k), top_k=self.top_k)
+
+        merged = attempt(self.cypher_llm)
+        invalid = [v for v in merged["variants"] if v["reason"]]
+        mismatch = any(is_schema_mismatch(v["reason"]) for v in invalid)
+        if not merged["context"] and (invalid or self.escalate_on_empty or not merged["variants"]) \
+                and (self.escalation_llm is not self.cypher_llm or mismatch):
+            reason = "; ".join(f"{v['name']}: {v['reason'] or '결과 없음'}" for v in merged["variants"]) or "후보 없음"
+            self._log("Escalating:", reason)
+            route.update({"escalated": self.escalation_llm is not self.cypher_llm, "reason": reason,
+                          "cypher_model": model_name(self.escalation_llm)})
+            retry = attempt(self.escalation_llm, feedback=reason)
+            if retry["context"] or any(not v["reason"] for v in retry["variants"]):
+                merged = retry
+
+        route["variants"] = merged["variants"]
+        route["chosen"] = merged["chosen"]
+        fixes = [fix for v in merged["variants"] for fix in v.get("fixes") or []]
+        if fixes:
+            route["fixes"] = list(dict.fromkeys(fixes))
+        route["validated"] = bool(merged["context"])
+        context = merged["context"]
+        if not context and merged["variants"] and all(v["reason"] for v in merged["variants"]) \
+                and not all(is_schema_mismatch(v["reason"]) for v in merged["variants"]):
+            # 모든 후보가 검증에 실패하면 대표 쿼리를 그대로 실행해 오류를 드러냅니다. (스키마 불일치는 빈 결과뿐이라 생략)
+            context = self.graph.query(merged["query"])[: self.top_k]
+        return merged["query"], context
+
+    @staticmethod
+    def _repaired(route: Dict[str, Any]) -> bool:
+        """돌려준 쿼리가 자동 교정을 거쳤는지. (동시 후보면 고른 후보만 봄)"""
+        if "variants" not in route:
+            return bool(route.get("fixes"))
+        chosen = set(route.get("chosen") or [])
+        return any(v.get("fixes") for v in route["variants"] if v["name"] in chosen)
+
+    def retrieve(self, question: str, config=None) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        질문 → Cypher → DB 결과까지만 실행합니다. (답변 생성 없음, planner.py가 하위 질문마다 사용)
+
+        Returns:
+            tuple: (대표 Cypher, 결과 행, route)
+        """
+        route: Dict[str, Any] = {"cypher_model": model_name(self.cypher_llm), "escalated": False, "reason": None}
+        governor = getattr(self.graph, "governor", None)
+        stats = governor.current()[2] if governor is not None else None
+        seen = len(stats["rewrites"]) if stats else 0
+        if self.speculative:
+            cypher, context = self._speculate(question, route, config)
+        else:
+            cypher, context = self._single(question, route, config)
+        self._log("Generated Cypher:", cypher)
+        if stats and len(stats["rewrites"]) > seen:
+            # 거버너 그래프의 재작성 내역 (그래프는 출력하지 않고 요청 통계에만 남김)
+            self._log("Rewrites:", "\n".join(f"[REWRITE] {'; '.join(r['changes'])}" for r in stats["rewrites"][seen:]))
+        self._log("Full Context:", context)
+
+        # 첫 생성 쿼리가 고치지 않고 검증을 통과해 결과가 있었을 때만 다음 질문의 예시가 됩니다.
+        # (재생성/승격한 쿼리와 자동 교정한 쿼리는 빗나간 첫 시도를 가린 것이라 배우지 않음)
+        if self.examples is not None and context and route.get("validated") \
+                and not route.get("reason") and not self._repaired(route):
+            self.examples.add(question, cypher)
+        return cypher, context, route
+
+    def answer(self, question: str, context: Any, config=None) -> str:
+        """답변 프롬프트로 LLM 답변을 만듭니다. 프롬프트에 {schema}가 있으면 질문에 관련된 조각을 채웁니다."""
+        inputs = {"question": question, "context": context}
+        if "schema" in self.qa_prompt.input_variables:
+            inputs["schema"] = self.schema_for(question)
+        return (self.qa_prompt | self.qa_llm | StrOutputParser()).invoke(inputs, config=stage_config(config, "qa"))
+
+    def invoke(self, inputs: Any, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        question = inputs["query"] if isinstance(inputs, dict) else str(inputs)
+        cypher, context, route = self.retrieve(question, config)
+
+        # 컬럼이 다른 후보 결과를 합쳤다면 표 템플릿 대신 LLM이 읽고 답합니다.
+        uniform = len({tuple(row) for row in context}) <= 1
+        answer = template_answer(question, context) if self.template_answers and uniform else None
+        if answer is not None:
+            route["answer"] = "template"
+        else:
+            route["answer"] = "llm"
+            answer = self.answer(question, context, config)
+
+        return {
+            "query": question,
+            "result": answer,
+            "intermediate_steps": [{"query": cypher}, {"context": context}],
+            "route": route,
+        }
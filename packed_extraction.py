@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 청크 묶음 추출 (Packed Graph Extraction)
+LLMGraphTransformer는 청크마다 시스템 프롬프트와 스키마 지시문(허용 노드/관계 목록)을 통째로 다시 보냅니다.
+청크가 작으면 호출 비용의 대부분이 이 고정 부분입니다.
+
+PackedGraphExtractor는 이어진 청크 여러 개를 토큰 예산(EXTRACT_PACK_TOKENS)까지 한 요청에 묶습니다.
+
+    <<<SEGMENT 1>>>
+    (청크 3 본문)
+    <<<SEGMENT 2>>>
+    (청크 4 본문)
+
+모델에는 노드/관계마다 'segment' 속성에 출처 구간 번호를 적게 하고(LLMGraphTransformer의
+node_properties/relationship_properties + additional_instructions), 응답을 다시 청크별 GraphDocument로 나눕니다.
+번호가 없거나 틀리면 id가 본문에 나오는 구간, 그것도 없으면 묶음의 첫 청크로 돌립니다.
+결과는 convert_to_graph_documents()와 같은 모양(청크마다 GraphDocument 하나)이라 이후 단계(중복 제거, 저장)는 그대로입니다.
+prefilter(entity_prefilter.EntityPrefilter)를 주면 엔티티 후보가 없는 청크는 묶기 전에 빼고 빈 GraphDocument를 돌려줍니다.
+patterns(pattern_extractor.PatternExtractor)를 주면 정형 문장은 규칙으로 먼저 추출하고, 규칙이 덮지 못한 문장만
+LLM에 보냅니다. 규칙 결과는 같은 청크의 GraphDocument에 합칩니다.
+
+환경 변수:
+    EXTRACT_PACK_TOKENS : 한 요청에 묶을 본문 토큰 예산 (기본 2000, 0이면 청크마다 한 번씩 호출)
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+from langchain_experimental.graph_transformers import LLMGraphTransformer
+
+from chunker import count_tokens
+
+SEGMENT_PROPERTY = "segment"
+SEGMENT_MARKER = "<<<SEGMENT {n}>>>"
+
+PACK_INSTRUCTIONS = (
+    "The input consists of several independent text segments, each introduced by a line like '<<<SEGMENT 2>>>'. "
+    "Extract nodes and relationships from every segment. "
+    "For every node and every relationship, set the property 'segment' to the number of the segment "
+    "the information was taken from. If the same fact appears in several segments, use the first one."
+)
+
+
+def pack_chunks(chunks: List[Document], max_tokens: int) -> List[List[int]]:
+    """이어진 청크들을 본문 토큰 합이 max_tokens를 넘지 않게 묶습니다. (청크 번호 목록의 목록)"""
+    packs: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for i, chunk in enumerate(chunks):
+        tokens = (chunk.metadata or {}).get("tokens") or count_tokens(chunk.page_content)
+        if current and used + tokens > max_tokens:
+            packs.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def render_pack(chunks: List[Document], indices: List[int]) -> Document:
+    body = "\n\n".join(
+        f"{SEGMENT_MARKER.format(n=n)}\n{chunks[i].page_content.strip()}" for n, i in enumerate(indices, 1)
+    )
+    return Document(page_content=body, metadata={"packed_chunks": indices})
+
+
+def _strip_segment(properties: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Any]:
+    properties = dict(properties or {})
+    return properties, properties.pop(SEGMENT_PROPERTY, None)
+
+
+def _resolve(value: Any, ids: List[str], indices: List[int], chunks: List[Document]) -> int:
+    """segment 값 → 원래 청크 번호. 값이 없거나 틀리면 id가 본문에 나오는 청크, 그것도 없으면 첫 청크."""
+    try:
+        n = int(str(value).strip())
+        if 1 <= n <= len(indices):
+            return indices[n - 1]
+    except (TypeError, ValueError):
+        pass
+    for i in indices:
+        text = chunks[i].page_content.casefold()
+        if all(str(node_id).casefold() in text for node_id in ids):
+            return i
+    return indices[0]
+
+
+class PackedGraphExtractor:
+    """
+    여러 청크를 한 번의 LLM 호출로 추출하는 LLMGraphTransformer 래퍼.
+
+    사용 예:
+        extractor = PackedGraphExtractor(llm, allowed_nodes=[...], allowed_relationships=[...])
+        graph_documents = extractor.convert_to_graph_documents(chunks)   # 청크마다 GraphDocument 하나
+        print(extractor.calls)                                           # 실제 LLM 호출 수
+        print(extractor.saved_calls)                                     # 사전 필터로 아낀 호출 수
+        print(extractor.rule_only)                                       # 규칙만으로 끝난 청크 수
+    """
+
+    def __init__(self, llm, allowed_nodes: Optional[List[str]] = None,
+                 allowed_relationships: Optional[List[str]] = None, max_tokens: Optional[int] = None,
+                 prefilter=None, patterns=None):
+        self.max_tokens = int(os.getenv("EXTRACT_PACK_TOKENS", 2000)) if max_tokens is None else max_tokens
+        self.prefilter = prefilter
+        self.patterns = patterns
+        options = {"allowed_nodes": allowed_nodes or [], "allowed_relationships": allowed_relationships or []}
+        self.single = LLMGraphTransformer(llm=llm, **options)
+        self.packed = LLMGraphTransformer(
+            llm=llm,
+            node_properties=[SEGMENT_PROPERTY],
+            relationship_properties=[SEGMENT_PROPERTY],
+            additional_instructions=PACK_INSTRUCTIONS,
+            **options,
+        )
+        self.calls = 0
+        # 사전 필터로 건너뛴 청크 수와 그 덕분에 줄어든 LLM 호출 수
+        self.skipped = 0
+        self.saved_calls = 0
+        # 규칙만으로 다 추출해 LLM에 보내지 않은 청크 수
+        self.rule_only = 0
+
+    def convert_to_graph_documents(self, chunks: List[Document]) -> List[GraphDocument]:
+        """청크 순서대로의 GraphDocument 목록 (source는 원래 청크)"""
+        chunks = list(chunks)
+        # LLM에 보낼 본문 (규칙 추출을 쓰면 규칙이 덮지 못한 문장만, metadata는 원래 청크 그대로)
+        work = chunks
+        rule_docs: List[Optional[GraphDocument]] = [None] * len(chunks)
+        if self.patterns is not None:
+            work = []
+            for i, chunk in enumerate(chunks):
+                rule_docs[i], residual = self.patterns.extract(chunk)
+                metadata = dict(chunk.metadata or {}, tokens=count_tokens(residual))
+                work.append(Document(page_content=residual, metadata=metadata))
+        keep = [i for i, chunk in enumerate(work) if chunk.page_content.strip()]
+        if self.patterns is not None:
+            self.rule_only += len(chunks) - len(keep)
+        if self.prefilter is not None:
+            kept, skipped = self.prefilter.split([work[i] for i in keep])
+            self.skipped += len(skipped)
+            self.saved_calls += len(self._packs(work, keep)) - len(self._packs(work, [keep[j] for j in kept]))
+            keep = [keep[j] for j in kept]
+        packs = self._packs(work, keep)
+        nodes: List[Dict[Tuple[str, str], Node]] = [{} for _ in chunks]
+        rels: List[List[Relationship]] = [[] for _ in chunks]
+        for i, doc in enumerate(rule_docs):
+            if doc is not None:
+                nodes[i].update(((n.type, n.id), n) for n in doc.nodes)
+                rels[i].extend(doc.relationships)
+
+        for indices in packs:
+            self.calls += 1
+            if len(indices) == 1:
+                (doc,) = self.single.convert_to_graph_documents([work[indices[0]]])
+                nodes[indices[0]].update(((n.type, n.id), n) for n in doc.nodes)
+                rels[indices[0]].extend(doc.relationships)
+                continue
+
+            (doc,) = self.packed.convert_to_graph_documents([render_pack(work, indices)])
+            for node in doc.nodes:
+                properties, segment = _strip_segment(node.properties)
+                home = _resolve(segment, [node.id], indices, work)
+                nodes[home][(node.type, node.id)] = Node(id=node.id, type=node.type, properties=properties)
+            for rel in doc.relationships:
+                properties, segment = _strip_segment(rel.properties)
+                home = _resolve(segment, [rel.source.id, rel.target.id], indices, work)
+                endpoints = []
+                for end in (rel.source, rel.target):
+                    end_props, _ = _strip_segment(end.properties)
+                    node = Node(id=end.id, type=end.type, properties=end_props)
+                    nodes[home].setdefault((node.type, node.id), node)
+                    endpoints.append(node)
+                rels[home].append(Relationship(
+                    source=endpoints[0], target=endpoints[1], type=rel.type, properties=properties
+                ))
+
+        documents = [
+            GraphDocument(nodes=list(nodes[i].values()), relationships=rels[i], source=chunk)
+            for i, chunk in enumerate(chunks)
+        ]
+        if self.prefilter is not None:
+            self.prefilter.observe(documents)
+        return documents
+
+    def _packs(self, chunks: List[Document], indices: List[int]) -> List[List[int]]:
+        """indices 청크들의 묶음 (원래 청크 번호)"""
+        if self.max_tokens <= 0:
+            return [[i] for i in indices]
+        return [[indices[j] for j in pack] for pack in pack_chunks([chunks[i] for i in indices], self.max_tokens)]
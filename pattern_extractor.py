@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 규칙 기반 관계 추출기 (Pattern Extractor)
+text.py의 truth_text, builder.py의 raw_text에 나오는 사실 중 일부는 몇 가지 문장 틀을 따릅니다.
+
+    "키피 D는 사우스사이드 크립스의 멤버였다."              → (Keffe D)-[:MEMBER_OF]->(Southside Crips)
+    "퍼프 대디(P. Diddy)는 Bad Boy Records의 CEO였다."      → (Puff Daddy)-[:CEO_OF]->(Bad Boy Records)
+    "투팍은 Death Row Records 소속이었으며, ..."            → (Tupac Shakur)-[:SIGNED_TO]->(Death Row Records)
+    "올랜도 앤더슨은 키피 D의 조카였으며, ..."              → (Keffe D)-[:UNCLE_OF]->(Orlando Anderson)
+    "퍼프 대디는 키피 D에게 ...살인을 청부했다."            → (Puff Daddy)-[:HIRED_HITMAN]->(Keffe D)
+    "투팍은 비기가 1994년 총격 사건의 배후라고 의심했다."   → (Tupac Shakur)-[:SUSPECTED]->(Notorious B.I.G.)
+    "투팍은 ... 디스곡으로 비기를 맹비난했다."              → (Tupac Shakur)-[:BEEF_WITH]->(Notorious B.I.G.)
+
+PatternExtractor는 문장을 절("...이었으며, " / "...였고, ")로 나눠 미리 컴파일한 틀에 맞추고,
+주어/목적어를 엔티티 사전(한국어 이름, 원어 병기, 별칭 → 그래프 id와 라벨)으로 풀어
+LLMGraphTransformer와 같은 GraphDocument를 만듭니다. "이 레이블", "그 갱단" 같은 지시어는
+같은 문장에서 앞에 나온 그 타입의 엔티티로 풉니다.
+
+모든 절이 틀에 맞은 문장은 LLM에 보내지 않고, 하나라도 남은 문장만 나머지 본문(residual)으로 돌려줍니다.
+사건 경위처럼 서술형인 문장(시간/장소 부사절, 한 절에 사실이 둘 이상인 문장)은 틀에 맞지 않으므로 LLM이 맡습니다.
+정형 문장의 비율만큼 추출 비용과 지연이 줄어듭니다.
+
+환경 변수:
+    PATTERN_EXTRACTION : 규칙 추출 사용 (기본 true)
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+from chunker import split_units
+
+# ==========================================
+# 1. 엔티티 사전 (그래프 id → 라벨, 별칭)
+# ==========================================
+ENTITIES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "Tupac Shakur": ("Rapper", ("투팍", "투팍 샤커", "Tupac", "2Pac")),
+    "Notorious B.I.G.": ("Rapper", ("비기", "노토리어스 비아이지", "노토리어스 B.I.G.", "Biggie", "Biggie Smalls")),
+    "Suge Knight": ("Producer", ("슈그 나이트", "슈그 나잇", "수그 나이트", "슈그")),
+    "Puff Daddy": ("Producer", ("퍼프 대디", "퍼프", "P. Diddy", "Diddy", "디디", "Sean Combs")),
+    "Orlando Anderson": ("Person", ("올랜도 앤더슨", "올랜도", "Orlando")),
+    "Keffe D": ("Person", ("키피 D", "키피", "Keefe D", "두에인 데이비스", "Duane Keith Davis", "Duane Davis")),
+    "Southside Crips": ("Gang", ("사우스사이드 크립스", "크립스", "Crips")),
+    "Mob Piru Bloods": ("Gang", ("몹 피루 블러즈", "블러즈", "Bloods")),
+    "Death Row Records": ("Label", ("데스 로우", "데스로우", "데스 로우 레코즈", "Death Row")),
+    "Bad Boy Records": ("Label", ("배드 보이", "배드보이", "배드 보이 레코즈", "Bad Boy")),
+}
+
+# 인물 자리(주어, 삼촌/조카)에 올 수 있는 라벨
+_PERSON_TYPES = ("Person", "Rapper", "Producer")
+
+# 이름 자리: 쉼표 없는 말, 괄호 병기 안의 쉼표는 허용 ("노토리어스 비아이지(Notorious B.I.G., 비기)")
+_NAME = r"(?:[^,(]|\([^)]*\))+?"
+_SUBJECT = rf"(?P<x>{_NAME})(?:은|는|이|가)\s+"
+_COPULA = r"(?:였다|이었다|이다|였으며|이었으며|이며|였고|이었고|이고)"
+
+# (관계 타입, 패턴, 목적어 라벨, 주어/목적어를 뒤집을지)
+PATTERNS: List[Tuple[str, "re.Pattern", Optional[Tuple[str, ...]], bool]] = [
+    ("MEMBER_OF", re.compile(rf"^{_SUBJECT}(?P<y>{_NAME})(?:\s*갱단)?의\s*(?:멤버|조직원|일원|간부){_COPULA}$"), ("Gang",), False),
+    ("CEO_OF", re.compile(rf"^{_SUBJECT}(?P<y>{_NAME})의\s*(?:CEO|대표|사장){_COPULA}$"), ("Label",), False),
+    ("SIGNED_TO", re.compile(rf"^{_SUBJECT}(?P<y>{_NAME})\s*소속{_COPULA}$"), ("Label",), False),
+    ("UNCLE_OF", re.compile(rf"^{_SUBJECT}(?P<y>{_NAME})의\s*삼촌{_COPULA}$"), _PERSON_TYPES, False),
+    ("UNCLE_OF", re.compile(rf"^{_SUBJECT}(?P<y>{_NAME})의\s*조카{_COPULA}$"), _PERSON_TYPES, True),
+    ("HIRED_HITMAN", re.compile(rf"^{_SUBJECT}(?P<y>{_NAME})에게\s.*(?:살인|살해|암살)을\s*(?:청부|의뢰)했다$"),
+     _PERSON_TYPES, False),
+    ("SUSPECTED", re.compile(rf"^{_SUBJECT}(?P<y>{_NAME})(?:이|가)\s.*배후(?:라고|로)\s*의심했다$"), _PERSON_TYPES, False),
+    ("BEEF_WITH", re.compile(rf"^{_SUBJECT}(?P<y>{_NAME})(?:을|를)\s*(?:맹)?(?:비난|디스)했다$"), _PERSON_TYPES, False),
+]
+
+# "...이었으며, " / "...였고, " 에서 절을 나눕니다.
+_CLAUSE = re.compile(r"(?<=[며고]),\s*")
+_PAREN = re.compile(r"\(([^)]*)\)")
+_ANAPHORA = re.compile(r"^(?:이|그|해당)\s*(레이블|레코드사|갱단|조직|인물|사람)$")
+_ANAPHORA_TYPES = {"레이블": ("Label",), "레코드사": ("Label",), "갱단": ("Gang",), "조직": ("Gang",),
+                   "인물": _PERSON_TYPES, "사람": _PERSON_TYPES}
+_QUOTES = "'\"‘’“”"
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _key(text: str) -> str:
+    return re.sub(r"\s+", "", text).casefold()
+
+
+# ==========================================
+# 2. 추출기
+# ==========================================
+class PatternExtractor:
+    """
+    정형 문장을 규칙으로 추출하고, 규칙이 다 덮지 못한 문장만 LLM용으로 남깁니다.
+
+    사용 예:
+        patterns = PatternExtractor(allowed_nodes=[...], allowed_relationships=[...])
+        graph_document, residual = patterns.extract(chunk)
+    """
+
+    def __init__(self, allowed_nodes: Optional[List[str]] = None,
+                 allowed_relationships: Optional[List[str]] = None,
+                 entities: Optional[Dict[str, Tuple[str, Tuple[str, ...]]]] = None,
+                 enabled: Optional[bool] = None):
+        self.enabled = _env_bool("PATTERN_EXTRACTION", True) if enabled is None else enabled
+        self.allowed_nodes = set(allowed_nodes or [])
+        allowed_rels = set(allowed_relationships or [])
+        # 허용되지 않은 관계의 틀은 쓰지 않습니다. (그 문장은 LLM으로)
+        self.patterns = [p for p in PATTERNS if not allowed_rels or p[0] in allowed_rels]
+        self.aliases: Dict[str, Tuple[str, str]] = {}
+        for entity_id, (label, aliases) in (entities or ENTITIES).items():
+            for alias in (entity_id,) + tuple(aliases):
+                self.aliases[_key(alias)] = (entity_id, label)
+        self.rule_facts = 0
+        self.covered_sentences = 0
+        self.total_sentences = 0
+
+    def _node_allowed(self, label: str) -> bool:
+        return not self.allowed_nodes or label in self.allowed_nodes
+
+    def resolve(self, mention: str, expected: Optional[Tuple[str, ...]],
+                seen: List[Tuple[str, str]], trailing: bool = False) -> Optional[Tuple[str, str]]:
+        """
+        언급 → (그래프 id, 라벨). 풀 수 없거나 기대 라벨과 다르면 None (그 절은 LLM에 맡김).
+        trailing이면 앞에 수식어가 붙은 언급("디스곡으로 비기")도 뒤쪽 단어부터 사전에서 찾습니다.
+        """
+        mention = mention.strip().strip(_QUOTES).strip()
+        anaphora = _ANAPHORA.match(mention)
+        if anaphora:
+            types = _ANAPHORA_TYPES[anaphora.group(1)]
+            for entity_id, label in reversed(seen):
+                if label in types:
+                    return entity_id, label
+            return None
+
+        inner = [part.strip() for m in _PAREN.findall(mention) for part in m.split(",")]
+        bare = _PAREN.sub("", mention).strip()
+        if expected == ("Gang",):
+            bare = re.sub(r"\s*갱단$", "", bare)
+        words = bare.split()
+        suffixes = [" ".join(words[i:]) for i in range(1, len(words))] if trailing else []
+        for candidate in [bare] + inner + suffixes:
+            hit = self.aliases.get(_key(candidate.strip(_QUOTES)))
+            if hit:
+                entity_id, label = hit
+                break
+        else:
+            # 사전에 없는 이름은 원어 병기나 영문 이름일 때만 그대로 씁니다.
+            english = next((c for c in inner if re.fullmatch(r"[A-Za-z][A-Za-z0-9 .&'\-]{1,40}", c)), None)
+            if english is None and re.fullmatch(r"[A-Za-z][A-Za-z0-9 .&'\-]{1,40}", bare):
+                english = bare
+            if english is None:
+                return None
+            entity_id, label = english, (expected[0] if expected else "Person")
+        if expected and label not in expected:
+            return None
+        return (entity_id, label) if self._node_allowed(label) else None
+
+    def _match_clause(self, clause: str, seen: List[Tuple[str, str]]) -> Optional[Tuple[Tuple[str, str], str, Tuple[str, str]]]:
+        clause = clause.strip().rstrip(".").strip()
+        for rel_type, pattern, expected, swap in self.patterns:
+            match = pattern.match(clause)
+            if not match:
+                continue
+            subject = self.resolve(match.group("x"), _PERSON_TYPES, seen)
+            if subject is None:
+                continue
+            obj = self.resolve(match.group("y"), expected, seen + [subject], trailing=True)
+            if obj is None:
+                continue
+            seen.extend([subject, obj])
+            return (obj, rel_type, subject) if swap else (subject, rel_type, obj)
+        return None
+
+    def extract(self, chunk: Document) -> Tuple[GraphDocument, str]:
+        """
+        청크 하나를 규칙으로 추출합니다.
+
+        Returns:
+            tuple: (규칙으로 찾은 노드/관계의 GraphDocument, 규칙이 다 덮지 못한 문장들 - 절 제목 포함)
+        """
+        text = chunk.page_content
+        nodes: Dict[Tuple[str, str], Node] = {}
+        relationships: List[Relationship] = []
+        residual: List[str] = []
+        headers: List[str] = []
+        if not self.enabled or not self.patterns:
+            return GraphDocument(nodes=[], relationships=[], source=chunk), text
+
+        for start, end, is_header in split_units(text):
+            sentence = text[start:end].strip()
+            if is_header:
+                headers.append(sentence)
+                continue
+            self.total_sentences += 1
+            seen: List[Tuple[str, str]] = []
+            facts = []
+            for clause in _CLAUSE.split(sentence):
+                fact = self._match_clause(clause, seen)
+                if fact is None:
+                    facts = None
+                    break
+                facts.append(fact)
+            if not facts:
+                # 절 제목은 뒤따르는 문장의 문맥으로 함께 보냅니다.
+                residual.extend(headers)
+                headers = []
+                residual.append(sentence)
+                continue
+            self.covered_sentences += 1
+            for (source_id, source_label), rel_type, (target_id, target_label) in facts:
+                source = nodes.setdefault((source_label, source_id), Node(id=source_id, type=source_label))
+                target = nodes.setdefault((target_label, target_id), Node(id=target_id, type=target_label))
+                relationships.append(Relationship(source=source, target=target, type=rel_type))
+                self.rule_facts += 1
+
+        document = GraphDocument(nodes=list(nodes.values()), relationships=relationships, source=chunk)
+        return document, "\n".join(residual)
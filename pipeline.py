@@ -3,13 +3,24 @@ Hip-Hop Noir: Graph ETL Pipeline Visualizer
 문서가 지식 그래프로 변환되는 전 과정을 실시간으로 추적하는 대시보드
 """
 import streamlit as st
+import hashlib
+import json
 import os
 from dotenv import load_dotenv
 from langchain_community.graphs import Neo4jGraph
+from langchain_community.graphs.graph_document import GraphDocument
 from langchain_openai import ChatOpenAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_core.documents import Document
+from chunker import TokenChunker
+from loaders import detect_format, load_text
+from entity_prefilter import EntityPrefilter
+from packed_extraction import PackedGraphExtractor
+from pattern_extractor import PatternExtractor
+from provenance import ProvenanceIndex
+from graph_rag import GraphRAGRetriever
+from rule_engine import RuleEngine
+from triple_dedup import merge_graph_documents
+from temporal import TemporalNormalizer
+from spatial import GeoEnricher
 from streamlit_agraph import agraph, Node, Edge, Config
 
 # 1. 설정 및 연결
@@ -38,6 +49,110 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# ==========================================
+# 단계 메모이제이션 (Streamlit 재실행 대응)
+# ==========================================
+# Streamlit은 슬라이더, 다운로드 버튼, 그래프 클릭마다 스크립트 전체를 다시 실행합니다.
+# 단계 결과를 입력 키와 함께 session_state에 두고, 키가 같으면 다시 계산하지 않습니다.
+# 단계 키는 앞 단계 키를 포함하므로 설정이 바뀌면 그 설정에 의존하는 뒤 단계만 다시 계산됩니다.
+#   chunks(텍스트, 크기, 중복) → graph_docs(+스키마) → cypher, write → visual
+# LLM 추출과 DB 저장은 '파이프라인 실행'을 눌렀을 때만 일어납니다.
+CHUNK_CACHE_MAX = int(os.getenv("ETL_CHUNK_CACHE_MAX", 500))
+
+
+def stage_key(*parts) -> str:
+    """단계 입력의 해시 키"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def cached_stage(name, key):
+    """키가 맞는 단계 결과 (없거나 입력이 바뀌었으면 None)"""
+    hit = st.session_state.setdefault("etl_stages", {}).get(name)
+    return hit["value"] if hit and hit["key"] == key else None
+
+
+def run_stage(name, key, compute):
+    """키가 같으면 저장된 결과를, 다르면 compute()를 실행해 저장한 결과를 반환합니다."""
+    value = cached_stage(name, key)
+    if value is None:
+        value = compute()
+        st.session_state["etl_stages"][name] = {"key": key, "value": value}
+    return value
+
+
+def clear_stages(*names):
+    stages = st.session_state.setdefault("etl_stages", {})
+    for name in names:
+        stages.pop(name, None)
+
+
+@st.cache_resource
+def get_graph():
+    return Neo4jGraph(
+        url=os.getenv("NEO4J_URI"),
+        username=os.getenv("NEO4J_USERNAME"),
+        password=os.getenv("NEO4J_PASSWORD")
+    )
+
+
+@st.cache_resource
+def get_llm():
+    return ChatOpenAI(model="gpt-4o", temperature=0, api_key=os.getenv("OPENAI_API_KEY"))
+
+
+@st.cache_resource
+def get_prefilter():
+    # 세션 사이에 유지되며, 그래프가 커지면 새 이름만 오토마톤에 더합니다.
+    return EntityPrefilter(get_graph())
+
+
+def extract_graph_documents(chunks, allowed_nodes, allowed_rels, pack_tokens=None, use_prefilter=True,
+                            use_patterns=True):
+    """
+    청크별로 추출 결과를 캐시하고, 처음 보는 청크만 LLM에 보냅니다.
+    (텍스트 뒤에 문단을 덧붙이면 앞쪽 청크는 다시 추출하지 않음)
+    정형 문장은 규칙으로 먼저 추출하고, 남은 본문은 pack_tokens 예산까지 한 요청에 묶으며,
+    엔티티 후보가 없는 청크는 LLM에 보내지 않습니다.
+
+    Returns:
+        tuple: (청크 순서대로의 GraphDocument 목록, 새로 추출한 청크 수,
+                {'calls': LLM 호출 수, 'skipped': 건너뛴 청크 수, 'saved_calls': 아낀 호출 수,
+                 'rule_facts': 규칙으로 찾은 관계 수, 'rule_only': LLM 없이 끝난 청크 수})
+    """
+    cache = st.session_state.setdefault("etl_chunk_docs", {})
+    # 건너뛴 청크는 빈 결과로, 규칙 추출한 청크는 규칙 결과로 캐시되므로
+    # 프리필터/묶음/규칙 설정도 키에 넣어 설정을 바꾸면 다시 추출합니다.
+    keys = [stage_key(chunk.page_content, allowed_nodes, allowed_rels, pack_tokens, use_prefilter, use_patterns)
+            for chunk in chunks]
+    missing = [(key, chunk) for key, chunk in zip(keys, chunks) if key not in cache]
+    if missing:
+        llm_transformer = PackedGraphExtractor(
+            llm=get_llm(),
+            allowed_nodes=allowed_nodes,
+            allowed_relationships=allowed_rels,
+            max_tokens=pack_tokens,
+            prefilter=get_prefilter() if use_prefilter else None,
+            patterns=PatternExtractor(allowed_nodes, allowed_rels) if use_patterns else None
+        )
+        extracted = llm_transformer.convert_to_graph_documents([chunk for _, chunk in missing])
+        for (key, _), doc in zip(missing, extracted):
+            cache[key] = doc
+        stats = {"calls": llm_transformer.calls, "skipped": llm_transformer.skipped,
+                 "saved_calls": llm_transformer.saved_calls, "rule_only": llm_transformer.rule_only,
+                 "rule_facts": llm_transformer.patterns.rule_facts if use_patterns else 0}
+    else:
+        stats = {"calls": 0, "skipped": 0, "saved_calls": 0, "rule_only": 0, "rule_facts": 0}
+    # 같은 본문이라도 앞에 문단이 끼면 청크 번호(metadata["chunk"])가 바뀌므로,
+    # 캐시된 결과는 지금 청크를 source로 다시 묶어야 source_chunks와 근거 청크가 맞습니다.
+    graph_documents = [GraphDocument(nodes=cache[key].nodes, relationships=cache[key].relationships, source=chunk)
+                       for key, chunk in zip(keys, chunks)]
+    # 오래된 청크부터 버립니다.
+    for stale in list(cache)[:max(0, len(cache) - CHUNK_CACHE_MAX)]:
+        cache.pop(stale)
+    return graph_documents, len(missing), stats
+
+
 st.title("⚙️ 힙합 느와르: 그래프 구축 파이프라인 (ETL)")
 st.caption("Raw Text가 지식 그래프(Knowledge Graph)로 변환되는 전 과정을 추적합니다.")
 
@@ -67,8 +182,23 @@ with st.sidebar:
     
     # 모델 및 청킹 설정
     st.header("⚙️ Pipeline Settings")
-    chunk_size = st.slider("Chunk Size (문자)", 100, 2000, 500, step=50)
-    chunk_overlap = st.slider("Overlap (중복)", 0, 500, 50, step=10)
+    chunk_size = st.slider("Chunk Size (토큰)", 100, 2000, int(os.getenv("CHUNK_MAX_TOKENS", 600)), step=50)
+    chunk_overlap = st.slider(
+        "앞 문맥 (토큰)", 0, 300, int(os.getenv("CHUNK_OVERLAP_TOKENS", 80)), step=10,
+        help="청크가 절 중간이나 지시어(그는, 이 사건 ...)로 시작할 때만 절 제목/앞 문장을 이 예산까지 붙입니다."
+    )
+    pack_tokens = st.slider(
+        "묶음 추출 (토큰)", 0, 4000, int(os.getenv("EXTRACT_PACK_TOKENS", 2000)), step=250,
+        help="이어진 청크를 이 예산까지 한 번의 LLM 호출로 추출합니다. 0이면 청크마다 호출합니다."
+    )
+    use_prefilter = st.checkbox(
+        "엔티티 사전 필터", value=os.getenv("ENTITY_PREFILTER", "true").lower() in ("1", "true", "yes", "on"),
+        help="알려진 이름(그래프, 별칭, 지명 사전)이나 고유명사 단서가 없는 청크는 LLM에 보내지 않습니다."
+    )
+    use_patterns = st.checkbox(
+        "규칙 추출", value=os.getenv("PATTERN_EXTRACTION", "true").lower() in ("1", "true", "yes", "on"),
+        help="'X는 Y의 멤버였다', 'X는 Y 소속이었다' 같은 정형 문장은 LLM 없이 규칙으로 추출합니다."
+    )
     
     st.divider()
     
@@ -92,12 +222,9 @@ with st.sidebar:
     st.header("🗄️ Database Management")
     if st.button("🗑️ 기존 데이터 삭제", type="secondary", use_container_width=True):
         try:
-            graph = Neo4jGraph(
-                url=os.getenv("NEO4J_URI"),
-                username=os.getenv("NEO4J_USERNAME"),
-                password=os.getenv("NEO4J_PASSWORD")
-            )
-            graph.query("MATCH (n) DETACH DELETE n")
+            get_graph().query("MATCH (n) DETACH DELETE n")
+            # 저장/시각화 결과는 더 이상 DB와 맞지 않습니다. (추출 결과는 재사용)
+            clear_stages("write", "visual")
             st.success("✅ 데이터 삭제 완료!")
         except Exception as e:
             st.error(f"오류: {e}")
@@ -120,38 +247,49 @@ input_text = st.text_area(
     key="input_text"
 )
 
+# 위키 덤프, HTML, Markdown 메모는 형식에 맞는 정리(템플릿/표/태그/각주 제거)를 거쳐 절 단위로 나눕니다.
+uploaded = st.file_uploader(
+    "또는 문서 파일을 올리세요 (txt, md, html, wiki):",
+    type=["txt", "md", "markdown", "html", "htm", "wiki", "mediawiki"]
+)
+input_format = "text"
+input_source = "dashboard"
+if uploaded is not None:
+    input_text = uploaded.getvalue().decode("utf-8", errors="replace")
+    input_format = detect_format(uploaded.name)
+    input_source = uploaded.name
+
 col1, col2, col3 = st.columns([1, 1, 2])
 with col1:
     run_button = st.button("🚀 파이프라인 실행", type="primary", use_container_width=True)
 with col2:
     st.metric("입력 문자 수", f"{len(input_text):,}")
 
-if run_button:
-    if not input_text.strip():
-        st.error("텍스트를 입력해주세요!")
-        st.stop()
-    
-    # Neo4j 및 LLM 연결
-    llm = ChatOpenAI(model="gpt-4o", temperature=0, api_key=os.getenv("OPENAI_API_KEY"))
-    graph = Neo4jGraph(
-        url=os.getenv("NEO4J_URI"),
-        username=os.getenv("NEO4J_USERNAME"),
-        password=os.getenv("NEO4J_PASSWORD")
-    )
+if run_button and not input_text.strip():
+    st.error("텍스트를 입력해주세요!")
+    st.stop()
+
+# 한 번이라도 실행했으면, 이후 재실행(슬라이더/다운로드/그래프 클릭)에서는 저장된 단계 결과를 그립니다.
+if run_button or st.session_state.get("etl_stages"):
+    chunks_key = stage_key(input_text, input_format, chunk_size, chunk_overlap)
+    docs_key = stage_key(chunks_key, allowed_nodes, allowed_rels, pack_tokens, use_prefilter, use_patterns)
 
     # ==========================================
     # Step 2: 청킹 (Chunking)
     # ==========================================
     st.divider()
     st.header("✂️ Step 2: Text Chunking")
-    st.caption(f"긴 문서를 LLM이 처리하기 좋은 크기({chunk_size}자)로 분할합니다.")
+    st.caption(f"긴 문서를 문장/절 경계에서 LLM이 처리하기 좋은 크기({chunk_size} 토큰)로 분할합니다.")
     
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
-    )
-    docs = [Document(page_content=input_text)]
-    chunks = text_splitter.split_documents(docs)
+    def split_chunks():
+        text_splitter = TokenChunker(
+            max_tokens=chunk_size,
+            overlap_tokens=chunk_overlap
+        )
+        docs = load_text(input_text, source=input_source, fmt=input_format)
+        return text_splitter.split_documents(docs)
+
+    chunks = run_stage("chunks", chunks_key, split_chunks)
     
     st.success(f"✅ 총 **{len(chunks)}개**의 청크로 분할되었습니다.")
     
@@ -163,7 +301,7 @@ if run_button:
             with cols[i % num_cols]:
                 with st.container():
                     st.markdown(f"**🧩 Chunk #{i+1}**")
-                    st.caption(f"({len(chunk.page_content)} chars)")
+                    st.caption(f"({chunk.metadata['tokens']} tokens, {len(chunk.page_content)} chars)")
                     preview = chunk.page_content[:150] + "..." if len(chunk.page_content) > 150 else chunk.page_content
                     st.info(f'"{preview}"')
 
@@ -174,34 +312,56 @@ if run_button:
     st.header("🧠 Step 3: LLM Entity & Relation Extraction")
     st.caption("GPT-4o가 텍스트를 분석하여 엔티티(노드)와 관계(엣지)를 추출합니다.")
     
-    with st.spinner("🤖 LLM이 텍스트를 이해하고 관계를 추출 중입니다... (약 10-30초 소요)"):
-        try:
-            llm_transformer = LLMGraphTransformer(
-                llm=llm,
-                allowed_nodes=allowed_nodes,
-                allowed_relationships=allowed_rels
-            )
-            graph_documents = llm_transformer.convert_to_graph_documents(chunks)
-            
-            # 전체 통계
-            total_nodes = sum(len(doc.nodes) for doc in graph_documents)
-            total_rels = sum(len(doc.relationships) for doc in graph_documents)
-            
-            st.success(f"✅ 추출 완료! 노드: **{total_nodes}개**, 관계: **{total_rels}개**")
-            
-        except Exception as e:
-            st.error(f"❌ LLM 추출 오류: {e}")
+    extraction = cached_stage("graph_docs", docs_key)
+    if extraction is None:
+        if not run_button:
+            # 입력/설정이 바뀐 뒤에는 버튼을 눌러야 LLM을 다시 부릅니다.
+            st.info("⚙️ 입력 또는 설정이 바뀌었습니다. '🚀 파이프라인 실행'을 누르면 이 단계부터 다시 계산합니다.")
             st.stop()
+        with st.spinner("🤖 LLM이 텍스트를 이해하고 관계를 추출 중입니다... (약 10-30초 소요)"):
+            try:
+                graph_documents, extracted, calls = extract_graph_documents(
+                    chunks, allowed_nodes, allowed_rels, pack_tokens, use_prefilter, use_patterns
+                )
+            except Exception as e:
+                st.error(f"❌ LLM 추출 오류: {e}")
+                st.stop()
+        # 청크 간 중복 사실을 합쳐 DB에는 각 사실이 한 번씩만 갑니다.
+        graph_documents, dedup = merge_graph_documents(graph_documents)
+        extraction = run_stage("graph_docs", docs_key, lambda: {
+            "documents": graph_documents,
+            "extracted": extracted,
+            "calls": calls,
+            "dedup": dedup,
+            "total_nodes": dedup["nodes_out"],
+            "total_rels": dedup["rels_out"],
+        })
+
+    graph_documents = extraction["documents"]
+    total_nodes = extraction["total_nodes"]
+    total_rels = extraction["total_rels"]
+    st.success(f"✅ 추출 완료! 노드: **{total_nodes}개**, 관계: **{total_rels}개**")
+    dedup = extraction["dedup"]
+    if dedup["rels_in"] > dedup["rels_out"] or dedup["nodes_in"] > dedup["nodes_out"]:
+        st.caption(f"🧹 중복 제거: 노드 {dedup['nodes_in']} → {dedup['nodes_out']}, 관계 {dedup['rels_in']} → {dedup['rels_out']}")
+    calls = extraction["calls"]
+    if calls["calls"] or calls["skipped"]:
+        st.caption(f"🤖 청크 {extraction['extracted']}개를 LLM 호출 {calls['calls']}번으로 추출했습니다.")
+    if calls.get("rule_facts"):
+        st.caption(f"📏 정형 문장에서 관계 {calls['rule_facts']}개를 규칙으로 추출했습니다. (LLM 없이 끝난 청크 {calls['rule_only']}개)")
+    if calls["skipped"]:
+        st.caption(f"🔎 엔티티 후보가 없는 청크 {calls['skipped']}개를 건너뛰어 LLM 호출 {calls['saved_calls']}번을 아꼈습니다.")
+    reused = len(chunks) - extraction["extracted"]
+    if reused:
+        st.caption(f"♻️ 캐시된 청크 {reused}개는 LLM을 다시 호출하지 않았습니다.")
     
     # 파싱 결과 시각화
+    all_nodes = [node for doc in graph_documents for node in doc.nodes]
+    all_rels = [rel for doc in graph_documents for rel in doc.relationships]
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("🔵 Extracted Nodes")
-        all_nodes = []
-        for doc in graph_documents:
-            all_nodes.extend(doc.nodes)
-        
         if all_nodes:
             for node in all_nodes:
                 st.code(f"(:{node.type} {{id: '{node.id}'}})", language="cypher")
@@ -210,13 +370,11 @@ if run_button:
     
     with col2:
         st.subheader("🔗 Extracted Relationships")
-        all_rels = []
-        for doc in graph_documents:
-            all_rels.extend(doc.relationships)
-        
         if all_rels:
             for rel in all_rels:
-                st.code(f"({rel.source.id}) -[:{rel.type}]-> ({rel.target.id})", language="cypher")
+                support = rel.properties.get("chunk_support", 1)
+                note = f"  // 청크 {support}개에서 추출" if support > 1 else ""
+                st.code(f"({rel.source.id}) -[:{rel.type}]-> ({rel.target.id}){note}", language="cypher")
         else:
             st.warning("추출된 관계가 없습니다.")
 
@@ -227,22 +385,25 @@ if run_button:
     st.header("📝 Step 4: Generated Cypher Query")
     st.caption("LLM이 추출한 데이터를 바탕으로 실행될 DB 쿼리입니다.")
     
-    cypher_preview = "// 노드 생성 쿼리\n"
-    for node in all_nodes:
-        props = ", ".join([f"{k}: '{v}'" for k, v in node.properties.items()]) if node.properties else ""
-        if props:
-            cypher_preview += f"MERGE (n:{node.type} {{id: '{node.id}', {props}}})\n"
-        else:
-            cypher_preview += f"MERGE (n:{node.type} {{id: '{node.id}'}})\n"
-    
-    cypher_preview += "\n// 관계 생성 쿼리\n"
-    for rel in all_rels:
-        cypher_preview += f"MATCH (a {{id: '{rel.source.id}'}}), (b {{id: '{rel.target.id}'}})\n"
-        cypher_preview += f"MERGE (a)-[:{rel.type}]->(b)\n\n"
-    
+    def build_cypher_preview():
+        cypher_preview = "// 노드 생성 쿼리\n"
+        for node in all_nodes:
+            props = ", ".join([f"{k}: '{v}'" for k, v in node.properties.items()]) if node.properties else ""
+            if props:
+                cypher_preview += f"MERGE (n:{node.type} {{id: '{node.id}', {props}}})\n"
+            else:
+                cypher_preview += f"MERGE (n:{node.type} {{id: '{node.id}'}})\n"
+        
+        cypher_preview += "\n// 관계 생성 쿼리\n"
+        for rel in all_rels:
+            cypher_preview += f"MATCH (a {{id: '{rel.source.id}'}}), (b {{id: '{rel.target.id}'}})\n"
+            cypher_preview += f"MERGE (a)-[:{rel.type}]->(b)\n\n"
+        return cypher_preview
+
+    cypher_preview = run_stage("cypher", docs_key, build_cypher_preview)
     st.code(cypher_preview, language="cypher")
     
-    # 복사 버튼
+    # 복사 버튼 (누르면 재실행되지만 저장된 단계 결과를 그대로 그립니다)
     st.download_button(
         label="📋 Cypher 쿼리 다운로드",
         data=cypher_preview,
@@ -257,85 +418,114 @@ if run_button:
     st.header("🎨 Step 5: Final Graph Visualization")
     st.caption("Neo4j에 저장된 그래프를 시각화합니다.")
     
-    # DB 저장
-    with st.spinner("💾 Neo4j 데이터베이스에 저장 중..."):
-        try:
-            graph.add_graph_documents(graph_documents)
-            st.toast("✅ 데이터베이스 저장 완료!", icon="💾")
-        except Exception as e:
-            st.error(f"❌ DB 저장 오류: {e}")
+    # DB 저장 (같은 추출 결과는 한 번만 저장)
+    write = cached_stage("write", docs_key)
+    if write is None:
+        if not run_button:
+            st.info("💾 추출 결과가 아직 DB에 없습니다. (DB 초기화 또는 저장 실패) '🚀 파이프라인 실행'을 누르면 추출 없이 저장만 다시 합니다.")
             st.stop()
+        with st.spinner("💾 Neo4j 데이터베이스에 저장 중..."):
+            try:
+                graph = get_graph()
+                graph.add_graph_documents(graph_documents)
+                # 청크(Document 노드)와 사실별 근거 문장 참조
+                provenance = ProvenanceIndex(graph).record(chunks, graph_documents)
+                # 청크/엔티티 임베딩 (탐정의 GraphRAG 검색)
+                indexed = GraphRAGRetriever(graph).index()
+                # 새 사실로 파생 관계(MASTERMIND_OF, ACCOMPLICE_OF) 증분 갱신
+                derived = RuleEngine(graph, verbose=False).on_graph_documents(graph_documents)
+                # 시간/장소 속성 정규화 (when 창, point)
+                TemporalNormalizer(graph, verbose=False).normalize()
+                GeoEnricher(graph, verbose=False).geocode()
+                st.toast("✅ 데이터베이스 저장 완료!", icon="💾")
+            except Exception as e:
+                st.error(f"❌ DB 저장 오류: {e}")
+                st.stop()
+        write = run_stage("write", docs_key, lambda: {"derived": derived, "provenance": provenance, "indexed": indexed})
+    if write["derived"]:
+        st.caption(f"🧩 파생 관계 갱신: {write['derived']}")
+    if write.get("provenance", {}).get("documents"):
+        provenance = write["provenance"]
+        st.caption(f"📎 청크 {provenance['documents']}개를 Document 노드로 저장하고, 노드 {provenance['nodes']}개 / 관계 {provenance['relationships']}개에 근거 문장을 연결했습니다.")
+    if any(write.get("indexed", {}).values()):
+        indexed = write["indexed"]
+        st.caption(f"🧭 GraphRAG 검색용으로 청크 {indexed['documents']}개 / 엔티티 {indexed['entities']}개를 임베딩했습니다.")
 
-    # 시각화를 위해 DB에서 데이터 가져오기
-    with st.spinner("🎨 그래프 렌더링 중..."):
-        try:
-            visual_query = """
-            MATCH (n)-[r]->(m)
-            RETURN n, r, m
-            LIMIT 100
-            """
-            results = graph.query(visual_query)
+    # 노드 타입별 색상 정의
+    color_map = {
+        "Rapper": "#FF6B6B",      # 빨간색
+        "Producer": "#4ECDC4",    # 청록색
+        "Gang": "#45B7D1",         # 파란색
+        "Event": "#96CEB4",        # 연두색
+        "Location": "#FFEAA7",     # 노란색
+        "Person": "#DDA0DD",       # 보라색
+        "Label": "#F39C12"         # 주황색
+    }
+
+    def fetch_visual_data():
+        visual_query = """
+        MATCH (n)-[r]->(m)
+        RETURN n, r, m
+        LIMIT 100
+        """
+        results = get_graph().query(visual_query)
+        
+        nodes = []
+        edges = []
+        node_ids = set()
+
+        for record in results:
+            source = record['n']
+            target = record['m']
+            rel = record['r']
             
-            nodes = []
-            edges = []
-            node_ids = set()
+            # 소스 노드
+            src_id = source.get('id', source.get('name', str(id(source))))
+            src_labels = list(source.labels) if hasattr(source, 'labels') else []
+            src_label = src_labels[0] if src_labels else "Node"
+            src_color = color_map.get(src_label, "#999999")
             
-            # 노드 타입별 색상 정의
-            color_map = {
-                "Rapper": "#FF6B6B",      # 빨간색
-                "Producer": "#4ECDC4",    # 청록색
-                "Gang": "#45B7D1",         # 파란색
-                "Event": "#96CEB4",        # 연두색
-                "Location": "#FFEAA7",     # 노란색
-                "Person": "#DDA0DD",       # 보라색
-                "Label": "#F39C12"         # 주황색
-            }
-
-            for record in results:
-                source = record['n']
-                target = record['m']
-                rel = record['r']
-                
-                # 소스 노드
-                src_id = source.get('id', source.get('name', str(id(source))))
-                src_labels = list(source.labels) if hasattr(source, 'labels') else []
-                src_label = src_labels[0] if src_labels else "Node"
-                src_color = color_map.get(src_label, "#999999")
-                
-                if src_id not in node_ids:
-                    nodes.append(Node(
-                        id=src_id,
-                        label=src_id,
-                        size=25,
-                        color=src_color,
-                        title=f"{src_label}: {src_id}"
-                    ))
-                    node_ids.add(src_id)
-                
-                # 타겟 노드
-                tgt_id = target.get('id', target.get('name', str(id(target))))
-                tgt_labels = list(target.labels) if hasattr(target, 'labels') else []
-                tgt_label = tgt_labels[0] if tgt_labels else "Node"
-                tgt_color = color_map.get(tgt_label, "#999999")
-
-                if tgt_id not in node_ids:
-                    nodes.append(Node(
-                        id=tgt_id,
-                        label=tgt_id,
-                        size=25,
-                        color=tgt_color,
-                        title=f"{tgt_label}: {tgt_id}"
-                    ))
-                    node_ids.add(tgt_id)
-                
-                # 엣지 (관계)
-                rel_type = rel[1] if isinstance(rel, tuple) else type(rel).__name__
-                edges.append(Edge(
-                    source=src_id,
-                    target=tgt_id,
-                    label=rel_type,
-                    color="#888888"
+            if src_id not in node_ids:
+                nodes.append(Node(
+                    id=src_id,
+                    label=src_id,
+                    size=25,
+                    color=src_color,
+                    title=f"{src_label}: {src_id}"
                 ))
+                node_ids.add(src_id)
+            
+            # 타겟 노드
+            tgt_id = target.get('id', target.get('name', str(id(target))))
+            tgt_labels = list(target.labels) if hasattr(target, 'labels') else []
+            tgt_label = tgt_labels[0] if tgt_labels else "Node"
+            tgt_color = color_map.get(tgt_label, "#999999")
+
+            if tgt_id not in node_ids:
+                nodes.append(Node(
+                    id=tgt_id,
+                    label=tgt_id,
+                    size=25,
+                    color=tgt_color,
+                    title=f"{tgt_label}: {tgt_id}"
+                ))
+                node_ids.add(tgt_id)
+            
+            # 엣지 (관계)
+            rel_type = rel[1] if isinstance(rel, tuple) else type(rel).__name__
+            edges.append(Edge(
+                source=src_id,
+                target=tgt_id,
+                label=rel_type,
+                color="#888888"
+            ))
+        return {"nodes": nodes, "edges": edges}
+
+    # 시각화를 위해 DB에서 데이터 가져오기 (저장 직후 한 번, 그래프 클릭/호버 재실행에서는 재사용)
+    with st.spinner("🎨 그래프 렌더링 중..."):
+        try:
+            visual = run_stage("visual", docs_key, fetch_visual_data)
+            nodes, edges = visual["nodes"], visual["edges"]
 
             if nodes:
                 st.success(f"✅ 그래프 로드 완료! 노드: {len(nodes)}개, 엣지: {len(edges)}개")
@@ -386,4 +576,3 @@ if run_button:
         st.metric("✅ 상태", "완료")
     
     st.success("🎉 파이프라인 실행 완료! 이제 `app.py`를 실행하여 질문해보세요.")
-
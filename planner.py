@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 질문 분해 플래너 (Question Decomposition Planner)
+"갱단 간 전쟁과 투팍 사건의 연관성은?" 같은 복합 질문을 Cypher 하나로 풀면
+결과가 비거나 폭발합니다. QuestionPlanner는 체인 앞에서
+
+    1. 질문을 작은 하위 질문 DAG로 나누고 (빠른 모델 한 번 호출)
+         s1: 갱단 간 전쟁 사실      s2: 폭행 사건 참여자      s3: {s2}로 이어지는 총격범 사슬
+    2. 서로 독립인 하위 질문은 동시에 조회하고 (답변 LLM 없이 Cypher → 결과까지만)
+    3. 하위 결과를 중복 제거·압축해 한 번의 종합 답변 호출에 넘깁니다.
+
+단순한 질문은 플래너를 거치지 않고 원래 체인으로 바로 갑니다.
+
+환경 변수:
+    QUESTION_PLANNER   : 복합 질문 분해 사용 (기본 true)
+    PLANNER_MAX_STEPS  : 하위 질문 최대 개수 (기본 4)
+    PLANNER_ROWS       : 하위 질문마다 종합 단계에 넘길 최대 행 수 (기본 8)
+"""
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from model_router import stage_config
+
+# 이런 말이 있으면 여러 사실을 엮는 질문으로 보고 분해를 시도합니다.
+# ("추론"은 단일 사실 질문에도 흔히 붙어 플래너 호출만 늘리므로 넣지 않습니다)
+COMPOUND_HINTS = (
+    "연관성", "근거로", "비교", "그리고", "각각", "관련이 있", "이어지", "종합",
+    " and ", "compare", "relationship between",
+)
+
+PLANNER_TEMPLATE = """당신은 90년대 힙합 범죄 그래프(Neo4j)의 질의 계획자입니다.
+아래 질문을, 그래프에서 각각 Cypher 한 번으로 조회할 수 있는 작은 하위 질문으로 나누세요.
+
+규칙:
+- 하위 질문은 최대 {max_steps}개이고, 각각 한 가지 사실만 묻습니다.
+  (예: 갱단 간 전쟁/충돌 사실, 폭행 사건과 참여자, 총격범으로 이어지는 청부/지시 사슬)
+- 서로 독립인 하위 질문은 depends_on을 비워 두세요. 동시에 실행됩니다.
+- 앞 단계의 결과가 필요하면 depends_on에 그 id를 넣고 질문 안에서 {{s1}}처럼 참조하세요.
+- 추론이나 종합은 하지 마세요. 마지막에 한 번에 종합합니다.
+- 이미 단순한 질문이면 하위 질문 하나만 반환하세요.
+
+JSON만 출력하세요:
+{{"steps": [{{"id": "s1", "question": "...", "depends_on": []}}]}}
+
+질문: {question}"""
+
+PLANNER_PROMPT = PromptTemplate(input_variables=["question", "max_steps"], template=PLANNER_TEMPLATE)
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def is_compound(question: str) -> bool:
+    """여러 사실을 엮어야 하는 질문인지 (LLM 없이 빠르게 판단)."""
+    lowered = question.lower()
+    return question.count("?") > 1 or any(hint in lowered for hint in COMPOUND_HINTS)
+
+
+# ==========================================
+# 1. 계획 (하위 질문 DAG)
+# ==========================================
+def parse_plan(text: str, max_steps: int = 4) -> Optional[List[Dict[str, Any]]]:
+    """
+    플래너 응답을 [{'id', 'question', 'depends_on'}, ...]로 바꿉니다.
+    형식이 깨졌거나, 없는 id를 참조하거나, 순환이 있으면 None (원래 체인으로 대체).
+    """
+    match = _JSON_OBJECT.search(text or "")
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    raw = data.get("steps") if isinstance(data, dict) else None
+    if not isinstance(raw, list):
+        return None
+
+    steps: List[Dict[str, Any]] = []
+    for i, item in enumerate(raw[:max_steps], 1):
+        if not isinstance(item, dict) or not str(item.get("question") or "").strip():
+            continue
+        steps.append({
+            "id": str(item.get("id") or f"s{i}"),
+            "question": str(item["question"]).strip(),
+            "depends_on": [str(d) for d in item.get("depends_on") or []],
+        })
+    ids = [step["id"] for step in steps]
+    if not steps or len(set(ids)) != len(ids):
+        return None
+    for step in steps:
+        if any(dep not in ids or dep == step["id"] for dep in step["depends_on"]):
+            return None
+    return steps if waves(steps) is not None else None
+
+
+def waves(steps: List[Dict[str, Any]]) -> Optional[List[List[Dict[str, Any]]]]:
+    """의존성을 따라 동시에 실행할 묶음으로 나눕니다. 순환이 있으면 None."""
+    done: set = set()
+    pending = list(steps)
+    result = []
+    while pending:
+        ready = [s for s in pending if all(dep in done for dep in s["depends_on"])]
+        if not ready:
+            return None
+        result.append(ready)
+        done.update(s["id"] for s in ready)
+        pending = [s for s in pending if s["id"] not in done]
+    return result
+
+
+# ==========================================
+# 2. 결과 압축
+# ==========================================
+def _compact_value(value: Any) -> Any:
+    """노드/관계 dict는 id/name만, 긴 리스트는 앞부분만 남깁니다."""
+    if isinstance(value, dict):
+        for key in ("id", "name"):
+            if value.get(key) is not None:
+                return value[key]
+        return {k: _compact_value(v) for k, v in list(value.items())[:6]}
+    if isinstance(value, (list, tuple)):
+        return [_compact_value(v) for v in value[:10]]
+    return value
+
+
+def compact_rows(rows: List[Dict[str, Any]], limit: int = 8) -> List[Dict[str, Any]]:
+    """행을 압축하고 중복을 지운 뒤 앞에서 limit개만 남깁니다."""
+    seen = set()
+    compact = []
+    for row in rows:
+        row = {k: _compact_value(v) for k, v in row.items()}
+        key = json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+        if key in seen:
+            continue
+        seen.add(key)
+        compact.append(row)
+        if len(compact) >= limit:
+            break
+    return compact
+
+
+def _mention(rows: List[Dict[str, Any]], limit: int = 5) -> str:
+    """의존 단계의 결과를 다음 하위 질문에 끼워 넣을 짧은 문자열로 만듭니다."""
+    values = []
+    for row in rows:
+        for value in row.values():
+            if isinstance(value, (str, int, float)) and str(value) not in values:
+                values.append(str(value))
+                break
+    return ", ".join(values[:limit]) or "(기록 없음)"
+
+
+# ==========================================
+# 3. 플래너 체인
+# ==========================================
+class QuestionPlanner:
+    """
+    TieredCypherQAChain 앞에 두는 체인. invoke({"query": 질문}) → 체인과 같은 형태의 dict
+    분해했을 때는 'plan'에 하위 질문별 {'id', 'question', 'depends_on', 'query', 'rows'}가 더해지고,
+    intermediate_steps는 [{'query': 하위 쿼리}, ..., {'context': 압축된 하위 결과}]입니다.
+    """
+
+    def __init__(self, chain, planner_llm, enabled: Optional[bool] = None, max_steps: Optional[int] = None,
+                 rows_per_step: Optional[int] = None):
+        self.chain = chain
+        self.planner_llm = planner_llm
+        self.enabled = _env_bool("QUESTION_PLANNER", True) if enabled is None else enabled
+        self.max_steps = max_steps or int(os.getenv("PLANNER_MAX_STEPS", 4))
+        self.rows_per_step = rows_per_step or int(os.getenv("PLANNER_ROWS", 8))
+
+    def plan(self, question: str, config=None) -> Optional[List[Dict[str, Any]]]:
+        """질문을 하위 질문 DAG로 나눕니다. 나눌 필요가 없거나 실패하면 None."""
+        text = (PLANNER_PROMPT | self.planner_llm | StrOutputParser()).invoke(
+            {"question": question, "max_steps": self.max_steps}, config=stage_config(config, "planner")
+        )
+        steps = parse_plan(text, self.max_steps)
+        return steps if steps and len(steps) > 1 else None
+
+    def _run_step(self, step: Dict[str, Any], results: Dict[str, Dict[str, Any]], config=None) -> Dict[str, Any]:
+        question = _PLACEHOLDER.sub(
+            lambda m: _mention(results[m.group(1)]["rows"]) if m.group(1) in results else m.group(0),
+            step["question"],
+        )
+        cypher, rows, _ = self.chain.retrieve(question, config)
+        return {**step, "question": question, "query": cypher, "rows": compact_rows(rows, self.rows_per_step)}
+
+    def invoke(self, inputs: Any, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        question = inputs["query"] if isinstance(inputs, dict) else str(inputs)
+        steps = self.plan(question, config) if self.enabled and is_compound(question) else None
+        if not steps:
+            return self.chain.invoke({"query": question}, config=config)
+
+        if self.chain.verbose:
+            print("\n[PLAN]\n" + "\n".join(
+                f"  {s['id']}: {s['question']}" + (f"  (← {', '.join(s['depends_on'])})" if s["depends_on"] else "")
+                for s in steps
+            ))
+
+        # 같은 묶음의 하위 질문은 작업 스레드에서 동시에 조회합니다. (요청 범위/취소는 거버너가 이어줌)
+        governor = getattr(self.chain.graph, "governor", None)
+        results: Dict[str, Dict[str, Any]] = {}
+        for wave in waves(steps):
+            run = self._run_step if governor is None else governor.bind(self._run_step)
+            if len(wave) == 1:
+                done = [run(wave[0], results, config)]
+            else:
+                with ThreadPoolExecutor(max_workers=len(wave)) as pool:
+                    done = list(pool.map(lambda s: run(s, results, config), wave))
+            results.update((r["id"], r) for r in done)
+
+        plan = [results[s["id"]] for s in steps]
+        context = [{"sub_question": r["question"], "rows": r["rows"]} for r in plan]
+        answer = self.chain.answer(question, context, config)
+        return {
+            "query": question,
+            "result": answer,
+            "intermediate_steps": [{"query": r["query"]} for r in plan] + [{"context": context}],
+            "plan": plan,
+            "route": {"answer": "llm", "planned": len(plan)},
+        }
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 출처 인덱스 (Chunk Provenance Index)
+그래프의 사실이 어느 문장에서 나왔는지 연결된 곳이 없어서, 프로파일러가 "Orlando Anderson SHOT_AT Tupac"이라고
+말해도 근거 문장을 보여주려면 추출을 다시 돌리거나 원문을 뒤져야 했습니다.
+
+수집할 때 ProvenanceIndex.record()가
+    1. 청크를 본문 해시(id)로 (:Document {id, text, source, section, chunk, source_start, source_end}) 노드에 한 번만 저장하고
+       (Document.id 유니크 제약 = 인덱스)
+    2. 노드/관계마다 근거 참조를 evidence 속성(문자열 리스트)에 덧붙입니다.
+           "3f2a9c1d0b7e4a55:120-168"  = 청크 해시 : 청크 본문 안 글자 구간 (근거 문장)
+       문장은 노드 id와 별칭(한국어 이름 포함)이 나오는 곳을 Aho–Corasick 한 번의 스캔으로 찾고,
+       관계는 두 끝이 함께 나오는 문장을 고릅니다. 못 찾으면 청크 본문 전체 구간을 씁니다.
+
+조회는 사실의 evidence → Document.id 인덱스 한 번(1-hop)이면 끝납니다.
+    index.citations(["3f2a9c1d0b7e4a55:120-168"])  → [{'ref', 'quote', 'source', 'section', ...}]
+    index.cite(rows)                                  → evidence 열이 있는 결과 행마다 근거 문장
+
+Document.source_start/source_end는 loaders.source_span()으로 되돌린 원본 파일 위치입니다.
+
+환경 변수:
+    PROVENANCE           : 수집 시 출처 기록 (기본 true)
+    PROVENANCE_MAX_REFS  : 노드/관계 하나에 남길 최대 근거 수 (기본 5)
+"""
+import hashlib
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from chunker import split_units
+from entity_prefilter import MIN_PART_LEN, AhoCorasick
+from loaders import source_span
+from pattern_extractor import ENTITIES
+from schema_selector import ENTITY_ALIASES
+from triple_dedup import normalize_id
+
+DOCUMENT_LABEL = "Document"
+EVIDENCE_PROPERTY = "evidence"
+
+_REF = re.compile(r"^([0-9a-f]+):(\d+)-(\d+)$")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def chunk_id(text: str) -> str:
+    """청크 본문 해시 (같은 본문은 몇 번 수집해도 같은 Document)"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def make_ref(chunk_hash: str, start: int, end: int) -> str:
+    return f"{chunk_hash}:{start}-{end}"
+
+
+def parse_ref(ref: str) -> Optional[Tuple[str, int, int]]:
+    match = _REF.match(str(ref))
+    if not match:
+        return None
+    return match.group(1), int(match.group(2)), int(match.group(3))
+
+
+def _label(value: str) -> str:
+    return "`" + str(value).replace("`", "") + "`"
+
+
+def _is_ascii_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+def entity_aliases() -> Dict[str, List[str]]:
+    """정규화한 노드 id → 한국어 이름/별칭 (schema_selector.ENTITY_ALIASES + pattern_extractor.ENTITIES)"""
+    aliases: Dict[str, List[str]] = {}
+    for alias, target in ENTITY_ALIASES.items():
+        aliases.setdefault(normalize_id(target), []).append(alias)
+    for target, (_, names) in ENTITIES.items():
+        aliases.setdefault(normalize_id(target), []).extend(names)
+    return aliases
+
+
+# ==========================================
+# 1. 근거 문장 찾기
+# ==========================================
+class _Mentions:
+    """노드 id → 이름/별칭 오토마톤. 청크마다 한 번 스캔해 (id → 나온 위치들)을 돌려줍니다."""
+
+    def __init__(self, node_ids: Iterable[str]):
+        self.automaton = AhoCorasick()
+        self.owners: Dict[str, set] = {}
+        korean = entity_aliases()
+        for node_id in node_ids:
+            key = normalize_id(node_id)
+            names = [str(node_id)] + korean.get(key, [])
+            names += [part for part in re.split(r"[\s\-]+", str(node_id)) if len(part) >= MIN_PART_LEN]
+            for name in names:
+                word = " ".join(name.split()).casefold()
+                self.automaton.add(word)
+                self.owners.setdefault(word, set()).add(key)
+
+    def scan(self, text: str) -> Dict[str, List[int]]:
+        lowered = text.casefold()
+        found: Dict[str, List[int]] = {}
+        for end, word in self.automaton.iter(lowered):
+            start = end - len(word)
+            if _is_ascii_word_char(word[0]) and start > 0 and _is_ascii_word_char(lowered[start - 1]):
+                continue
+            if _is_ascii_word_char(word[-1]) and end < len(lowered) and _is_ascii_word_char(lowered[end]):
+                continue
+            for key in self.owners.get(word, ()):
+                found.setdefault(key, []).append(start)
+        return found
+
+
+class _ChunkView:
+    """청크 하나의 문장 구간과 이름 위치"""
+
+    def __init__(self, chunk, mentions: _Mentions):
+        text = chunk.page_content
+        metadata = chunk.metadata or {}
+        self.chunk = chunk
+        self.id = chunk_id(text)
+        self.body_offset = metadata.get("body_offset", 0)
+        self.body = (self.body_offset, len(text.rstrip()))
+        # 앞 문맥(절 제목, 앞 문장)은 이전 청크의 본문이므로 본문 문장을 먼저 봅니다.
+        units = [(s, e) for s, e, is_header in split_units(text) if not is_header]
+        self.sentences = [u for u in units if u[0] >= self.body_offset] + [u for u in units if u[0] < self.body_offset]
+        self.found = mentions.scan(text)
+
+    def sentence_with(self, *keys: str) -> Optional[Tuple[int, int]]:
+        positions = [self.found.get(key, []) for key in keys]
+        if not all(positions):
+            return None
+        for start, end in self.sentences:
+            if all(any(start <= pos < end for pos in p) for p in positions):
+                return start, end
+        return None
+
+    def ref(self, *keys: str) -> str:
+        span = self.sentence_with(*keys)
+        if span is None and len(keys) > 1:
+            # 두 끝이 한 문장에 없으면 한쪽이라도 나오는 문장
+            span = next((s for s in (self.sentence_with(key) for key in keys) if s), None)
+        return make_ref(self.id, *(span or self.body))
+
+
+# ==========================================
+# 2. 인덱스
+# ==========================================
+class ProvenanceIndex:
+    """
+    청크(Document 노드)와 사실(노드/관계의 evidence 속성)을 잇는 출처 인덱스.
+
+    사용 예:
+        index = ProvenanceIndex(graph)
+        index.record(chunks, graph_documents)      # merge_graph_documents() 결과, add_graph_documents() 뒤에
+        index.cite(rows)                           # rows: evidence 열이 있는 쿼리 결과
+    """
+
+    def __init__(self, graph, max_refs: Optional[int] = None, enabled: Optional[bool] = None):
+        self.graph = graph
+        self.max_refs = max_refs or int(os.getenv("PROVENANCE_MAX_REFS", 5))
+        self.enabled = _env_bool("PROVENANCE", True) if enabled is None else enabled
+        self._indexed = False
+
+    def ensure_index(self) -> None:
+        if self._indexed:
+            return
+        self.graph.query(
+            f"CREATE CONSTRAINT document_id IF NOT EXISTS FOR (d:{DOCUMENT_LABEL}) REQUIRE d.id IS UNIQUE"
+        )
+        self._indexed = True
+
+    # ---------- 기록 ----------
+    def record(self, chunks: List[Any], graph_documents: List[Any]) -> Dict[str, int]:
+        """
+        청크를 Document 노드로 저장하고, 방금 쓴 노드/관계에 근거 참조를 덧붙입니다.
+
+        Args:
+            chunks: 수집한 청크 (TokenChunker.split_documents() 결과)
+            graph_documents: merge_graph_documents() 결과 (관계의 source_chunks로 근거 청크를 찾음)
+
+        Returns:
+            dict: {'documents', 'nodes', 'relationships'} 기록한 개수
+        """
+        stats = {"documents": 0, "nodes": 0, "relationships": 0}
+        if not self.enabled or not chunks:
+            return stats
+        self.ensure_index()
+
+        node_ids = {node.id for doc in graph_documents for node in doc.nodes}
+        node_ids.update(end.id for doc in graph_documents for rel in doc.relationships for end in (rel.source, rel.target))
+        mentions = _Mentions(node_ids)
+        views = [_ChunkView(chunk, mentions) for chunk in chunks]
+        by_number = {(view.chunk.metadata or {}).get("chunk", i): view for i, view in enumerate(views)}
+        by_source = {id(view.chunk): view for view in views}
+
+        def home_of(doc) -> Optional[_ChunkView]:
+            return by_source.get(id(doc.source)) or by_number.get((getattr(doc.source, "metadata", None) or {}).get("chunk"))
+
+        stats["documents"] = self._store_chunks(views)
+
+        # 노드: 이름이 나오는 청크들, 없으면 처음 추출된 청크 본문
+        node_rows: Dict[str, Dict[str, List[str]]] = {}
+        for doc in graph_documents:
+            home = home_of(doc)
+            for node in doc.nodes:
+                key = normalize_id(node.id)
+                refs = [view.ref(key) for view in views if key in view.found][:self.max_refs]
+                if not refs and home is not None:
+                    refs = [home.ref(key)]
+                if refs:
+                    node_rows.setdefault(node.type, {})[node.id] = refs
+
+        # 관계: 근거 청크(source_chunks)에서 두 끝이 함께 나오는 문장
+        rel_rows: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+        for doc in graph_documents:
+            home = home_of(doc)
+            for rel in doc.relationships:
+                keys = (normalize_id(rel.source.id), normalize_id(rel.target.id))
+                numbers = (rel.properties or {}).get("source_chunks") or []
+                support = [by_number[n] for n in numbers if n in by_number] or ([home] if home else [])
+                refs = [view.ref(*keys) for view in support][:self.max_refs]
+                if refs:
+                    rel_rows.setdefault((rel.source.type, rel.type, rel.target.type), []).append(
+                        {"source": rel.source.id, "target": rel.target.id, "refs": refs}
+                    )
+
+        append = (f"SET x.{EVIDENCE_PROPERTY} = (coalesce(x.{EVIDENCE_PROPERTY}, []) + "
+                  f"[ref IN row.refs WHERE NOT ref IN coalesce(x.{EVIDENCE_PROPERTY}, [])])[..$max_refs]")
+        for label, rows in node_rows.items():
+            self.graph.query(
+                f"UNWIND $rows AS row MATCH (x:{_label(label)} {{id: row.id}}) {append}",
+                {"rows": [{"id": node_id, "refs": refs} for node_id, refs in rows.items()], "max_refs": self.max_refs},
+            )
+            stats["nodes"] += len(rows)
+        for (source_label, rel_type, target_label), rows in rel_rows.items():
+            self.graph.query(
+                f"UNWIND $rows AS row "
+                f"MATCH (:{_label(source_label)} {{id: row.source}})-[x:{_label(rel_type)}]->(:{_label(target_label)} {{id: row.target}}) "
+                f"{append}",
+                {"rows": rows, "max_refs": self.max_refs},
+            )
+            stats["relationships"] += len(rows)
+        return stats
+
+    def _store_chunks(self, views: List[_ChunkView]) -> int:
+        rows = []
+        seen = set()
+        for view in views:
+            if view.id in seen:
+                continue
+            seen.add(view.id)
+            metadata = view.chunk.metadata or {}
+            start, end = source_span(metadata, metadata.get("start", 0), metadata.get("end", 0))
+            rows.append({
+                "id": view.id,
+                "text": view.chunk.page_content,
+                "source": metadata.get("source"),
+                "section": metadata.get("section"),
+                "chunk": metadata.get("chunk"),
+                "source_start": start,
+                "source_end": end,
+            })
+        self.graph.query(
+            f"UNWIND $rows AS row MERGE (d:{DOCUMENT_LABEL} {{id: row.id}}) "
+            "ON CREATE SET d.text = row.text, d.source = row.source, d.section = row.section, "
+            "d.chunk = row.chunk, d.source_start = row.source_start, d.source_end = row.source_end",
+            {"rows": rows},
+        )
+        return len(rows)
+
+    # ---------- 조회 ----------
+    def citations(self, refs: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        근거 참조 → 근거 문장. Document.id 인덱스 한 번으로 찾습니다.
+
+        Returns:
+            list: [{'ref', 'quote', 'source', 'section', 'source_start', 'source_end'}, ...] (refs 순서)
+        """
+        refs = [ref for ref in dict.fromkeys(refs) if parse_ref(ref)]
+        if not refs:
+            return []
+        rows = self.graph.query(
+            "UNWIND $refs AS ref "
+            "WITH ref, split(ref, ':') AS parts "
+            f"MATCH (d:{DOCUMENT_LABEL} {{id: parts[0]}}) "
+            "WITH ref, d, [x IN split(parts[1], '-') | toInteger(x)] AS span "
+            "RETURN ref, substring(d.text, span[0], span[1] - span[0]) AS quote, "
+            "d.source AS source, d.section AS section, d.source_start AS source_start, d.source_end AS source_end",
+            {"refs": refs},
+        )
+        by_ref = {row["ref"]: row for row in rows}
+        return [by_ref[ref] for ref in refs if ref in by_ref]
+
+    def cite(self, rows: List[Dict[str, Any]], per_row: int = 1, column: str = EVIDENCE_PROPERTY) -> List[Dict[str, Any]]:
+        """
+        evidence 열이 있는 결과 행마다 근거 문장을 붙입니다. (조회는 한 번)
+
+        Returns:
+            list: [{'row': 원래 행, 'citations': [...]}, ...] 근거가 있는 행만
+        """
+        wanted = [(row, list(row.get(column) or [])[:per_row]) for row in rows]
+        found = {c["ref"]: c for c in self.citations(ref for _, refs in wanted for ref in refs)}
+        out = []
+        for row, refs in wanted:
+            cited = [found[ref] for ref in refs if ref in found]
+            if cited:
+                out.append({"row": row, "citations": cited})
+        return out
+
+    def facts_between(self, ids: Iterable[str], limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        주어진 노드 id들 사이의 근거 있는 관계. (답변에 나온 엔티티들의 근거 문장을 보여줄 때)
+        시작 노드는 라벨별 MATCH를 UNION으로 묶어 찾으므로 각 라벨의 id 인덱스를 탑니다. (전체 노드 스캔 없음)
+        """
+        ids = [str(i) for i in dict.fromkeys(ids) if i is not None]
+        if len(ids) < 2:
+            return []
+        branches = [
+            f"MATCH (s:{_label(label)}) WHERE s.id IN $ids "
+            f"MATCH (s)-[r]->(t) WHERE t.id IN $ids AND r.{EVIDENCE_PROPERTY} IS NOT NULL "
+            f"RETURN s.id AS source, type(r) AS relation, t.id AS target, r.{EVIDENCE_PROPERTY} AS evidence "
+            "LIMIT $limit"
+            for label in sorted(self._entity_labels())
+        ]
+        if not branches:
+            return []
+        return self.graph.query(" UNION ".join(branches), {"ids": ids, "limit": limit})[:limit]
+
+    def _entity_labels(self) -> Set[str]:
+        """엔티티 라벨 (DB의 라벨 이름, 없으면 스키마의 라벨. Document 제외)"""
+        cache = getattr(self.graph, "schema_cache", None)
+        if cache is not None:
+            labels = set(cache.db_names()[0])
+        else:
+            structured = getattr(self.graph, "structured_schema", None) or {}
+            labels = set(structured.get("node_props", {}))
+        return labels - {DOCUMENT_LABEL}
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - LLM 생성 Cypher 쿼리 거버너
+체인이 실행하는 모든 쿼리에 다음 제한을 겁니다.
+    - 쿼리별 트랜잭션 타임아웃
+    - 결과 행 수 / 결과 크기 상한 (넘으면 즉시 스트리밍 중단)
+    - 읽기 전용 (쓰기 절 사전 차단 + READ 세션 모드로 서버 측 강제)
+    - 사용자가 요청을 버리면 서버 트랜잭션까지 취소
+
+환경 변수:
+    GOVERNOR_TIMEOUT_S  : 쿼리 타임아웃 (초, 기본 15)
+    GOVERNOR_MAX_ROWS   : 최대 결과 행 수 (기본 1000)
+    GOVERNOR_MAX_BYTES  : 최대 결과 크기 (바이트, 기본 1MB)
+    GOVERNOR_READ_ONLY  : "true"(기본) 이면 쓰기 쿼리 거부
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from cypher_rewriter import (CypherRewriter, SchemaCache, load_db_names, load_graph_version, lookup_anchor_labels,
+                             rewrite_enabled)
+from query_profiler import ProfilingNeo4jGraph, collect_profiles, current_profiles, cypher_errors
+
+# 쓰기/관리 절 (문자열 리터럴 안의 단어는 제외하고 검사)
+_WRITE_CLAUSES = re.compile(
+    r"\b(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|LOAD\s+CSV|FOREACH|"
+    r"TERMINATE|ALTER|GRANT|REVOKE|DENY|START\s+DATABASE|STOP\s+DATABASE)\b"
+    r"|\bCALL\s+(apoc\.(create|merge|refactor|periodic|do|cypher\.run(Write|Many)|nodes\.delete)|db\.create|dbms\.)",
+    re.IGNORECASE,
+)
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_COMMENT = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+
+_local = threading.local()
+
+
+class QueryGovernorError(Exception):
+    """거버너가 쿼리를 막거나 중단했을 때 발생합니다."""
+
+
+class QueryRejected(QueryGovernorError):
+    """읽기 전용 정책 위반 등으로 실행 전에 거부된 쿼리"""
+
+
+class QueryCancelled(QueryGovernorError):
+    """사용자가 요청을 버려 중단된 쿼리"""
+
+
+class QueryTimeout(QueryGovernorError):
+    """트랜잭션 타임아웃을 넘긴 쿼리"""
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def find_write_clause(query: str) -> Optional[str]:
+    """쿼리에 쓰기/관리 절이 있으면 해당 키워드를, 없으면 None을 반환합니다."""
+    stripped = _STRING_LITERAL.sub("''", _COMMENT.sub(" ", query))
+    match = _WRITE_CLAUSES.search(stripped)
+    return match.group(0).upper() if match else None
+
+
+class QueryGovernor:
+    """
+    요청(질문) 단위로 쿼리 제한과 취소를 관리합니다.
+    하나의 인스턴스를 앱 전체에서 공유하고, 요청마다 request()로 범위를 엽니다.
+    """
+
+    def __init__(
+        self,
+        timeout_s: Optional[float] = None,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        read_only: Optional[bool] = None,
+    ):
+        self.timeout_s = float(timeout_s if timeout_s is not None else os.getenv("GOVERNOR_TIMEOUT_S", 15))
+        self.max_rows = int(max_rows if max_rows is not None else os.getenv("GOVERNOR_MAX_ROWS", 1000))
+        self.max_bytes = int(max_bytes if max_bytes is not None else os.getenv("GOVERNOR_MAX_BYTES", 1024 * 1024))
+        self.read_only = read_only if read_only is not None else _env_bool("GOVERNOR_READ_ONLY", True)
+
+        self._lock = threading.Lock()
+        self._active: Dict[str, threading.Event] = {}
+        self._graphs: List["GovernedNeo4jGraph"] = []
+
+    # ---------- 요청 범위 ----------
+    @contextmanager
+    def request(self, request_id: Optional[str] = None):
+        """
+        현재 스레드에 요청 범위를 엽니다. 범위 안의 쿼리는 이 요청의 취소 신호를 따릅니다.
+
+        Yields:
+            dict: 요청 통계 {'request_id', 'queries', 'rows', 'truncated', 'rewrites', 'db_ms'}
+        """
+        request_id = request_id or uuid.uuid4().hex
+        with self._lock:
+            cancel_event = self._active.setdefault(request_id, threading.Event())
+        stats = {"request_id": request_id, "queries": 0, "rows": 0, "truncated": False, "rewrites": [], "db_ms": 0.0}
+
+        previous = getattr(_local, "scope", None)
+        _local.scope = (request_id, cancel_event, stats)
+        try:
+            yield stats
+        finally:
+            _local.scope = previous
+            with self._lock:
+                self._active.pop(request_id, None)
+
+    def current(self) -> Tuple[Optional[str], Optional[threading.Event], Optional[Dict[str, Any]]]:
+        return getattr(_local, "scope", None) or (None, None, None)
+
+    def bind(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        현재 스레드의 요청 범위(취소 신호, 통계)와 프로파일 수집기를 fn에 묶습니다.
+        한 요청 안에서 쿼리를 여러 작업 스레드로 나눠 실행할 때 사용합니다.
+        """
+        scope = getattr(_local, "scope", None)
+        profiles = current_profiles()
+
+        def _bound(*args, **kwargs):
+            previous = getattr(_local, "scope", None)
+            _local.scope = scope
+            try:
+                with collect_profiles(profiles):
+                    return fn(*args, **kwargs)
+            finally:
+                _local.scope = previous
+
+        return _bound
+
+    def cancel(self, request_id: str) -> None:
+        """요청을 취소합니다. 클라이언트 스트리밍을 멈추고 서버의 트랜잭션도 종료합니다."""
+        with self._lock:
+            cancel_event = self._active.get(request_id)
+            graphs = list(self._graphs)
+        if cancel_event is not None:
+            cancel_event.set()
+        for graph in graphs:
+            graph.terminate_request(request_id)
+
+    def run_cancellable(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        heartbeat: Optional[Callable[[float], None]] = None,
+        poll_interval: float = 0.5,
+        **kwargs,
+    ) -> Any:
+        """
+        fn을 작업 스레드에서 실행하고, 호출 스레드는 완료를 기다리며 heartbeat(경과 초)를 부릅니다.
+        기다리는 도중 예외(Ctrl+C, Streamlit 재실행 등)가 발생하면 요청을 취소하고 예외를 다시 던집니다.
+        """
+        request_id = uuid.uuid4().hex
+
+        def _scoped():
+            with self.request(request_id):
+                return fn(*args, **kwargs)
+
+        started = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(_scoped)
+        try:
+            while True:
+                try:
+                    return future.result(timeout=poll_interval)
+                except FutureTimeout:
+                    if heartbeat:
+                        heartbeat(time.perf_counter() - started)
+        except BaseException:
+            if not future.done():
+                self.cancel(request_id)
+            raise
+        finally:
+            executor.shutdown(wait=False)
+
+    # ---------- 정책 ----------
+    def check(self, query: str) -> None:
+        """실행 전 정책 검사. 위반 시 QueryRejected를 던집니다."""
+        if self.read_only:
+            clause = find_write_clause(query)
+            if clause:
+                raise QueryRejected(f"읽기 전용 모드에서는 '{clause}' 절을 실행할 수 없습니다.")
+
+    def register(self, graph: "GovernedNeo4jGraph") -> None:
+        with self._lock:
+            self._graphs.append(graph)
+
+
+# 앱 전체에서 공유하는 기본 거버너
+default_governor = QueryGovernor()
+
+
+class GovernedNeo4jGraph(ProfilingNeo4jGraph):
+    """
+    QueryGovernor의 제한을 적용해 쿼리를 실행하는 그래프 래퍼.
+    PROFILE/EXPLAIN 수집(ProfilingNeo4jGraph)과 함께 동작하며,
+    CYPHER_REWRITE가 켜져 있으면 실행 전에 CypherRewriter로 쿼리를 재작성합니다.
+    """
+
+    def __init__(self, *args, governor: Optional[QueryGovernor] = None,
+                 rewriter: Optional[CypherRewriter] = None, **kwargs):
+        self.governor = governor or default_governor
+        self.rewriter = None
+        self.schema_cache = None
+        super().__init__(*args, **kwargs)  # 스키마 조회(APOC)는 거버너 제한 없이 실행 (internal_queries)
+        # 앵커 id의 라벨은 쿼리에 나온 값만 id 인덱스로 찾고, 그래프 버전이 바뀔 때만 캐시를 비웁니다.
+        # (거버너 제한 없이 조회)
+        run = lambda q, p=None: ProfilingNeo4jGraph._execute(self, q, p or {})[0]
+        self.schema_cache = rewriter.schema if rewriter is not None else SchemaCache(
+            self.structured_schema,
+            lookup=lambda op, value, labels: lookup_anchor_labels(run, op, value, labels),
+            version=lambda: load_graph_version(run),
+            names=lambda: load_db_names(run),
+            ttl_s=30.0,
+        )
+        if rewriter is None and rewrite_enabled():
+            rewriter = CypherRewriter(self.schema_cache)
+        self.rewriter = rewriter
+        self._schema_lock = threading.Lock()
+        self._schema_version = self.schema_cache.graph_version()
+        self._forced_version = None
+        self.governor.register(self)
+
+    @property
+    def _governing(self) -> bool:
+        return self._profiling_enabled
+
+    def refresh_schema(self) -> None:
+        super().refresh_schema()
+        if getattr(self, "schema_cache", None) is not None:
+            self.schema_cache.set_schema(self.structured_schema)
+
+    def sync_schema(self, force: bool = False) -> bool:
+        """
+        스키마를 읽은 뒤 그래프 버전(노드/관계 수)이 바뀌었으면(force면 항상) 스키마를 다시 읽습니다.
+        structured_schema가 새 dict가 되므로 검증기(cypher_validator.get_validator)도 다시 만들어집니다.
+        (버전 조회는 schema_cache의 ttl_s마다 한 번)
+
+        Returns:
+            bool: 다시 읽었으면 True
+        """
+        version = self.schema_cache.graph_version()
+        # 강제로 다시 읽는 것은 그래프 버전마다 한 번 (표본에 계속 안 잡히는 이름 때문에 매번 읽지 않도록)
+        force = force and self._forced_version != version
+        if not force and version == self._schema_version:
+            return False
+        with self._schema_lock:
+            if not force and version == self._schema_version:
+                return False
+            self.refresh_schema()
+            self._schema_version = version
+            if force:
+                self._forced_version = version
+        return True
+
+    def db_names(self) -> Set[str]:
+        """DB에 실제로 있는 라벨/관계 타입 이름 (토큰 조회라 그래프 크기와 무관, 캐시된 스키마가 낡았는지 확인용)."""
+        labels, types = self.schema_cache.db_names(fresh=True)
+        return labels | types
+
+    def query(self, query: str, params: Optional[dict] = None, *args, **kwargs) -> List[Dict[str, Any]]:
+        if self._governing:
+            # 수집 스크립트가 그래프를 바꿨으면 재작성/검증 전에 스키마를 다시 읽습니다. (버전 조회는 ttl마다 한 번)
+            self.sync_schema()
+        if self._governing and self.rewriter is not None:
+            rewritten, params, changes = self.rewriter.rewrite(query, params)
+            if changes:
+                # 출력은 체인이 verbose일 때만 합니다. (TieredCypherQAChain이 요청 통계의 rewrites를 로그로 남김)
+                stats = self.governor.current()[2]
+                if stats is not None:
+                    stats["rewrites"].append({"original": query, "rewritten": rewritten, "changes": changes})
+            query = rewritten
+        return super().query(query, params, *args, **kwargs)
+
+    def _run(self, query: str, params: Dict[str, Any], *args, **kwargs) -> List[Dict[str, Any]]:
+        # 실제 쿼리도 거버너 제한(_execute)을 거치고, 오류/값 정제는 Neo4jGraph.query와 같게 맞춥니다.
+        if not self._governing:
+            return super()._run(query, params, *args, **kwargs)
+        with cypher_errors():
+            rows, _ = self._execute(query, params)
+        return self._sanitize_rows(rows)
+
+    def _execute(self, query: str, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Any]:
+        if not self._governing:
+            return super()._execute(query, params)
+
+        from neo4j import READ_ACCESS, WRITE_ACCESS
+        from neo4j.exceptions import ClientError
+
+        governor = self.governor
+        governor.check(query)
+        request_id, cancel_event, stats = governor.current()
+        metadata = {"app": "hiphop-noir", "request_id": request_id or "-"}
+
+        rows: List[Dict[str, Any]] = []
+        size = 0
+        summary = None
+        truncated = False
+
+        access_mode = READ_ACCESS if governor.read_only else WRITE_ACCESS
+        started = time.perf_counter()
+        with self._driver.session(
+            database=self._database,
+            default_access_mode=access_mode,
+            fetch_size=min(governor.max_rows, 1000),
+        ) as session:
+            tx = session.begin_transaction(timeout=governor.timeout_s, metadata=metadata)
+            try:
+                result = tx.run(query, params)
+                for record in result:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise QueryCancelled("사용자가 요청을 취소했습니다.")
+                    row = record.data()
+                    size += len(json.dumps(row, ensure_ascii=False, default=str))
+                    rows.append(row)
+                    if len(rows) >= governor.max_rows or size >= governor.max_bytes:
+                        # 남은 결과는 받지 않고 트랜잭션을 닫아 서버 작업을 중단시킵니다.
+                        truncated = True
+                        break
+                if not truncated:
+                    summary = result.consume()
+            except ClientError as e:
+                if "TransactionTimedOut" in (e.code or ""):
+                    raise QueryTimeout(f"쿼리가 {governor.timeout_s:g}초 안에 끝나지 않았습니다.") from e
+                if "Terminated" in (e.code or "") and cancel_event is not None and cancel_event.is_set():
+                    raise QueryCancelled("사용자가 요청을 취소했습니다.") from e
+                raise
+            finally:
+                # 읽기 전용이므로 커밋할 것이 없습니다. close()는 롤백 후 스트림을 버립니다.
+                tx.close()
+
+        if stats is not None:
+            with governor._lock:  # 같은 요청의 쿼리가 여러 스레드에서 동시에 끝날 수 있습니다.
+                stats["queries"] += 1
+                stats["rows"] += len(rows)
+                stats["truncated"] = stats["truncated"] or truncated
+                stats["db_ms"] = round(stats["db_ms"] + (time.perf_counter() - started) * 1000, 1)
+        return rows, summary
+
+    def terminate_request(self, request_id: str) -> None:
+        """request_id 메타데이터가 붙은 서버 트랜잭션을 종료합니다."""
+        find = (
+            "SHOW TRANSACTIONS YIELD transactionId, metaData "
+            "WHERE metaData.request_id = $request_id RETURN transactionId"
+        )
+        try:
+            with self._driver.session(database=self._database) as session:
+                ids = [r["transactionId"] for r in session.run(find, request_id=request_id)]
+                if ids:
+                    session.run("TERMINATE TRANSACTIONS $ids", ids=ids).consume()
+        except Exception:
+            # Neo4j 4.x에는 SHOW/TERMINATE TRANSACTIONS가 없으므로 프로시저로 재시도합니다.
+            try:
+                with self._driver.session(database=self._database) as session:
+                    session.run(
+                        "CALL dbms.listTransactions() YIELD transactionId, metaData "
+                        "WHERE metaData.request_id = $request_id "
+                        "CALL dbms.killTransaction(transactionId) YIELD message RETURN message",
+                        request_id=request_id,
+                    ).consume()
+            except Exception as e:
+                print(f"[GOVERNOR] 서버 트랜잭션 종료 실패 ({request_id}): {e}")
+
+
+def get_governed_graph(governor: Optional[QueryGovernor] = None, **kwargs) -> GovernedNeo4jGraph:
+    """.env 접속 정보로 거버너가 적용된 그래프를 만듭니다."""
+    return GovernedNeo4jGraph(
+        url=os.getenv("NEO4J_URI"),
+        username=os.getenv("NEO4J_USERNAME"),
+        password=os.getenv("NEO4J_PASSWORD"),
+        governor=governor,
+        **kwargs,
+    )
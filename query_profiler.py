@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - Cypher 쿼리 프로파일러 & 슬로우 쿼리 로그
+LLM이 생성한 쿼리와 템플릿 쿼리를 PROFILE(실행) 또는 EXPLAIN(계획만 따로 받고 쿼리는 그대로 실행)으로 돌려
+db hits, rows, 연산자 트리를 수집하고, 임계값을 넘는 쿼리는 회전 로그에 남깁니다.
+
+환경 변수:
+    CYPHER_PROFILE_MODE   : "off"(기본) | "profile" | "explain"
+    SLOW_QUERY_MS         : 슬로우 쿼리 판정 시간 임계값 (ms, 기본 500)
+    SLOW_QUERY_DB_HITS    : 슬로우 쿼리 판정 db hits 임계값 (기본 10000)
+    SLOW_QUERY_LOG        : 로그 파일 경로 (기본 logs/slow_queries.log)
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_community.graphs import Neo4jGraph
+
+from cypher_rewriter import INTERNAL_LABELS, public_schema
+
+PROFILE_MODES = ("off", "profile", "explain")
+
+# 이미 PROFILE/EXPLAIN이 붙은 쿼리에는 다시 붙이지 않습니다.
+_PLAN_PREFIX = re.compile(r"^\s*(PROFILE|EXPLAIN)\b", re.IGNORECASE)
+
+# 스레드별로 수집된 프로파일 (ask_detective 한 번의 호출 단위로 묶기 위함)
+_local = threading.local()
+
+
+def get_profile_mode() -> str:
+    """환경 변수에서 프로파일 모드를 읽습니다."""
+    mode = os.getenv("CYPHER_PROFILE_MODE", "off").strip().lower()
+    return mode if mode in PROFILE_MODES else "off"
+
+
+# ==========================================
+# 1. 실행 계획 요약
+# ==========================================
+def _operator_name(plan: Dict[str, Any]) -> str:
+    # 서버 버전에 따라 "NodeByLabelScan@neo4j" 처럼 접미사가 붙습니다.
+    return str(plan.get("operatorType", "?")).split("@")[0]
+
+
+def _operator_details(plan: Dict[str, Any]) -> str:
+    args = plan.get("args") or {}
+    return str(args.get("Details") or args.get("details") or "")
+
+
+def summarize_plan(plan: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    드라이버가 돌려준 PROFILE/EXPLAIN 계획을 가벼운 dict로 요약합니다.
+
+    Args:
+        plan: neo4j ResultSummary.profile 또는 ResultSummary.plan
+
+    Returns:
+        dict: {'db_hits', 'rows', 'operators': [평탄화된 연산자 목록], 'tree': 문자열 트리}
+    """
+    if not plan:
+        return {"db_hits": 0, "rows": 0, "operators": [], "tree": ""}
+
+    operators: List[Dict[str, Any]] = []
+    lines: List[str] = []
+
+    def walk(node: Dict[str, Any], depth: int) -> None:
+        args = node.get("args") or {}
+        db_hits = int(node.get("dbHits", 0) or 0)
+        rows = int(node.get("rows", args.get("EstimatedRows", 0)) or 0)
+        op = {
+            "operator": _operator_name(node),
+            "db_hits": db_hits,
+            "rows": rows,
+            "depth": depth,
+            "details": _operator_details(node),
+        }
+        operators.append(op)
+        lines.append(
+            f"{'  ' * depth}+{op['operator']} (hits={db_hits}, rows={rows}) {op['details']}".rstrip()
+        )
+        for child in node.get("children") or []:
+            walk(child, depth + 1)
+
+    walk(plan, 0)
+
+    return {
+        "db_hits": sum(op["db_hits"] for op in operators),
+        "rows": int(plan.get("rows", 0) or 0),
+        "operators": operators,
+        "tree": "\n".join(lines),
+    }
+
+
+def expensive_operators(profile: Dict[str, Any], top_n: int = 5) -> List[Dict[str, Any]]:
+    """db hits 기준으로 가장 비싼 연산자를 반환합니다. (AllNodesScan 등 라벨 없는 패턴 탐지용)"""
+    ops = profile.get("operators", [])
+    return sorted(ops, key=lambda op: (op["db_hits"], op["rows"]), reverse=True)[:top_n]
+
+
+# ==========================================
+# 2. 슬로우 쿼리 로그 (회전 파일)
+# ==========================================
+class SlowQueryLog:
+    """임계값을 넘는 쿼리의 프로파일을 JSON Lines 형식으로 회전 로그에 기록합니다."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold_ms: Optional[float] = None,
+        threshold_db_hits: Optional[int] = None,
+        max_bytes: int = 5 * 1024 * 1024,
+        backup_count: int = 5,
+    ):
+        self.path = path or os.getenv("SLOW_QUERY_LOG", os.path.join("logs", "slow_queries.log"))
+        self.threshold_ms = float(threshold_ms if threshold_ms is not None else os.getenv("SLOW_QUERY_MS", 500))
+        self.threshold_db_hits = int(
+            threshold_db_hits if threshold_db_hits is not None else os.getenv("SLOW_QUERY_DB_HITS", 10000)
+        )
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self._logger = logging.getLogger(f"hiphop_noir.slow_query.{os.path.abspath(self.path)}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._handler_lock = threading.Lock()
+
+    def _ensure_handler(self) -> None:
+        # 로그 디렉터리/파일은 실제로 슬로우 쿼리를 기록할 때 처음 만듭니다.
+        with self._handler_lock:
+            if self._logger.handlers:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            handler = RotatingFileHandler(
+                self.path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    def is_slow(self, profile: Dict[str, Any]) -> bool:
+        return (
+            profile.get("elapsed_ms", 0) >= self.threshold_ms
+            or profile.get("db_hits", 0) >= self.threshold_db_hits
+        )
+
+    def record(self, profile: Dict[str, Any]) -> bool:
+        """슬로우 쿼리면 기록하고 True를 반환합니다."""
+        if not self.is_slow(profile):
+            return False
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "mode": profile.get("mode"),
+            "elapsed_ms": profile.get("elapsed_ms"),
+            "db_hits": profile.get("db_hits"),
+            "rows": profile.get("rows"),
+            "query": profile.get("query"),
+            "top_operators": expensive_operators(profile),
+            "tree": profile.get("tree"),
+        }
+        self._ensure_handler()
+        self._logger.info(json.dumps(entry, ensure_ascii=False))
+        return True
+
+
+# ==========================================
+# 3. 프로파일 수집 (스레드 단위)
+# ==========================================
+@contextmanager
+def collect_profiles(profiles: Optional[List[Dict[str, Any]]] = None):
+    """
+    with 블록 안에서 실행된 쿼리들의 프로파일을 리스트로 모읍니다.
+    profiles를 넘기면 그 리스트에 이어서 모읍니다 (다른 스레드의 수집기를 이어받을 때).
+
+    사용 예:
+        with collect_profiles() as profiles:
+            chain.invoke(...)
+        # profiles -> [{'query': ..., 'db_hits': ..., ...}, ...]
+    """
+    previous = getattr(_local, "profiles", None)
+    profiles = [] if profiles is None else profiles
+    _local.profiles = profiles
+    try:
+        yield profiles
+    finally:
+        _local.profiles = previous
+
+
+def current_profiles() -> Optional[List[Dict[str, Any]]]:
+    """현재 스레드에서 열려 있는 프로파일 수집 리스트 (없으면 None)."""
+    return getattr(_local, "profiles", None)
+
+
+def _publish(profile: Dict[str, Any]) -> None:
+    sink = getattr(_local, "profiles", None)
+    if sink is not None:
+        sink.append(profile)
+
+
+# ==========================================
+# 4. 프로파일링 Neo4jGraph
+# ==========================================
+@contextmanager
+def cypher_errors():
+    """Neo4jGraph.query처럼 문법 오류를 ValueError로 바꿉니다. (체인이 잡는 예외 형태를 유지)"""
+    from neo4j.exceptions import CypherSyntaxError
+
+    try:
+        yield
+    except CypherSyntaxError as e:
+        raise ValueError(f"Generated Cypher Statement is not valid\n{e}") from e
+
+
+class ProfilingNeo4jGraph(Neo4jGraph):
+    """
+    Neo4jGraph.query()를 PROFILE/EXPLAIN으로 감싸는 그래프 래퍼.
+    GraphCypherQAChain에 그대로 넘길 수 있으며, 모드가 "off"면 기존과 동일하게 동작합니다.
+    """
+
+    def __init__(self, *args, profile_mode: Optional[str] = None, slow_log: Optional[SlowQueryLog] = None, **kwargs):
+        # 부모 __init__이 refresh_schema()로 query()를 호출하므로 먼저 설정합니다.
+        self.profile_mode = (profile_mode or get_profile_mode()).lower()
+        self.slow_log = slow_log or SlowQueryLog()
+        self._internal = threading.local()
+        super().__init__(*args, **kwargs)
+
+    @contextmanager
+    def internal_queries(self):
+        """이 스레드에서 with 블록 안의 쿼리(스키마 조회 등)는 프로파일하지 않습니다. 다른 스레드의 쿼리는 그대로입니다."""
+        previous = getattr(self._internal, "active", False)
+        self._internal.active = True
+        try:
+            yield
+        finally:
+            self._internal.active = previous
+
+    @property
+    def _profiling_enabled(self) -> bool:
+        return not getattr(self._internal, "active", False)
+
+    def refresh_schema(self) -> None:
+        # 스키마 조회(APOC)는 프로파일하지 않습니다. (__init__에서도 호출됨)
+        with self.internal_queries():
+            super().refresh_schema()
+        # 내부 라벨(Document, EntityVector)은 structured_schema를 읽는 곳(스키마 선택기, 검증기, 재작성기,
+        # 예시 저장소)과 프롬프트 스키마 문자열에서 모두 뺍니다.
+        if INTERNAL_LABELS & set(self.structured_schema.get("node_props") or {}):
+            from langchain_community.chains.graph_qa.cypher import construct_schema
+
+            self.structured_schema = public_schema(self.structured_schema)
+            self.schema = construct_schema(self.structured_schema, [], [])
+
+    def _execute(self, query: str, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Any]:
+        """쿼리를 실행하고 (rows, ResultSummary 또는 None)을 반환합니다. 하위 클래스에서 재정의합니다."""
+        from neo4j import Query
+
+        with self._driver.session(database=self._database) as session:
+            result = session.run(Query(text=query, timeout=self.timeout), params)
+            rows = [r.data() for r in result]
+            summary = result.consume()
+        return rows, summary
+
+    def _run(self, query: str, params: Dict[str, Any], *args, **kwargs) -> List[Dict[str, Any]]:
+        """접두어 없이 실제 쿼리를 실행합니다. 기본은 Neo4jGraph.query (문법 오류 래핑, 값 정제 포함)."""
+        return super().query(query, params, *args, **kwargs)
+
+    def query(self, query: str, params: Optional[dict] = None, *args, **kwargs) -> List[Dict[str, Any]]:
+        params = params or {}
+        mode = self.profile_mode if self._profiling_enabled else "off"
+        if mode == "off" or _PLAN_PREFIX.match(query):
+            return self._run(query, params, *args, **kwargs)
+
+        if mode == "profile":
+            # PROFILE은 쿼리를 실제로 실행하므로 결과 행도 함께 돌려받습니다.
+            started = time.perf_counter()
+            with cypher_errors():
+                rows, summary = self._execute(f"PROFILE {query}", params)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            rows = self._sanitize_rows(rows)
+            # 행 제한 등으로 결과를 끝까지 소비하지 않았다면 summary가 없을 수 있습니다.
+            plan = summary.profile if summary is not None else None
+        else:
+            # EXPLAIN은 행을 돌려주지 않으므로 계획만 따로 받고, 실제 쿼리는 그대로 실행합니다.
+            try:
+                _, summary = self._execute(f"EXPLAIN {query}", params)
+                plan = summary.plan if summary is not None else None
+            except Exception:
+                plan = None  # 잘못된 쿼리라면 아래 실제 실행이 같은 오류를 알려줍니다.
+            started = time.perf_counter()
+            rows = self._run(query, params, *args, **kwargs)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+        profile = summarize_plan(plan)
+        profile.update({"query": query.strip(), "mode": mode, "elapsed_ms": round(elapsed_ms, 1)})
+        profile["slow"] = self.slow_log.record(profile)
+        _publish(profile)
+        return rows
+
+    def _sanitize_rows(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.sanitize:
+            return rows
+        try:
+            from langchain_community.graphs.neo4j_graph import value_sanitize
+        except ImportError:
+            return rows
+        return [value_sanitize(row) for row in rows]
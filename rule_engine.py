@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 추론 관계 구체화(Materialization) 룰 엔진
+fix_db.py처럼 배후/공범 지름길 관계를 손으로 주입하는 대신, 선언적 규칙으로 파생 관계를 만듭니다.
+
+    예) (K)-[:RODE_IN]->(차량)<-[:RODE_IN]-(S)-[:SUSPECTED_SHOOTER]->(사건)<-[:VICTIM_OF]-(V)  ⇒  (K)-[:ACCOMPLICE_OF]->(V)
+        (P)-[:OFFERED_BOUNTY]->(K)-[:ACCOMPLICE_OF]->(V)                                        ⇒  (P)-[:MASTERMIND_OF]->(V)
+
+파생 관계에는 다음 속성이 붙습니다.
+    derived    : true
+    rules      : 이 관계를 도출한 규칙 이름 목록
+    provenance : 근거 경로 문자열 목록 ("Puff Daddy -[:OFFERED_BOUNTY]-> Keffe D -[:ACCOMPLICE_OF]-> ...")
+    support    : 근거 경로를 이루는 관계 elementId 목록 (경로당 "id1,id2,id3" 한 줄)
+
+수집(ingestion)이 새 사실을 쓰면 on_new_facts()/on_graph_documents()로
+새 관계에 닿는 경로만 다시 계산합니다 (증분 유지). 파생 관계가 다른 규칙의 재료가 되면
+고정점에 도달할 때까지 반복합니다. derive()는 DB 없이 사실 목록에 같은 규칙을 적용합니다 (규칙 점검용).
+
+사용법:
+    python rule_engine.py          # 전체 재구체화 + 인덱스 생성
+"""
+import os
+import sys
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# (시작 라벨, 시작 id, 관계 타입, 끝 라벨, 끝 id) - 라벨을 모르면 None
+Fact = Tuple[Optional[str], str, str, Optional[str], str]
+
+# ==========================================
+# 1. 규칙 정의
+# ==========================================
+# body의 각 단계: "TYPE_A|TYPE_B>" 는 정방향(->), "<TYPE" 은 역방향(<-)
+# 어휘는 seed_corrected.py(사건 Event 경유: OFFERED_BOUNTY, RODE_IN, SUSPECTED_SHOOTER, VICTIM_OF)와
+# fix_db.py(직접 총격: HIRED_HITMAN, ORDERED_HIT, GAVE_WEAPON, SHOT_AT)의 관계 타입을 따릅니다.
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        "name": "accomplice_getaway_vehicle",
+        "description": "사건의 용의 저격범과 같은 차량에 탔던 사람은 그 사건 피해자에 대한 공범",
+        "head": "ACCOMPLICE_OF",
+        "body": ["RODE_IN>", "<RODE_IN", "SUSPECTED_SHOOTER>", "<VICTIM_OF"],
+    },
+    {
+        "name": "accomplice_event_chain",
+        "description": "사건의 용의 저격범에게 살인을 지시하거나 무기를 건넨 사람은 그 사건 피해자에 대한 공범",
+        "head": "ACCOMPLICE_OF",
+        "body": ["ORDERED_HIT|GAVE_WEAPON>", "SUSPECTED_SHOOTER>", "<VICTIM_OF"],
+    },
+    {
+        "name": "accomplice_hit_chain",
+        "description": "실행범에게 살인을 지시하거나 무기를 건넨 사람은 공범",
+        "head": "ACCOMPLICE_OF",
+        "body": ["ORDERED_HIT|GAVE_WEAPON>", "SHOT_AT|SUSPECTED_KILLER_OF>"],
+    },
+    {
+        "name": "mastermind_bounty_shooter",
+        "description": "사건의 용의 저격범을 고용하거나 그에게 현상금을 건 사람은 그 사건 피해자에 대한 배후",
+        "head": "MASTERMIND_OF",
+        "body": ["HIRED_HITMAN|OFFERED_BOUNTY>", "SUSPECTED_SHOOTER>", "<VICTIM_OF"],
+    },
+    {
+        "name": "mastermind_via_accomplice",
+        "description": "공범을 고용하거나 공범에게 현상금을 건 사람은 배후",
+        "head": "MASTERMIND_OF",
+        "body": ["HIRED_HITMAN|OFFERED_BOUNTY>", "ACCOMPLICE_OF>"],
+    },
+]
+
+MAX_ROUNDS = 5
+
+
+def _quote(name: str) -> str:
+    return name if name.isidentifier() else f"`{name}`"
+
+
+def parse_step(step: str) -> Tuple[List[str], str]:
+    """'A|B>' → (['A', 'B'], 'out'),  '<A' → (['A'], 'in')"""
+    step = step.strip()
+    if step.startswith("<"):
+        return [t.strip() for t in step[1:].split("|")], "in"
+    return [t.strip() for t in step.rstrip(">").split("|")], "out"
+
+
+class Rule:
+    """선언적 규칙 하나와 그에 대응하는 Cypher 생성기"""
+
+    def __init__(self, name: str, head: str, body: List[str], description: str = ""):
+        self.name = name
+        self.head = head
+        self.steps = [parse_step(s) for s in body]
+        self.description = description
+
+    @property
+    def body_types(self) -> set:
+        return {t for types, _ in self.steps for t in types}
+
+    def _pattern(self, anchor: Optional[Tuple[int, Optional[str], Optional[str]]] = None) -> str:
+        """
+        (n0)-[r0:A]->(n1)<-[r1:B]-(n2)... 패턴 문자열.
+        anchor=(k, src_label, tgt_label) 이면 k번째 관계의 양 끝을 f.source / f.target id로 고정합니다.
+        """
+        def node(i: int) -> str:
+            if anchor is None or i not in (anchor[0], anchor[0] + 1):
+                return f"(n{i})"
+            k, src_label, tgt_label = anchor
+            _, direction = self.steps[k]
+            # 정방향이면 n_k가 시작, 역방향이면 n_{k+1}이 시작 노드입니다.
+            is_source = (i == k) == (direction == "out")
+            label = src_label if is_source else tgt_label
+            label_expr = f":{_quote(label)}" if label else ""
+            return f"(n{i}{label_expr} {{id: f.{'source' if is_source else 'target'}}})"
+
+        parts = [node(0)]
+        for i, (types, direction) in enumerate(self.steps):
+            rel = f"[r{i}:{'|'.join(_quote(t) for t in types)}]"
+            parts.append(f"-{rel}->" if direction == "out" else f"<-{rel}-")
+            parts.append(node(i + 1))
+        return "".join(parts)
+
+    def cypher(self, anchor: Optional[Tuple[int, Optional[str], Optional[str]]] = None, full_run: bool = False) -> str:
+        """규칙을 구체화하는 Cypher. anchor가 있으면 UNWIND $facts 로 새 사실에 닿는 경로만 계산합니다."""
+        n = len(self.steps)
+        nodes = ", ".join(f"n{i}" for i in range(n + 1))
+        rels = ", ".join(f"r{i}" for i in range(n))
+        distinct = " AND ".join(
+            f"n{i} <> n{j}" for i in range(n + 1) for j in range(i + 1, n + 1)
+        )
+        head = _quote(self.head)
+
+        unwind = ""
+        type_filter = ""
+        if anchor is not None:
+            unwind = "UNWIND $facts AS f\n"
+            type_filter = f" AND type(r{anchor[0]}) = f.type"
+
+        if full_run:
+            # 전체 실행: 이번 run_id에서 처음 만나는 관계는 근거를 새로 쓰고, 같은 run에서 다시 만나면
+            # (같은 head를 가진 다른 규칙) 덧붙입니다. 끝나고 run_id가 다른 파생 관계는 삭제합니다.
+            keep = "coalesce(d.run_id, '') = $run_id"
+        else:
+            # 증분 실행: 기존 근거에 새 경로만 덧붙입니다.
+            keep = "true"
+        update = (
+            f"WITH s, t, d, paths, support, {keep} AS keep\n"
+            "SET d.derived = true,\n"
+            "    d.rules = CASE WHEN keep THEN coalesce(d.rules, []) + [x IN [$rule] WHERE NOT x IN coalesce(d.rules, [])]"
+            " ELSE [$rule] END,\n"
+            "    d.provenance = CASE WHEN keep THEN coalesce(d.provenance, []) + [p IN paths WHERE NOT p IN coalesce(d.provenance, [])]"
+            " ELSE paths END,\n"
+            "    d.support = CASE WHEN keep THEN coalesce(d.support, []) + [x IN support WHERE NOT x IN coalesce(d.support, [])]"
+            " ELSE support END,\n"
+            + ("    d.run_id = $run_id,\n" if full_run else "")
+            + "    d.updated_at = datetime()"
+        )
+
+        return f"""{unwind}MATCH {self._pattern(anchor)}
+WHERE {distinct}{type_filter}
+WITH n0 AS s, n{n} AS t, [{nodes}] AS ns, [{rels}] AS rs
+WITH s, t,
+     collect(DISTINCT reduce(p = coalesce(ns[0].id, '?'), i IN range(0, size(rs) - 1) |
+         p + CASE $dirs[i] WHEN 'out' THEN ' -[:' + type(rs[i]) + ']-> ' ELSE ' <-[:' + type(rs[i]) + ']- ' END
+           + coalesce(ns[i + 1].id, '?'))) AS paths,
+     collect(DISTINCT reduce(k = '', x IN rs | k + elementId(x) + ',')) AS support
+MERGE (s)-[d:{head}]->(t)
+{update}
+RETURN labels(s)[0] AS source_label, s.id AS source, labels(t)[0] AS target_label, t.id AS target,
+       size(paths) AS path_count"""
+
+    def params(self) -> Dict[str, Any]:
+        return {"rule": self.name, "dirs": [direction for _, direction in self.steps]}
+
+
+def derive(facts: Iterable[Fact], rules: Optional[List[Dict[str, Any]]] = None) -> Dict[Tuple[str, str, str], List[str]]:
+    """
+    DB 없이 사실 목록에 규칙을 고정점까지 적용합니다. Rule.cypher()와 같은 의미(경로의 노드는 모두 다름)입니다.
+
+    Returns:
+        dict: {(시작 id, 파생 관계 타입, 끝 id): 근거 경로 문자열 목록}
+    """
+    compiled = [Rule(**r) for r in (rules or DEFAULT_RULES)]
+    edges = {(src, rel_type, tgt) for _, src, rel_type, _, tgt in facts}
+    derived: Dict[Tuple[str, str, str], List[str]] = {}
+    for _ in range(MAX_ROUNDS):
+        before = len(derived)
+        by_type: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        nodes_all = set()
+        for src, rel_type, tgt in edges | set(derived):
+            by_type[rel_type].append((src, tgt))
+            nodes_all.update((src, tgt))
+        for rule in compiled:
+            # 경로 = (노드 목록, 근거 문자열)
+            paths = [([start], start) for start in sorted(nodes_all)]
+            for types, direction in rule.steps:
+                extended = []
+                for nodes, text in paths:
+                    for t in types:
+                        for src, tgt in by_type[t]:
+                            here, there = (src, tgt) if direction == "out" else (tgt, src)
+                            if here != nodes[-1] or there in nodes:
+                                continue
+                            arrow = f" -[:{t}]-> " if direction == "out" else f" <-[:{t}]- "
+                            extended.append((nodes + [there], text + arrow + there))
+                paths = extended
+            for nodes, text in paths:
+                proofs = derived.setdefault((nodes[0], rule.head, nodes[-1]), [])
+                if text not in proofs:
+                    proofs.append(text)
+        if len(derived) == before:
+            break
+    return derived
+
+
+# ==========================================
+# 2. 엔진
+# ==========================================
+class RuleEngine:
+    """
+    규칙 목록을 그래프에 구체화하고, 새 사실이 들어오면 증분으로 유지합니다.
+
+    Args:
+        graph: 쓰기가 가능한 Neo4jGraph (거버너 그래프는 읽기 전용이므로 사용 불가)
+        rules: 규칙 dict 목록 (기본 DEFAULT_RULES)
+    """
+
+    def __init__(self, graph, rules: Optional[List[Dict[str, Any]]] = None, verbose: bool = True):
+        self.graph = graph
+        self.rules = [Rule(**r) for r in (rules or DEFAULT_RULES)]
+        self.verbose = verbose
+
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    @property
+    def head_types(self) -> set:
+        return {rule.head for rule in self.rules}
+
+    def ensure_indexes(self) -> None:
+        """파생 관계를 한 번의 인덱스 홉으로 찾을 수 있도록 인덱스를 만듭니다."""
+        for head in sorted(self.head_types):
+            self.graph.query(
+                f"CREATE INDEX {head.lower()}_derived IF NOT EXISTS FOR ()-[r:{_quote(head)}]-() ON (r.derived)"
+            )
+        labels = self.graph.query("CALL db.labels() YIELD label RETURN label")
+        for row in labels:
+            label = row["label"]
+            self.graph.query(
+                f"CREATE INDEX {label.lower()}_id IF NOT EXISTS FOR (n:{_quote(label)}) ON (n.id)"
+            )
+
+    # ---------- 전체 구체화 ----------
+    def materialize_all(self) -> Dict[str, int]:
+        """모든 규칙을 처음부터 다시 계산하고, 더 이상 근거가 없는 파생 관계를 지웁니다."""
+        run_id = uuid.uuid4().hex
+        stats: Dict[str, int] = {}
+        for _ in range(MAX_ROUNDS):
+            changed = False
+            for rule in self.rules:
+                rows = self.graph.query(rule.cypher(full_run=True), {**rule.params(), "run_id": run_id})
+                if len(rows) != stats.get(rule.name, 0):
+                    changed = True
+                stats[rule.name] = len(rows)
+            # 다른 규칙의 재료가 되는 파생 관계가 없으면 한 번으로 충분합니다.
+            if not changed or not any(self.head_types & rule.body_types for rule in self.rules):
+                break
+
+        # 이번 실행에서 다시 도출되지 않은 파생 관계 = 근거가 사라진 관계
+        for head in self.head_types:
+            self.graph.query(
+                f"MATCH ()-[d:{_quote(head)}]->() WHERE d.derived AND coalesce(d.run_id, '') <> $run_id DELETE d",
+                {"run_id": run_id},
+            )
+        for name, count in stats.items():
+            self._log(f"  [RULE] {name}: {count} derived edges")
+        return stats
+
+    # ---------- 증분 유지 ----------
+    def on_new_facts(self, facts: Iterable[Fact]) -> Dict[str, int]:
+        """
+        새로 쓰인 관계(사실)에 닿는 경로만 다시 계산합니다.
+
+        Args:
+            facts: (시작 라벨, 시작 id, 관계 타입, 끝 라벨, 끝 id) 목록
+
+        Returns:
+            dict: {규칙 이름: 갱신된 파생 관계 수}
+        """
+        stats: Dict[str, int] = defaultdict(int)
+        pending = list(facts)
+        for _ in range(MAX_ROUNDS):
+            if not pending:
+                break
+            derived: List[Fact] = []
+            for rule in self.rules:
+                for k, (types, _) in enumerate(rule.steps):
+                    # 같은 (라벨, 라벨) 조합끼리 묶어서 한 번에 실행합니다.
+                    groups: Dict[Tuple[Optional[str], Optional[str]], List[Dict[str, str]]] = defaultdict(list)
+                    for src_label, src_id, rel_type, tgt_label, tgt_id in pending:
+                        if rel_type in types:
+                            groups[(src_label, tgt_label)].append(
+                                {"source": src_id, "target": tgt_id, "type": rel_type}
+                            )
+                    for (src_label, tgt_label), group in groups.items():
+                        rows = self.graph.query(
+                            rule.cypher(anchor=(k, src_label, tgt_label)),
+                            {**rule.params(), "facts": group},
+                        )
+                        stats[rule.name] += len(rows)
+                        derived.extend(
+                            (r["source_label"], r["source"], rule.head, r["target_label"], r["target"]) for r in rows
+                        )
+            # 파생 관계가 다른 규칙의 재료라면 다음 라운드의 새 사실이 됩니다.
+            pending = list({f for f in derived if any(f[2] in rule.body_types for rule in self.rules)})
+        for name, count in stats.items():
+            self._log(f"  [RULE] {name}: {count} derived edges updated")
+        return dict(stats)
+
+    def on_graph_documents(self, graph_documents) -> Dict[str, int]:
+        """add_graph_documents() 직후 호출해, 방금 쓴 관계들로 파생 관계를 갱신합니다."""
+        facts = {
+            (rel.source.type, rel.source.id, rel.type, rel.target.type, rel.target.id)
+            for doc in graph_documents
+            for rel in doc.relationships
+        }
+        return self.on_new_facts(facts)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from langchain_community.graphs import Neo4jGraph
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    load_dotenv()
+    graph = Neo4jGraph(
+        url=os.getenv("NEO4J_URI"),
+        username=os.getenv("NEO4J_USERNAME"),
+        password=os.getenv("NEO4J_PASSWORD")
+    )
+
+    print("=" * 60)
+    print("Rule Engine - Materializing derived relationships")
+    print("=" * 60)
+
+    engine = RuleEngine(graph)
+    print("\n[INDEX] Ensuring indexes...")
+    engine.ensure_indexes()
+    print("\n[MATERIALIZE] Running all rules...")
+    engine.materialize_all()
+
+    print("\n[CHECK] Derived relationships:")
+    for rec in graph.query("""
+        MATCH (s)-[d]->(t) WHERE d.derived
+        RETURN s.id AS source, type(d) AS rel, t.id AS target, d.provenance AS provenance
+        LIMIT 20
+    """):
+        print(f"  {rec['source']} -[:{rec['rel']}]-> {rec['target']}")
+        for path in rec['provenance'] or []:
+            print(f"      근거: {path}")
+    print("\n" + "=" * 60)
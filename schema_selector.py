@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 질문 관련 스키마 선택기 (Schema Pruning)
+Cypher 생성 프롬프트에 전체 스키마를 넣으면, pipeline.py/builder.py 적재로 라벨과 관계 타입이
+늘어날수록 프롬프트 크기, 지연, 없는 타입 환각이 함께 커집니다.
+SchemaSelector는 질문에 대해 라벨/관계 타입/속성 점수를 매기고 관련된 조각과 그 1-hop 이웃만 남깁니다.
+
+    점수 = 한국어 별칭 일치 + 식별자 단어 일치("SUSPECTED_SHOOTER" → suspected, shooter)
+           + 글자 n-gram 벡터 코사인 (외부 모델 없는 로컬 임베딩)
+           + 질문에 나온 엔티티의 라벨 (이름마다 id 인덱스 조회, cypher_rewriter.SchemaCache)
+
+    선택된 라벨/관계 타입 → 그 타입을 쓰거나 그 라벨에 닿는 관계 패턴(1-hop) → 토큰 예산 안으로 자르기
+
+전체 스키마가 예산(SCHEMA_MAX_TOKENS) 안이면 그대로 씁니다. 예산을 넘는 스키마에서도
+프롬프트 크기는 거의 일정하게 유지됩니다.
+
+환경 변수:
+    SCHEMA_PRUNING      : 스키마 선택 사용 (기본 true)
+    SCHEMA_MAX_TOKENS   : 스키마 블록 토큰 상한 (기본 500)
+    SCHEMA_MAX_TYPES    : 점수로 고를 관계 타입 수 (기본 8)
+    SCHEMA_MAX_PROPS    : 라벨/관계마다 보여줄 속성 수 (기본 6)
+"""
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from text_utils import approx_tokens, char_ngrams
+
+# 한국어 질문 단어 → 스키마 식별자 (라벨, 관계 타입, 속성)
+ALIASES: Dict[str, Tuple[str, ...]] = {
+    "래퍼": ("Rapper",), "프로듀서": ("Producer",), "제작자": ("Producer",), "사람": ("Person",),
+    "인물": ("Person",), "갱": ("Gang", "MEMBER_OF"), "갱단": ("Gang", "MEMBER_OF"),
+    "레이블": ("Label", "SIGNED_TO"), "레코드": ("Label",), "소속사": ("Label", "SIGNED_TO"),
+    "사건": ("Event",), "장소": ("Location", "location"), "어디": ("Location", "location", "city"),
+    "차량": ("Vehicle", "RODE_IN", "USED_IN"), "차": ("Vehicle", "RODE_IN"), "캐딜락": ("Vehicle",),
+    "무기": ("Weapon", "USED_IN"), "총": ("Weapon", "USED_IN"),
+    "총격": ("Event", "SUSPECTED_SHOOTER", "SHOT_AT"), "쏜": ("SUSPECTED_SHOOTER", "SHOT_AT"),
+    "저격": ("SUSPECTED_SHOOTER", "SHOT_AT"), "용의": ("SUSPECTED_SHOOTER", "SUSPECTED"),
+    "배후": ("MASTERMIND_OF", "ORDERED_HIT_ON", "OFFERED_BOUNTY", "HIRED_HITMAN", "ALLEGEDLY_ORCHESTRATED_MURDER_OF"),
+    "청부": ("HIRED_HITMAN", "OFFERED_BOUNTY"), "현상금": ("OFFERED_BOUNTY", "amount"),
+    "지시": ("ORDERED_HIT_ON", "ORDERED_HIT"), "공범": ("ACCOMPLICE_OF",),
+    "살해": ("KILLED", "DIED_FROM", "MASTERMIND_OF"), "죽": ("KILLED", "DIED_FROM", "MASTERMIND_OF"),
+    "사망": ("DIED_FROM", "death_date", "status"), "피해": ("VICTIM_OF",), "부상": ("INJURED_IN", "injury"),
+    "다친": ("INJURED_IN", "injury"), "살아남": ("SURVIVED",), "생존": ("SURVIVED",),
+    "설립": ("FOUNDED",), "창립": ("FOUNDED",), "계약": ("SIGNED_TO",), "소속": ("MEMBER_OF", "SIGNED_TO", "AFFILIATED_WITH"),
+    "멤버": ("MEMBER_OF",), "연결": ("AFFILIATED_WITH",), "비프": ("BEEF_WITH",), "디스": ("BEEF_WITH",),
+    "사이가": ("BEEF_WITH", "RIVAL_OF"), "대립": ("RIVAL_OF", "RIVALRY_WITH"), "라이벌": ("RIVAL_OF", "RIVALRY_WITH"),
+    "경쟁": ("RIVALRY_WITH", "RIVAL_OF"), "삼촌": ("UNCLE_OF",), "조카": ("UNCLE_OF",), "가족": ("UNCLE_OF",),
+    "관람": ("ATTENDED",), "참석": ("ATTENDED",), "폭행": ("ATTACKED", "PARTICIPATED_IN", "Event"),
+    "때린": ("ATTACKED",), "참여": ("PARTICIPATED_IN",), "친구": ("FORMER_FRIEND_OF",), "싸운": ("FOUGHT_WITH",),
+    "싸움": ("FOUGHT_WITH",), "날짜": ("date", "when"), "언제": ("date", "when", "year"), "년": ("year", "when"),
+    "이유": ("reason",), "동기": ("reason",), "금액": ("amount",), "체포": ("arrest_date", "status"),
+    "근처": ("point", "Location"), "반경": ("point",),
+}
+
+# 한국어로 부르는 주요 인물/조직 → 그래프 id (질문에 나오면 그 노드의 라벨을 고릅니다)
+ENTITY_ALIASES: Dict[str, str] = {
+    "투팍": "Tupac Shakur", "비기": "Notorious B.I.G.", "노토리어스": "Notorious B.I.G.",
+    "올랜도": "Orlando Anderson", "키피": "Keffe D", "퍼프": "Puff Daddy", "디디": "Puff Daddy",
+    "슈그": "Suge Knight", "수그": "Suge Knight", "데스 로우": "Death Row Records", "데스로우": "Death Row Records",
+    "배드 보이": "Bad Boy Records", "배드보이": "Bad Boy Records", "크립스": "Southside Crips",
+    "블러즈": "Mob Piru Bloods", "타이슨": "Mike Tyson Fight", "mgm": "MGM Grand Hotel",
+}
+
+# 예산이 남으면 항상 보여줄 속성
+CORE_PROPS = ("id", "name")
+
+_WORD = re.compile(r"[a-z0-9]+")
+# 질문의 영문 이름 ("Tupac", "Orlando Anderson", "MGM")
+_NAME = re.compile(r"\b[A-Z][A-Za-z0-9.'&\-]*(?:\s+[A-Z0-9][A-Za-z0-9.'&\-]*)*")
+# 질문마다 DB에서 찾을 영문 이름 수 상한
+MAX_NAME_LOOKUPS = 5
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def identifier_words(identifier: str) -> List[str]:
+    """SUSPECTED_SHOOTER → ['suspected', 'shooter'], birthDate → ['birth', 'date']"""
+    spaced = re.sub(r"([a-z])([A-Z])", r"\1 \2", identifier).replace("_", " ").lower()
+    return _WORD.findall(spaced)
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(count * b[gram] for gram, count in a.items() if gram in b)
+    if not dot:
+        return 0.0
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+
+def _props(entries: Iterable[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    return [(e.get("property"), e.get("type", "")) for e in entries or [] if e.get("property")]
+
+
+# ==========================================
+# 1. 스키마 포맷
+# ==========================================
+def format_schema(
+    node_props: Dict[str, List[Tuple[str, str]]],
+    rel_props: Dict[str, List[Tuple[str, str]]],
+    patterns: List[Tuple[str, str, str]],
+) -> str:
+    """Neo4jGraph.schema와 같은 모양의 스키마 문자열."""
+    def block(items: Dict[str, List[Tuple[str, str]]]) -> List[str]:
+        return [f"{name} {{{', '.join(f'{p}: {t}' for p, t in props)}}}" for name, props in items.items() if props]
+
+    lines = ["Node properties:"] + block(node_props)
+    lines += ["Relationship properties:"] + block(rel_props)
+    lines += ["The relationships:"] + [f"(:{s})-[:{t}]->(:{e})" for s, t, e in patterns]
+    return "\n".join(lines)
+
+
+# ==========================================
+# 2. 선택기
+# ==========================================
+class SchemaSelector:
+    """
+    질문에 관련된 스키마 조각을 고릅니다.
+
+    사용 예:
+        selector = SchemaSelector(graph)
+        selector.select("투팍을 쏜 용의자는 어느 갱단 소속이야?")   # → 스키마 문자열
+    """
+
+    def __init__(self, graph, enabled: Optional[bool] = None, max_tokens: Optional[int] = None,
+                 max_types: Optional[int] = None, max_props: Optional[int] = None):
+        self.graph = graph
+        self.enabled = _env_bool("SCHEMA_PRUNING", True) if enabled is None else enabled
+        self.max_tokens = max_tokens or int(os.getenv("SCHEMA_MAX_TOKENS", 500))
+        self.max_types = max_types or int(os.getenv("SCHEMA_MAX_TYPES", 8))
+        self.max_props = max_props or int(os.getenv("SCHEMA_MAX_PROPS", 6))
+        self._signature = None
+        self._vectors: Dict[str, Counter] = {}
+        self._words: Dict[str, Set[str]] = {}
+
+    # ---------- 스키마 읽기 ----------
+    def _schema(self) -> Tuple[Dict[str, List[Tuple[str, str]]], Dict[str, List[Tuple[str, str]]], List[Tuple[str, str, str]]]:
+        structured = getattr(self.graph, "structured_schema", None) or {}
+        node_props = {label: _props(entries) for label, entries in (structured.get("node_props") or {}).items()}
+        rel_props = {rel: _props(entries) for rel, entries in (structured.get("rel_props") or {}).items()}
+        patterns = [(r["start"], r["type"], r["end"]) for r in structured.get("relationships") or []]
+        return node_props, rel_props, patterns
+
+    def _index(self, identifiers: Iterable[str]) -> None:
+        """식별자별 단어/n-gram 벡터 (스키마가 바뀔 때만 다시 만듦)."""
+        identifiers = sorted(set(identifiers))
+        signature = hash(tuple(identifiers))
+        if signature == self._signature:
+            return
+        aliases: Dict[str, List[str]] = {}
+        for word, targets in ALIASES.items():
+            for target in targets:
+                aliases.setdefault(target, []).append(word)
+        self._vectors, self._words = {}, {}
+        for identifier in identifiers:
+            words = identifier_words(identifier)
+            self._words[identifier] = set(words)
+            self._vectors[identifier] = char_ngrams(" ".join(words + aliases.get(identifier, [])))
+        self._signature = signature
+
+    def _entity_labels(self, question: str) -> Set[str]:
+        """
+        질문에 나온 엔티티(한국어 별칭, 영문 이름)의 라벨.
+        그래프의 id 전체를 훑지 않고 이름마다 라벨별 id 인덱스로 찾으므로(SchemaCache.labels_for_anchor,
+        그래프 버전별 캐시) 그래프가 커져도 질문당 비용이 일정합니다.
+        """
+        cache = getattr(self.graph, "schema_cache", None)
+        if cache is None:
+            return set()
+        lowered = question.lower()
+        labels: Set[str] = set()
+        for node_id in {node_id for alias, node_id in ENTITY_ALIASES.items() if alias in lowered}:
+            labels |= cache.labels_for_anchor("=", node_id)
+        # "Tupac" → "Tupac Shakur" 처럼 이름의 앞부분만 써도 찾습니다.
+        names = [name for name in dict.fromkeys(_NAME.findall(question)) if len(name) >= 3]
+        for name in names[:MAX_NAME_LOOKUPS]:
+            labels |= cache.labels_for_anchor("STARTS WITH", name)
+        return labels
+
+    def scores(self, question: str, identifiers: Iterable[str]) -> Dict[str, float]:
+        """식별자별 관련도 (별칭 1.0, 단어 0.8, n-gram 코사인 0~0.5를 더함)."""
+        identifiers = list(identifiers)
+        self._index(identifiers)
+        lowered = question.lower()
+        question_words = set(_WORD.findall(lowered))
+        question_vector = char_ngrams(question)
+        alias_hits: Set[str] = set()
+        for word, targets in ALIASES.items():
+            if word in lowered:
+                alias_hits.update(targets)
+
+        scores: Dict[str, float] = {}
+        for identifier in identifiers:
+            score = 1.0 if identifier in alias_hits else 0.0
+            if self._words.get(identifier, set()) & question_words:
+                score += 0.8
+            score += 0.5 * _cosine(question_vector, self._vectors.get(identifier, Counter()))
+            scores[identifier] = round(score, 3)
+        return scores
+
+    # ---------- 선택 ----------
+    def select(self, question: str) -> str:
+        """
+        질문에 관련된 스키마 문자열을 반환합니다. 선택이 꺼져 있거나 전체가 예산 안이면 전체 스키마.
+
+        Returns:
+            str: Neo4jGraph.schema 형식의 스키마 (라벨/관계 속성 + 관계 패턴)
+        """
+        full = self.graph.schema
+        node_props, rel_props, patterns = self._schema()
+        if not self.enabled or not patterns or approx_tokens(full) <= self.max_tokens:
+            return full
+
+        types = {t for _, t, _ in patterns} | set(rel_props)
+        labels = set(node_props) | {s for s, _, _ in patterns} | {e for _, _, e in patterns}
+        props = {p for entries in list(node_props.values()) + list(rel_props.values()) for p, _ in entries}
+        scores = self.scores(question, types | labels | props)
+
+        chosen_types = [t for t in sorted(types, key=lambda t: -scores[t]) if scores[t] > 0.1][: self.max_types]
+        chosen_labels = {label for label in labels if scores[label] >= 0.8} | self._entity_labels(question)
+
+        # 1-hop 이웃: 고른 타입의 패턴 + 고른 라벨에 닿는 패턴 (관련도 순)
+        def pattern_score(pattern: Tuple[str, str, str]) -> float:
+            start, rel_type, end = pattern
+            return scores[rel_type] * 2 + (start in chosen_labels) + (end in chosen_labels)
+
+        candidates = [p for p in patterns if p[1] in chosen_types or p[0] in chosen_labels or p[2] in chosen_labels]
+        candidates.sort(key=pattern_score, reverse=True)
+
+        def render(selected: List[Tuple[str, str, str]]) -> str:
+            used_labels = {s for s, _, _ in selected} | {e for _, _, e in selected} | chosen_labels
+            used_types = {t for _, t, _ in selected}
+            return format_schema(
+                {label: self._top_props(node_props.get(label, []), scores) for label in sorted(used_labels)},
+                {rel: self._top_props(rel_props.get(rel, []), scores) for rel in sorted(used_types)},
+                selected,
+            )
+
+        # 예산을 넘기 직전까지 패턴을 관련도 순으로 더합니다.
+        selected: List[Tuple[str, str, str]] = []
+        for pattern in candidates:
+            if approx_tokens(render(selected + [pattern])) > self.max_tokens and selected:
+                break
+            selected.append(pattern)
+        if not selected:
+            # 아무것도 고르지 못한 질문은 관련도 순 상위 패턴으로 채웁니다.
+            for pattern in sorted(patterns, key=pattern_score, reverse=True):
+                if approx_tokens(render(selected + [pattern])) > self.max_tokens and selected:
+                    break
+                selected.append(pattern)
+        return render(selected)
+
+    def _top_props(self, props: List[Tuple[str, str]], scores: Dict[str, float]) -> List[Tuple[str, str]]:
+        """id/name과 관련도 높은 속성부터 max_props개."""
+        ranked = sorted(props, key=lambda p: (p[0] not in CORE_PROPS, -scores.get(p[0], 0.0)))
+        return ranked[: self.max_props]
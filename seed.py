@@ -5,6 +5,8 @@ Hip-Hop Noir 데이터베이스 시드 스크립트
 import os
 from dotenv import load_dotenv
 from langchain_community.graphs import Neo4jGraph
+from temporal import TemporalNormalizer
+from spatial import GeoEnricher
 
 load_dotenv()
 
@@ -143,6 +145,16 @@ def seed_database():
         graph.query(create_nodes)
         graph.query(create_contracts)
         graph.query(create_relations)
+        
+        # 시간 속성 정규화 ("1996-09-07" → date, time: "Evening" → 18:00~23:59 창)
+        normalizer = TemporalNormalizer(graph)
+        normalizer.normalize()
+        normalizer.ensure_indexes()
+        
+        # 지오코딩 ("Las Vegas, Flamingo Road" → point)
+        enricher = GeoEnricher(graph)
+        enricher.geocode()
+        enricher.ensure_indexes()
         print("\n✅ 데이터 구축 완료!")
         print("\n📊 데이터베이스 통계:")
         
@@ -7,6 +7,9 @@ import os
 import sys
 from dotenv import load_dotenv
 from langchain_community.graphs import Neo4jGraph
+from rule_engine import RuleEngine
+from temporal import TemporalNormalizer
+from spatial import GeoEnricher
 
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -257,7 +260,25 @@ def seed_corrected_data():
         MERGE (a)-[:DIED_FROM]->(b)
     ''', "Biggie died")
     
-    # 4. 통계 출력
+    # 4. 파생 관계 구체화 (배후/공범 지름길 + 근거 경로)
+    print("\n[RULES] Materializing derived relationships...")
+    engine = RuleEngine(graph)
+    engine.ensure_indexes()
+    engine.materialize_all()
+    
+    # 5. 시간 속성 정규화 (문자열 날짜 → date, when 창 + 범위 인덱스)
+    print("\n[TEMPORAL] Normalizing time properties...")
+    normalizer = TemporalNormalizer(graph)
+    normalizer.normalize()
+    normalizer.ensure_indexes()
+    
+    # 6. 지오코딩 (장소 문자열 → point + 포인트 인덱스)
+    print("\n[GEO] Geocoding places...")
+    enricher = GeoEnricher(graph)
+    enricher.geocode()
+    enricher.ensure_indexes()
+    
+    # 7. 통계 출력
     print("\n[STATS] Database statistics:")
     node_stats = graph.query("""
         MATCH (n)
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 오프라인 지오코딩 & 근접 검색
+Location/Event 노드의 자유 텍스트 장소("MGM Grand Hotel", "Las Vegas, Flamingo Road")를
+오프라인 지명 사전(gazetteer)으로 좌표로 바꿔 `point` 속성과 포인트 인덱스를 붙입니다.
+
+근접 API는 포인트 인덱스(거리)와 temporal.py의 when 범위 인덱스(시간)를 한 쿼리로 묶어
+"MGM Grand 반경 5km, 48시간 이내의 사건"을 문자열 매칭 없이 인덱스 조회로 답합니다.
+
+지오코딩된 노드/관계에는 다음 속성이 붙습니다.
+    point         : point({latitude, longitude}) (WGS-84)
+    geo_match     : 사전에서 일치한 이름
+    geo_precision : "poi" | "street" | "city"
+
+환경 변수:
+    GAZETTEER_PATH : 추가 지명 사전 JSON 파일 ({"이름": {"lat", "lon", "precision", "aliases": [...]}})
+
+사용법:
+    python spatial.py                                   # 지오코딩 + 포인트 인덱스 생성
+    python spatial.py "MGM Grand" 5 1996-09-07 48       # 반경 5km, 그날 ±48시간 이내
+"""
+import json
+import os
+import re
+import sys
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from temporal import MAX_WINDOW, jsonable, parse_window
+
+# ==========================================
+# 1. 오프라인 지명 사전
+# ==========================================
+# 이름: (위도, 경도, 정밀도, 별칭)
+GAZETTEER: Dict[str, Tuple[float, float, str, List[str]]] = {
+    "MGM Grand Hotel": (36.1024, -115.1700, "poi", ["MGM Grand", "MGM Grand Lobby", "MGM", "MGM 그랜드"]),
+    "Flamingo Road & Koval Lane": (36.1162, -115.1622, "street", ["Flamingo Road", "Flamingo Rd", "Koval Lane", "플라밍고 로드"]),
+    "Club 662": (36.1003, -115.1223, "poi", ["Club 662", "클럽 662"]),
+    "Las Vegas": (36.1699, -115.1398, "city", ["Vegas", "라스베이거스", "라스베가스"]),
+    "Lakewood Mall": (33.8525, -118.1413, "poi", ["Lakewood Center", "레이크우드 몰"]),
+    "Petersen Automotive Museum": (34.0623, -118.3612, "poi", ["Wilshire Blvd", "Wilshire Boulevard", "Petersen Museum", "윌셔"]),
+    "Compton": (33.8958, -118.2201, "city", ["컴튼"]),
+    "Los Angeles": (34.0522, -118.2437, "city", ["LA", "L.A.", "로스앤젤레스", "엘에이"]),
+    "Quad Studios": (40.7592, -73.9861, "poi", ["Quad Recording Studios", "Quad Studio", "쿼드 스튜디오"]),
+    "Brooklyn": (40.6782, -73.9442, "city", ["Brooklyn, NY", "브루클린"]),
+    "New York": (40.7128, -74.0060, "city", ["New York City", "NYC", "NY", "뉴욕"]),
+}
+
+# 같은 길이로 겹칠 때 더 구체적인 쪽을 고릅니다.
+_PRECISION_RANK = {"poi": 0, "street": 1, "city": 2}
+
+# 거리 조건이 포인트 인덱스를 타도록 기준점을 상수식으로 둡니다.
+_CENTER = "point({latitude: $lat, longitude: $lon})"
+
+
+def _quote(name: str) -> str:
+    return f"`{name.replace('`', '')}`"
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^0-9a-z가-힣&]+", " ", text.lower()).strip()
+
+
+class Gazetteer:
+    """별칭 → 좌표 사전. 가장 구체적이고 가장 긴 별칭을 우선합니다."""
+
+    def __init__(self, entries: Optional[Dict[str, Tuple[float, float, str, List[str]]]] = None,
+                 path: Optional[str] = None):
+        self.entries: Dict[str, Tuple[float, float, str]] = {}
+        self._aliases: Dict[str, str] = {}
+        for name, (lat, lon, precision, aliases) in (entries or GAZETTEER).items():
+            self.add(name, lat, lon, precision, aliases)
+        path = path or os.getenv("GAZETTEER_PATH")
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def add(self, name: str, lat: float, lon: float, precision: str = "poi", aliases: Optional[List[str]] = None) -> None:
+        self.entries[name] = (float(lat), float(lon), precision)
+        for alias in [name] + list(aliases or []):
+            key = _normalize(alias)
+            if key:
+                self._aliases[key] = name
+
+    def load(self, path: str) -> None:
+        with open(path, encoding="utf-8") as f:
+            for name, entry in json.load(f).items():
+                self.add(name, entry["lat"], entry["lon"], entry.get("precision", "poi"), entry.get("aliases"))
+
+    def lookup(self, text: Any) -> Optional[Dict[str, Any]]:
+        """
+        자유 텍스트 장소를 좌표로 바꿉니다.
+
+        Returns:
+            dict | None: {'name', 'lat', 'lon', 'precision'}
+        """
+        if not isinstance(text, str) or not text.strip():
+            return None
+        norm = _normalize(text)
+        padded = f" {norm} "
+        candidates = [alias for alias in self._aliases if alias == norm or f" {alias} " in padded]
+        if not candidates:
+            return None
+
+        def rank(alias: str) -> Tuple[int, int]:
+            precision = self.entries[self._aliases[alias]][2]
+            return (_PRECISION_RANK.get(precision, 3), -len(alias))
+
+        name = self._aliases[min(candidates, key=rank)]
+        lat, lon, precision = self.entries[name]
+        return {"name": name, "lat": lat, "lon": lon, "precision": precision}
+
+
+# ==========================================
+# 2. 지오코딩 단계 (수집 시)
+# ==========================================
+# 장소를 담는 속성 (앞에 있을수록 구체적)
+PLACE_KEYS = ("location", "address", "venue", "city")
+
+
+def place_text(props: Dict[str, Any], labels: Optional[List[str]] = None) -> List[str]:
+    """지오코딩 후보 문자열을 반환합니다. Location 노드는 id/name 자체가 장소입니다."""
+    texts = [props[k] for k in PLACE_KEYS if isinstance(props.get(k), str)]
+    if labels and "Location" in labels:
+        texts = [props.get("id") or props.get("name")] + texts
+    elif labels and "Event" in labels:
+        # "MGM Lobby Assault", "Quad Studios Shooting"처럼 사건 이름에 장소가 들어 있는 경우 (최후 수단)
+        texts = texts + [props.get("id") or props.get("name")]
+    return [t for t in texts if t]
+
+
+class GeoEnricher:
+    """point가 없는 Location/Event 노드와 location 속성이 있는 관계에 좌표를 붙입니다."""
+
+    def __init__(self, graph, gazetteer: Optional[Gazetteer] = None, verbose: bool = True, batch_size: int = 500):
+        self.graph = graph
+        self.gazetteer = gazetteer or Gazetteer()
+        self.verbose = verbose
+        self.batch_size = batch_size
+
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    def _resolve(self, props: Dict[str, Any], labels: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        best = None
+        for text in place_text(props, labels):
+            hit = self.gazetteer.lookup(text)
+            if hit and (best is None or _PRECISION_RANK[hit["precision"]] < _PRECISION_RANK[best["precision"]]):
+                best = hit
+        return best
+
+    def _write(self, rows: List[Dict[str, Any]], target: str) -> None:
+        match = "MATCH (x) WHERE elementId(x) = row.eid" if target == "node" \
+            else "MATCH ()-[x]->() WHERE elementId(x) = row.eid"
+        for i in range(0, len(rows), self.batch_size):
+            self.graph.query(f"""
+                UNWIND $rows AS row {match}
+                SET x.point = point({{latitude: row.lat, longitude: row.lon}}),
+                    x.geo_match = row.name, x.geo_precision = row.precision
+            """, params={"rows": rows[i:i + self.batch_size]})
+
+    def geocode(self, overwrite: bool = False) -> Dict[str, Any]:
+        """
+        point가 없는 항목만 지오코딩합니다. (증분, 재실행 안전)
+
+        Returns:
+            dict: {'nodes', 'relationships', 'unresolved': [못 찾은 장소 문자열]}
+        """
+        params = {"keys": list(PLACE_KEYS), "overwrite": overwrite}
+        nodes = self.graph.query("""
+            MATCH (n) WHERE ($overwrite OR n.point IS NULL)
+              AND (n:Location OR n:Event OR any(k IN keys(n) WHERE k IN $keys))
+            RETURN elementId(n) AS eid, labels(n) AS labels, properties(n) AS props
+        """, params=params)
+        rels = self.graph.query("""
+            MATCH ()-[r]->() WHERE ($overwrite OR r.point IS NULL)
+              AND any(k IN keys(r) WHERE k IN $keys)
+            RETURN elementId(r) AS eid, properties(r) AS props
+        """, params=params)
+
+        stats: Dict[str, Any] = {"unresolved": []}
+        for target, records in (("node", nodes), ("relationship", rels)):
+            rows = []
+            for rec in records:
+                props = rec["props"] or {}
+                hit = self._resolve(props, rec.get("labels"))
+                if hit:
+                    rows.append({"eid": rec["eid"], **hit})
+                elif place_text(props, rec.get("labels")):
+                    stats["unresolved"].extend(place_text(props, rec.get("labels"))[:1])
+            self._write(rows, target)
+            stats["nodes" if target == "node" else "relationships"] = len(rows)
+
+        stats["unresolved"] = sorted(set(stats["unresolved"]))
+        self._log(f"  [GEO] 노드 {stats['nodes']}개, 관계 {stats['relationships']}개 지오코딩")
+        if stats["unresolved"]:
+            self._log(f"  [GEO] 사전에 없는 장소: {', '.join(stats['unresolved'][:10])}")
+        return stats
+
+    def ensure_indexes(self) -> List[str]:
+        """point 속성에 라벨/관계 타입별 포인트 인덱스를 만듭니다."""
+        created = []
+        for row in self.graph.query("""
+            MATCH (n) WHERE n.point IS NOT NULL
+            UNWIND labels(n) AS label
+            RETURN DISTINCT label
+        """):
+            name = f"{row['label'].lower()}_point"
+            self.graph.query(
+                f"CREATE POINT INDEX {name} IF NOT EXISTS FOR (n:{_quote(row['label'])}) ON (n.point)"
+            )
+            created.append(name)
+        for row in self.graph.query("""
+            MATCH ()-[r]->() WHERE r.point IS NOT NULL
+            RETURN DISTINCT type(r) AS type
+        """):
+            name = f"{row['type'].lower()}_point"
+            self.graph.query(
+                f"CREATE POINT INDEX {name} IF NOT EXISTS FOR ()-[r:{_quote(row['type'])}]-() ON (r.point)"
+            )
+            created.append(name)
+        self._log(f"  [GEO] 포인트 인덱스 {len(created)}개 확인")
+        return created
+
+
+# ==========================================
+# 3. 근접 조회 (공간 + 시간)
+# ==========================================
+class Proximity:
+    """
+    포인트 인덱스가 걸린 라벨/관계 타입별로 거리 조건(+ 선택적 when 범위)을 돌려 합칩니다.
+    """
+
+    def __init__(self, graph, gazetteer: Optional[Gazetteer] = None):
+        self.graph = graph
+        self.gazetteer = gazetteer or Gazetteer()
+        self._catalog: Optional[Dict[str, List[str]]] = None
+
+    def refresh(self) -> None:
+        """인덱스 목록을 다시 읽습니다. (지오코딩/인덱스 생성 후 호출)"""
+        self._catalog = None
+
+    @property
+    def catalog(self) -> Dict[str, List[str]]:
+        """{'node': [label], 'relationship': [type]} - point 속성의 포인트 인덱스 기준"""
+        if self._catalog is None:
+            rows = self.graph.query("""
+                SHOW INDEXES YIELD type, entityType, labelsOrTypes, properties, state
+                WHERE type = 'POINT' AND state = 'ONLINE' AND properties = ['point']
+                RETURN entityType, labelsOrTypes[0] AS name
+            """)
+            catalog: Dict[str, List[str]] = {"node": [], "relationship": []}
+            for row in rows:
+                catalog["node" if row["entityType"] == "NODE" else "relationship"].append(row["name"])
+            self._catalog = catalog
+        return self._catalog
+
+    def resolve(self, place: Any) -> Dict[str, Any]:
+        """
+        기준 장소를 좌표로 바꿉니다. (lat, lon) 튜플, 그래프의 노드 id, 지명 사전 순으로 찾습니다.
+        """
+        if isinstance(place, (tuple, list)) and len(place) == 2:
+            return {"name": f"{place[0]},{place[1]}", "lat": float(place[0]), "lon": float(place[1])}
+        rows = self.graph.query("""
+            MATCH (n:Location) WHERE n.id = $place AND n.point IS NOT NULL
+            RETURN n.id AS name, n.point.latitude AS lat, n.point.longitude AS lon
+            LIMIT 1
+        """, params={"place": place})
+        if rows:
+            return dict(rows[0])
+        hit = self.gazetteer.lookup(place)
+        if not hit:
+            raise ValueError(f"장소를 찾을 수 없습니다: {place!r}")
+        return hit
+
+    def _branches(self, timed: bool) -> List[str]:
+        when = "AND x.when >= $lo AND x.when <= $end AND x.when_end >= $start" if timed else ""
+        branches = []
+        for label in self.catalog["node"]:
+            branches.append(f"""
+                MATCH (x:{_quote(label)})
+                WHERE point.distance(x.point, {_CENTER}) <= $meters {when}
+                RETURN 'node' AS kind, {label!r} AS label, coalesce(x.id, x.name) AS id,
+                       null AS source, null AS target, x.geo_match AS place,
+                       point.distance(x.point, {_CENTER}) AS meters, x.when AS when, properties(x) AS properties""")
+        for rel_type in self.catalog["relationship"]:
+            branches.append(f"""
+                MATCH (a)-[x:{_quote(rel_type)}]->(b)
+                WHERE point.distance(x.point, {_CENTER}) <= $meters {when}
+                RETURN 'relationship' AS kind, {rel_type!r} AS label, null AS id,
+                       coalesce(a.id, a.name) AS source, coalesce(b.id, b.name) AS target, x.geo_match AS place,
+                       point.distance(x.point, {_CENTER}) AS meters, x.when AS when, properties(x) AS properties""")
+        return branches
+
+    def near(self, place: Any, km: float = 5.0, around: Any = None, hours: float = 0,
+             start: Any = None, end: Any = None, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """
+        기준 장소 반경 km 안의 노드/관계를 (선택적으로 시간 창 안에서) 가까운 순으로 반환합니다.
+
+        Args:
+            place: 기준 장소 (노드 id, 지명, 또는 (lat, lon))
+            km: 반경 (km)
+            around: 기준 시점 ("1996-09-07" 등). hours와 함께 쓰면 창을 앞뒤로 넓힙니다.
+            hours: around 기준 ±시간
+            start, end: around 대신 직접 지정하는 시간 창
+            limit, offset: 페이지
+
+        Returns:
+            dict: {'center', 'km', 'start', 'end', 'items': [...], 'next_offset'}
+        """
+        center = self.resolve(place)
+        window = None
+        if around is not None:
+            lo, hi = parse_window(around)
+            window = (lo - timedelta(hours=hours), hi + timedelta(hours=hours))
+        elif start is not None:
+            window = parse_window(start, end)
+
+        branches = self._branches(timed=window is not None)
+        result = {
+            "center": center,
+            "km": km,
+            "start": window[0].isoformat() if window else None,
+            "end": window[1].isoformat() if window else None,
+            "items": [],
+            "next_offset": None,
+        }
+        if not branches:
+            return result
+
+        query = (
+            "CALL {" + "\n UNION ALL ".join(branches) + "\n}\n"
+            "RETURN kind, label, id, source, target, place, meters, when, properties\n"
+            "ORDER BY meters, when, label\n"
+            "SKIP $offset LIMIT $limit"
+        )
+        params = {
+            "lat": center["lat"],
+            "lon": center["lon"],
+            "meters": float(km) * 1000,
+            "offset": int(offset),
+            "limit": int(limit) + 1,
+        }
+        if window:
+            params.update({"start": window[0], "end": window[1], "lo": window[0] - MAX_WINDOW})
+        rows = self.graph.query(query, params=params)
+        result["items"] = [jsonable({**dict(row), "km": round(row["meters"] / 1000, 2)}) for row in rows[:limit]]
+        result["next_offset"] = offset + limit if len(rows) > limit else None
+        return result
+
+
+def format_proximity(result: Dict[str, Any]) -> str:
+    """근접 조회 결과를 사람이 읽을 수 있는 줄 목록으로 만듭니다."""
+    header = f"📍 {result['center']['name']} 반경 {result['km']}km"
+    if result["start"]:
+        header += f" / {result['start']} ~ {result['end']}"
+    lines = [header]
+    for item in result["items"]:
+        if item["kind"] == "relationship":
+            body = f"{item['source']} -[:{item['label']}]-> {item['target']}"
+        else:
+            body = f"{item['id']} ({item['label']})"
+        lines.append(f"  {item['km']:>6}km  {item['when'] or '-'}  {body}")
+    if result.get("next_offset") is not None:
+        lines.append(f"  ... (다음 페이지 offset={result['next_offset']})")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from langchain_community.graphs import Neo4jGraph
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    load_dotenv()
+    graph = Neo4jGraph(
+        url=os.getenv("NEO4J_URI"),
+        username=os.getenv("NEO4J_USERNAME"),
+        password=os.getenv("NEO4J_PASSWORD")
+    )
+
+    args = sys.argv[1:]
+    if not args:
+        print("=" * 60)
+        print("Spatial - Geocoding places")
+        print("=" * 60)
+        enricher = GeoEnricher(graph)
+        enricher.geocode()
+        enricher.ensure_indexes()
+        print("\n" + "=" * 60)
+    else:
+        place = args[0]
+        km = float(args[1]) if len(args) > 1 else 5.0
+        around = args[2] if len(args) > 2 else None
+        hours = float(args[3]) if len(args) > 3 else 0
+        print(format_proximity(Proximity(graph).near(place, km=km, around=around, hours=hours)))
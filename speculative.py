@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 추측 병렬 Cypher (Speculative Cypher Variants)
+페르소나 프롬프트는 "직접 관계가 안 나오면 2~3단계 관계를 의심하고, 없다고 답하기 전에
+다른 관계 타입으로 다시 검색하라"고 시킵니다. 이를 LLM 왕복으로 하나씩 시도하는 대신
+
+    1. 한 번의 LLM 호출로 전략이 다른 후보 쿼리 여러 개를 만들고
+         direct : 한 번의 관계 (KILLED, SHOT_AT, BEEF_WITH, MEMBER_OF ...)
+         chain  : 청부/지시 사슬 (OFFERED_BOUNTY, ORDERED_HIT_ON, HIRED_HITMAN, MASTERMIND_OF ...)
+         event  : 사건(Event) 노드를 거치는 경로 (SUSPECTED_SHOOTER, VICTIM_OF, USED_IN ...)
+    2. 후보들을 동시에 검증(EXPLAIN)·실행한 뒤
+    3. 신뢰도 정책으로 가장 나은 결과를 고르거나(best) 합칩니다(merge).
+
+최악의 지연은 "LLM 한 번 + 가장 느린 쿼리 하나"가 됩니다.
+
+환경 변수:
+    CYPHER_SPECULATIVE   : 후보 병렬 실행 사용 (기본 true, TieredCypherQAChain에서 사용)
+    SPECULATIVE_POLICY   : merge(기본, 결과가 있는 후보를 신뢰도 순으로 합침) | best(가장 높은 후보만)
+"""
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_community.chains.graph_qa.cypher import extract_cypher
+
+from model_router import repair_cypher, validate_cypher
+
+VARIANTS = ("direct", "chain", "event")
+
+# 전략별 기본 신뢰도와, 질문에 이런 말이 있으면 더 믿을 전략
+PRIORS = {"direct": 0.6, "chain": 0.5, "event": 0.5}
+HINTS = {
+    "direct": ("관계", "소속", "멤버", "계약", "누구와", "member", "signed"),
+    "chain": ("배후", "청부", "지시", "사주", "현상금", "시켰", "누가 죽", "살해", "죽인", "ordered", "hired", "mastermind", "bounty"),
+    "event": ("사건", "총격", "현장", "당일", "습격", "폭행", "무기", "차량", "event", "shooting"),
+}
+
+SPECULATIVE_TEMPLATE = """Task: Generate Cypher statement to query a graph database.
+Write one read-only Cypher query for EACH of the following search strategies, all answering the same question:
+- direct: entities connected by a single relationship (e.g. KILLED, SHOT_AT, VICTIM_OF, BEEF_WITH, MEMBER_OF).
+- chain: a 2-3 hop hire/order chain (e.g. OFFERED_BOUNTY, ORDERED_HIT_ON, HIRED_HITMAN, MASTERMIND_OF, ACCOMPLICE_OF)
+  that ends at the person or event in question.
+- event: a path through an Event node (e.g. (p)-[:SUSPECTED_SHOOTER|PARTICIPATED_IN]->(e:Event)<-[:VICTIM_OF]-(v)).
+Use only the node labels, relationship types and properties provided in the schema.
+Prefer returning the same columns from every query.
+
+Schema:
+{schema}
+{examples}
+Respond with exactly three labelled code blocks and nothing else:
+-- direct
+```cypher
+...
+```
+-- chain
+```cypher
+...
+```
+-- event
+```cypher
+...
+```
+
+The question is:
+{question}"""
+
+SPECULATIVE_PROMPT = PromptTemplate(input_variables=["schema", "examples", "question"], template=SPECULATIVE_TEMPLATE)
+
+_LABELLED_BLOCK = re.compile(
+    r"--\s*(direct|chain|event)\s*:?\s*\n\s*```(?:cypher)?\s*(.*?)```", re.IGNORECASE | re.DOTALL
+)
+
+
+# ==========================================
+# 1. 후보 생성
+# ==========================================
+def parse_variants(text: str) -> List[Tuple[str, str]]:
+    """
+    LLM 응답에서 (전략 이름, Cypher) 목록을 뽑습니다.
+    라벨이 붙은 블록이 없으면(쿼리 하나만 준 경우) 전체를 direct 하나로 봅니다.
+    """
+    variants: Dict[str, str] = {}
+    for name, body in _LABELLED_BLOCK.findall(text or ""):
+        name, body = name.lower(), body.strip()
+        if body and name not in variants:
+            variants[name] = body
+    if not variants:
+        single = extract_cypher(text or "").strip()
+        return [("direct", single)] if single else []
+
+    # 같은 쿼리를 두 번 실행하지 않습니다.
+    seen = set()
+    unique = []
+    for name in VARIANTS:
+        cypher = variants.get(name)
+        if cypher and cypher not in seen:
+            seen.add(cypher)
+            unique.append((name, cypher))
+    return unique
+
+
+def generate_variants(llm, inputs: Dict[str, Any], config=None, prompt=None) -> List[Tuple[str, str]]:
+    """
+    한 번의 LLM 호출로 후보 쿼리들을 만듭니다.
+
+    Args:
+        inputs: 프롬프트 입력 {'schema', 'question', 'examples'}
+    """
+    text = ((prompt or SPECULATIVE_PROMPT) | llm | StrOutputParser()).invoke(inputs, config=config)
+    return parse_variants(text)
+
+
+# ==========================================
+# 2. 동시 실행
+# ==========================================
+def _run_variant(graph, name: str, cypher: str, top_k: int) -> Dict[str, Any]:
+    # 스키마와 어긋난 이름/방향은 실행 전에 교정 (고치지 못하면 검증 실패로 DB에 보내지 않음)
+    cypher, fixes = repair_cypher(graph, cypher)
+    reason = validate_cypher(graph, cypher)
+    rows: List[Dict[str, Any]] = []
+    if reason is None:
+        try:
+            rows = graph.query(cypher)
+        except Exception as e:  # 다른 후보가 살아 있으면 그쪽 결과로 답합니다.
+            reason = f"실행 실패: {e}"
+    return {"name": name, "query": cypher, "rows": rows[:top_k], "total_rows": len(rows), "reason": reason,
+            "fixes": fixes}
+
+
+def run_variants(graph, variants: List[Tuple[str, str]], top_k: int = 10) -> List[Dict[str, Any]]:
+    """
+    후보 쿼리들을 작업 스레드에서 동시에 검증·실행합니다.
+    거버너 요청 범위(취소, 통계)와 프로파일 수집기를 작업 스레드로 이어줍니다.
+
+    Returns:
+        list: [{'name', 'query', 'rows', 'total_rows', 'reason', 'fixes'}, ...] (variants 순서)
+    """
+    if not variants:
+        return []
+    governor = getattr(graph, "governor", None)
+
+    def task(name: str, cypher: str) -> Dict[str, Any]:
+        return _run_variant(graph, name, cypher, top_k)
+
+    if governor is not None:
+        task = governor.bind(task)
+    if len(variants) == 1:
+        return [task(*variants[0])]
+    with ThreadPoolExecutor(max_workers=len(variants)) as pool:
+        futures = [pool.submit(task, name, cypher) for name, cypher in variants]
+        return [f.result() for f in futures]
+
+
+# ==========================================
+# 3. 신뢰도 정책
+# ==========================================
+def confidence(question: str, result: Dict[str, Any], top_k: int = 10) -> float:
+    """
+    후보 결과의 신뢰도 (0~1). 실패하거나 비면 0,
+    그 외에는 전략 기본값 + 질문 단서 가산, 결과가 top_k를 넘으면(질문보다 넓은 쿼리) 감점합니다.
+    """
+    if result.get("reason") or not result.get("rows"):
+        return 0.0
+    name = result["name"]
+    lowered = question.lower()
+    score = PRIORS.get(name, 0.5)
+    if any(hint in lowered for hint in HINTS.get(name, ())):
+        score += 0.3
+    if result.get("total_rows", 0) > top_k:
+        score *= 0.8
+    return round(min(score, 1.0), 2)
+
+
+def merge_results(
+    question: str,
+    results: List[Dict[str, Any]],
+    policy: Optional[str] = None,
+    top_k: int = 10,
+) -> Dict[str, Any]:
+    """
+    후보 결과를 정책에 따라 고르거나 합칩니다.
+
+    Args:
+        question: 사용자 질문
+        results: run_variants() 결과
+        policy: merge | best (기본 SPECULATIVE_POLICY)
+        top_k: 합친 결과의 최대 행 수
+
+    Returns:
+        dict: {'query': 대표 쿼리, 'context': 행 목록, 'chosen': [전략 이름], 'variants': [요약]}
+              성공한 후보가 없으면 query는 첫 후보, context는 빈 리스트
+    """
+    policy = (policy or os.getenv("SPECULATIVE_POLICY", "merge")).strip().lower()
+    for result in results:
+        result["confidence"] = confidence(question, result, top_k)
+    ranked = sorted((r for r in results if r["confidence"] > 0), key=lambda r: -r["confidence"])
+    summary = [
+        {k: r.get(k) for k in ("name", "query", "total_rows", "confidence", "reason", "fixes")} for r in results
+    ]
+    if not ranked:
+        return {"query": results[0]["query"] if results else "", "context": [], "chosen": [], "variants": summary}
+
+    if policy == "best":
+        ranked = ranked[:1]
+    context: List[Dict[str, Any]] = []
+    seen = set()
+    chosen = []
+    for result in ranked:
+        added = False
+        for row in result["rows"]:
+            key = json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+            if key in seen or len(context) >= top_k:
+                continue
+            seen.add(key)
+            context.append(row)
+            added = True
+        if added:
+            chosen.append(result["name"])
+    return {"query": ranked[0]["query"], "context": context, "chosen": chosen, "variants": summary}
@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 시간 속성 정규화 & 타임라인 쿼리 엔진
+시드 스크립트마다 제각각인 시간 표현을 네이티브 date/datetime 속성으로 바꾸고
+범위 인덱스를 걸어, "1996-09-07에 무슨 일이 있었어?" 같은 질문을 인덱스 범위 스캔으로 답합니다.
+
+    date: "1996-09-07"          →  date("1996-09-07")
+    arrest_date: "2024"         →  date("2024-01-01") + arrest_date_precision: "year"
+    year: 1995 / since: 1990    →  (정수 유지) + 시간 창
+    time: "Evening"             →  같은 날 18:00~23:59로 시간 창을 좁힘
+
+정규화된 노드/관계에는 다음 속성이 붙습니다.
+    when           : 시간 창 시작 (localdatetime)
+    when_end       : 시간 창 끝 (localdatetime)
+    when_precision : "year" | "month" | "day" | "part_of_day" | "minute"
+
+when/when_end는 항상 localdatetime으로 통일합니다. (date와 datetime을 비교하면 null이 됩니다)
+
+사용법:
+    python temporal.py                        # 정규화 + 인덱스 생성
+    python temporal.py 1996-09-07             # 그날의 타임라인
+    python temporal.py 1996-09 1997-03        # 기간 타임라인
+"""
+import os
+import re
+import sys
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# when의 출처가 되는 속성 (앞에 있을수록 우선)
+WHEN_KEYS = ("datetime", "timestamp", "date", "year", "since", "founded")
+# 노드 생애 날짜 - 타입만 바꾸고 라벨별 범위 인덱스를 겁니다.
+LIFECYCLE_KEYS = ("birth_date", "death_date", "arrest_date", "release_date")
+TIME_KEYS = ("time",)
+
+# 자유 텍스트 시간대 → (시작 시, 끝 시)
+PARTS_OF_DAY = {
+    "dawn": (4, 6), "새벽": (0, 6),
+    "morning": (6, 12), "아침": (6, 10), "오전": (0, 12),
+    "noon": (11, 14), "정오": (11, 14), "점심": (11, 14),
+    "afternoon": (12, 18), "오후": (12, 24),
+    "evening": (18, 24), "저녁": (18, 24),
+    "night": (20, 24), "밤": (20, 24), "late night": (22, 24), "심야": (22, 24),
+}
+
+# 타임라인 조회 시 when 범위 스캔의 하한 여유 (가장 넓은 창 = 1년)
+MAX_WINDOW = timedelta(days=366)
+
+_RE_YEAR = re.compile(r"^\s*(\d{4})\s*$")
+_RE_MONTH = re.compile(r"^\s*(\d{4})-(\d{1,2})\s*$")
+_RE_DAY = re.compile(r"^\s*(\d{4})-(\d{1,2})-(\d{1,2})\s*$")
+_RE_KO_DATE = re.compile(r"(\d{4})\s*년(?:\s*(\d{1,2})\s*월)?(?:\s*(\d{1,2})\s*일)?")
+_RE_CLOCK = re.compile(r"^\s*(\d{1,2}):(\d{2})(?::(\d{2}))?\s*([AaPp][Mm])?\s*$")
+
+
+def _quote(name: str) -> str:
+    return f"`{name.replace('`', '')}`"
+
+
+# ==========================================
+# 1. 파싱 (순수 파이썬)
+# ==========================================
+def _to_native(value: Any) -> Any:
+    """neo4j.time 타입이면 파이썬 date/datetime으로 바꿉니다."""
+    to_native = getattr(value, "to_native", None)
+    return to_native() if callable(to_native) else value
+
+
+def _year_window(y: int) -> Tuple[datetime, datetime]:
+    return datetime(y, 1, 1), datetime(y, 12, 31, 23, 59, 59, 999000)
+
+
+def _month_window(y: int, m: int) -> Tuple[datetime, datetime]:
+    start = datetime(y, m, 1)
+    nxt = datetime(y + 1, 1, 1) if m == 12 else datetime(y, m + 1, 1)
+    return start, nxt - timedelta(milliseconds=1)
+
+
+def _day_window(d: date) -> Tuple[datetime, datetime]:
+    start = datetime(d.year, d.month, d.day)
+    return start, start + timedelta(days=1) - timedelta(milliseconds=1)
+
+
+def parse_temporal(value: Any) -> Optional[Dict[str, Any]]:
+    """
+    시간 값을 해석합니다.
+
+    Args:
+        value: "1996-09-07", "1996-09", "2024", "1996년 9월 7일", 1995, date/datetime 등
+
+    Returns:
+        dict | None: {'typed': 저장할 네이티브 값, 'start', 'end', 'precision'}
+                     해석할 수 없으면 None
+    """
+    value = _to_native(value)
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, datetime):
+        naive = value.replace(tzinfo=None)
+        return {"typed": value, "start": naive, "end": naive, "precision": "minute"}
+    if isinstance(value, date):
+        start, end = _day_window(value)
+        return {"typed": value, "start": start, "end": end, "precision": "day"}
+    if isinstance(value, int):
+        if 1000 <= value <= 2999:
+            start, end = _year_window(value)
+            return {"typed": value, "start": start, "end": end, "precision": "year"}
+        return None
+    if not isinstance(value, str):
+        return None
+
+    text = value.strip()
+    try:
+        if _RE_YEAR.match(text):
+            y = int(text)
+            start, end = _year_window(y)
+            return {"typed": date(y, 1, 1), "start": start, "end": end, "precision": "year"}
+        m = _RE_MONTH.match(text)
+        if m:
+            y, mo = int(m.group(1)), int(m.group(2))
+            start, end = _month_window(y, mo)
+            return {"typed": date(y, mo, 1), "start": start, "end": end, "precision": "month"}
+        m = _RE_DAY.match(text)
+        if m:
+            d = date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+            start, end = _day_window(d)
+            return {"typed": d, "start": start, "end": end, "precision": "day"}
+        if "T" in text or re.match(r"^\d{4}-\d{2}-\d{2} \d", text):
+            dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+            naive = dt.replace(tzinfo=None)
+            return {"typed": dt, "start": naive, "end": naive, "precision": "minute"}
+        m = _RE_KO_DATE.search(text)
+        if m:
+            y = int(m.group(1))
+            if m.group(3) and m.group(2):
+                return parse_temporal(date(y, int(m.group(2)), int(m.group(3))))
+            if m.group(2):
+                return parse_temporal(f"{y}-{int(m.group(2)):02d}")
+            return parse_temporal(str(y))
+    except ValueError:
+        return None
+    return None
+
+
+def apply_time_of_day(window: Dict[str, Any], text: Any) -> Dict[str, Any]:
+    """
+    하루 단위 창을 "Evening", "23:15", "11:15 PM" 같은 시간 표현으로 좁힙니다.
+    하루 단위가 아니거나 해석할 수 없으면 그대로 반환합니다.
+    """
+    if window.get("precision") != "day" or not isinstance(text, str):
+        return window
+    day = window["start"]
+    m = _RE_CLOCK.match(text)
+    if m:
+        hour, minute = int(m.group(1)), int(m.group(2))
+        ampm = (m.group(4) or "").lower()
+        if ampm == "pm" and hour < 12:
+            hour += 12
+        elif ampm == "am" and hour == 12:
+            hour = 0
+        if hour > 23 or minute > 59:
+            return window
+        at = datetime.combine(day.date(), time(hour, minute, int(m.group(3) or 0)))
+        return {**window, "start": at, "end": at, "precision": "minute"}
+
+    key = text.strip().lower()
+    if key not in PARTS_OF_DAY:
+        return window
+    first, last = PARTS_OF_DAY[key]
+    start = day + timedelta(hours=first)
+    end = day + timedelta(hours=last) - timedelta(milliseconds=1)
+    return {**window, "start": start, "end": end, "precision": "part_of_day"}
+
+
+def normalize_properties(props: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    노드/관계 속성에서 바꿔 써야 할 속성만 골라 반환합니다. (SET n += 결과)
+
+    Returns:
+        dict: 타입이 바뀐 시간 속성, *_precision, when/when_end/when_precision
+    """
+    updates: Dict[str, Any] = {}
+
+    # 생애 날짜 및 기타 *_date 속성: 타입만 바꿉니다.
+    for key, value in props.items():
+        if key in WHEN_KEYS or not (key in LIFECYCLE_KEYS or key.endswith("_date")):
+            continue
+        parsed = parse_temporal(value)
+        if not parsed:
+            continue
+        if isinstance(value, str):
+            updates[key] = parsed["typed"]
+        if parsed["precision"] != "day":
+            updates[f"{key}_precision"] = parsed["precision"]
+
+    # when 창: 우선순위가 가장 높은 키 하나만 사용합니다.
+    for key in WHEN_KEYS:
+        if key not in props:
+            continue
+        parsed = parse_temporal(props[key])
+        if not parsed:
+            continue
+        # 재실행 시: 이미 date로 바뀐 연/월 단위 값은 저장된 정밀도로 창을 되살립니다.
+        stored = props.get(f"{key}_precision")
+        if stored == "year":
+            parsed = {**parsed, **dict(zip(("start", "end"), _year_window(parsed["start"].year))), "precision": "year"}
+        elif stored == "month":
+            window = _month_window(parsed["start"].year, parsed["start"].month)
+            parsed = {**parsed, "start": window[0], "end": window[1], "precision": "month"}
+        if isinstance(props[key], str):
+            updates[key] = parsed["typed"]
+            if parsed["precision"] not in ("day", "minute"):
+                updates[f"{key}_precision"] = parsed["precision"]
+        for tkey in TIME_KEYS:
+            if tkey in props:
+                parsed = apply_time_of_day(parsed, props[tkey])
+        updates.update({
+            "when": parsed["start"],
+            "when_end": parsed["end"],
+            "when_precision": parsed["precision"],
+        })
+        break
+
+    return updates
+
+
+def parse_window(start: Any, end: Any = None) -> Tuple[datetime, datetime]:
+    """
+    타임라인 조회 창을 만듭니다. end가 없으면 start의 정밀도 전체를 창으로 씁니다.
+        parse_window("1996-09-07")            → 그날 하루
+        parse_window("1996-09", "1997-03")    → 1996-09-01 ~ 1997-03-31
+    """
+    first = parse_temporal(start)
+    if not first:
+        raise ValueError(f"시간을 해석할 수 없습니다: {start!r}")
+    if end is None:
+        return first["start"], first["end"]
+    last = parse_temporal(end)
+    if not last:
+        raise ValueError(f"시간을 해석할 수 없습니다: {end!r}")
+    return first["start"], last["end"]
+
+
+def jsonable(value: Any) -> Any:
+    """neo4j.time/date 값을 ISO 문자열로 바꿔 JSON으로 직렬화할 수 있게 만듭니다."""
+    value = _to_native(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: jsonable(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [jsonable(v) for v in value]
+    return value
+
+
+# ==========================================
+# 2. 정규화 + 인덱스
+# ==========================================
+class TemporalNormalizer:
+    """그래프 전체(또는 새로 들어온 항목)의 시간 속성을 네이티브 타입으로 바꿉니다."""
+
+    def __init__(self, graph, verbose: bool = True, batch_size: int = 500):
+        self.graph = graph
+        self.verbose = verbose
+        self.batch_size = batch_size
+
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(message)
+
+    @property
+    def keys(self) -> List[str]:
+        return list(WHEN_KEYS) + list(LIFECYCLE_KEYS) + list(TIME_KEYS)
+
+    def _write(self, rows: List[Dict[str, Any]], target: str) -> None:
+        match = "MATCH (x) WHERE elementId(x) = row.eid" if target == "node" \
+            else "MATCH ()-[x]->() WHERE elementId(x) = row.eid"
+        for i in range(0, len(rows), self.batch_size):
+            self.graph.query(
+                f"UNWIND $rows AS row {match} SET x += row.props",
+                params={"rows": rows[i:i + self.batch_size]},
+            )
+
+    def normalize(self) -> Dict[str, int]:
+        """
+        시간 속성을 가진 노드/관계를 읽어 파이썬에서 해석한 뒤 배치로 되씁니다.
+        여러 번 실행해도 결과가 같습니다.
+
+        Returns:
+            dict: {'nodes': 갱신된 노드 수, 'relationships': 갱신된 관계 수}
+        """
+        params = {"keys": self.keys}
+        nodes = self.graph.query("""
+            MATCH (n) WHERE any(k IN keys(n) WHERE k IN $keys OR k ENDS WITH '_date')
+            RETURN elementId(n) AS eid, properties(n) AS props
+        """, params=params)
+        rels = self.graph.query("""
+            MATCH ()-[r]->() WHERE any(k IN keys(r) WHERE k IN $keys OR k ENDS WITH '_date')
+            RETURN elementId(r) AS eid, properties(r) AS props
+        """, params=params)
+
+        stats = {}
+        for target, records in (("node", nodes), ("relationship", rels)):
+            rows = []
+            for rec in records:
+                updates = normalize_properties(rec["props"] or {})
+                if updates:
+                    rows.append({"eid": rec["eid"], "props": updates})
+            self._write(rows, target)
+            stats[f"{target}s" if target == "node" else "relationships"] = len(rows)
+        self._log(f"  [TEMPORAL] 노드 {stats['nodes']}개, 관계 {stats['relationships']}개 정규화")
+        return stats
+
+    def ensure_indexes(self) -> List[str]:
+        """when 및 생애 날짜 속성에 라벨/관계 타입별 범위 인덱스를 만듭니다."""
+        created = []
+        node_rows = self.graph.query("""
+            MATCH (n) WHERE n.when IS NOT NULL
+            UNWIND labels(n) AS label
+            RETURN DISTINCT label
+        """)
+        for row in node_rows:
+            name = f"{row['label'].lower()}_when"
+            self.graph.query(
+                f"CREATE RANGE INDEX {name} IF NOT EXISTS FOR (n:{_quote(row['label'])}) ON (n.when)"
+            )
+            created.append(name)
+
+        rel_rows = self.graph.query("""
+            MATCH ()-[r]->() WHERE r.when IS NOT NULL
+            RETURN DISTINCT type(r) AS type
+        """)
+        for row in rel_rows:
+            name = f"{row['type'].lower()}_when"
+            self.graph.query(
+                f"CREATE RANGE INDEX {name} IF NOT EXISTS FOR ()-[r:{_quote(row['type'])}]-() ON (r.when)"
+            )
+            created.append(name)
+
+        life_rows = self.graph.query("""
+            MATCH (n) UNWIND labels(n) AS label
+            UNWIND [k IN keys(n) WHERE k IN $keys] AS key
+            RETURN DISTINCT label, key
+        """, params={"keys": list(LIFECYCLE_KEYS)})
+        for row in life_rows:
+            name = f"{row['label'].lower()}_{row['key']}"
+            self.graph.query(
+                f"CREATE RANGE INDEX {name} IF NOT EXISTS "
+                f"FOR (n:{_quote(row['label'])}) ON (n.{_quote(row['key'])})"
+            )
+            created.append(name)
+
+        self._log(f"  [TEMPORAL] 범위 인덱스 {len(created)}개 확인")
+        return created
+
+
+# ==========================================
+# 3. 타임라인 조회
+# ==========================================
+class Timeline:
+    """
+    범위 인덱스가 걸린 라벨/관계 타입별로 인덱스 범위 스캔을 돌려
+    창 안의 사건/관계/생애 날짜를 시간순으로 합치고 페이지로 나눕니다.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self._catalog: Optional[Dict[str, List[Tuple[str, str]]]] = None
+
+    def refresh(self) -> None:
+        """인덱스 목록을 다시 읽습니다. (정규화/인덱스 생성 후 호출)"""
+        self._catalog = None
+
+    @property
+    def catalog(self) -> Dict[str, List[Tuple[str, str]]]:
+        """{'node': [(label, prop)], 'relationship': [(type, prop)]} - 범위 인덱스 기준"""
+        if self._catalog is None:
+            rows = self.graph.query("""
+                SHOW INDEXES YIELD type, entityType, labelsOrTypes, properties, state
+                WHERE type = 'RANGE' AND state = 'ONLINE' AND size(properties) = 1
+                RETURN entityType, labelsOrTypes[0] AS name, properties[0] AS prop
+            """)
+            catalog: Dict[str, List[Tuple[str, str]]] = {"node": [], "relationship": []}
+            for row in rows:
+                prop = row["prop"]
+                if prop != "when" and prop not in LIFECYCLE_KEYS:
+                    continue
+                kind = "node" if row["entityType"] == "NODE" else "relationship"
+                catalog[kind].append((row["name"], prop))
+            self._catalog = catalog
+        return self._catalog
+
+    def _branches(self) -> List[str]:
+        branches = []
+        for label, prop in self.catalog["node"]:
+            if prop == "when":
+                branches.append(f"""
+                    MATCH (n:{_quote(label)})
+                    WHERE n.when >= $lo AND n.when <= $end AND n.when_end >= $start
+                    RETURN 'event' AS kind, n.when AS when, n.when_end AS when_end,
+                           n.when_precision AS precision, {label!r} AS label,
+                           coalesce(n.id, n.name) AS id, null AS source, null AS target, properties(n) AS properties""")
+            else:
+                branches.append(f"""
+                    MATCH (n:{_quote(label)})
+                    WHERE n.{_quote(prop)} >= $start_date AND n.{_quote(prop)} <= $end_date
+                    RETURN 'lifecycle' AS kind, localdatetime({{date: n.{_quote(prop)}}}) AS when,
+                           null AS when_end, coalesce(n.{prop}_precision, 'day') AS precision,
+                           {label!r} AS label, coalesce(n.id, n.name) AS id, null AS source, null AS target,
+                           {{field: {prop!r}, value: n.{_quote(prop)}}} AS properties""")
+        for rel_type, prop in self.catalog["relationship"]:
+            if prop != "when":
+                continue
+            branches.append(f"""
+                MATCH (a)-[r:{_quote(rel_type)}]->(b)
+                WHERE r.when >= $lo AND r.when <= $end AND r.when_end >= $start
+                RETURN 'relationship' AS kind, r.when AS when, r.when_end AS when_end,
+                       r.when_precision AS precision, {rel_type!r} AS label,
+                       null AS id, coalesce(a.id, a.name) AS source, coalesce(b.id, b.name) AS target, properties(r) AS properties""")
+        return branches
+
+    def window(self, start: Any, end: Any = None, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """
+        시간 창 안의 항목을 시간순으로 반환합니다.
+
+        Args:
+            start: 창 시작 ("1996-09-07", "1996", date 등). end가 없으면 start의 정밀도 전체
+            end: 창 끝 (선택)
+            limit: 페이지 크기
+            offset: 건너뛸 항목 수
+
+        Returns:
+            dict: {'start', 'end', 'items': [{'kind', 'when', 'when_end', 'precision',
+                   'label', 'id', 'source', 'target', 'properties'}], 'next_offset'}
+        """
+        lo_dt, hi_dt = parse_window(start, end)
+        branches = self._branches()
+        if not branches:
+            return {"start": lo_dt.isoformat(), "end": hi_dt.isoformat(), "items": [], "next_offset": None}
+
+        query = (
+            "CALL {" + "\n UNION ALL ".join(branches) + "\n}\n"
+            "RETURN kind, when, when_end, precision, label, id, source, target, properties\n"
+            "ORDER BY when, kind, label, coalesce(id, source)\n"
+            "SKIP $offset LIMIT $limit"
+        )
+        params = {
+            "start": lo_dt,
+            "end": hi_dt,
+            "lo": lo_dt - MAX_WINDOW,
+            "start_date": lo_dt.date(),
+            "end_date": hi_dt.date(),
+            "offset": int(offset),
+            "limit": int(limit) + 1,  # 다음 페이지 존재 여부 확인용
+        }
+        rows = self.graph.query(query, params=params)
+        items = [jsonable(dict(row)) for row in rows[:limit]]
+        return {
+            "start": lo_dt.isoformat(),
+            "end": hi_dt.isoformat(),
+            "items": items,
+            "next_offset": offset + limit if len(rows) > limit else None,
+        }
+
+    def on(self, day: Any, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        """특정 날짜(또는 연/월) 하나의 타임라인."""
+        return self.window(day, None, limit=limit, offset=offset)
+
+
+def format_timeline(result: Dict[str, Any]) -> str:
+    """타임라인 결과를 사람이 읽을 수 있는 줄 목록으로 만듭니다."""
+    lines = [f"🕰️ {result['start']} ~ {result['end']}"]
+    for item in result["items"]:
+        when = item["when"] or ""
+        if item["kind"] == "relationship":
+            body = f"{item['source']} -[:{item['label']}]-> {item['target']}"
+        elif item["kind"] == "lifecycle":
+            body = f"{item['id']} ({item['label']}) {item['properties'].get('field')}"
+        else:
+            body = f"{item['id']} ({item['label']})"
+        lines.append(f"  {when} [{item['precision']}] {body}")
+    if result.get("next_offset") is not None:
+        lines.append(f"  ... (다음 페이지 offset={result['next_offset']})")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from langchain_community.graphs import Neo4jGraph
+
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    load_dotenv()
+    graph = Neo4jGraph(
+        url=os.getenv("NEO4J_URI"),
+        username=os.getenv("NEO4J_USERNAME"),
+        password=os.getenv("NEO4J_PASSWORD")
+    )
+
+    args = sys.argv[1:]
+    if not args:
+        print("=" * 60)
+        print("Temporal - Normalizing time properties")
+        print("=" * 60)
+        normalizer = TemporalNormalizer(graph)
+        normalizer.normalize()
+        normalizer.ensure_indexes()
+        print("\n" + "=" * 60)
+    else:
+        print(format_timeline(Timeline(graph).window(args[0], args[1] if len(args) > 1 else None)))
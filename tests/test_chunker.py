@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""split_units가 괄호 안 약어에서는 끊지 않고, 닫히지 않은 괄호 뒤의 문장 경계는 그대로 지키는지 확인합니다."""
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from chunker import split_units  # noqa: E402
+
+
+def sentences(text):
+    return [text[start:end].strip() for start, end, is_header in split_units(text) if not is_header]
+
+
+def test_abbreviation_inside_parentheses_is_not_a_boundary():
+    text = "퍼프 대디(P. Diddy)는 Bad Boy Records의 CEO였다. 노토리어스 비아이지(Notorious B.I.G., 비기)는 소속이었다."
+    assert sentences(text) == [
+        "퍼프 대디(P. Diddy)는 Bad Boy Records의 CEO였다.",
+        "노토리어스 비아이지(Notorious B.I.G., 비기)는 소속이었다.",
+    ]
+
+
+def test_unbalanced_parenthesis_keeps_later_boundaries():
+    # 위키/HTML에서 흔한 닫히지 않은 "(" 뒤에도 한 줄의 문장들이 각각 나뉘어야 합니다.
+    text = "투팍은 (1971년 생. 키피 D는 크립스의 멤버였다. " + " ".join(f"문장 {i}번이다." for i in range(2000))
+    units = sentences(text)
+    assert units[:2] == ["투팍은 (1971년 생.", "키피 D는 크립스의 멤버였다."]
+    assert len(units) == 2002
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""ExampleStore가 학습 상한에서 새 예시를 거절하지 않고 가장 오래 안 쓰인 학습 예시를 버리는지 확인합니다."""
+from cypher_examples import ExampleStore
+
+SEED = '{"question": "올랜도는 어느 갱단이야?", "cypher": "MATCH (p:Person)-[:MEMBER_OF]->(g) RETURN g.id"}\n'
+
+
+def store(tmp_path, monkeypatch, limit=2):
+    monkeypatch.setenv("CYPHER_EXAMPLES_MAX", str(limit))
+    seed = tmp_path / "seed.jsonl"
+    seed.write_text(SEED, encoding="utf-8")
+    return ExampleStore(path=str(seed), learned_path=str(tmp_path / "learned.jsonl"), learn=True)
+
+
+def test_full_store_evicts_least_recently_used(tmp_path, monkeypatch):
+    examples = store(tmp_path, monkeypatch)
+    assert examples.add("투팍을 쏜 사람은 누구야?", "MATCH (a)-[:SHOT_AT]->(b) RETURN a.id")
+    assert examples.add("비기의 레이블은 어디야?", "MATCH (r)-[:SIGNED_TO]->(l) RETURN l.id")
+    # 투팍 예시를 다시 쓰면 비기 예시가 가장 오래 안 쓰인 예시가 됩니다.
+    assert examples.search("투팍을 쏜 사람", min_score=0.1)[0]["question"] == "투팍을 쏜 사람은 누구야?"
+    assert examples.add("슈그 나이트의 회사는?", "MATCH (p)-[:CEO_OF]->(c) RETURN c.id")
+    questions = {e["question"] for e in examples.examples}
+    assert questions == {"올랜도는 어느 갱단이야?", "투팍을 쏜 사람은 누구야?", "슈그 나이트의 회사는?"}
+    assert examples.learned == 2
+
+    reloaded = store(tmp_path, monkeypatch)
+    assert {e["question"] for e in reloaded.examples} == questions
+
+
+def test_reload_keeps_most_recent_when_limit_shrinks(tmp_path, monkeypatch):
+    examples = store(tmp_path, monkeypatch, limit=3)
+    for i in range(3):
+        examples.add(f"질문 {i}번", f"MATCH (n) RETURN n.id LIMIT {i + 1}")
+    reloaded = store(tmp_path, monkeypatch, limit=1)
+    assert [e["question"] for e in reloaded.examples if e["source"] == "learned"] == ["질문 2번"]
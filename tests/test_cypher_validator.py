@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""CypherValidator가 비슷한 이름은 고치되, 캐시된 스키마 이후 DB에 생긴 이름은 고치거나 막지 않는지 확인합니다."""
+from cypher_rewriter import public_schema
+from cypher_validator import CypherValidator
+
+SCHEMA = {
+    "node_props": {"Person": [{"property": "id"}], "Rapper": [{"property": "id"}, {"property": "name"}]},
+    "rel_props": {"ORDERED_HIT_ON": [{"property": "target"}]},
+    "relationships": [
+        {"start": "Person", "type": "ORDERED_HIT_ON", "end": "Person"},
+        {"start": "Person", "type": "SHOT_AT", "end": "Rapper"},
+    ],
+}
+QUERY = "MATCH (a:Person)-[r:ORDERED_HIT]->(b:Person) WHERE r.weapon = 'Glock 22' RETURN a.id"
+
+
+def test_near_miss_type_is_fixed_against_cached_schema():
+    fixed, fixes, remaining = CypherValidator(SCHEMA).repair(QUERY)
+    assert "[r:ORDERED_HIT_ON]" in fixed
+    assert fixes == ["[:ORDERED_HIT] → [:ORDERED_HIT_ON]"]
+
+
+def test_name_already_in_db_is_a_suggestion_not_an_edit():
+    # builder.py가 스키마를 읽은 뒤 ORDERED_HIT을 수집한 경우
+    known = lambda: {"Person", "Rapper", "ORDERED_HIT_ON", "SHOT_AT", "ORDERED_HIT"}
+    validator = CypherValidator(SCHEMA)
+    fixed, fixes, remaining = validator.repair(QUERY, known)
+    assert (fixed, fixes, remaining) == (QUERY, [], [])
+    _, issues = validator.analyze(QUERY, known)
+    assert [(i["kind"], i["found"], i["blocking"], i["stale"]) for i in issues] == [
+        ("type", "ORDERED_HIT", False, True)
+    ]
+
+
+def test_new_label_does_not_block_its_properties():
+    query = "MATCH (a:Hitman)-[:SHOT_AT]->(b:Rapper) WHERE a.alias = 'Baby Lane' RETURN b.name"
+    fixed, fixes, remaining = CypherValidator(SCHEMA).repair(query, lambda: {"Hitman"})
+    assert (fixed, fixes, remaining) == (query, [], [])
+    # DB에도 없는 라벨은 여전히 막습니다.
+    _, _, remaining = CypherValidator(SCHEMA).repair(query, lambda: set())
+    assert "Hitman" in [i["found"] for i in remaining]
+
+
+def test_internal_labels_are_not_suggested():
+    schema = dict(SCHEMA, node_props=dict(SCHEMA["node_props"], Document=[{"property": "text"}],
+                                          EntityVector=[{"property": "entity"}]))
+    validator = CypherValidator(public_schema(schema))
+    _, _, remaining = validator.repair("MATCH (d:Documents) RETURN d.text")
+    assert [(i["found"], i.get("fix")) for i in remaining] == [("Documents", None)]
+    assert public_schema(schema)["node_props"] == SCHEMA["node_props"]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""context_rows/context_ids가 체인 결과와 플래너 결과를 같은 행 목록으로 펼치는지 확인합니다."""
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from graph_rag import context_ids, context_rows  # noqa: E402
+
+
+def test_chain_result_ids():
+    result = {"intermediate_steps": [
+        {"query": "MATCH ..."},
+        {"context": [{"shooter": {"id": "Orlando Anderson", "name": "Orlando"}, "victim": "Tupac Shakur", "hits": 4}]},
+    ]}
+    assert context_ids(result) == ["Orlando Anderson", "Tupac Shakur"]
+
+
+def test_planner_result_ids():
+    result = {"intermediate_steps": [{"context": [
+        {"sub_question": "누가 총을 쐈어?", "rows": [{"shooter": "Orlando Anderson"}]},
+        {"sub_question": "누가 돈을 댔어?", "rows": [{"p": {"id": "Puff Daddy"}, "amount": "1 Million USD"}]},
+    ]}]}
+    assert context_rows(result) == [{"shooter": "Orlando Anderson"}, {"p": {"id": "Puff Daddy"}, "amount": "1 Million USD"}]
+    assert context_ids(result) == ["Orlando Anderson", "Puff Daddy", "1 Million USD"]
+
+
+def test_empty_result_ids():
+    assert context_ids({}) == []
+    assert context_ids({"intermediate_steps": [{"context": [{"sub_question": "?", "rows": None}]}]}) == []
+
+
+def test_internal_labels_cover_index_labels():
+    from cypher_rewriter import INTERNAL_LABELS
+    from graph_rag import ENTITY_LABEL
+    from provenance import DOCUMENT_LABEL
+    assert {DOCUMENT_LABEL, ENTITY_LABEL} <= INTERNAL_LABELS
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""PatternExtractor가 text.py, builder.py의 예시 본문에서 정형 문장만 규칙으로 추출하는지 확인합니다."""
+import os
+import re
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from langchain_core.documents import Document  # noqa: E402
+
+from pattern_extractor import PatternExtractor  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample(filename, name):
+    """스크립트의 예시 본문과, 그 스크립트가 추출기에 넘기는 허용 노드/관계 목록."""
+    with open(os.path.join(ROOT, filename), encoding="utf-8") as f:
+        source = f.read()
+    text = re.search(rf'{name} = """(.*?)"""', source, re.S).group(1)
+    allowed = {
+        var: re.findall(r'"(\w+)"', re.search(rf"{var} = \[(.*?)\]", source, re.S).group(1))
+        for var in ("allowed_nodes", "allowed_rels")
+    }
+    return text, allowed["allowed_nodes"], allowed["allowed_rels"]
+
+
+def extract(filename, name):
+    text, allowed_nodes, allowed_rels = sample(filename, name)
+    patterns = PatternExtractor(allowed_nodes, allowed_rels, enabled=True)
+    document, residual = patterns.extract(Document(page_content=text))
+    facts = {(r.source.id, r.type, r.target.id) for r in document.relationships}
+    return patterns, facts, residual
+
+
+def test_builder_raw_text_templated_sentences():
+    patterns, facts, residual = extract("builder.py", "raw_text")
+    assert facts == {
+        ("Orlando Anderson", "MEMBER_OF", "Southside Crips"),
+        ("Keffe D", "MEMBER_OF", "Southside Crips"),
+        ("Tupac Shakur", "SIGNED_TO", "Death Row Records"),
+        ("Suge Knight", "CEO_OF", "Death Row Records"),
+        ("Puff Daddy", "CEO_OF", "Bad Boy Records"),
+        ("Notorious B.I.G.", "SIGNED_TO", "Bad Boy Records"),
+        ("Tupac Shakur", "SUSPECTED", "Notorious B.I.G."),
+        ("Tupac Shakur", "BEEF_WITH", "Notorious B.I.G."),
+    }
+    assert (patterns.covered_sentences, patterns.total_sentences) == (7, 22)
+    # 서술형 문장은 LLM으로 갑니다.
+    assert "슈그 나이트도 이 폭행에 가담했다." in residual
+    assert "비기를 맹비난했다" not in residual
+
+
+def test_text_truth_text_hire_sentence():
+    patterns, facts, residual = extract("text.py", "truth_text")
+    assert facts == {("Puff Daddy", "HIRED_HITMAN", "Keffe D")}
+    assert (patterns.covered_sentences, patterns.total_sentences) == (1, 16)
+    # 한 절에 사실이 둘인 문장(무기 전달 + 지시)은 규칙으로 반만 덮지 않고 통째로 LLM에 맡깁니다.
+    assert "올랜도 앤더슨에게 건네주며 투팍을 쏘라고 지시했다." in residual
+    # 절 하나만 틀에 맞는 문장도 마찬가지입니다.
+    assert "올랜도 앤더슨은 키피 D의 조카였으며," in residual
+
+
+def test_disallowed_relationship_goes_to_llm():
+    text, allowed_nodes, _ = sample("builder.py", "raw_text")
+    patterns = PatternExtractor(allowed_nodes, ["MEMBER_OF"], enabled=True)
+    document, residual = patterns.extract(Document(page_content=text))
+    assert {r.type for r in document.relationships} == {"MEMBER_OF"}
+    assert "비기를 맹비난했다." in residual
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""rule_engine 기본 규칙이 seed_corrected.py의 실제 어휘에서 파생 관계를 만드는지 확인합니다."""
+import os
+import re
+
+from rule_engine import DEFAULT_RULES, derive
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SEED_REL = re.compile(
+    r'MATCH \(a:(\w+) \{id: "([^"]+)"\}\), \(b:(\w+) \{id: "([^"]+)"\}\)\s*MERGE \(a\)-\[:(\w+)'
+)
+
+
+def seed_facts():
+    with open(os.path.join(ROOT, "seed_corrected.py"), encoding="utf-8") as f:
+        source = f.read()
+    return [(sl, s, rel, tl, t) for sl, s, tl, t, rel in _SEED_REL.findall(source)]
+
+
+def test_seed_vocabulary_is_used_by_rules():
+    seed_types = {fact[2] for fact in seed_facts()}
+    body_types = {t for rule in DEFAULT_RULES for step in rule["body"] for t in step.strip("<>").split("|")}
+    assert {"OFFERED_BOUNTY", "RODE_IN", "SUSPECTED_SHOOTER", "VICTIM_OF"} <= seed_types & body_types
+
+
+def test_seed_graph_derives_accomplice_and_mastermind():
+    derived = derive(seed_facts())
+    assert ("Keffe D", "ACCOMPLICE_OF", "Tupac Shakur") in derived
+    assert ("Puff Daddy", "MASTERMIND_OF", "Tupac Shakur") in derived
+    # 저격범 본인은 같은 차량 규칙으로 공범이 되지 않습니다. (경로의 노드는 모두 달라야 함)
+    assert ("Orlando Anderson", "ACCOMPLICE_OF", "Tupac Shakur") not in derived
+    proof = derived[("Puff Daddy", "MASTERMIND_OF", "Tupac Shakur")][0]
+    assert proof.startswith("Puff Daddy -[:OFFERED_BOUNTY]-> Keffe D -[:ACCOMPLICE_OF]->")
+
+
+def test_fix_db_hit_chain_still_derives():
+    facts = [
+        ("Producer", "Puff Daddy", "HIRED_HITMAN", "Person", "Keffe D"),
+        ("Person", "Keffe D", "ORDERED_HIT", "Person", "Orlando Anderson"),
+        ("Person", "Orlando Anderson", "SHOT_AT", "Rapper", "Tupac Shakur"),
+    ]
+    derived = derive(facts)
+    assert ("Keffe D", "ACCOMPLICE_OF", "Tupac Shakur") in derived
+    assert ("Puff Daddy", "MASTERMIND_OF", "Tupac Shakur") in derived
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""SchemaSelector가 질문의 엔티티 라벨을 id 전체 색인 없이 이름별 앵커 조회로 찾는지 확인합니다."""
+from cypher_rewriter import SchemaCache
+from schema_selector import SchemaSelector
+
+NODES = {"Tupac Shakur": ["Rapper"], "Orlando Anderson": ["Person"], "MGM Grand Hotel": ["Location"]}
+
+
+class FakeGraph:
+    def __init__(self):
+        self.lookups = []
+
+        def lookup(op, value, labels):
+            self.lookups.append((op, value))
+            match = (lambda k: k == value) if op == "=" else (lambda k: k.startswith(value))
+            return {k: v for k, v in NODES.items() if match(k)}
+
+        def loader():
+            raise AssertionError("전체 id 색인을 읽으면 안 됩니다")
+
+        self.schema_cache = SchemaCache({"node_props": {"Rapper": [], "Person": [], "Location": []}},
+                                        loader=loader, lookup=lookup)
+
+
+def test_entity_labels_use_anchor_lookups():
+    graph = FakeGraph()
+    selector = SchemaSelector(graph)
+    assert selector._entity_labels("올랜도는 MGM 로비에서 누구와 싸웠어?") == {"Person", "Location"}
+    assert selector._entity_labels("Who shot Tupac?") == {"Rapper"}
+    assert ("=", "Orlando Anderson") in graph.lookups and ("STARTS WITH", "Tupac") in graph.lookups
+
+
+def test_repeated_question_hits_the_anchor_cache():
+    graph = FakeGraph()
+    selector = SchemaSelector(graph)
+    selector._entity_labels("투팍을 쏜 사람은?")
+    calls = len(graph.lookups)
+    selector._entity_labels("투팍을 쏜 사람은?")
+    assert len(graph.lookups) == calls
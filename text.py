@@ -9,9 +9,17 @@ import re
 from dotenv import load_dotenv
 from langchain_community.graphs import Neo4jGraph
 from langchain_openai import ChatOpenAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_core.documents import Document
+from chunker import TokenChunker
+from loaders import load_text
+from entity_prefilter import EntityPrefilter
+from packed_extraction import PackedGraphExtractor
+from pattern_extractor import PatternExtractor
+from provenance import ProvenanceIndex
+from graph_rag import GraphRAGRetriever
+from rule_engine import RuleEngine
+from triple_dedup import merge_graph_documents
+from temporal import TemporalNormalizer
+from spatial import GeoEnricher
 
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -65,8 +73,8 @@ def inject_truth():
     # graph.query("MATCH (n) DETACH DELETE n") 
 
     # 텍스트 전처리 및 청킹
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    docs = [Document(page_content=truth_text)]
+    text_splitter = TokenChunker()
+    docs = load_text(truth_text, source="text.truth_text")
     chunks = text_splitter.split_documents(docs)
     print(f"\n[CHUNK] Text split into {len(chunks)} pieces.")
 
@@ -75,29 +83,42 @@ def inject_truth():
 
     # [핵심] 추출할 노드와 관계를 명확히 지정해줍니다.
     # LLM에게 "이런 관계를 중점적으로 찾아봐"라고 힌트를 주는 겁니다.
-    transformer = LLMGraphTransformer(
+    # 청크 여러 개를 한 요청에 묶어 추출합니다. (EXTRACT_PACK_TOKENS)
+    allowed_nodes = [
+        "Person", "Rapper", "Producer", "Gang", "Weapon", "Event", "Label", "Location"
+    ]
+    allowed_rels = [
+        "HIRED_HITMAN",    # 청부하다
+        "OFFERED_BOUNTY",  # 현상금을 걸다
+        "ORDERED_HIT",     # 살인을 지시하다
+        "GAVE_WEAPON",     # 무기를 건네다
+        "SHOT_AT",         # 총을 쏘다
+        "KILLED",          # 죽이다
+        "UNCLE_OF",        # 삼촌 관계
+        "MEMBER_OF",       # 조직원
+        "BEEF_WITH",       # 적대 관계
+        "FOUNDED",         # 설립하다
+        "ATTACKED"         # 공격하다
+    ]
+    transformer = PackedGraphExtractor(
         llm=llm,
-        allowed_nodes=[
-            "Person", "Rapper", "Producer", "Gang", "Weapon", "Event", "Label", "Location"
-        ],
-        allowed_relationships=[
-            "HIRED_HITMAN",    # 청부하다
-            "OFFERED_BOUNTY",  # 현상금을 걸다
-            "ORDERED_HIT",     # 살인을 지시하다
-            "GAVE_WEAPON",     # 무기를 건네다
-            "SHOT_AT",         # 총을 쏘다
-            "KILLED",          # 죽이다
-            "UNCLE_OF",        # 삼촌 관계
-            "MEMBER_OF",       # 조직원
-            "BEEF_WITH",       # 적대 관계
-            "FOUNDED",         # 설립하다
-            "ATTACKED"         # 공격하다
-        ]
+        allowed_nodes=allowed_nodes,
+        allowed_relationships=allowed_rels,
+        # 엔티티 후보가 없는 청크(목차, 각주 등)는 LLM에 보내지 않음 (ENTITY_PREFILTER)
+        prefilter=EntityPrefilter(graph),
+        # "X는 Y의 멤버였다" 같은 정형 문장은 규칙으로 먼저 추출 (PATTERN_EXTRACTION)
+        patterns=PatternExtractor(allowed_nodes, allowed_rels)
     )
 
     print("\n[EXTRACT] AI is extracting the truth from text...")
     print("  (This may take 30-60 seconds...)")
     graph_documents = transformer.convert_to_graph_documents(chunks)
+    print(f"  -> {len(chunks)} chunks extracted in {transformer.calls} LLM calls.")
+    if transformer.patterns.rule_facts:
+        patterns = transformer.patterns
+        print(f"  -> [PATTERN] {patterns.rule_facts} facts from {patterns.covered_sentences}/{patterns.total_sentences} templated sentences ({transformer.rule_only} chunks without LLM)")
+    if transformer.skipped:
+        print(f"  -> [PREFILTER] {transformer.skipped} chunks without entity candidates skipped ({transformer.saved_calls} LLM calls saved)")
     
     total_nodes = sum(len(d.nodes) for d in graph_documents)
     total_rels = sum(len(d.relationships) for d in graph_documents)
@@ -115,8 +136,28 @@ def inject_truth():
         for rel in graph_documents[0].relationships[:5]:
             print(f"  - ({rel.source.id}) -[:{rel.type}]-> ({rel.target.id})")
 
+    # 청크 간 중복 사실을 메모리에서 합쳐 DB에는 한 번씩만 씁니다.
+    graph_documents, dedup = merge_graph_documents(graph_documents)
+    print(f"\n[DEDUP] nodes {dedup['nodes_in']} -> {dedup['nodes_out']}, relationships {dedup['rels_in']} -> {dedup['rels_out']}")
+
     print("\n[SAVE] Saving to Neo4j database...")
     graph.add_graph_documents(graph_documents)
+
+    # 청크를 Document 노드로 한 번 저장하고, 노드/관계마다 근거 문장 참조(evidence)를 남김 (PROVENANCE)
+    provenance = ProvenanceIndex(graph).record(chunks, graph_documents)
+    print(f"  -> [PROVENANCE] {provenance['documents']} chunks stored, evidence on {provenance['nodes']} nodes / {provenance['relationships']} relationships")
+    # 청크/엔티티 임베딩 (탐정의 GraphRAG 검색용 벡터 인덱스, GRAPHRAG)
+    indexed = GraphRAGRetriever(graph).index()
+    print(f"  -> [GRAPHRAG] embedded {indexed['documents']} chunks / {indexed['entities']} entities")
+    
+    # 새 사실로 파생 관계(MASTERMIND_OF, ACCOMPLICE_OF) 증분 갱신
+    print("\n[RULES] Updating derived relationships...")
+    RuleEngine(graph).on_graph_documents(graph_documents)
+    
+    # 시간/장소 속성 정규화 (새로 들어온 항목만 point가 붙습니다)
+    print("\n[ENRICH] Normalizing time and place properties...")
+    TemporalNormalizer(graph).normalize()
+    GeoEnricher(graph).geocode()
     
     # 검증
     print("\n" + "=" * 60)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 텍스트 유틸리티 (의존성 없음)
+예시 저장소(cypher_examples), 스키마 선택기(schema_selector), 증거 패킹(evidence), GraphRAG 검색(graph_rag)이
+함께 쓰는 토큰 근사와 글자 n-gram을 둡니다. 체인 모듈(model_router, langchain)을 끌어오지 않으므로
+순수 계산 모듈도 langchain 없이 import 할 수 있습니다.
+"""
+import re
+from collections import Counter
+
+_NOISE = re.compile(r"[\s\?\!\.,'\"()\[\]{}:;~·]+")
+
+
+def normalize_question(question: str) -> str:
+    """비교용 질문 문자열 (소문자, 공백/문장부호 제거)."""
+    return _NOISE.sub("", question.lower())
+
+
+def char_ngrams(text: str, sizes=(2, 3)) -> Counter:
+    """글자 n-gram 빈도. 띄어쓰기와 조사 차이("투팍을"/"투팍이")에 덜 민감합니다."""
+    text = normalize_question(text)
+    grams: Counter = Counter()
+    for n in sizes:
+        grams.update(text[i:i + n] for i in range(max(0, len(text) - n + 1)))
+    return grams
+
+
+def approx_tokens(text: str) -> int:
+    """토큰 수 근사 (UTF-8 바이트 / 4)."""
+    return max(1, len(text.encode("utf-8")) // 4)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Hip-Hop Noir - 추출 트리플 중복 제거 (Overlap-aware Triple Dedup)
+청크가 겹치거나 같은 사실이 여러 문장에 나오면 LLMGraphTransformer는 같은 노드/관계를 여러 번 돌려줍니다.
+그대로 add_graph_documents()에 넘기면 같은 사실을 하나씩 MERGE하느라 왕복이 늘고,
+속성이 조금 다른 관계(예: {year: 1996} / {year: "1996"})는 평행 간선이 됩니다.
+
+merge_graph_documents()는 한 번의 수집에서 나온 모든 청크의 결과를 메모리에서 합칩니다.
+    - 노드 키: (타입, 정규화된 id)   "Tupac Shakur", " tupac  shakur" → 같은 노드, 가장 많이 쓰인 표기를 씀
+    - 관계 키: (출발 노드 키, 관계 타입, 도착 노드 키)
+    - 속성: 합집합, 값이 다르면 서로 다른 값의 리스트
+    - 근거: 관계마다 그 사실을 뒷받침한 청크 번호(source_chunks)와 개수(chunk_support)
+
+합친 사실은 처음 나온 청크의 GraphDocument에만 남기므로 DB는 각 사실을 한 번씩만 받습니다.
+"""
+import re
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+NodeKey = Tuple[str, str]
+RelKey = Tuple[NodeKey, str, NodeKey]
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_id(value: Any) -> str:
+    """비교용 id (공백 정리, 대소문자 무시)"""
+    return _SPACES.sub(" ", str(value)).strip().casefold()
+
+
+def normalize_type(value: str) -> str:
+    """관계 타입 정규화 ("beef with" → BEEF_WITH)"""
+    return _SPACES.sub("_", str(value).strip()).upper()
+
+
+def node_key(node: Node) -> NodeKey:
+    return (node.type, normalize_id(node.id))
+
+
+def _fold(target: Dict[str, Any], properties: Dict[str, Any]) -> None:
+    """속성을 합칩니다. 같은 키에 다른 값이 오면 서로 다른 값의 리스트로 둡니다."""
+    for key, value in (properties or {}).items():
+        if value is None or value == "":
+            continue
+        if key not in target:
+            target[key] = value
+            continue
+        current = target[key]
+        values = current if isinstance(current, list) else [current]
+        if value in values or str(value) in [str(v) for v in values]:
+            continue
+        # Neo4j 리스트 속성은 같은 타입만 담을 수 있으므로 섞이면 문자열로 맞춥니다.
+        merged = values + [value]
+        if len({type(v) for v in merged}) > 1:
+            merged = [str(v) for v in merged]
+        target[key] = merged
+
+
+def _chunk_index(doc: GraphDocument, position: int) -> int:
+    metadata = getattr(doc.source, "metadata", None) or {}
+    return metadata.get("chunk", position)
+
+
+def merge_graph_documents(graph_documents: List[GraphDocument]) -> Tuple[List[GraphDocument], Dict[str, int]]:
+    """
+    한 번의 수집에서 나온 GraphDocument들의 노드/관계를 합칩니다.
+
+    Args:
+        graph_documents: LLMGraphTransformer.convert_to_graph_documents() 결과 (청크 순서)
+
+    Returns:
+        tuple: (합친 GraphDocument 목록 - 청크마다 처음 나온 사실만 담김,
+                {'nodes_in', 'nodes_out', 'rels_in', 'rels_out'})
+    """
+    # 1) 노드: 키별 표기 빈도와 속성
+    spellings: Dict[NodeKey, Counter] = {}
+    node_props: Dict[NodeKey, Dict[str, Any]] = {}
+    node_home: Dict[NodeKey, int] = {}
+    nodes_in = 0
+
+    def see_node(node: Node, position: int) -> NodeKey:
+        key = node_key(node)
+        spellings.setdefault(key, Counter())[_SPACES.sub(" ", str(node.id)).strip()] += 1
+        _fold(node_props.setdefault(key, {}), node.properties)
+        node_home.setdefault(key, position)
+        return key
+
+    # 2) 관계: 키별 속성과 근거 청크
+    rel_props: Dict[RelKey, Dict[str, Any]] = {}
+    rel_chunks: Dict[RelKey, List[int]] = {}
+    rel_home: Dict[RelKey, int] = {}
+    rels_in = 0
+
+    for position, doc in enumerate(graph_documents):
+        chunk = _chunk_index(doc, position)
+        for node in doc.nodes:
+            nodes_in += 1
+            see_node(node, position)
+        for rel in doc.relationships:
+            rels_in += 1
+            key = (see_node(rel.source, position), normalize_type(rel.type), see_node(rel.target, position))
+            _fold(rel_props.setdefault(key, {}), rel.properties)
+            chunks = rel_chunks.setdefault(key, [])
+            if chunk not in chunks:
+                chunks.append(chunk)
+            rel_home.setdefault(key, position)
+
+    # 3) 정규 노드 (가장 많이 쓰인 표기, 같으면 먼저 나온 표기)
+    canonical: Dict[NodeKey, Node] = {
+        key: Node(id=counts.most_common(1)[0][0], type=key[0], properties=node_props[key])
+        for key, counts in spellings.items()
+    }
+
+    # 4) 처음 나온 청크의 문서에만 담기
+    merged_nodes: List[List[Node]] = [[] for _ in graph_documents]
+    merged_rels: List[List[Relationship]] = [[] for _ in graph_documents]
+    for key, position in node_home.items():
+        merged_nodes[position].append(canonical[key])
+    for key, position in rel_home.items():
+        source, rel_type, target = key
+        properties = dict(rel_props[key])
+        properties["source_chunks"] = rel_chunks[key]
+        properties["chunk_support"] = len(rel_chunks[key])
+        merged_rels[position].append(Relationship(
+            source=canonical[source], target=canonical[target], type=rel_type, properties=properties
+        ))
+
+    merged = [
+        GraphDocument(nodes=merged_nodes[i], relationships=merged_rels[i], source=doc.source)
+        for i, doc in enumerate(graph_documents)
+    ]
+    stats = {"nodes_in": nodes_in, "nodes_out": len(canonical), "rels_in": rels_in, "rels_out": len(rel_home)}
+    return merged, stats